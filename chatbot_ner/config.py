@@ -84,6 +84,158 @@ except ValueError:
     ES_BULK_MSG_SIZE = 10000
     ES_SEARCH_SIZE = 10000
 
+# Datastore population streams entity documents to Elasticsearch from ES_BULK_THREAD_COUNT threads, each sending
+# ES_BULK_MSG_SIZE documents per bulk request, with at most ES_BULK_QUEUE_SIZE more requests built ahead of them
+ES_BULK_THREAD_COUNT = os.environ.get('ES_BULK_THREAD_COUNT', '4')
+ES_BULK_QUEUE_SIZE = os.environ.get('ES_BULK_QUEUE_SIZE', '4')
+try:
+    ES_BULK_THREAD_COUNT = int(ES_BULK_THREAD_COUNT)
+    ES_BULK_QUEUE_SIZE = int(ES_BULK_QUEUE_SIZE)
+except ValueError:
+    ES_BULK_THREAD_COUNT = 4
+    ES_BULK_QUEUE_SIZE = 4
+# Entity transfers between Elasticsearch clusters (ESTransfer) read ES_TRANSFER_SLICE_COUNT slices of a sliced scroll
+# in parallel from the source
+ES_TRANSFER_SLICE_COUNT = os.environ.get('ES_TRANSFER_SLICE_COUNT', '4')
+try:
+    ES_TRANSFER_SLICE_COUNT = int(ES_TRANSFER_SLICE_COUNT)
+except ValueError:
+    ES_TRANSFER_SLICE_COUNT = 4
+
+# Entity indices created with ES_VARIANT_SUBFIELDS also index variants as word shingles and edge n-grams. Text detection
+# lookups then first find variants contained exactly in the text through the shingles and only fuzzy match the tokens
+# left over, and variant search terms of the entity data browse API match variant prefixes. Enable it only once the
+# index was created (or rebuilt through entities/rebuild_index) with this setting
+ES_VARIANT_SUBFIELDS = os.environ.get('ES_VARIANT_SUBFIELDS', 'false').lower() == 'true'
+
+# Text detection lookups on elasticsearch. With ES_SEARCH_EXACT_FIRST, variants contained exactly in the text are found
+# first (through the shingles of ES_VARIANT_SUBFIELDS if enabled) and the fuzzy search only runs for the tokens left
+# over, it defaults to ES_VARIANT_SUBFIELDS. ES_SEARCH_MAX_EXPANSIONS limits the terms each token of the text is fuzzily
+# expanded to. With ES_SEARCH_TEMPLATES, the searches are stored on the cluster as search templates and only their
+# parameters are sent with each lookup
+ES_SEARCH_EXACT_FIRST = os.environ.get('ES_SEARCH_EXACT_FIRST', str(ES_VARIANT_SUBFIELDS)).lower() == 'true'
+ES_SEARCH_TEMPLATES = os.environ.get('ES_SEARCH_TEMPLATES', 'false').lower() == 'true'
+ES_SEARCH_MAX_EXPANSIONS = os.environ.get('ES_SEARCH_MAX_EXPANSIONS', '50')
+try:
+    ES_SEARCH_MAX_EXPANSIONS = int(ES_SEARCH_MAX_EXPANSIONS)
+except ValueError:
+    ES_SEARCH_MAX_EXPANSIONS = 50
+
+# Limits on hits retrieved by text detection lookups. If ES_SEARCH_SIZE_PER_TOKEN is set, size of the search is
+# chosen from the number of tokens in the text and the number of documents of the entity (capped at ES_SEARCH_SIZE).
+# ES_SEARCH_TERMINATE_AFTER stops collecting hits on each shard after that many documents and ES_SEARCH_MIN_SCORE
+# drops hits scoring lower. 0 disables each of these limits
+ES_SEARCH_SIZE_PER_TOKEN = os.environ.get('ES_SEARCH_SIZE_PER_TOKEN', '0')
+ES_SEARCH_TERMINATE_AFTER = os.environ.get('ES_SEARCH_TERMINATE_AFTER', '0')
+ES_SEARCH_MIN_SCORE = os.environ.get('ES_SEARCH_MIN_SCORE', '0')
+try:
+    ES_SEARCH_SIZE_PER_TOKEN = int(ES_SEARCH_SIZE_PER_TOKEN)
+    ES_SEARCH_TERMINATE_AFTER = int(ES_SEARCH_TERMINATE_AFTER)
+    ES_SEARCH_MIN_SCORE = float(ES_SEARCH_MIN_SCORE)
+except ValueError:
+    ES_SEARCH_SIZE_PER_TOKEN = 0
+    ES_SEARCH_TERMINATE_AFTER = 0
+    ES_SEARCH_MIN_SCORE = 0
+
+# Elasticsearch transport settings, refer datastore.elastic_search.transport.ResilientTransport. ES_REQUEST_TIMEOUT is
+# the deadline in seconds for a whole call to elasticsearch, retries and hedged requests included. ES_TIMEOUT is the
+# default timeout of a single request. With ES_HEDGE_REQUESTS, searches slower than the ES_HEDGE_PERCENTILE latency of
+# recent searches (but at least ES_HEDGE_MIN_DELAY seconds) are sent to another node as well, this needs more than one
+# node in ES_URL. After ES_CIRCUIT_BREAKER_FAILURES consecutive failed calls, calls fail fast without contacting
+# elasticsearch for ES_CIRCUIT_BREAKER_RESET_TIMEOUT seconds, 0 disables the circuit breaker
+ES_MAX_RETRIES = os.environ.get('ES_MAX_RETRIES', '1')
+ES_RETRY_ON_TIMEOUT = os.environ.get('ES_RETRY_ON_TIMEOUT', 'false').lower() == 'true'
+ES_TIMEOUT = os.environ.get('ES_TIMEOUT', '20')
+ES_REQUEST_TIMEOUT = os.environ.get('ES_REQUEST_TIMEOUT', '5000')
+ES_PING_TIMEOUT = os.environ.get('ES_PING_TIMEOUT', '5')
+ES_CONNECTIONS_PER_HOST = os.environ.get('ES_CONNECTIONS_PER_HOST', '10')
+ES_HEDGE_REQUESTS = os.environ.get('ES_HEDGE_REQUESTS', 'false').lower() == 'true'
+ES_HEDGE_PERCENTILE = os.environ.get('ES_HEDGE_PERCENTILE', '95')
+ES_HEDGE_MIN_DELAY = os.environ.get('ES_HEDGE_MIN_DELAY', '0.05')
+ES_CIRCUIT_BREAKER_FAILURES = os.environ.get('ES_CIRCUIT_BREAKER_FAILURES', '0')
+ES_CIRCUIT_BREAKER_RESET_TIMEOUT = os.environ.get('ES_CIRCUIT_BREAKER_RESET_TIMEOUT', '30')
+try:
+    ES_MAX_RETRIES = int(ES_MAX_RETRIES)
+    ES_TIMEOUT = float(ES_TIMEOUT)
+    ES_REQUEST_TIMEOUT = float(ES_REQUEST_TIMEOUT)
+    ES_PING_TIMEOUT = float(ES_PING_TIMEOUT)
+    ES_CONNECTIONS_PER_HOST = int(ES_CONNECTIONS_PER_HOST)
+    ES_HEDGE_PERCENTILE = float(ES_HEDGE_PERCENTILE)
+    ES_HEDGE_MIN_DELAY = float(ES_HEDGE_MIN_DELAY)
+    ES_CIRCUIT_BREAKER_FAILURES = int(ES_CIRCUIT_BREAKER_FAILURES)
+    ES_CIRCUIT_BREAKER_RESET_TIMEOUT = float(ES_CIRCUIT_BREAKER_RESET_TIMEOUT)
+except ValueError:
+    ES_MAX_RETRIES = 1
+    ES_TIMEOUT = 20
+    ES_REQUEST_TIMEOUT = 5000
+    ES_PING_TIMEOUT = 5
+    ES_CONNECTIONS_PER_HOST = 10
+    ES_HEDGE_PERCENTILE = 95
+    ES_HEDGE_MIN_DELAY = 0.05
+    ES_CIRCUIT_BREAKER_FAILURES = 0
+    ES_CIRCUIT_BREAKER_RESET_TIMEOUT = 30
+
+# Embedded sqlite engine settings, refer datastore.sqlite
+SQLITE_DATABASE_PATH = os.environ.get('SQLITE_DATABASE_PATH') or os.path.join(BASE_DIR, 'data', 'datastore.sqlite3')
+SQLITE_BUSY_TIMEOUT = os.environ.get('SQLITE_BUSY_TIMEOUT', '5')
+try:
+    SQLITE_BUSY_TIMEOUT = float(SQLITE_BUSY_TIMEOUT)
+except ValueError:
+    SQLITE_BUSY_TIMEOUT = 5
+
+# Seconds after which in-process dictionary indices used by text detection in local matching mode are rebuilt
+TEXT_DETECTION_LOCAL_INDEX_TTL = os.environ.get('TEXT_DETECTION_LOCAL_INDEX_TTL', '300')
+try:
+    TEXT_DETECTION_LOCAL_INDEX_TTL = int(TEXT_DETECTION_LOCAL_INDEX_TTL)
+except ValueError:
+    TEXT_DETECTION_LOCAL_INDEX_TTL = 300
+
+# Bloom filter over variant tokens (and their deletion neighbourhoods) of each entity, used by text detection to skip
+# datastore queries for texts that can not match any variant. Error rate is the false positive probability of the
+# filter, i.e. the fraction of such texts still sent to the datastore
+TEXT_DETECTION_BLOOM_PREFILTER = os.environ.get('TEXT_DETECTION_BLOOM_PREFILTER', 'false').lower() == 'true'
+TEXT_DETECTION_BLOOM_FILTER_ERROR_RATE = os.environ.get('TEXT_DETECTION_BLOOM_FILTER_ERROR_RATE', '0.01')
+try:
+    TEXT_DETECTION_BLOOM_FILTER_ERROR_RATE = float(TEXT_DETECTION_BLOOM_FILTER_ERROR_RATE)
+except ValueError:
+    TEXT_DETECTION_BLOOM_FILTER_ERROR_RATE = 0.01
+
+# In-process cache for DataStore.get_similar_dictionary, disabled by default (size 0). TTLs are in seconds, negative TTL
+# applies to lookups that found no variants. Writes to an entity touch a file per entity in the generation directory
+# so that workers in other processes drop their cached results for that entity
+DATASTORE_CACHE_SIZE = os.environ.get('DATASTORE_CACHE_SIZE', '0')
+DATASTORE_CACHE_TTL = os.environ.get('DATASTORE_CACHE_TTL', '300')
+DATASTORE_CACHE_NEGATIVE_TTL = os.environ.get('DATASTORE_CACHE_NEGATIVE_TTL', '60')
+try:
+    DATASTORE_CACHE_SIZE = int(DATASTORE_CACHE_SIZE)
+    DATASTORE_CACHE_TTL = int(DATASTORE_CACHE_TTL)
+    DATASTORE_CACHE_NEGATIVE_TTL = int(DATASTORE_CACHE_NEGATIVE_TTL)
+except ValueError:
+    DATASTORE_CACHE_SIZE = 0
+    DATASTORE_CACHE_TTL = 300
+    DATASTORE_CACHE_NEGATIVE_TTL = 60
+DATASTORE_CACHE_GENERATION_DIR = os.environ.get('DATASTORE_CACHE_GENERATION_DIR') or \
+                                 os.path.join(BASE_DIR, 'data', 'cache_generation')
+
+# Directory in which dictionary snapshots (see datastore.snapshot) are published. Worker processes memory map the
+# current snapshot read-only and check at most every DATASTORE_SNAPSHOT_CHECK_INTERVAL seconds for a new one
+DATASTORE_SNAPSHOT_DIR = os.environ.get('DATASTORE_SNAPSHOT_DIR') or \
+                         os.path.join(BASE_DIR, 'data', 'dictionary_snapshot')
+DATASTORE_SNAPSHOT_CHECK_INTERVAL = os.environ.get('DATASTORE_SNAPSHOT_CHECK_INTERVAL', '10')
+try:
+    DATASTORE_SNAPSHOT_CHECK_INTERVAL = float(DATASTORE_SNAPSHOT_CHECK_INTERVAL)
+except ValueError:
+    DATASTORE_SNAPSHOT_CHECK_INTERVAL = 10
+
+# Seconds between polls of DataStore.get_entity_changes by the background refresher of each worker process, which
+# patches in-process indices (see datastore.local_index) with changed and deleted values of their entities instead of
+# waiting for TEXT_DETECTION_LOCAL_INDEX_TTL. 0 disables the refresher
+DATASTORE_CHANGE_FEED_INTERVAL = os.environ.get('DATASTORE_CHANGE_FEED_INTERVAL', '0')
+try:
+    DATASTORE_CHANGE_FEED_INTERVAL = float(DATASTORE_CHANGE_FEED_INTERVAL)
+except ValueError:
+    DATASTORE_CHANGE_FEED_INTERVAL = 0
+
 # Optional Vars
 ES_INDEX_1 = os.environ.get('ES_INDEX_1')
 ES_INDEX_2 = os.environ.get('ES_INDEX_2')
@@ -120,10 +272,17 @@ CHATBOT_NER_DATASTORE = {
         'port': ES_PORT,  # Port of elastic search
         'user': ES_AUTH_NAME,
         'password': ES_AUTH_PASSWORD,
-        'retry_on_timeout': False,
-        'max_retries': 1,
-        'timeout': 20,
-        'request_timeout': 5000,
+        'retry_on_timeout': ES_RETRY_ON_TIMEOUT,
+        'max_retries': ES_MAX_RETRIES,
+        'timeout': ES_TIMEOUT,
+        'request_timeout': ES_REQUEST_TIMEOUT,  # Deadline of every call, see ES_REQUEST_TIMEOUT
+        'ping_timeout': ES_PING_TIMEOUT,
+        'connections_per_host': ES_CONNECTIONS_PER_HOST,
+        'hedge_requests': ES_HEDGE_REQUESTS,
+        'hedge_percentile': ES_HEDGE_PERCENTILE,
+        'hedge_min_delay': ES_HEDGE_MIN_DELAY,
+        'circuit_breaker_failure_threshold': ES_CIRCUIT_BREAKER_FAILURES,
+        'circuit_breaker_reset_timeout': ES_CIRCUIT_BREAKER_RESET_TIMEOUT,
 
         # Transfer Specific constants (ignore if only one elasticsearch is setup)
         # For detailed explanation datastore.elastic_search.transfer.py
@@ -136,6 +295,10 @@ CHATBOT_NER_DATASTORE = {
         # Training Data ES constants
         'elasticsearch_crf_data_index_name': ELASTICSEARCH_CRF_DATA_INDEX_NAME,
         'elasticsearch_crf_data_doc_type': ELASTICSEARCH_CRF_DATA_DOC_TYPE,
+    },
+    'sqlite': {
+        'database_path': SQLITE_DATABASE_PATH,  # Path of the database file
+        'busy_timeout': SQLITE_BUSY_TIMEOUT,
     }
 }
 
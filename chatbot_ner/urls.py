@@ -42,6 +42,7 @@ urlpatterns = [
 
     # Transfer Dictionary
     url(r'^entities/transfer_entities', external_api.transfer_entities),
+    url(r'^entities/rebuild_index', external_api.rebuild_index),
 
     # Training Data Read Write
     url(r'^entities/get_crf_training_data', external_api.get_crf_training_data),
@@ -1,8 +1,31 @@
 import errno
+import json
 import os
+import tempfile
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
 import boto3
 
+# Name of the file in the target directory recording the ETag and size of every object downloaded by sync_dir
+SYNC_MANIFEST_FILE_NAME = '.s3_sync_manifest.json'
+
+# Number of objects downloaded at the same time by sync_dir
+S3_SYNC_THREAD_COUNT = os.environ.get('S3_SYNC_THREAD_COUNT', '8')
+try:
+    S3_SYNC_THREAD_COUNT = max(int(S3_SYNC_THREAD_COUNT), 1)
+except ValueError:
+    S3_SYNC_THREAD_COUNT = 8
+
+# Hold while printing from download threads so that lines do not interleave
+_print_lock = threading.Lock()
+
+
+def _print(message):
+    with _print_lock:
+        print(message)
+
 
 def assert_dir_exists(path):
     """
@@ -16,34 +39,159 @@ def assert_dir_exists(path):
             raise
 
 
-def download_dir(client, bucket, path, target):
+def list_objects(client, bucket, path):
+    """
+    Lists the objects under the given S3 path, skipping directory placeholders
+    :param client: S3 client to use.
+    :param bucket: the name of the bucket to list
+    :param path: The S3 directory to list, ending with /
+    :return: generator of dicts with Key, ETag and Size of each object
+    """
+    paginator = client.get_paginator('list_objects_v2')
+    for result in paginator.paginate(Bucket=bucket, Prefix=path):
+        for key in result.get('Contents', []):
+            if not key['Key'].endswith('/'):
+                yield key
+
+
+def load_sync_manifest(target):
+    """
+    Reads the manifest written by sync_dir in the target directory
+    :param target: the local directory files are downloaded to
+    :return: dict mapping S3 key to dict with etag and size of the downloaded object, empty if there is no manifest
+    """
+    try:
+        with open(os.path.join(target, SYNC_MANIFEST_FILE_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_sync_manifest(target, manifest):
+    """
+    Atomically replaces the manifest in the target directory
+    :param target: the local directory files are downloaded to
+    :param manifest: dict mapping S3 key to dict with etag and size of the downloaded object
+    """
+    fd, temp_path = tempfile.mkstemp(dir=target, prefix='.' + SYNC_MANIFEST_FILE_NAME)
+    with os.fdopen(fd, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.rename(temp_path, os.path.join(target, SYNC_MANIFEST_FILE_NAME))
+
+
+def is_up_to_date(key, manifest, local_file_path):
+    """
+    Checks if the local copy of an object is the same as the one in S3, by comparing the ETag and size recorded when it
+    was downloaded and the size of the file on disk
+    :param key: dict with Key, ETag and Size of the object as returned by list_objects
+    :param manifest: dict loaded with load_sync_manifest
+    :param local_file_path: path the object is downloaded to
+    :return: True if the object does not need to be downloaded again
+    """
+    entry = manifest.get(key['Key'])
+    if not entry or entry['etag'] != key['ETag'] or entry['size'] != key['Size']:
+        return False
+    return os.path.isfile(local_file_path) and os.path.getsize(local_file_path) == key['Size']
+
+
+def download_file_atomically(client, bucket, key, local_file_path):
     """
-    Downloads recursively the given S3 path to the target directory.
+    Downloads an object to a temporary file next to local_file_path and renames it in place, so that a partially
+    downloaded file never replaces the previous copy
+    :param client: S3 client to use.
+    :param bucket: the name of the bucket to download from
+    :param key: the S3 key of the object
+    :param local_file_path: the path to download the object to
+    """
+    local_file_dir = os.path.dirname(local_file_path)
+    assert_dir_exists(local_file_dir)
+    fd, temp_path = tempfile.mkstemp(dir=local_file_dir, prefix='.' + os.path.basename(local_file_path))
+    os.close(fd)
+    try:
+        client.download_file(bucket, key, temp_path)
+        os.rename(temp_path, local_file_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+
+def sync_dir(client, bucket, path, target, thread_count=S3_SYNC_THREAD_COUNT):
+    """
+    Downloads the objects under the given S3 path to the target directory, skipping the ones that did not change since
+    the last sync. Objects are downloaded concurrently, each through a temporary file, and the ETag and size of every
+    downloaded object is kept in a manifest in the target directory. Files downloaded by a previous sync whose object was
+    deleted from S3 are removed.
     :param client: S3 client to use.
     :param bucket: the name of the bucket to download from
     :param path: The S3 directory to download.
     :param target: the local directory to download the files to.
+    :param thread_count: number of objects to download at the same time
+    :return: dict with the number of objects downloaded, skipped and removed and the bytes downloaded
     """
 
     # Handle missing / at end of prefix
     if not path.endswith('/'):
         path += '/'
 
-    paginator = client.get_paginator('list_objects_v2')
-    for result in paginator.paginate(Bucket=bucket, Prefix=path):
-        # Download each file individually
-        for key in result['Contents']:
-            # Calculate relative path
-            rel_path = key['Key'][len(path):]
-            # Skip paths ending in /
-            if not key['Key'].endswith('/'):
-                local_file_path = os.path.join(target, rel_path)
-                # Make sure directories exist
-                local_file_dir = os.path.dirname(local_file_path)
-                assert_dir_exists(local_file_dir)
-                print("Downloading data of " + str(key['Key']))
-                client.download_file(bucket, key['Key'], local_file_path)
+    assert_dir_exists(target)
+    manifest = load_sync_manifest(target)
+    new_manifest = {}
+    to_download = []
+    for key in list_objects(client, bucket, path):
+        local_file_path = os.path.join(target, key['Key'][len(path):])
+        if is_up_to_date(key, manifest, local_file_path):
+            new_manifest[key['Key']] = manifest[key['Key']]
+        else:
+            to_download.append((key, local_file_path))
+
+    removed = 0
+    for s3_key in set(manifest) - set(new_manifest) - set(key['Key'] for key, _ in to_download):
+        local_file_path = os.path.join(target, s3_key[len(path):])
+        if os.path.isfile(local_file_path):
+            os.remove(local_file_path)
+            removed += 1
+            _print("Removed data of " + str(s3_key))
 
+    def download(item):
+        key, local_file_path = item
+        _print("Downloading data of " + str(key['Key']))
+        download_file_atomically(client, bucket, key['Key'], local_file_path)
+        return key
+
+    skipped = len(new_manifest)
+    start = time.time()
+    downloaded_bytes = 0
+    pool = ThreadPool(min(max(thread_count, 1), max(len(to_download), 1)))
+    try:
+        for key in pool.imap_unordered(download, to_download):
+            new_manifest[key['Key']] = {'etag': key['ETag'], 'size': key['Size']}
+            downloaded_bytes += key['Size']
+    finally:
+        pool.terminate()
+        # Previous copies of objects that failed to download are left in place, keep their entries so that they are
+        # still removed if the object gets deleted
+        for key, _ in to_download:
+            if key['Key'] not in new_manifest and key['Key'] in manifest:
+                new_manifest[key['Key']] = manifest[key['Key']]
+        # Record what was downloaded even if a download failed, so that it is not downloaded again on the next sync
+        write_sync_manifest(target, new_manifest)
+    elapsed = max(time.time() - start, 1e-6)
+
+    _print("Downloaded %d objects (%d bytes, %.0f bytes/sec), %d unchanged, %d removed"
+           % (len(to_download), downloaded_bytes, downloaded_bytes / elapsed, skipped, removed))
+    return {'downloaded': len(to_download), 'skipped': skipped, 'removed': removed, 'bytes': downloaded_bytes}
+
+
+def download_dir(client, bucket, path, target):
+    """
+    Downloads recursively the given S3 path to the target directory. Only objects that changed since the last download
+    are fetched, see sync_dir.
+    :param client: S3 client to use.
+    :param bucket: the name of the bucket to download from
+    :param path: The S3 directory to download.
+    :param target: the local directory to download the files to.
+    """
+    sync_dir(client, bucket, path, target)
 
 
 def execute_download():
@@ -58,4 +206,5 @@ def execute_download():
     print("Download S3 Data Done!")
 
 
-execute_download()
+if __name__ == '__main__':
+    execute_download()
@@ -0,0 +1,124 @@
+"""
+Benchmark full text queries on the embedded sqlite engine against elasticsearch
+
+Usage:
+    python -m datastore.benchmarks.engines --entity_data_directory_path data/entity_data --messages 200
+
+Entity csv files are loaded into a temporary sqlite database (the configured datastore is not touched). For every
+entity, generated messages (some with typos) are searched on sqlite and, unless --skip_es is passed, on the
+configured elasticsearch engine in highlighter free mode, alternating the order to not favour either with warm
+caches. Reports p50/p99 latency and throughput of both engines and parity of the returned variants (as a set,
+lowercased).
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import shutil
+import tempfile
+
+from chatbot_ner.config import ner_logger
+from datastore import DataStore
+from datastore.benchmarks.utils import load_entity_dictionaries, generate_messages, percentile, timed_call
+from datastore.constants import DEFAULT_ENTITY_DATA_DIRECTORY, ELASTICSEARCH_DOC_TYPE, ELASTICSEARCH_SEARCH_SIZE
+from datastore.elastic_search import query as es_query
+from datastore.sqlite import connect, create, populate, query as sqlite_query
+from language_utilities.constant import ENGLISH_LANG
+
+SQLITE, ES = 'sqlite', 'es'
+
+
+def _variant_keys(variants_to_values):
+    return {variant.lower() for variant in variants_to_values}
+
+
+def _throughput(latencies):
+    total = sum(latencies)
+    return 1000.0 * len(latencies) / total if total else 0.0
+
+
+def _create_sqlite_database(database_path, dictionaries):
+    connection = connect.connect(database_path=database_path)
+    create.create_tables(connection=connection, logger=ner_logger)
+    for entity_name, dictionary in dictionaries.items():
+        populate.add_entity_data(connection=connection, entity_name=entity_name, value_variant_records=[
+            {'value': value, 'variants': variants, 'language_script': ENGLISH_LANG}
+            for value, variants in dictionary.items()])
+    return connection
+
+
+def _search_es(datastore, entity_name, text, fuzziness):
+    return es_query.full_text_query(connection=datastore._client_or_connection, index_name=datastore._store_name,
+                                    doc_type=datastore._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                    entity_name=entity_name, sentence=text, fuzziness_threshold=fuzziness,
+                                    highlight=False)
+
+
+def _search_sqlite(connection, entity_name, text, fuzziness):
+    return sqlite_query.full_text_query(connection=connection, entity_name=entity_name, sentence=text,
+                                        fuzziness_threshold=fuzziness, size=ELASTICSEARCH_SEARCH_SIZE)
+
+
+def run(entity_data_directory_path, messages_per_entity, fuzziness, entity_names=None, seed=0, skip_es=False):
+    datastore = None
+    if not skip_es:
+        datastore = DataStore()
+        if datastore._client_or_connection is None:
+            datastore._connect()
+
+    dictionaries = load_entity_dictionaries(entity_data_directory_path, logger=ner_logger, entity_names=entity_names)
+    directory = tempfile.mkdtemp()
+    try:
+        connection = _create_sqlite_database(os.path.join(directory, 'benchmark.sqlite3'), dictionaries)
+        engines = [SQLITE] if skip_es else [SQLITE, ES]
+        searches = {
+            SQLITE: lambda entity_name, text: _search_sqlite(connection, entity_name, text, fuzziness),
+            ES: lambda entity_name, text: _search_es(datastore, entity_name, text, fuzziness),
+        }
+
+        print('%-25s %8s %10s %10s %10s %10s %10s %10s %8s' % ('entity', 'messages', 'sql_p50', 'sql_p99', 'sql_qps',
+                                                             'es_p50', 'es_p99', 'es_qps', 'parity'))
+        for entity_name, dictionary in sorted(dictionaries.items()):
+            latencies = {SQLITE: [], ES: []}
+            same = 0
+            messages = generate_messages(dictionary, count=messages_per_entity, seed=seed)
+            for i, message in enumerate(messages):
+                results = {}
+                for engine in (engines if i % 2 == 0 else engines[::-1]):
+                    results[engine], latency = timed_call(searches[engine], entity_name, message)
+                    latencies[engine].append(latency)
+                if not skip_es:
+                    same += int(_variant_keys(results[SQLITE]) == _variant_keys(results[ES]))
+
+            parity = '%.3f' % (float(same) / len(messages)) if messages and not skip_es else '-'
+            print('%-25s %8d %10.3f %10.3f %10.1f %10.3f %10.3f %10.1f %8s' % (
+                entity_name[:25], len(messages),
+                percentile(latencies[SQLITE], 50), percentile(latencies[SQLITE], 99), _throughput(latencies[SQLITE]),
+                percentile(latencies[ES], 50), percentile(latencies[ES], 99), _throughput(latencies[ES]),
+                parity))
+        connection.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark full text queries on sqlite and elasticsearch engines')
+    parser.add_argument('--entity_data_directory_path', default=DEFAULT_ENTITY_DATA_DIRECTORY,
+                        help='directory containing entity data csv files')
+    parser.add_argument('--entity_names', default=None, help='comma separated entity names to benchmark')
+    parser.add_argument('--messages', type=int, default=200, help='messages to generate per entity')
+    parser.add_argument('--fuzziness', default=1, help='fuzziness, int or auto:<lo>,<hi>')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip_es', action='store_true', help='only benchmark the sqlite engine')
+    args = parser.parse_args()
+
+    fuzziness = args.fuzziness
+    if not str(fuzziness).lower().startswith('auto'):
+        fuzziness = int(fuzziness)
+    entity_names = args.entity_names.split(',') if args.entity_names else None
+    run(entity_data_directory_path=args.entity_data_directory_path, messages_per_entity=args.messages,
+        fuzziness=fuzziness, entity_names=entity_names, seed=args.seed, skip_es=args.skip_es)
+
+
+if __name__ == '__main__':
+    main()
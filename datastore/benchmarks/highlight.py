@@ -0,0 +1,99 @@
+"""
+Benchmark full_text_query with elasticsearch highlighting against the highlighter free retrieval mode
+
+Usage:
+    python -m datastore.benchmarks.highlight --entity_data_directory_path data/entity_data --messages 200
+
+For every entity csv file, generated messages (some with typos) are searched on the configured elasticsearch engine
+in both modes, alternating the order to not favour either with warm caches. Reports p50/p99 latency for both modes
+(client side parsing included), the server side time reported by elasticsearch ("took") and parity of the returned
+variants (as a set, lowercased).
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+
+from chatbot_ner.config import ner_logger
+from datastore import DataStore
+from datastore.benchmarks.utils import load_entity_dictionaries, generate_messages, percentile, timed_call
+from datastore.constants import (DEFAULT_ENTITY_DATA_DIRECTORY, ELASTICSEARCH_DOC_TYPE,
+                                 ELASTICSEARCH_SEARCH_SIZE)
+from datastore.elastic_search import query
+from lib.nlp.const import TOKENIZER
+
+
+def _variant_keys(variants_to_values):
+    return {variant.lower() for variant in variants_to_values}
+
+
+def _search(datastore, entity_name, text, fuzziness, highlight):
+    """
+    Run the same steps as query.full_text_query and also return the server side time reported by elasticsearch
+
+    Returns:
+        tuple: (variants to values dictionary, took in milliseconds)
+    """
+    body = query._generate_es_search_dictionary(entity_name, text, fuzziness, highlight=highlight)
+    results = datastore._client_or_connection.search(index=datastore._store_name,
+                                                     doc_type=datastore._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                                     body=body, size=ELASTICSEARCH_SEARCH_SIZE)
+    if highlight:
+        variants_to_values = query._parse_es_search_results(results)
+    else:
+        variants_to_values = query._parse_es_search_results_without_highlights(
+            results, text, query._get_dynamic_fuzziness_threshold(fuzziness))
+    return variants_to_values, results.get('took', 0)
+
+
+def run(entity_data_directory_path, messages_per_entity, fuzziness, entity_names=None, seed=0):
+    datastore = DataStore()
+    if datastore._client_or_connection is None:
+        datastore._connect()
+
+    dictionaries = load_entity_dictionaries(entity_data_directory_path, logger=ner_logger, entity_names=entity_names)
+    print('%-25s %8s %10s %10s %8s %10s %10s %8s %8s' % ('entity', 'messages', 'hl_p50', 'hl_p99', 'hl_took',
+                                                       'nohl_p50', 'nohl_p99', 'nohl_took', 'parity'))
+    for entity_name, dictionary in sorted(dictionaries.items()):
+        latencies = {True: [], False: []}
+        took = {True: [], False: []}
+        same = 0
+        messages = generate_messages(dictionary, count=messages_per_entity, seed=seed)
+        for i, message in enumerate(messages):
+            text = u' '.join(TOKENIZER.tokenize(message.lower()))
+            results = {}
+            for highlight in ((True, False) if i % 2 == 0 else (False, True)):
+                (results[highlight], took_ms), latency = timed_call(_search, datastore, entity_name=entity_name,
+                                                                    text=text, fuzziness=fuzziness,
+                                                                    highlight=highlight)
+                latencies[highlight].append(latency)
+                took[highlight].append(took_ms)
+            same += int(_variant_keys(results[True]) == _variant_keys(results[False]))
+
+        parity = '%.3f' % (float(same) / len(messages)) if messages else '-'
+        print('%-25s %8d %10.3f %10.3f %8.1f %10.3f %10.3f %8.1f %8s' % (
+            entity_name[:25], len(messages),
+            percentile(latencies[True], 50), percentile(latencies[True], 99), percentile(took[True], 50),
+            percentile(latencies[False], 50), percentile(latencies[False], 99), percentile(took[False], 50),
+            parity))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark highlight and highlighter free full text queries')
+    parser.add_argument('--entity_data_directory_path', default=DEFAULT_ENTITY_DATA_DIRECTORY,
+                        help='directory containing entity data csv files')
+    parser.add_argument('--entity_names', default=None, help='comma separated entity names to benchmark')
+    parser.add_argument('--messages', type=int, default=200, help='messages to generate per entity')
+    parser.add_argument('--fuzziness', default=1, help='fuzziness, int or auto:<lo>,<hi>')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fuzziness = args.fuzziness
+    if not str(fuzziness).lower().startswith('auto'):
+        fuzziness = int(fuzziness)
+    entity_names = args.entity_names.split(',') if args.entity_names else None
+    run(entity_data_directory_path=args.entity_data_directory_path, messages_per_entity=args.messages,
+        fuzziness=fuzziness, entity_names=entity_names, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark in-process LocalEntityIndex against elasticsearch full_text_query for text detection lookups
+
+Usage:
+    python -m datastore.benchmarks.local_index --entity_data_directory_path data/entity_data --messages 200
+
+For every entity csv file, the local index is built from the csv data and generated messages (some with typos) are
+looked up both locally and, unless --skip_es is passed, on the configured elasticsearch engine. Reports build time,
+p50/p99 latency for both paths and parity of the returned variants (as a set, lowercased).
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+
+from chatbot_ner.config import ner_logger
+from datastore.benchmarks.utils import load_entity_dictionaries, generate_messages, percentile, timed_call
+from datastore.constants import DEFAULT_ENTITY_DATA_DIRECTORY
+from datastore.local_index import LocalEntityIndex
+from lib.nlp.const import TOKENIZER
+
+
+def _variant_keys(variants_to_values):
+    return {variant.lower() for variant in variants_to_values}
+
+
+def run(entity_data_directory_path, messages_per_entity, fuzziness, min_token_size_for_fuzziness, skip_es,
+        entity_names=None, seed=0):
+    datastore = None
+    if not skip_es:
+        from datastore import DataStore
+        datastore = DataStore()
+
+    dictionaries = load_entity_dictionaries(entity_data_directory_path, logger=ner_logger, entity_names=entity_names)
+    print('%-25s %8s %9s %10s %10s %10s %10s %8s' % ('entity', 'values', 'build_ms', 'local_p50', 'local_p99',
+                                                    'es_p50', 'es_p99', 'parity'))
+    for entity_name, dictionary in sorted(dictionaries.items()):
+        local_index, build_ms = timed_call(LocalEntityIndex.from_dictionary, entity_name=entity_name,
+                                           dictionary=dictionary)
+        local_latencies, es_latencies, same = [], [], 0
+        messages = generate_messages(dictionary, count=messages_per_entity, seed=seed)
+        for message in messages:
+            text = u' '.join(TOKENIZER.tokenize(message.lower()))
+            local_result, latency = timed_call(local_index.get_similar_dictionary, text=text,
+                                               fuzziness_threshold=fuzziness,
+                                               min_token_size_for_fuzziness=min_token_size_for_fuzziness)
+            local_latencies.append(latency)
+            if datastore is not None:
+                es_result, latency = timed_call(datastore.get_similar_dictionary, entity_name=entity_name, text=text,
+                                                fuzziness_threshold=fuzziness)
+                es_latencies.append(latency)
+                same += int(_variant_keys(local_result) == _variant_keys(es_result))
+
+        parity = '%.3f' % (float(same) / len(messages)) if datastore is not None and messages else '-'
+        print('%-25s %8d %9.1f %10.3f %10.3f %10.3f %10.3f %8s' % (
+            entity_name[:25], len(dictionary), build_ms,
+            percentile(local_latencies, 50), percentile(local_latencies, 99),
+            percentile(es_latencies, 50), percentile(es_latencies, 99), parity))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark local fuzzy variant index against elasticsearch')
+    parser.add_argument('--entity_data_directory_path', default=DEFAULT_ENTITY_DATA_DIRECTORY,
+                        help='directory containing entity data csv files')
+    parser.add_argument('--entity_names', default=None, help='comma separated entity names to benchmark')
+    parser.add_argument('--messages', type=int, default=200, help='messages to generate per entity')
+    parser.add_argument('--fuzziness', default=1, help='fuzziness, int or auto:<lo>,<hi>')
+    parser.add_argument('--min_token_len_fuzziness', type=int, default=4,
+                        help='text tokens not longer than this must match exactly')
+    parser.add_argument('--skip_es', action='store_true', help='only benchmark the local index')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fuzziness = args.fuzziness
+    if not str(fuzziness).lower().startswith('auto'):
+        fuzziness = int(fuzziness)
+    entity_names = args.entity_names.split(',') if args.entity_names else None
+    run(entity_data_directory_path=args.entity_data_directory_path, messages_per_entity=args.messages,
+        fuzziness=fuzziness, min_token_size_for_fuzziness=args.min_token_len_fuzziness, skip_es=args.skip_es,
+        entity_names=entity_names, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark full_text_query with a single fuzzy search against exact shingle matches first and a fuzzy search of the
+tokens left over
+
+Usage:
+    ES_VARIANT_SUBFIELDS=true python -m datastore.benchmarks.shingles --entity_data_directory_path data/entity_data
+
+The configured elasticsearch index must have been created (or rebuilt) with ES_VARIANT_SUBFIELDS. Without
+--entity_names only the entity with the most values is benchmarked. Generated messages (some with typos) are searched
+with both query styles, alternating the order to not favour either with warm caches. Reports p50/p99 latency for both
+styles (all searches and client side parsing included), the share of messages for which the exact search covered
+every token (no fuzzy search needed) and parity of the returned variants (as a set, lowercased).
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+
+from chatbot_ner.config import ner_logger
+from datastore import DataStore
+from datastore.benchmarks.utils import load_entity_dictionaries, generate_messages, percentile, timed_call
+from datastore.constants import DEFAULT_ENTITY_DATA_DIRECTORY, ELASTICSEARCH_DOC_TYPE
+from datastore.elastic_search import query
+from lib.nlp.const import TOKENIZER
+
+
+def _variant_keys(variants_to_values):
+    return {variant.lower() for variant in variants_to_values}
+
+
+def _search(datastore, entity_name, text, fuzziness, exact_first, highlight):
+    return query.full_text_query(connection=datastore._client_or_connection, index_name=datastore._store_name,
+                                 doc_type=datastore._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                 entity_name=entity_name, sentence=text, fuzziness_threshold=fuzziness,
+                                 highlight=highlight, exact_first=exact_first)
+
+
+def run(entity_data_directory_path, messages_per_entity, fuzziness, highlight=True, entity_names=None, seed=0):
+    datastore = DataStore()
+    if datastore._client_or_connection is None:
+        datastore._connect()
+
+    dictionaries = load_entity_dictionaries(entity_data_directory_path, logger=ner_logger, entity_names=entity_names)
+    if not entity_names and dictionaries:
+        largest_entity_name = max(dictionaries, key=lambda entity_name: len(dictionaries[entity_name]))
+        dictionaries = {largest_entity_name: dictionaries[largest_entity_name]}
+
+    print('%-25s %8s %8s %10s %10s %10s %10s %8s %8s' % ('entity', 'values', 'messages', 'fuzzy_p50', 'fuzzy_p99',
+                                                        'exact_p50', 'exact_p99', 'covered', 'parity'))
+    for entity_name, dictionary in sorted(dictionaries.items()):
+        latencies = {True: [], False: []}
+        same, covered = 0, 0
+        messages = generate_messages(dictionary, count=messages_per_entity, seed=seed)
+        for i, message in enumerate(messages):
+            text = u' '.join(TOKENIZER.tokenize(message.lower()))
+            results = {}
+            for exact_first in ((False, True) if i % 2 == 0 else (True, False)):
+                results[exact_first], latency = timed_call(_search, datastore, entity_name=entity_name, text=text,
+                                                           fuzziness=fuzziness, exact_first=exact_first,
+                                                           highlight=highlight)
+                latencies[exact_first].append(latency)
+            same += int(_variant_keys(results[True]) == _variant_keys(results[False]))
+            covered += int(not query._get_uncovered_text(text, results[True]))
+
+        parity = '%.3f' % (float(same) / len(messages)) if messages else '-'
+        covered = '%.3f' % (float(covered) / len(messages)) if messages else '-'
+        print('%-25s %8d %8d %10.3f %10.3f %10.3f %10.3f %8s %8s' % (
+            entity_name[:25], len(dictionary), len(messages),
+            percentile(latencies[False], 50), percentile(latencies[False], 99),
+            percentile(latencies[True], 50), percentile(latencies[True], 99),
+            covered, parity))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fuzzy only and exact shingle first full text queries')
+    parser.add_argument('--entity_data_directory_path', default=DEFAULT_ENTITY_DATA_DIRECTORY,
+                        help='directory containing entity data csv files')
+    parser.add_argument('--entity_names', default=None,
+                        help='comma separated entity names to benchmark, defaults to the entity with most values')
+    parser.add_argument('--messages', type=int, default=200, help='messages to generate per entity')
+    parser.add_argument('--fuzziness', default=1, help='fuzziness, int or auto:<lo>,<hi>')
+    parser.add_argument('--no_highlight', action='store_true', help='fetch hits without highlights')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    fuzziness = args.fuzziness
+    if not str(fuzziness).lower().startswith('auto'):
+        fuzziness = int(fuzziness)
+    entity_names = args.entity_names.split(',') if args.entity_names else None
+    run(entity_data_directory_path=args.entity_data_directory_path, messages_per_entity=args.messages,
+        fuzziness=fuzziness, highlight=not args.no_highlight, entity_names=entity_names, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
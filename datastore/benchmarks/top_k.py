@@ -0,0 +1,146 @@
+"""
+Recall/latency harness for limits on hits retrieved by text detection lookups
+
+Usage:
+    python -m datastore.benchmarks.top_k --entity_names city,restaurant --corpus_path messages.txt \
+        --sizes_per_token 0,5,10,20 --terminate_after 0,500
+
+Messages are read from the corpus file (one message per line) or, if not given, generated from the entity csv files.
+Every message is run through TextDetector for every entity once with no limits (the reference) and once per
+combination of --sizes_per_token, --terminate_after and --min_score (see DataStore._get_search_limits). Reports the
+recall of text_entity_values against the reference along with p50/p99 latency of detect_entity for each combination.
+The datastore lookup cache is disabled while running.
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import collections
+import io
+import itertools
+
+from chatbot_ner.config import ner_logger
+from datastore import DataStore
+from datastore.benchmarks.utils import load_entity_dictionaries, generate_messages, percentile, timed_call
+from datastore.constants import DEFAULT_ENTITY_DATA_DIRECTORY
+from ner_v1.detectors.textual.text.text_detection import TextDetector
+
+
+def _parse_list(value, cast):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def _load_corpus(corpus_path):
+    with io.open(corpus_path, 'r', encoding='utf-8') as corpus_file:
+        return [line.strip() for line in corpus_file if line.strip()]
+
+
+def _replay(datastore, entity_name, messages, limits):
+    """
+    Run text detection for the entity on all messages with the given limits
+
+    Args:
+        datastore (DataStore): datastore whose search limits are set
+        entity_name (str): name of the entity
+        messages (list): messages to detect the entity in
+        limits (tuple): (size per token, terminate after, min score), 0 disables a limit
+
+    Returns:
+        tuple:
+            list: detected entity values per message
+            list: latencies of detect_entity in milliseconds
+    """
+    datastore.search_size_per_token, datastore.search_terminate_after, datastore.search_min_score = limits
+    text_detector = TextDetector(entity_name=entity_name)
+    values, latencies = [], []
+    for message in messages:
+        (entity_values, _), latency = timed_call(text_detector.detect_entity, message)
+        values.append(entity_values)
+        latencies.append(latency)
+    return values, latencies
+
+
+def _recall(reference_values, values):
+    """
+    Micro averaged recall of detected values against reference values, counting repeated values
+
+    Returns:
+        float: recall, 1.0 if nothing was detected in the reference
+    """
+    expected, found = 0, 0
+    for reference, detected in zip(reference_values, values):
+        reference = collections.Counter(reference)
+        expected += sum(reference.values())
+        found += sum((reference & collections.Counter(detected)).values())
+    return float(found) / expected if expected else 1.0
+
+
+def run(entity_names, messages_per_entity, sizes_per_token, terminate_after_values, min_scores,
+        entity_data_directory_path=DEFAULT_ENTITY_DATA_DIRECTORY, corpus_path=None, seed=0):
+    datastore = DataStore()
+    original_limits = (datastore.search_size_per_token, datastore.search_terminate_after, datastore.search_min_score)
+    original_cache_size = datastore._similar_dictionary_cache.max_size
+    datastore._similar_dictionary_cache.max_size = 0
+
+    corpus = _load_corpus(corpus_path) if corpus_path else None
+    dictionaries = {}
+    if corpus is None:
+        dictionaries = load_entity_dictionaries(entity_data_directory_path, logger=ner_logger,
+                                                entity_names=entity_names)
+
+    print('%-25s %8s %10s %10s %8s %10s %10s %10s' % ('entity', 'messages', 'per_token', 'term_after', 'min_score',
+                                                      'recall', 'p50', 'p99'))
+    try:
+        for entity_name in entity_names or sorted(dictionaries):
+            if corpus is not None:
+                messages = corpus
+            else:
+                messages = generate_messages(dictionaries.get(entity_name, {}), count=messages_per_entity, seed=seed)
+            if not messages:
+                continue
+
+            reference_values, latencies = _replay(datastore, entity_name, messages, limits=(0, 0, 0))
+            rows = [((0, 0, 0), 1.0, latencies)]
+            for limits in itertools.product(sizes_per_token, terminate_after_values, min_scores):
+                if limits == (0, 0, 0):
+                    continue
+                values, latencies = _replay(datastore, entity_name, messages, limits=limits)
+                rows.append((limits, _recall(reference_values, values), latencies))
+
+            for (size_per_token, terminate_after, min_score), recall, latencies in rows:
+                print('%-25s %8d %10s %10s %8s %10.4f %10.3f %10.3f' % (
+                    entity_name[:25], len(messages), size_per_token or '-', terminate_after or '-',
+                    min_score or '-', recall, percentile(latencies, 50), percentile(latencies, 99)))
+    finally:
+        datastore.search_size_per_token, datastore.search_terminate_after, datastore.search_min_score = \
+            original_limits
+        datastore._similar_dictionary_cache.max_size = original_cache_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure recall and latency of text detection with limits on '
+                                                 'retrieved hits against unlimited retrieval')
+    parser.add_argument('--entity_names', default=None,
+                        help='comma separated entity names, required with --corpus_path. Defaults to all csv files')
+    parser.add_argument('--corpus_path', default=None, help='file with one message per line to replay')
+    parser.add_argument('--entity_data_directory_path', default=DEFAULT_ENTITY_DATA_DIRECTORY,
+                        help='directory containing entity data csv files, used to generate messages')
+    parser.add_argument('--messages', type=int, default=200, help='messages to generate per entity')
+    parser.add_argument('--sizes_per_token', default='0,5,10,20,50',
+                        help='comma separated values of hits per token to try, 0 for unlimited')
+    parser.add_argument('--terminate_after', default='0', help='comma separated terminate_after values, 0 for none')
+    parser.add_argument('--min_score', default='0', help='comma separated min_score values, 0 for none')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    entity_names = args.entity_names.split(',') if args.entity_names else None
+    if args.corpus_path and not entity_names:
+        parser.error('--entity_names is required with --corpus_path')
+    run(entity_names=entity_names, messages_per_entity=args.messages,
+        sizes_per_token=_parse_list(args.sizes_per_token, int),
+        terminate_after_values=_parse_list(args.terminate_after, int),
+        min_scores=_parse_list(args.min_score, float),
+        entity_data_directory_path=args.entity_data_directory_path, corpus_path=args.corpus_path, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+from __future__ import absolute_import
+
+import os
+import random
+import time
+
+from datastore.utils import get_files_from_directory, get_variants_dictionary_value_from_key, remove_duplicate_data
+
+MESSAGE_TEMPLATES = [
+    u'{0}',
+    u'i want {0}',
+    u'can you show me {0} please',
+    u'is {0} available near me?',
+    u'book {0} for 2 people tomorrow',
+]
+
+
+def load_entity_dictionaries(entity_data_directory_path, logger, entity_names=None):
+    """
+    Read entity csv files from a directory the same way datastore population does
+
+    Args:
+        entity_data_directory_path (str): path of the directory containing entity data csv files
+        logger: logging object to log at debug and exception level
+        entity_names (list, optional): only load these entities. If None all csv files are loaded
+
+    Returns:
+        dict: mapping entity name to dictionary mapping entity values to list of their variants
+    """
+    dictionaries = {}
+    for csv_file in sorted(get_files_from_directory(entity_data_directory_path)):
+        entity_name = os.path.splitext(csv_file)[0]
+        if entity_names and entity_name not in entity_names:
+            continue
+        dictionary_value = get_variants_dictionary_value_from_key(
+            csv_file_path=os.path.join(entity_data_directory_path, csv_file),
+            dictionary_key=entity_name,
+            logger=logger)
+        dictionaries[entity_name] = remove_duplicate_data(dictionary_value)
+    return dictionaries
+
+
+def _add_typo(token, rng):
+    """
+    Apply a single random edit (insert, delete, substitute or transpose) to a token after its first character
+    """
+    if len(token) < 5:
+        return token
+    position = rng.randint(1, len(token) - 2)
+    operation = rng.choice(['insert', 'delete', 'substitute', 'transpose'])
+    letter = rng.choice(u'abcdefghijklmnopqrstuvwxyz')
+    if operation == 'insert':
+        return token[:position] + letter + token[position:]
+    elif operation == 'delete':
+        return token[:position] + token[position + 1:]
+    elif operation == 'substitute':
+        return token[:position] + letter + token[position + 1:]
+    return token[:position] + token[position + 1] + token[position] + token[position + 2:]
+
+
+def generate_messages(dictionary, count, typo_probability=0.3, seed=0):
+    """
+    Generate chat like messages that mention variants of the entity, some of them with typos
+
+    Args:
+        dictionary (dict): dictionary mapping entity values to list of their variants
+        count (int): number of messages to generate
+        typo_probability (float, optional): probability of adding a typo to each token of the mentioned variant
+        seed (int, optional): seed for the random number generator, for reproducible runs
+
+    Returns:
+        list: list of unicode messages
+    """
+    rng = random.Random(seed)
+    variants = []
+    for value in sorted(dictionary):
+        for variant in dictionary[value]:
+            if variant:
+                variants.append(variant.decode('utf-8') if isinstance(variant, bytes) else variant)
+    if not variants:
+        return []
+
+    messages = []
+    for _ in range(count):
+        variant = rng.choice(variants)
+        tokens = [_add_typo(token, rng) if rng.random() < typo_probability else token
+                  for token in variant.lower().split()]
+        messages.append(rng.choice(MESSAGE_TEMPLATES).format(u' '.join(tokens)))
+    return messages
+
+
+def percentile(values, q):
+    """
+    Get the q-th percentile of values using nearest rank
+
+    Args:
+        values (list): list of numbers
+        q (float): percentile to compute, between 0 and 100
+
+    Returns:
+        float: the percentile, 0.0 if values is empty
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(round(q / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+def timed_call(function, *args, **kwargs):
+    """
+    Call function and measure its wall clock latency
+
+    Returns:
+        tuple: (return value of function, latency in milliseconds)
+    """
+    start = time.time()
+    result = function(*args, **kwargs)
+    return result, (time.time() - start) * 1000.0
@@ -0,0 +1,229 @@
+from __future__ import absolute_import
+
+import collections
+import errno
+import os
+import re
+import threading
+import time
+
+from chatbot_ner.config import ner_logger
+
+log_prefix = 'datastore.cache'
+
+# Name of the generation file touched when all entities need to be invalidated
+ALL_ENTITIES_GENERATION_FILE = '__all__'
+
+
+def get_generation_file_path(generation_dir, entity_name):
+    """
+    Get path of the generation file of the entity
+
+    Args:
+        generation_dir (str): directory shared by processes to keep the generation files in
+        entity_name (str): name of the entity or ALL_ENTITIES_GENERATION_FILE
+
+    Returns:
+        str: path of the generation file
+    """
+    return os.path.join(generation_dir, re.sub(r'[^\w.-]', '_', entity_name))
+
+
+def get_entity_generation(generation_dir, entity_name):
+    """
+    Get current generation of the entity across processes, i.e. when the entity (or all entities) was last written to
+
+    Args:
+        generation_dir (str): directory shared by processes to keep the generation files in
+        entity_name (str): name of the entity
+
+    Returns:
+        tuple: modification times of the generation files of the entity and of all entities, 0 if missing
+    """
+    generation = []
+    for name in (entity_name, ALL_ENTITIES_GENERATION_FILE):
+        try:
+            generation.append(os.stat(get_generation_file_path(generation_dir, name)).st_mtime)
+        except OSError:
+            generation.append(0)
+    return tuple(generation)
+
+
+class EntityResultsCache(object):
+    """
+    Bounded in-process LRU cache with TTL for datastore lookups that belong to an entity, e.g. results of
+    DataStore.get_similar_dictionary keyed by (entity_name, text, fuzziness, language_script)
+
+    Empty results are cached too (negative caching) but with their own, usually shorter, TTL.
+
+    Cached results of an entity can be invalidated in the current process with invalidate(). To reach other
+    processes (e.g. other uwsgi workers) invalidate() also touches a file per entity in generation_dir. The number of
+    invalidations in the process and the modification time of this file (and of the file for all entities) are the
+    generation of the entity, every cached entry remembers the generation it was stored in and is treated as stale
+    when it differs. get() returns the generation seen on a miss, to pass to set() with the result of the lookup, so
+    that a result looked up before an invalidation is never cached as current.
+
+    Attributes:
+        max_size (int): maximum number of entries, least recently used entries are evicted first. 0 disables the
+                        cache
+        ttl (int or float): seconds for which a non empty result stays valid
+        negative_ttl (int or float): seconds for which an empty result stays valid
+        generation_dir (str or None): directory shared by processes to keep the generation files in. If None,
+                                      invalidation stays local to the process
+        hits (int): number of lookups served from the cache
+        misses (int): number of lookups not found in the cache, expired or stale
+        evictions (int): number of entries evicted because the cache was full
+    """
+
+    def __init__(self, max_size, ttl, negative_ttl, generation_dir=None):
+        """
+        Args:
+            max_size (int): maximum number of entries. 0 disables the cache
+            ttl (int or float): seconds for which a non empty result stays valid
+            negative_ttl (int or float): seconds for which an empty result stays valid
+            generation_dir (str, optional): directory shared by processes to keep the generation files in.
+                                            Defaults to None
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.generation_dir = generation_dir
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        # Number of invalidations in this process by entity name, None for invalidations of all entities
+        self._invalidation_counts = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def _get_generation_file_path(self, entity_name):
+        return get_generation_file_path(generation_dir=self.generation_dir, entity_name=entity_name)
+
+    def _get_generation(self, entity_name):
+        """
+        Get current generation of the entity across processes
+
+        Args:
+            entity_name (str): name of the entity
+
+        Returns:
+            tuple: invalidations of the entity and of all entities in this process, followed by modification times
+                   of the generation files of the entity and of all entities (0 if missing) if generation_dir is set
+        """
+        generation = (self._invalidation_counts[entity_name], self._invalidation_counts[None])
+        if self.generation_dir is None:
+            return generation
+        return generation + get_entity_generation(generation_dir=self.generation_dir, entity_name=entity_name)
+
+    def _touch_generation_file(self, entity_name):
+        """
+        Bump the generation of the entity for all processes by touching its generation file
+
+        Args:
+            entity_name (str): name of the entity or ALL_ENTITIES_GENERATION_FILE
+        """
+        try:
+            if not os.path.isdir(self.generation_dir):
+                os.makedirs(self.generation_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                ner_logger.exception('%s: Could not create cache generation directory %s'
+                                     % (log_prefix, self.generation_dir))
+                return
+        try:
+            file_path = self._get_generation_file_path(entity_name)
+            with open(file_path, 'a'):
+                os.utime(file_path, None)
+        except (IOError, OSError):
+            ner_logger.exception('%s: Could not touch cache generation file for %s' % (log_prefix, entity_name))
+
+    def get(self, entity_name, key):
+        """
+        Get cached result for the key
+
+        Args:
+            entity_name (str): name of the entity the result belongs to
+            key (hashable): lookup key, e.g. tuple of arguments of the lookup
+
+        Returns:
+            tuple:
+                bool: True if a valid result was found in the cache
+                object: the cached result, None if not found
+                object: generation of the entity when it was looked up, to pass to set with the result
+        """
+        if not self.enabled:
+            return False, None, None
+
+        generation = self._get_generation(entity_name)
+        with self._lock:
+            entry = self._entries.pop((entity_name, key), None)
+            if entry is not None:
+                expires_at, entry_generation, value = entry
+                if expires_at > time.time() and entry_generation == generation:
+                    self._entries[(entity_name, key)] = entry
+                    self.hits += 1
+                    return True, value, generation
+            self.misses += 1
+        return False, None, generation
+
+    def set(self, entity_name, key, value, generation):
+        """
+        Cache the result for the key. The result is stored with the generation seen by the get that missed, so if
+        the entity was invalidated while the result was looked up it is stale right away
+
+        Args:
+            entity_name (str): name of the entity the result belongs to
+            key (hashable): lookup key, e.g. tuple of arguments of the lookup
+            value (object): result to cache. Empty results are cached with the negative TTL
+            generation (object): generation returned by get for the key before the result was looked up
+        """
+        if not self.enabled:
+            return
+
+        ttl = self.ttl if value else self.negative_ttl
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries.pop((entity_name, key), None)
+            self._entries[(entity_name, key)] = (time.time() + ttl, generation, value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, entity_name=None):
+        """
+        Drop cached results of the entity in this process and bump its generation for other processes
+
+        Args:
+            entity_name (str, optional): name of the entity. If None, results of all entities are dropped
+        """
+        with self._lock:
+            self._invalidation_counts[entity_name] += 1
+            if entity_name is None:
+                self._entries.clear()
+            else:
+                for cache_key in [cache_key for cache_key in self._entries if cache_key[0] == entity_name]:
+                    del self._entries[cache_key]
+
+        if self.generation_dir is not None:
+            self._touch_generation_file(entity_name if entity_name is not None else ALL_ENTITIES_GENERATION_FILE)
+
+    def stats(self):
+        """
+        Returns:
+            dict: size, max_size, hits, misses, evictions and hit_ratio of the cache
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': float(self.hits) / lookups if lookups else 0.0,
+        }
@@ -7,9 +7,10 @@ from datastore import DataStore
 
 class Command(BaseCommand):
     help = 'Repopulate DataStore with entity data read from csv files stored at entity_data_directory_path argument' \
-           ' and csv files at paths specified by csv_file_paths argument. NOTE this only deletes and repopulates the' \
+           ' and csv files at paths specified by csv_file_paths argument. NOTE this only repopulates the' \
            ' data for entities specified by the names of csv files pointed by the arguments. Other entity data will' \
-           ' remain unchanged'
+           ' remain unchanged. Only values added, changed or removed since the last repopulation are written and' \
+           ' entities whose csv file and data did not change are skipped, unless --full is given'
 
     def add_arguments(self, parser):
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
@@ -26,6 +27,20 @@ class Command(BaseCommand):
             help='comma separated file paths to individual csv files',
         )
 
+        parser.add_argument(
+            '--dry_run',
+            action='store_true',
+            default=False,
+            help='print the planned changes without writing them. Use --verbosity 2 to list the values',
+        )
+
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            default=False,
+            help='delete all data of the entities and index their csv files again',
+        )
+
     def handle(self, *args, **options):
         entity_data_directory_path = None
         csv_file_paths = None
@@ -41,8 +56,15 @@ class Command(BaseCommand):
                 csv_file_paths = options['csv_file_paths'].split(',')
                 csv_file_paths = [csv_file_path for csv_file_path in csv_file_paths if csv_file_path and
                                   csv_file_path.endswith('.csv')]
+            if options.get('dry_run') and options.get('full'):
+                self.stdout.write(self.style.ERROR('--dry_run can not be used with --full'))
+                return
             db = DataStore()
-            db.repopulate(entity_data_directory_path=entity_data_directory_path, csv_file_paths=csv_file_paths)
+            plans = db.repopulate(entity_data_directory_path=entity_data_directory_path, csv_file_paths=csv_file_paths,
+                                  full=options.get('full', False), dry_run=options.get('dry_run', False))
+            if options.get('dry_run'):
+                self._write_plans(plans, verbosity=options.get('verbosity', 1))
+                return
             if entity_data_directory_path:
                 self.stdout.write(
                     'Successfully Repopulated entity data from csv files at "%s"' % entity_data_directory_path)
@@ -51,3 +73,16 @@ class Command(BaseCommand):
                                   % len(csv_file_paths))
         else:
             self.stdout.write(self.style.ERROR('argument --entity_data_directory_path or --csv_file_paths required'))
+
+    def _write_plans(self, plans, verbosity):
+        for plan in plans:
+            if plan['skipped']:
+                self.stdout.write('%s: unchanged, skipped' % plan['entity_name'])
+                continue
+            self.stdout.write('%s: %d added, %d changed, %d removed, %d unchanged'
+                              % (plan['entity_name'], len(plan['added']), len(plan['changed']),
+                                 len(plan['removed']), plan['unchanged']))
+            if verbosity > 1:
+                for key, sign in (('added', '+'), ('changed', '~'), ('removed', '-')):
+                    for value in plan[key]:
+                        self.stdout.write(u'  %s %s' % (sign, value))
@@ -1,12 +1,30 @@
 import elasticsearch
 import os
 from chatbot_ner.settings import BASE_DIR
-from chatbot_ner.config import ES_BULK_MSG_SIZE, ES_SEARCH_SIZE
+from chatbot_ner.config import (ES_BULK_MSG_SIZE, ES_SEARCH_SIZE, ES_SEARCH_SIZE_PER_TOKEN, ES_SEARCH_TERMINATE_AFTER,
+                                 ES_SEARCH_MIN_SCORE, ES_BULK_THREAD_COUNT, ES_BULK_QUEUE_SIZE, ES_TRANSFER_SLICE_COUNT,
+                                 ES_VARIANT_SUBFIELDS, ES_SEARCH_EXACT_FIRST, ES_SEARCH_TEMPLATES,
+                                 ES_SEARCH_MAX_EXPANSIONS)
 
 DEFAULT_ENTITY_DATA_DIRECTORY = os.path.join(os.path.join(BASE_DIR, 'data'), 'entity_data')
 ELASTICSEARCH = 'elasticsearch'
+SQLITE = 'sqlite'
 ELASTICSEARCH_SEARCH_SIZE = ES_SEARCH_SIZE
+ELASTICSEARCH_SEARCH_SIZE_PER_TOKEN = ES_SEARCH_SIZE_PER_TOKEN
+ELASTICSEARCH_SEARCH_TERMINATE_AFTER = ES_SEARCH_TERMINATE_AFTER
+ELASTICSEARCH_SEARCH_MIN_SCORE = ES_SEARCH_MIN_SCORE
 ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE = ES_BULK_MSG_SIZE
+ELASTICSEARCH_BULK_THREAD_COUNT = ES_BULK_THREAD_COUNT
+ELASTICSEARCH_BULK_QUEUE_SIZE = ES_BULK_QUEUE_SIZE
+ELASTICSEARCH_TRANSFER_SLICE_COUNT = ES_TRANSFER_SLICE_COUNT
+ELASTICSEARCH_VARIANT_SUBFIELDS = ES_VARIANT_SUBFIELDS
+ELASTICSEARCH_SEARCH_EXACT_FIRST = ES_SEARCH_EXACT_FIRST
+ELASTICSEARCH_SEARCH_TEMPLATES = ES_SEARCH_TEMPLATES
+ELASTICSEARCH_SEARCH_MAX_EXPANSIONS = ES_SEARCH_MAX_EXPANSIONS
+# Datastore population logs its progress every this many documents
+ELASTICSEARCH_BULK_PROGRESS_INTERVAL = 50000
+# Index settings relaxed while datastore population runs, restored when it finishes
+ELASTICSEARCH_BULK_LOAD_SETTINGS = {'refresh_interval': '-1', 'number_of_replicas': 0}
 
 # settings dictionary key constants
 ENGINE = 'engine'
@@ -15,3 +33,7 @@ ELASTICSEARCH_DOC_TYPE = 'doc_type'
 ELASTICSEARCH_VERSION_MAJOR, ELASTICSEARCH_VERSION_MINOR, ELASTICSEARCH_VERSION_OTHER = elasticsearch.VERSION
 ELASTICSEARCH_CRF_DATA_INDEX_NAME = 'elasticsearch_crf_data_index_name'
 ELASTICSEARCH_CRF_DATA_DOC_TYPE = 'elasticsearch_crf_data_doc_type'
+SQLITE_DATABASE_PATH = 'database_path'
+# DataStore.get_entity_changes only reports writes older than this many milliseconds, so that writes still in flight
+# or not yet visible to searches (elasticsearch refreshes every second) are reported by a later call instead of missed
+CHANGE_FEED_SETTLE_MS = 2000
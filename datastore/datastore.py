@@ -1,12 +1,23 @@
 import collections
+import os
+import time
 
 import elastic_search
-from chatbot_ner.config import ner_logger, CHATBOT_NER_DATASTORE
+import sqlite
+from chatbot_ner.config import (ner_logger, CHATBOT_NER_DATASTORE, DATASTORE_CACHE_SIZE, DATASTORE_CACHE_TTL,
+                                DATASTORE_CACHE_NEGATIVE_TTL, DATASTORE_CACHE_GENERATION_DIR)
 from lib.singleton import Singleton
-from .constants import (ELASTICSEARCH, ENGINE, ELASTICSEARCH_INDEX_NAME, DEFAULT_ENTITY_DATA_DIRECTORY,
-                        ELASTICSEARCH_DOC_TYPE, ELASTICSEARCH_CRF_DATA_INDEX_NAME, ELASTICSEARCH_CRF_DATA_DOC_TYPE)
+from .cache import EntityResultsCache
+from .constants import (ELASTICSEARCH, SQLITE, ENGINE, ELASTICSEARCH_INDEX_NAME, DEFAULT_ENTITY_DATA_DIRECTORY,
+                        ELASTICSEARCH_DOC_TYPE, ELASTICSEARCH_CRF_DATA_INDEX_NAME, ELASTICSEARCH_CRF_DATA_DOC_TYPE,
+                        ELASTICSEARCH_SEARCH_SIZE_PER_TOKEN, ELASTICSEARCH_SEARCH_TERMINATE_AFTER,
+                        ELASTICSEARCH_SEARCH_MIN_SCORE, SQLITE_DATABASE_PATH, CHANGE_FEED_SETTLE_MS)
 from .exceptions import (DataStoreSettingsImproperlyConfiguredException, EngineNotImplementedException,
                          EngineConnectionException, NonESEngineTransferException, IndexNotFoundException)
+from .local_index import invalidate_local_entity_index, get_entity_document_count
+from .utils import (get_files_from_directory, get_file_content_hash, get_entity_data_delta, iter_variants_from_csv,
+                    get_update_marker, MANIFEST_FILE_HASH_FIELD, MANIFEST_POPULATED_AT_FIELD)
+from language_utilities.constant import ENGLISH_LANG
 
 
 class DataStore(object):
@@ -24,12 +35,15 @@ class DataStore(object):
         NAME                                             USES
         --------------------------------------------------------------------------------------------------
         1. elasticsearch                                 https://github.com/elastic/elasticsearch-py
+        2. sqlite                                        https://www.sqlite.org/fts5.html (embedded, no service)
 
     Attributes:
         _engine: Engine name as read from the environment config
         _connection_settings: Connection settings compiled from variables in the environment config
         _store_name: Name of the database/index to query on the engine server
         _client_or_connection: Low level connection object to the engine, None at initialization
+        _similar_dictionary_cache: In-process cache of get_similar_dictionary results, invalidated on writes to
+                                   the entity
     """
     __metaclass__ = Singleton
 
@@ -49,6 +63,14 @@ class DataStore(object):
         # This can be index name for elastic search, table name for SQL,
         self._store_name = None
         self._client_or_connection = None
+        self._similar_dictionary_cache = EntityResultsCache(max_size=DATASTORE_CACHE_SIZE,
+                                                            ttl=DATASTORE_CACHE_TTL,
+                                                            negative_ttl=DATASTORE_CACHE_NEGATIVE_TTL,
+                                                            generation_dir=DATASTORE_CACHE_GENERATION_DIR)
+        # Limits on hits retrieved by get_similar_dictionary(_bulk), 0 disables a limit. See _get_search_limits
+        self.search_size_per_token = ELASTICSEARCH_SEARCH_SIZE_PER_TOKEN
+        self.search_terminate_after = ELASTICSEARCH_SEARCH_TERMINATE_AFTER
+        self.search_min_score = ELASTICSEARCH_SEARCH_MIN_SCORE
         self._connect()
 
     def _connect(self):
@@ -63,6 +85,9 @@ class DataStore(object):
         if self._engine == ELASTICSEARCH:
             self._store_name = self._connection_settings.get(ELASTICSEARCH_INDEX_NAME, '_all')
             self._client_or_connection = elastic_search.connect.connect(**self._connection_settings)
+        elif self._engine == SQLITE:
+            self._store_name = self._connection_settings.get(SQLITE_DATABASE_PATH)
+            self._client_or_connection = sqlite.connect.connect(**self._connection_settings)
         else:
             self._client_or_connection = None
             raise EngineNotImplementedException()
@@ -120,6 +145,8 @@ class DataStore(object):
                     ignore=[400, 404],
                     **kwargs
                 )
+        elif self._engine == SQLITE:
+            sqlite.create.create_tables(connection=self._client_or_connection, logger=ner_logger, **kwargs)
 
     def populate(self, entity_data_directory_path=DEFAULT_ENTITY_DATA_DIRECTORY, csv_file_paths=None, **kwargs):
         """
@@ -151,6 +178,14 @@ class DataStore(object):
                                                                csv_file_paths=csv_file_paths,
                                                                logger=ner_logger,
                                                                **kwargs)
+        elif self._engine == SQLITE:
+            sqlite.populate.create_all_dictionary_data(connection=self._client_or_connection,
+                                                       entity_data_directory_path=entity_data_directory_path,
+                                                       csv_file_paths=csv_file_paths,
+                                                       logger=ner_logger,
+                                                       **kwargs)
+
+        self._invalidate_cache()
 
     def delete(self, **kwargs):
         """
@@ -181,6 +216,10 @@ class DataStore(object):
                                                logger=ner_logger,
                                                ignore=[400, 404],
                                                **kwargs)
+        elif self._engine == SQLITE:
+            sqlite.create.delete_tables(connection=self._client_or_connection, logger=ner_logger, **kwargs)
+
+        self._invalidate_cache()
 
     def get_entity_dictionary(self, entity_name, **kwargs):
         """
@@ -228,17 +267,62 @@ class DataStore(object):
                                                                        entity_name=entity_name,
                                                                        request_timeout=request_timeout,
                                                                        **kwargs)
+        elif self._engine == SQLITE:
+            results_dictionary = sqlite.query.dictionary_query(connection=self._client_or_connection,
+                                                               entity_name=entity_name,
+                                                               **kwargs)
 
         return results_dictionary
 
+    def iter_entity_dictionary(self, entity_name, **kwargs):
+        """
+        Generator form of get_entity_dictionary. Values and their variants are streamed from the datastore one page
+        at a time instead of being collected in a dictionary first, use this for large entities
+
+        Args:
+            entity_name: the name of the entity to get the stored data for
+            kwargs:
+                For Elasticsearch:
+                    Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+        Yields:
+            tuple: (entity value, list of its variants). A value stored for more than one language script is
+                yielded once per language script
+
+        Raises:
+            DataStoreSettingsImproperlyConfiguredException if connection settings are invalid or missing
+            All other exceptions raised by elasticsearch-py library
+        """
+        if self._client_or_connection is None:
+            self._connect()
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            for value, variants in elastic_search.query.iter_dictionary_query(
+                    connection=self._client_or_connection,
+                    index_name=self._store_name,
+                    doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                    entity_name=entity_name,
+                    request_timeout=request_timeout,
+                    **kwargs):
+                yield value, variants
+        elif self._engine == SQLITE:
+            for value, variants in sqlite.query.iter_dictionary_query(connection=self._client_or_connection,
+                                                                      entity_name=entity_name,
+                                                                      **kwargs):
+                yield value, variants
+
     def get_similar_dictionary(self, entity_name, text, fuzziness_threshold="auto:4,7",
-                               search_language_script=None, **kwargs):
+                               search_language_script=None, highlight=True, **kwargs):
         """
         Args:
             entity_name: the name of the entity to lookup in the datastore for getting entity values and their variants
             text: the text for which variants need to be find out
             fuzziness_threshold: fuzziness allowed for search results on entity value variants
             search_language_script: language of elasticsearch documents which are eligible for match
+            highlight (bool, optional): if True, matched variants are found with elasticsearch highlights, else
+                                        candidate documents are fetched without highlighting and matched variants
+                                        are found by comparing tokens locally. Defaults to True
             kwargs:
                 For Elasticsearch:
                     Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
@@ -263,12 +347,21 @@ class DataStore(object):
                  u'mumbai': u'mumbai',
                  u'pune': u'pune'}
         """
+        cache_key = (text, fuzziness_threshold, search_language_script, highlight, self.search_size_per_token,
+                     self.search_terminate_after, self.search_min_score)
+        if not kwargs:
+            found, results_dictionary, generation = self._similar_dictionary_cache.get(entity_name=entity_name,
+                                                                                       key=cache_key)
+            if found:
+                return collections.OrderedDict(results_dictionary)
+
         results_dictionary = collections.OrderedDict()
         if self._client_or_connection is None:
             self._connect()
         if self._engine == ELASTICSEARCH:
             self._check_doc_type_for_elasticsearch()
             request_timeout = self._connection_settings.get('request_timeout', 20)
+            search_limits = self._get_search_limits(entity_names=[entity_name], text=text)
             results_dictionary = elastic_search.query.full_text_query(connection=self._client_or_connection,
                                                                       index_name=self._store_name,
                                                                       doc_type=self._connection_settings[
@@ -277,11 +370,184 @@ class DataStore(object):
                                                                       sentence=text,
                                                                       fuzziness_threshold=fuzziness_threshold,
                                                                       search_language_script=search_language_script,
+                                                                      highlight=highlight,
+                                                                      size=search_limits['sizes'].get(entity_name),
+                                                                      terminate_after=search_limits['terminate_after'],
+                                                                      min_score=search_limits['min_score'],
                                                                       request_timeout=request_timeout,
                                                                       **kwargs)
-
+        elif self._engine == SQLITE:
+            search_limits = self._get_search_limits(entity_names=[entity_name], text=text)
+            results_dictionary = sqlite.query.full_text_query(connection=self._client_or_connection,
+                                                              entity_name=entity_name,
+                                                              sentence=text,
+                                                              fuzziness_threshold=fuzziness_threshold,
+                                                              search_language_script=search_language_script,
+                                                              size=search_limits['sizes'].get(entity_name),
+                                                              **kwargs)
+
+        if not kwargs:
+            self._similar_dictionary_cache.set(entity_name=entity_name, key=cache_key,
+                                               value=collections.OrderedDict(results_dictionary),
+                                               generation=generation)
         return results_dictionary
 
+    def get_similar_dictionary_bulk(self, entity_names, text, fuzziness_threshold="auto:4,7",
+                                    search_language_script=None, highlight=True, **kwargs):
+        """
+        Same as get_similar_dictionary but for multiple entities at once. All entities are looked up in a single
+        request to the engine instead of one request per entity
+
+        Args:
+            entity_names (list): names of the entities to lookup in the datastore for getting entity values and
+                                 their variants
+            text: the text for which variants need to be find out
+            fuzziness_threshold: fuzziness allowed for search results on entity value variants
+            search_language_script: language of elasticsearch documents which are eligible for match
+            highlight (bool, optional): use elasticsearch highlights to find matched variants, see
+                                        get_similar_dictionary. Defaults to True
+            kwargs:
+                For Elasticsearch:
+                    Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.msearch
+
+        Returns:
+            collections.OrderedDict: dictionary mapping each entity name to a collections.OrderedDict of
+                                     entity value variants to their entity value
+
+        Example:
+            db = DataStore()
+            db.get_similar_dictionary_bulk(entity_names=['city', 'restaurant'], text=u'mainland china in mumbai',
+                                           fuzziness_threshold=1)
+
+            Output:
+                {'city': {u'Mumbai': u'Mumbai', u'mumbai': u'mumbai'},
+                 'restaurant': {u'Mainland China': u'Mainland China'}}
+        """
+        results_dictionary = collections.OrderedDict()
+        cache_key = (text, fuzziness_threshold, search_language_script, highlight, self.search_size_per_token,
+                     self.search_terminate_after, self.search_min_score)
+        uncached_entity_names = []
+        generations = {}
+        for entity_name in entity_names:
+            found, cached_dictionary = False, None
+            if not kwargs:
+                found, cached_dictionary, generations[entity_name] = self._similar_dictionary_cache.get(
+                    entity_name=entity_name, key=cache_key)
+            if found:
+                results_dictionary[entity_name] = collections.OrderedDict(cached_dictionary)
+            else:
+                uncached_entity_names.append(entity_name)
+
+        if not uncached_entity_names:
+            return results_dictionary
+
+        if self._client_or_connection is None:
+            self._connect()
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            search_limits = self._get_search_limits(entity_names=uncached_entity_names, text=text)
+            uncached_results = elastic_search.query.full_text_query_bulk(connection=self._client_or_connection,
+                                                                         index_name=self._store_name,
+                                                                         doc_type=self._connection_settings[
+                                                                             ELASTICSEARCH_DOC_TYPE],
+                                                                         entity_names=uncached_entity_names,
+                                                                         sentence=text,
+                                                                         fuzziness_threshold=fuzziness_threshold,
+                                                                         search_language_script=
+                                                                         search_language_script,
+                                                                         highlight=highlight,
+                                                                         sizes=search_limits['sizes'],
+                                                                         terminate_after=
+                                                                         search_limits['terminate_after'],
+                                                                         min_score=search_limits['min_score'],
+                                                                         request_timeout=request_timeout,
+                                                                         **kwargs)
+        elif self._engine == SQLITE:
+            search_limits = self._get_search_limits(entity_names=uncached_entity_names, text=text)
+            uncached_results = sqlite.query.full_text_query_bulk(connection=self._client_or_connection,
+                                                                 entity_names=uncached_entity_names,
+                                                                 sentence=text,
+                                                                 fuzziness_threshold=fuzziness_threshold,
+                                                                 search_language_script=search_language_script,
+                                                                 sizes=search_limits['sizes'],
+                                                                 **kwargs)
+        else:
+            uncached_results = {}
+
+        for entity_name, entity_results_dictionary in uncached_results.items():
+            results_dictionary[entity_name] = entity_results_dictionary
+            if not kwargs:
+                self._similar_dictionary_cache.set(entity_name=entity_name, key=cache_key,
+                                                   value=collections.OrderedDict(entity_results_dictionary),
+                                                   generation=generations[entity_name])
+
+        return collections.OrderedDict((entity_name, results_dictionary[entity_name])
+                                       for entity_name in entity_names if entity_name in results_dictionary)
+
+    def _get_search_limits(self, entity_names, text):
+        """
+        Get limits on hits retrieved by full text queries on the text for the entities, as set in
+        search_size_per_token, search_terminate_after and search_min_score (0 disables a limit)
+
+        Args:
+            entity_names (list): names of the entities to be searched
+            text (str or unicode): text to be searched
+
+        Returns:
+            dict: sizes (dict mapping entity names to number of hits to retrieve, empty if not limited),
+                  terminate_after (int or None) and min_score (float or None)
+        """
+        sizes = {}
+        if self.search_size_per_token > 0:
+            for entity_name in entity_names:
+                try:
+                    entity_document_count = get_entity_document_count(entity_name=entity_name)
+                except Exception:
+                    ner_logger.exception('Could not get document count for entity %s' % entity_name)
+                    entity_document_count = None
+                sizes[entity_name] = elastic_search.query.get_adaptive_search_size(
+                    text=text,
+                    size_per_token=self.search_size_per_token,
+                    entity_document_count=entity_document_count)
+        return {
+            'sizes': sizes,
+            'terminate_after': self.search_terminate_after or None,
+            'min_score': self.search_min_score or None,
+        }
+
+    def get_entity_document_count(self, entity_name, **kwargs):
+        """
+        Get number of documents stored for the entity, one per entity value and language
+
+        Args:
+            entity_name (str): name of the entity
+            kwargs:
+                For Elasticsearch:
+                    Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.count
+
+        Returns:
+            int: number of documents of the entity
+        """
+        if self._client_or_connection is None:
+            self._connect()
+        document_count = 0
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            document_count = elastic_search.query.get_entity_document_count(connection=self._client_or_connection,
+                                                                            index_name=self._store_name,
+                                                                            doc_type=self._connection_settings[
+                                                                                ELASTICSEARCH_DOC_TYPE],
+                                                                            entity_name=entity_name,
+                                                                            request_timeout=request_timeout,
+                                                                            **kwargs)
+        elif self._engine == SQLITE:
+            document_count = sqlite.query.get_entity_document_count(connection=self._client_or_connection,
+                                                                    entity_name=entity_name,
+                                                                    **kwargs)
+        return document_count
+
     def delete_entity(self, entity_name, **kwargs):
         """
         Deletes the entity data for entity named entity_named from the datastore
@@ -307,20 +573,111 @@ class DataStore(object):
                                                           logger=ner_logger,
                                                           ignore=[400, 404],
                                                           **kwargs)
+        elif self._engine == SQLITE:
+            sqlite.populate.delete_entity_by_name(connection=self._client_or_connection,
+                                                  entity_name=entity_name,
+                                                  logger=ner_logger,
+                                                  **kwargs)
+
+        self._invalidate_cache(entity_name=entity_name)
+
+    def add_variants_normalized_fields(self, entity_names=None, **kwargs):
+        """
+        Add normalized forms and token counts of variants to entity data indexed before these fields were stored
+        (see datastore.utils.get_variants_normalized_fields). Data indexed afterwards already has them
+
+        Args:
+            entity_names (list, optional): only migrate data of these entities. If None, all entities are migrated
+            kwargs:
+                For Elasticsearch:
+                    Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
+
+        Returns:
+            int: number of entity documents updated
+        """
+        if self._client_or_connection is None:
+            self._connect()
+
+        updated_count = 0
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            updated_count = elastic_search.populate.add_variants_normalized_fields(
+                connection=self._client_or_connection,
+                index_name=self._store_name,
+                doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                logger=ner_logger,
+                entity_names=entity_names,
+                **kwargs)
+
+        if entity_names:
+            for entity_name in entity_names:
+                self._invalidate_cache(entity_name=entity_name)
+        else:
+            self._invalidate_cache()
+        return updated_count
+
+    def rekey_entity_data(self, entity_names=None, **kwargs):
+        """
+        Move entity data indexed before document ids were deterministic to the id of its entity, value and language
+        (see datastore.utils.get_entity_data_document_id), so that writes overwrite it in place and lookups by value
+        find it by id. The sqlite engine identifies rows by value already and needs no migration
+
+        Args:
+            entity_names (list, optional): only migrate data of these entities. If None, all entities are migrated
+            kwargs:
+                For Elasticsearch:
+                    Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
+
+        Returns:
+            int: number of entity documents moved
+        """
+        if self._client_or_connection is None:
+            self._connect()
+
+        rekeyed_count = 0
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            rekeyed_count = elastic_search.populate.rekey_entity_data(
+                connection=self._client_or_connection,
+                index_name=self._store_name,
+                doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                logger=ner_logger,
+                entity_names=entity_names,
+                **kwargs)
+
+        if entity_names:
+            for entity_name in entity_names:
+                self._invalidate_cache(entity_name=entity_name)
+        else:
+            self._invalidate_cache()
+        return rekeyed_count
 
-    def repopulate(self, entity_data_directory_path=DEFAULT_ENTITY_DATA_DIRECTORY, csv_file_paths=None, **kwargs):
+    def repopulate(self, entity_data_directory_path=DEFAULT_ENTITY_DATA_DIRECTORY, csv_file_paths=None, full=False,
+                   dry_run=False, **kwargs):
         """
-        Deletes the existing data and repopulates it for entities from csv files stored in directory path indicated by
-        entity_data_directory_path and from csv files at file paths in csv_file_paths list
+        Repopulates entities from csv files stored in directory path indicated by entity_data_directory_path and from
+        csv files at file paths in csv_file_paths list, so that each entity holds exactly the data of its file.
+
+        Only the difference is written: values whose variants are unchanged are left alone, added and changed values
+        are upserted and values missing from the file are deleted, see datastore.utils.get_entity_data_delta. A
+        manifest of the file content hash is recorded for each entity, and an entity is skipped without reading its
+        data when its file has the same hash and the entity was not written to since
 
         Args:
             entity_data_directory_path: Directory path containing CSV files to populate the datastore from.
                                         See the CSV file structure explanation in the datastore docs
             csv_file_paths: Optional, list of absolute file paths to csv files
+            full (bool, optional): True to delete all data of the entities and index the files again instead.
+                                   Defaults to False
+            dry_run (bool, optional): True to only plan the changes without writing anything. Ignored if full is
+                                      True. Defaults to False
             kwargs:
                 For Elasticsearch:
                     Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
 
+        Returns:
+            list: planned changes for each entity (see _plan_entity_repopulation), None if full is True
+
         Raises:
             DataStoreSettingsImproperlyConfiguredException if connection settings are invalid or missing
             All other exceptions raised by elasticsearch-py library
@@ -328,6 +685,19 @@ class DataStore(object):
         if self._client_or_connection is None:
             self._connect()
 
+        if not full:
+            csv_file_paths = [os.path.join(entity_data_directory_path, csv_file)
+                              for csv_file in get_files_from_directory(entity_data_directory_path)] + \
+                             [csv_file_path for csv_file_path in csv_file_paths or []
+                              if csv_file_path and csv_file_path.endswith('.csv')]
+            plans = []
+            for csv_file_path in csv_file_paths:
+                plan = self._plan_entity_repopulation(csv_file_path=csv_file_path)
+                if not dry_run:
+                    self._apply_entity_repopulation(plan, **kwargs)
+                plans.append(plan)
+            return plans
+
         if self._engine == ELASTICSEARCH:
             self._check_doc_type_for_elasticsearch()
             elastic_search.populate.recreate_all_dictionary_data(connection=self._client_or_connection,
@@ -340,6 +710,119 @@ class DataStore(object):
                                                                  ignore=[400, 404],
                                                                  **kwargs)
             # TODO: repopulate code for crf index missing
+        elif self._engine == SQLITE:
+            sqlite.populate.recreate_all_dictionary_data(connection=self._client_or_connection,
+                                                         entity_data_directory_path=entity_data_directory_path,
+                                                         csv_file_paths=csv_file_paths,
+                                                         logger=ner_logger,
+                                                         **kwargs)
+
+        self._invalidate_cache()
+
+    def _plan_entity_repopulation(self, csv_file_path):
+        """
+        Compare the csv file of an entity to its manifest and data
+
+        Args:
+            csv_file_path (str): path of the csv file, named after the entity
+
+        Returns:
+            dict: with entity_name, csv_file_path, file_hash, skipped (True if the entity is up to date) and unless
+                  skipped, the delta keys (records, added, changed, removed, unchanged, language_scripts) of
+                  datastore.utils.get_entity_data_delta
+        """
+        entity_name = os.path.splitext(os.path.basename(csv_file_path))[0]
+        file_hash = get_file_content_hash(csv_file_path)
+        plan = {'entity_name': entity_name, 'csv_file_path': csv_file_path, 'file_hash': file_hash, 'skipped': False}
+
+        manifest = self._get_entity_manifest(entity_name=entity_name)
+        if manifest and manifest[MANIFEST_FILE_HASH_FIELD] == file_hash:
+            changes = self.get_entity_changes(entity_name=entity_name, since=manifest[MANIFEST_POPULATED_AT_FIELD],
+                                              until=get_update_marker())
+            if not (changes['changed'] or changes['deleted'] or changes['full_reload']):
+                plan['skipped'] = True
+                return plan
+
+        value_variants = iter_variants_from_csv(csv_file_path=csv_file_path, dictionary_key=entity_name,
+                                                logger=ner_logger)
+        plan.update(get_entity_data_delta(value_variants=value_variants,
+                                          existing_records=self.iter_entity_data(entity_name=entity_name),
+                                          language_script=ENGLISH_LANG))
+        return plan
+
+    def _apply_entity_repopulation(self, plan, **kwargs):
+        """
+        Write the changes planned by _plan_entity_repopulation and record the manifest of the entity
+        """
+        entity_name = plan['entity_name']
+        if plan['skipped']:
+            ner_logger.info('Repopulate %s: skipped, unchanged since last repopulation' % entity_name)
+            return
+        if plan['records'] or plan['removed']:
+            self.upsert_entity_data(entity_name=entity_name, value_variant_records=plan['records'],
+                                    values_to_delete=plan['removed'], language_scripts=plan['language_scripts'],
+                                    **kwargs)
+        self._put_entity_manifest(entity_name=entity_name, file_hash=plan['file_hash'],
+                                  populated_at=get_update_marker())
+        ner_logger.info('Repopulate %s: %d added, %d changed, %d removed, %d unchanged'
+                        % (entity_name, len(plan['added']), len(plan['changed']), len(plan['removed']),
+                           plan['unchanged']))
+
+    def _get_entity_manifest(self, entity_name):
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            return elastic_search.query.get_entity_manifest(connection=self._client_or_connection,
+                                                            index_name=self._store_name,
+                                                            doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                                            entity_name=entity_name,
+                                                            request_timeout=request_timeout)
+        elif self._engine == SQLITE:
+            return sqlite.query.get_entity_manifest(connection=self._client_or_connection, entity_name=entity_name)
+
+    def _put_entity_manifest(self, entity_name, file_hash, populated_at):
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            update_index = elastic_search.connect.get_current_live_index(self._store_name)
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            elastic_search.populate.put_entity_manifest(connection=self._client_or_connection,
+                                                        index_name=update_index,
+                                                        doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                                        entity_name=entity_name,
+                                                        file_hash=file_hash,
+                                                        populated_at=populated_at,
+                                                        request_timeout=request_timeout)
+        elif self._engine == SQLITE:
+            sqlite.populate.put_entity_manifest(connection=self._client_or_connection, entity_name=entity_name,
+                                                file_hash=file_hash, populated_at=populated_at)
+
+    def _invalidate_cache(self, entity_name=None):
+        """
+        Drop cached lookups of the entity in this and (through the shared generation directory) other worker
+        processes. Must be called after every write to entity data
+
+        Args:
+            entity_name (str, optional): name of the entity whose data was changed. If None, cached lookups of all
+                                         entities are dropped
+        """
+        self._similar_dictionary_cache.invalidate(entity_name=entity_name)
+        invalidate_local_entity_index(entity_name=entity_name)
+
+    def get_cache_stats(self):
+        """
+        Get counters of the in-process get_similar_dictionary cache
+
+        Returns:
+            dict: size, max_size, hits, misses, evictions and hit_ratio of the cache
+
+        Example:
+            DataStore().get_cache_stats()
+
+            Output:
+                {'size': 120, 'max_size': 10000, 'hits': 4213, 'misses': 377, 'evictions': 0,
+                 'hit_ratio': 0.9178649237472767}
+        """
+        return self._similar_dictionary_cache.stats()
 
     def _check_doc_type_for_elasticsearch(self):
         """
@@ -375,6 +858,8 @@ class DataStore(object):
 
         if self._engine == ELASTICSEARCH:
             return elastic_search.create.exists(connection=self._client_or_connection, index_name=self._store_name)
+        elif self._engine == SQLITE:
+            return sqlite.create.exists(connection=self._client_or_connection)
 
         return False
 
@@ -407,6 +892,15 @@ class DataStore(object):
                                                        entity_name=entity_name,
                                                        language_script=language_script,
                                                        **kwargs)
+        elif self._engine == SQLITE:
+            sqlite.populate.entity_data_update(connection=self._client_or_connection,
+                                               logger=ner_logger,
+                                               entity_data=entity_data,
+                                               entity_name=entity_name,
+                                               language_script=language_script,
+                                               **kwargs)
+
+        self._invalidate_cache(entity_name=entity_name)
 
     def get_entity_supported_languages(self, entity_name, **kwargs):
         """
@@ -432,6 +926,68 @@ class DataStore(object):
             )
 
             return results_dictionary
+        elif self._engine == SQLITE:
+            return sqlite.query.get_entity_supported_languages(connection=self._client_or_connection,
+                                                               entity_name=entity_name,
+                                                               **kwargs)
+
+    def get_entity_names(self, **kwargs):
+        """
+        Get names of all entities having dictionary data in the datastore
+
+        Returns:
+            (list): sorted list of entity names
+        """
+        if self._client_or_connection is None:
+            self._connect()
+
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            return elastic_search.query.get_entity_names(connection=self._client_or_connection,
+                                                         index_name=self._store_name,
+                                                         doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                                         request_timeout=request_timeout,
+                                                         **kwargs)
+        elif self._engine == SQLITE:
+            return sqlite.query.get_entity_names(connection=self._client_or_connection, **kwargs)
+
+    def get_entity_changes(self, entity_name, since, until=None, **kwargs):
+        """
+        Get changes to dictionary data of the entity after the update marker since. Changes made in the last
+        CHANGE_FEED_SETTLE_MS milliseconds are left for the next call so that writes still in flight (or not yet
+        visible to search) are not skipped
+
+        Args:
+            entity_name (str): name of the entity
+            since (int): update marker returned as until by the previous call, 0 to get all changes
+            until (int, optional): update marker upto which changes are returned, instead of CHANGE_FEED_SETTLE_MS
+                                   before now
+
+        Returns:
+            dict: with changed records, deleted (value, language_script) tuples, full_reload flag and the until
+                  update marker to pass as since with the next call.
+                  Refer datastore.elastic_search.query.get_entity_changes
+        """
+        if self._client_or_connection is None:
+            self._connect()
+
+        if until is None:
+            until = max(int(time.time() * 1000) - CHANGE_FEED_SETTLE_MS, since)
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            return elastic_search.query.get_entity_changes(connection=self._client_or_connection,
+                                                           index_name=self._store_name,
+                                                           doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                                           entity_name=entity_name,
+                                                           since=since,
+                                                           until=until,
+                                                           request_timeout=request_timeout,
+                                                           **kwargs)
+        elif self._engine == SQLITE:
+            return sqlite.query.get_entity_changes(connection=self._client_or_connection, entity_name=entity_name,
+                                                   since=since, until=until, **kwargs)
 
     def get_entity_unique_values(self, entity_name, **kwargs):
         """
@@ -457,6 +1013,49 @@ class DataStore(object):
             )
 
             return results_dictionary
+        elif self._engine == SQLITE:
+            return sqlite.query.get_entity_unique_values(connection=self._client_or_connection,
+                                                         entity_name=entity_name,
+                                                         **kwargs)
+
+    def get_entity_values_page(self, entity_name, size, search_after=None, **kwargs):
+        """
+        Get a page of unique values in this entity in ascending order. Unlike get_entity_unique_values, the cost of a
+        page does not grow with its depth
+
+        Args:
+            entity_name (str): Name of the entity for which the values are to be fetched
+            size (int): number of values in the page
+            search_after (str, optional): search_after returned with the previous page. If None, the first page is
+                                          returned
+            kwargs: value_search_term, variant_search_term and empty_variants_only filters, refer
+                    get_entity_unique_values
+        Returns:
+            dict: values in the page, total number of values and search_after for the next page (None if this is
+                  the last page)
+        """
+        if self._client_or_connection is None:
+            self._connect()
+
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            return elastic_search.query.get_entity_values_page(
+                connection=self._client_or_connection,
+                index_name=self._store_name,
+                doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                entity_name=entity_name,
+                size=size,
+                search_after=search_after,
+                request_timeout=request_timeout,
+                **kwargs
+            )
+        elif self._engine == SQLITE:
+            return sqlite.query.get_entity_values_page(connection=self._client_or_connection,
+                                                       entity_name=entity_name,
+                                                       size=size,
+                                                       search_after=search_after,
+                                                       **kwargs)
 
     def delete_entity_data_by_values(self, entity_name, values=None, **kwargs):
         """
@@ -484,6 +1083,13 @@ class DataStore(object):
                 request_timeout=request_timeout,
                 **kwargs
             )
+        elif self._engine == SQLITE:
+            sqlite.populate.delete_entity_data_by_values(connection=self._client_or_connection,
+                                                         entity_name=entity_name,
+                                                         values=values,
+                                                         **kwargs)
+
+        self._invalidate_cache(entity_name=entity_name)
 
     def add_entity_data(self, entity_name, value_variant_records, **kwargs):
         """
@@ -509,6 +1115,57 @@ class DataStore(object):
                 value_variant_records=value_variant_records,
                 **kwargs
             )
+        elif self._engine == SQLITE:
+            sqlite.populate.add_entity_data(connection=self._client_or_connection,
+                                            entity_name=entity_name,
+                                            value_variant_records=value_variant_records,
+                                            **kwargs)
+
+        self._invalidate_cache(entity_name=entity_name)
+
+    def upsert_entity_data(self, entity_name, value_variant_records, values_to_delete=None, language_scripts=None,
+                           **kwargs):
+        """
+        Write the records, replacing all existing records of their values, and delete records of values_to_delete.
+        Refer datastore.elastic_search.populate.upsert_entity_data
+
+        Args:
+            entity_name (str): Name of the entity
+            value_variant_records (list): List of dicts with the value, variants and language script
+                Sample Dict: {'value': 'value', 'language_script': 'en', variants': ['variant 1', 'variant 2']}
+            values_to_delete (list, optional): List of values for which records are to be deleted
+            language_scripts (list, optional): languages of the existing records of the entity, if already known
+        Returns:
+            tuple: number of records written and number of records deleted
+        """
+        if self._client_or_connection is None:
+            self._connect()
+
+        counts = None
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            update_index = elastic_search.connect.get_current_live_index(self._store_name)
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            counts = elastic_search.populate.upsert_entity_data(
+                connection=self._client_or_connection,
+                index_name=update_index,
+                doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                entity_name=entity_name,
+                value_variant_records=value_variant_records,
+                values_to_delete=values_to_delete,
+                language_scripts=language_scripts,
+                request_timeout=request_timeout,
+                **kwargs
+            )
+        elif self._engine == SQLITE:
+            counts = sqlite.populate.upsert_entity_data(connection=self._client_or_connection,
+                                                        entity_name=entity_name,
+                                                        value_variant_records=value_variant_records,
+                                                        values_to_delete=values_to_delete,
+                                                        **kwargs)
+
+        self._invalidate_cache(entity_name=entity_name)
+        return counts
 
     def get_entity_data(self, entity_name, values=None, **kwargs):
         """
@@ -537,6 +1194,44 @@ class DataStore(object):
             )
 
             return results_dictionary
+        elif self._engine == SQLITE:
+            return sqlite.query.get_entity_data(connection=self._client_or_connection,
+                                                entity_name=entity_name,
+                                                values=values,
+                                                **kwargs)
+
+    def iter_entity_data(self, entity_name, values=None, **kwargs):
+        """
+        Generator form of get_entity_data. Records are streamed from the datastore one page at a time instead of
+        being collected in a list first, use this for large entities
+
+        Args:
+            entity_name (str): Name of the entity for which the entity data is to be fetched
+            values (list): List of values for which the entity data is to be fetched
+        Yields:
+            dict: records with entity data matching the filters
+        """
+        if self._client_or_connection is None:
+            self._connect()
+
+        if self._engine == ELASTICSEARCH:
+            self._check_doc_type_for_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            for record in elastic_search.query.iter_entity_data(
+                    connection=self._client_or_connection,
+                    index_name=self._store_name,
+                    doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                    entity_name=entity_name,
+                    values=values,
+                    request_timeout=request_timeout,
+                    **kwargs):
+                yield record
+        elif self._engine == SQLITE:
+            for record in sqlite.query.iter_entity_data(connection=self._client_or_connection,
+                                                        entity_name=entity_name,
+                                                        values=values,
+                                                        **kwargs):
+                yield record
 
     def transfer_entities_elastic_search(self, entity_list):
         """
@@ -548,6 +1243,9 @@ class DataStore(object):
         if self._engine != ELASTICSEARCH:
             raise NonESEngineTransferException
         es_url = CHATBOT_NER_DATASTORE.get(self._engine).get('connection_url')
+        if es_url:
+            # transfer talks to a single node
+            es_url = es_url.split(',')[0].strip()
         if es_url is None:
             es_url = elastic_search.connect.get_es_url()
         if es_url is None:
@@ -556,6 +1254,87 @@ class DataStore(object):
         es_object = elastic_search.transfer.ESTransfer(source=es_url, destination=destination)
         es_object.transfer_specific_entities(list_of_entities=entity_list)
 
+    def rebuild_index(self, **kwargs):
+        """
+        Start rebuilding the index behind the datastore alias into a new index with the current mappings. Documents
+        are copied by a reindex task running on the cluster, so workers take no part in the copy, and searches and
+        writes keep using the current index until finalize_rebuild swaps the alias.
+        Refer datastore.elastic_search.reindex.start_index_rebuild
+
+        Returns:
+            dict: with task_id of the reindex task, index being built, source_index it is copied from and started_at,
+                  to pass to finalize_rebuild
+
+        Raises:
+            NonESEngineTransferException if the engine is not elasticsearch
+        """
+        if self._engine != ELASTICSEARCH:
+            raise NonESEngineTransferException('Index rebuilds are only supported for elasticsearch')
+        if self._client_or_connection is None:
+            self._connect()
+        self._check_doc_type_for_elasticsearch()
+        return elastic_search.reindex.start_index_rebuild(connection=self._client_or_connection,
+                                                          alias_name=self._store_name,
+                                                          doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                                          logger=ner_logger,
+                                                          **kwargs)
+
+    def get_rebuild_status(self, task_id, index_name):
+        """
+        Get the progress of a rebuild started with rebuild_index
+        Refer datastore.elastic_search.reindex.get_index_rebuild_status
+
+        Args:
+            task_id (str): id of the reindex task returned by rebuild_index
+            index_name (str): name of the index being built returned by rebuild_index
+
+        Returns:
+            dict: with completed, total, copied, failures, index and alias_swapped
+
+        Raises:
+            NonESEngineTransferException if the engine is not elasticsearch
+        """
+        if self._engine != ELASTICSEARCH:
+            raise NonESEngineTransferException('Index rebuilds are only supported for elasticsearch')
+        if self._client_or_connection is None:
+            self._connect()
+        return elastic_search.reindex.get_index_rebuild_status(connection=self._client_or_connection,
+                                                               alias_name=self._store_name,
+                                                               task_id=task_id,
+                                                               index_name=index_name)
+
+    def finalize_rebuild(self, task_id, index_name, started_at, **kwargs):
+        """
+        Point the alias to the index built by rebuild_index once its copy completed, after replaying the entity data
+        written to the current index since the rebuild started. Cached lookups stay valid since the rebuilt index
+        holds the same documents.
+        Refer datastore.elastic_search.reindex.finalize_index_rebuild
+
+        Args:
+            task_id (str): id of the reindex task returned by rebuild_index
+            index_name (str): name of the index being built returned by rebuild_index
+            started_at (int): update marker returned by rebuild_index
+
+        Returns:
+            dict: with completed, total, copied, failures, index, alias_swapped and replayed
+
+        Raises:
+            NonESEngineTransferException if the engine is not elasticsearch
+        """
+        if self._engine != ELASTICSEARCH:
+            raise NonESEngineTransferException('Index rebuilds are only supported for elasticsearch')
+        if self._client_or_connection is None:
+            self._connect()
+        self._check_doc_type_for_elasticsearch()
+        return elastic_search.reindex.finalize_index_rebuild(connection=self._client_or_connection,
+                                                             alias_name=self._store_name,
+                                                             doc_type=self._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                                                             task_id=task_id,
+                                                             index_name=index_name,
+                                                             started_at=started_at,
+                                                             logger=ner_logger,
+                                                             **kwargs)
+
     def get_crf_data_for_entity_name(self, entity_name, **kwargs):
         """
         This method is used to obtain the sentences and entities from sentences given entity name
@@ -607,8 +1386,53 @@ class DataStore(object):
                 request_timeout=request_timeout,
                 **kwargs)
             ner_logger.debug('Datastore, get_entity_training_data, results_dictionary %s' % str(entity_name))
+        elif self._engine == SQLITE:
+            results_dictionary = sqlite.query.get_crf_data_for_entity_name(connection=self._client_or_connection,
+                                                                           entity_name=entity_name,
+                                                                           **kwargs)
         return results_dictionary
 
+    def iter_crf_data_for_entity_name(self, entity_name, **kwargs):
+        """
+        Generator form of get_crf_data_for_entity_name. Training sentences are streamed from the datastore one page
+        at a time instead of being collected first
+
+        Args:
+            entity_name (str): Entity name for which training data needs to be obtained
+            kwargs:
+                For Elasticsearch:
+                    Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+        Yields:
+            tuple: (sentence, list of entities present in the sentence)
+
+        Raises:
+             IndexNotFoundException if es_training_index was not found in connection settings
+        """
+        ner_logger.debug('Datastore, iter_crf_data_for_entity_name, entity_name %s' % entity_name)
+        if self._client_or_connection is None:
+            self._connect()
+        if self._engine == ELASTICSEARCH:
+            es_training_index = self._connection_settings.get(ELASTICSEARCH_CRF_DATA_INDEX_NAME)
+            if es_training_index is None:
+                raise IndexNotFoundException('Index for ELASTICSEARCH_CRF_DATA_INDEX_NAME not found. '
+                                             'Please configure the same')
+            self._check_doc_type_for_crf_data_elasticsearch()
+            request_timeout = self._connection_settings.get('request_timeout', 20)
+            for sentence, entities in elastic_search.query.iter_crf_data_for_entity_name(
+                    connection=self._client_or_connection,
+                    index_name=es_training_index,
+                    doc_type=self._connection_settings[ELASTICSEARCH_CRF_DATA_DOC_TYPE],
+                    entity_name=entity_name,
+                    request_timeout=request_timeout,
+                    **kwargs):
+                yield sentence, entities
+        elif self._engine == SQLITE:
+            for sentence, entities in sqlite.query.iter_crf_data_for_entity_name(
+                    connection=self._client_or_connection,
+                    entity_name=entity_name,
+                    **kwargs):
+                yield sentence, entities
+
     def update_entity_crf_data(self, entity_name, entity_list, language_script, sentence_list, **kwargs):
         """
         This method is used to populate the training data for a given entity
@@ -645,3 +1469,11 @@ class DataStore(object):
                                                                     entity_name=entity_name,
                                                                     language_script=language_script,
                                                                     **kwargs)
+        elif self._engine == SQLITE:
+            sqlite.populate.update_entity_crf_data_populate(connection=self._client_or_connection,
+                                                            logger=ner_logger,
+                                                            entity_list=entity_list,
+                                                            sentence_list=sentence_list,
+                                                            entity_name=entity_name,
+                                                            language_script=language_script,
+                                                            **kwargs)
@@ -2,4 +2,7 @@ import connect
 import create
 import populate
 import query
-import transfer
\ No newline at end of file
+import reindex
+import templates
+import transfer
+import transport
@@ -1,7 +1,79 @@
+from datastore import constants
+from datastore.utils import (VARIANTS_NORMALIZED_FIELD, VARIANTS_TOKEN_COUNT_FIELD, UPDATED_AT_FIELD,
+                             TOMBSTONE_ENTITY_FIELD, MANIFEST_ENTITY_FIELD, MANIFEST_FILE_HASH_FIELD,
+                             MANIFEST_POPULATED_AT_FIELD)
 from utils import filter_kwargs
 
 log_prefix = 'datastore.elastic_search.create'
 
+# Mapping of the normalized variant fields stored alongside variants, they are only read back from _source and never
+# searched
+VARIANTS_NORMALIZED_FIELDS_MAPPING = {
+    VARIANTS_NORMALIZED_FIELD: {'type': 'keyword', 'index': False},
+    VARIANTS_TOKEN_COUNT_FIELD: {'type': 'integer', 'index': False},
+}
+
+# Mapping of the fields used by DataStore.get_entity_changes
+CHANGE_FEED_FIELDS_MAPPING = {
+    UPDATED_AT_FIELD: {'type': 'long'},
+    TOMBSTONE_ENTITY_FIELD: {'type': 'keyword'},
+}
+
+# Mapping of the fields of entity manifests used by DataStore.repopulate, they are only fetched by id
+MANIFEST_FIELDS_MAPPING = {
+    MANIFEST_ENTITY_FIELD: {'type': 'keyword'},
+    MANIFEST_FILE_HASH_FIELD: {'type': 'keyword', 'index': False},
+    MANIFEST_POPULATED_AT_FIELD: {'type': 'long', 'index': False},
+}
+
+# Analyzers of the variants sub-fields added with ELASTICSEARCH_VARIANT_SUBFIELDS. variants.shingles holds every token
+# and every run of up to VARIANT_SHINGLE_MAX_SIZE tokens of a variant, so that variants contained in a text are found
+# by exact term matches on the shingles of the text. variants.edge_ngrams holds prefixes of the tokens of a variant
+VARIANT_SHINGLE_MAX_SIZE = 4
+VARIANT_SUBFIELDS_ANALYSIS = {
+    'analyzer': {
+        'variant_shingle_analyzer': {
+            'tokenizer': 'whitespace',
+            'filter': ['lowercase', 'variant_shingle']
+        },
+        'variant_edge_ngram_analyzer': {
+            'tokenizer': 'whitespace',
+            'filter': ['lowercase', 'variant_edge_ngram']
+        },
+        'variant_prefix_search_analyzer': {
+            'tokenizer': 'whitespace',
+            'filter': ['lowercase']
+        }
+    },
+    'filter': {
+        'variant_shingle': {
+            'type': 'shingle',
+            'min_shingle_size': 2,
+            'max_shingle_size': VARIANT_SHINGLE_MAX_SIZE,
+            'output_unigrams': True
+        },
+        'variant_edge_ngram': {
+            'type': 'edge_ngram',
+            'min_gram': 1,
+            'max_gram': 20
+        }
+    }
+}
+
+VARIANT_SUBFIELDS_MAPPING = {
+    'shingles': {
+        'type': 'text',
+        'analyzer': 'variant_shingle_analyzer',
+        'norms': {'enabled': False},
+    },
+    'edge_ngrams': {
+        'type': 'text',
+        'analyzer': 'variant_edge_ngram_analyzer',
+        'search_analyzer': 'variant_prefix_search_analyzer',
+        'norms': {'enabled': False},
+    },
+}
+
 
 def delete_index(connection, index_name, logger, **kwargs):
     """
@@ -27,7 +99,7 @@ def delete_index(connection, index_name, logger, **kwargs):
         logger.exception('%s: Exception in deleting index %s ' % (log_prefix, e))
 
 
-def _create_index(connection, index_name, doc_type, logger, mapping_body, **kwargs):
+def _create_index(connection, index_name, doc_type, logger, mapping_body, analysis=None, **kwargs):
     """
     Creates an Elasticsearch index needed for similarity based searching
     Args:
@@ -36,6 +108,7 @@ def _create_index(connection, index_name, doc_type, logger, mapping_body, **kwar
         doc_type:  The type of the documents that will be indexed
         logger: logging object to log at debug and exception level
         mapping_body: dict, mappings to put on the index
+        analysis: dict, analyzers and filters to define on the index in addition to my_analyzer, optional
         kwargs:
             master_timeout: Specify timeout for connection to master
             timeout: Explicit operation timeout
@@ -70,6 +143,9 @@ def _create_index(connection, index_name, doc_type, logger, mapping_body, **kwar
                 }
             }
         }
+        if analysis:
+            for key, definitions in analysis.items():
+                body['index']['analysis'].setdefault(key, {}).update(definitions)
 
         # At this point in time, elasticsearch-py doesn't accept arbitrary kwargs, so we have to filter kwargs per
         # method. Refer https://github.com/elastic/elasticsearch-py/blob/master/elasticsearch/client/indices.py
@@ -110,7 +186,8 @@ def exists(connection, index_name):
 def create_entity_index(connection, index_name, doc_type, logger, **kwargs):
     """
     Creates an mapping specific to entity storage in elasticsearch and makes a call to create_index
-    to create the index with the given mapping body
+    to create the index with the given mapping body. With ELASTICSEARCH_VARIANT_SUBFIELDS, variants are also indexed
+    as shingles and edge n-grams (VARIANT_SUBFIELDS_MAPPING)
     Args:
         connection: Elasticsearch client object
         index_name: The name of the index
@@ -143,8 +220,16 @@ def create_entity_index(connection, index_name, doc_type, logger, **kwargs):
             }
         }
     }
+    mapping_body[doc_type]['properties'].update(VARIANTS_NORMALIZED_FIELDS_MAPPING)
+    mapping_body[doc_type]['properties'].update(CHANGE_FEED_FIELDS_MAPPING)
+    mapping_body[doc_type]['properties'].update(MANIFEST_FIELDS_MAPPING)
 
-    _create_index(connection, index_name, doc_type, logger, mapping_body, **kwargs)
+    analysis = None
+    if constants.ELASTICSEARCH_VARIANT_SUBFIELDS:
+        mapping_body[doc_type]['properties']['variants']['fields'] = VARIANT_SUBFIELDS_MAPPING
+        analysis = VARIANT_SUBFIELDS_ANALYSIS
+
+    _create_index(connection, index_name, doc_type, logger, mapping_body, analysis=analysis, **kwargs)
 
 
 def create_crf_index(connection, index_name, doc_type, logger, **kwargs):
@@ -1,17 +1,26 @@
 from __future__ import absolute_import
 
 # std imports
+import collections
+import contextlib
+import itertools
 import os
-from collections import defaultdict
+import time
 
 # 3rd party imports
+import six
 from elasticsearch import helpers
 
 # Local imports
 from chatbot_ner.config import ner_logger
 from datastore import constants
-from datastore.elastic_search.query import get_entity_data
-from datastore.utils import get_files_from_directory, read_csv, remove_duplicate_data
+from datastore.elastic_search.create import VARIANTS_NORMALIZED_FIELDS_MAPPING
+from datastore.elastic_search.query import get_entity_data, get_entity_manifest_id
+from datastore.utils import (get_files_from_directory, get_variants_normalized_fields, iter_variants_from_csv,
+                             get_update_marker, get_entity_data_document_id, VARIANTS_TOKEN_COUNT_FIELD,
+                             UPDATED_AT_FIELD, DICTIONARY_DATA_TOMBSTONE, TOMBSTONE_ENTITY_FIELD,
+                             DICTIONARY_DATA_MANIFEST, MANIFEST_ENTITY_FIELD, MANIFEST_FILE_HASH_FIELD,
+                             MANIFEST_POPULATED_AT_FIELD)
 from language_utilities.constant import ENGLISH_LANG
 from ner_constants import DICTIONARY_DATA_VARIANTS
 
@@ -21,7 +30,8 @@ log_prefix = 'datastore.elastic_search.populate'
 def create_all_dictionary_data(connection, index_name, doc_type, logger, entity_data_directory_path=None,
                                csv_file_paths=None, **kwargs):
     """
-    Indexes all entity data from csv files stored at entity_data_directory_path, one file at a time
+    Indexes all entity data from csv files stored at entity_data_directory_path, one file at a time, with index
+    refreshes and replicas turned off until done, see relaxed_index_settings
     Args:
         connection: Elasticsearch client object
         index_name: The name of the index
@@ -35,25 +45,27 @@ def create_all_dictionary_data(connection, index_name, doc_type, logger, entity_
 
     """
     logger.debug('%s: +++ Started: create_all_dictionary_data() +++' % log_prefix)
-    if entity_data_directory_path:
-        logger.debug('%s: \t== Fetching from variants/ ==' % log_prefix)
-        csv_files = get_files_from_directory(entity_data_directory_path)
-        for csv_file in csv_files:
-            csv_file_path = os.path.join(entity_data_directory_path, csv_file)
-            create_dictionary_data_from_file(connection=connection, index_name=index_name, doc_type=doc_type,
-                                             csv_file_path=csv_file_path, update=False, logger=logger, **kwargs)
-    if csv_file_paths:
-        for csv_file_path in csv_file_paths:
-            if csv_file_path and csv_file_path.endswith('.csv'):
+    with relaxed_index_settings(connection=connection, index_name=index_name, logger=logger):
+        if entity_data_directory_path:
+            logger.debug('%s: \t== Fetching from variants/ ==' % log_prefix)
+            csv_files = get_files_from_directory(entity_data_directory_path)
+            for csv_file in csv_files:
+                csv_file_path = os.path.join(entity_data_directory_path, csv_file)
                 create_dictionary_data_from_file(connection=connection, index_name=index_name, doc_type=doc_type,
                                                  csv_file_path=csv_file_path, update=False, logger=logger, **kwargs)
+        if csv_file_paths:
+            for csv_file_path in csv_file_paths:
+                if csv_file_path and csv_file_path.endswith('.csv'):
+                    create_dictionary_data_from_file(connection=connection, index_name=index_name, doc_type=doc_type,
+                                                     csv_file_path=csv_file_path, update=False, logger=logger, **kwargs)
     logger.debug('%s: +++ Finished: create_all_dictionary_data() +++' % log_prefix)
 
 
 def recreate_all_dictionary_data(connection, index_name, doc_type, logger, entity_data_directory_path=None,
                                  csv_file_paths=None, **kwargs):
     """
-    Re-indexes all entity data from csv files stored at entity_data_directory_path, one file at a time
+    Re-indexes all entity data from csv files stored at entity_data_directory_path, one file at a time, with index
+    refreshes and replicas turned off until done, see relaxed_index_settings
     Args:
         connection: Elasticsearch client object
         index_name: The name of the index
@@ -67,61 +79,22 @@ def recreate_all_dictionary_data(connection, index_name, doc_type, logger, entit
 
     """
     logger.debug('%s: +++ Started: recreate_all_dictionary_data() +++' % log_prefix)
-    if entity_data_directory_path:
-        logger.debug('%s: \t== Fetching from variants/ ==' % log_prefix)
-        csv_files = get_files_from_directory(entity_data_directory_path)
-        for csv_file in csv_files:
-            csv_file_path = os.path.join(entity_data_directory_path, csv_file)
-            create_dictionary_data_from_file(connection=connection, index_name=index_name, doc_type=doc_type,
-                                             csv_file_path=csv_file_path, update=True, logger=logger, **kwargs)
-    if csv_file_paths:
-        for csv_file_path in csv_file_paths:
-            if csv_file_path and csv_file_path.endswith('.csv'):
+    with relaxed_index_settings(connection=connection, index_name=index_name, logger=logger):
+        if entity_data_directory_path:
+            logger.debug('%s: \t== Fetching from variants/ ==' % log_prefix)
+            csv_files = get_files_from_directory(entity_data_directory_path)
+            for csv_file in csv_files:
+                csv_file_path = os.path.join(entity_data_directory_path, csv_file)
                 create_dictionary_data_from_file(connection=connection, index_name=index_name, doc_type=doc_type,
                                                  csv_file_path=csv_file_path, update=True, logger=logger, **kwargs)
+        if csv_file_paths:
+            for csv_file_path in csv_file_paths:
+                if csv_file_path and csv_file_path.endswith('.csv'):
+                    create_dictionary_data_from_file(connection=connection, index_name=index_name, doc_type=doc_type,
+                                                     csv_file_path=csv_file_path, update=True, logger=logger, **kwargs)
     logger.debug('%s: +++ Finished: recreate_all_dictionary_data() +++' % log_prefix)
 
 
-def get_variants_dictionary_value_from_key(csv_file_path, dictionary_key, logger, **kwargs):
-    """
-    Reads the csv file at csv_file_path and create a dictionary mapping
-    entity value to a list of their variants. The entity values are first column of the
-    csv file and their corresponding variants are stored in the second column delimited by '|'
-
-    Args:
-        csv_file_path: absolute file path of the csv file populate entity data from
-        dictionary_key: name of the entity to be put the values under
-        logger: logging object to log at debug and exception level
-        kwargs:
-            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
-
-    Returns:
-        Dictionary mapping entity value to a list of their variants.
-    """
-    dictionary_value = defaultdict(list)
-    try:
-        csv_reader = read_csv(csv_file_path)
-        next(csv_reader)
-        for data_row in csv_reader:
-            try:
-                data = map(str.strip, data_row[1].split('|'))
-                # remove empty strings
-                data = [variant for variant in data if variant]
-                dictionary_value[data_row[0].strip().replace('.', ' ')].extend(data)
-
-            except Exception as e:
-                logger.exception('%s: \t\t== Exception in dict creation for keyword: %s -- %s -- %s =='
-                                 % (log_prefix, dictionary_key, data_row, e))
-
-    except Exception as e:
-        logger.exception(
-            '%s: \t\t\t=== Exception in __get_variants_dictionary_value_from_key() Dictionary Key: %s \n %s  ===' % (
-                log_prefix,
-                dictionary_key, e.message))
-
-    return dictionary_value
-
-
 def add_data_elastic_search(
         connection, index_name, doc_type, dictionary_key,
         dictionary_value, language_script, logger, **kwargs
@@ -146,25 +119,23 @@ def add_data_elastic_search(
     Example of underlying index query
         {'_index': 'index_name',
          '_type': 'dictionary_data',
+         '_id': '5d3c1b1e0d8c7bd5b4a1f2b1e8d1f3a2c4b5e6f7',
          'dict_type': 'variants',
          'entity_data': 'city',
          'value': 'Baripada Town'',
          'variants': ['Baripada', 'Baripada Town', '']
+         'variants_normalized': ['baripada', 'baripada town', ''],
+         'variants_token_count': [1, 2, 0],
+         'updated_at': 1546300800000,
          '_op_type': 'index'
          }
 
     """
     str_query = []
-    for value in dictionary_value:
-        query_dict = {'_index': index_name,
-                      'entity_data': dictionary_key,
-                      'dict_type': DICTIONARY_DATA_VARIANTS,
-                      'value': value,
-                      'variants': dictionary_value[value],
-                      "language_script": language_script,
-                      '_type': doc_type,
-                      '_op_type': 'index'
-                      }
+    value_variants = ((value, dictionary_value[value]) for value in dictionary_value)
+    for query_dict in _iter_entity_data_index_actions(index_name=index_name, doc_type=doc_type,
+                                                      entity_name=dictionary_key, value_variants=value_variants,
+                                                      language_script=language_script):
         str_query.append(query_dict)
         if len(str_query) > constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE:
             result = helpers.bulk(connection, str_query, stats_only=True, **kwargs)
@@ -175,9 +146,129 @@ def add_data_elastic_search(
         logger.debug('%s: \t++ %s status %s ++' % (log_prefix, dictionary_key, result))
 
 
+def _iter_entity_data_index_actions(index_name, doc_type, entity_name, value_variants, language_script):
+    """
+    Lazily builds the bulk index actions of entity documents, see add_data_elastic_search for their structure
+
+    Args:
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents being indexed
+        entity_name (str): name of the entity
+        value_variants (iterable): (entity value, list of its variants) pairs
+        language_script (str): Language code of the entity script
+
+    Yields:
+        dict: bulk index action of the entity document of each value
+    """
+    for value, variants in value_variants:
+        query_dict = {'_index': index_name,
+                      '_id': get_entity_data_document_id(entity_name, value, language_script),
+                      'entity_data': entity_name,
+                      'dict_type': DICTIONARY_DATA_VARIANTS,
+                      'value': value,
+                      'variants': variants,
+                      "language_script": language_script,
+                      UPDATED_AT_FIELD: get_update_marker(),
+                      '_type': doc_type,
+                      '_op_type': 'index'
+                      }
+        query_dict.update(get_variants_normalized_fields(variants))
+        yield query_dict
+
+
+def stream_bulk_actions(connection, actions, entity_name, logger, thread_count=None, queue_size=None,
+                        chunk_size=None, **kwargs):
+    """
+    Sends actions to Elasticsearch as they are produced, from thread_count threads each sending one bulk request of
+    chunk_size actions at a time. At most queue_size further requests are built ahead of the threads, so the
+    actions in memory stay bounded however many actions are produced. Progress is logged every
+    ELASTICSEARCH_BULK_PROGRESS_INTERVAL actions and when done
+
+    Args:
+        connection: Elasticsearch client object
+        actions (iterable): bulk actions, consumed lazily
+        entity_name (str): name of the entity the actions are for, only used for logging
+        logger: logging object to log at debug and exception level
+        thread_count (int, optional): number of threads sending bulk requests. Defaults to
+                                      ELASTICSEARCH_BULK_THREAD_COUNT
+        queue_size (int, optional): number of bulk requests built ahead of the threads. Defaults to
+                                    ELASTICSEARCH_BULK_QUEUE_SIZE
+        chunk_size (int, optional): number of actions in each bulk request. Defaults to
+                                    ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE
+        kwargs:
+            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.parallel_bulk
+
+    Returns:
+        int: number of actions sent successfully
+
+    Raises:
+        elasticsearch.helpers.BulkIndexError if any action fails, unless raise_on_error=False is passed in kwargs
+    """
+    started_at = time.time()
+    sent_count = 0
+    success_count = 0
+    results = helpers.parallel_bulk(connection, actions,
+                                    thread_count=thread_count or constants.ELASTICSEARCH_BULK_THREAD_COUNT,
+                                    queue_size=queue_size or constants.ELASTICSEARCH_BULK_QUEUE_SIZE,
+                                    chunk_size=chunk_size or constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE,
+                                    **kwargs)
+    for success, _ in results:
+        sent_count += 1
+        if success:
+            success_count += 1
+        if sent_count % constants.ELASTICSEARCH_BULK_PROGRESS_INTERVAL == 0:
+            _log_bulk_progress(logger=logger, entity_name=entity_name, count=sent_count, started_at=started_at)
+    _log_bulk_progress(logger=logger, entity_name=entity_name, count=sent_count, started_at=started_at)
+    return success_count
+
+
+def _log_bulk_progress(logger, entity_name, count, started_at):
+    elapsed = max(time.time() - started_at, 1e-6)
+    logger.info('%s: \t++ %s: %d documents in %.1fs, %.0f docs/sec ++'
+                % (log_prefix, entity_name, count, elapsed, count / elapsed))
+
+
+@contextlib.contextmanager
+def relaxed_index_settings(connection, index_name, logger):
+    """
+    Context manager turning off periodic refreshes and replicas of the index (ELASTICSEARCH_BULK_LOAD_SETTINGS) for
+    the duration of a bulk load, so that segments are not flushed every second and every document is indexed only
+    once. The previous settings of each index behind index_name are restored and the index refreshed on exit, whether
+    the load succeeded or not. If the settings cannot be changed (e.g. hosted clusters restricting the settings API)
+    the load runs with the current settings
+
+    Args:
+        connection: Elasticsearch client object
+        index_name (str): The name of the index or alias
+        logger: logging object to log at debug and exception level
+    """
+    original_settings = None
+    try:
+        original_settings = connection.indices.get_settings(index=index_name,
+                                                            name='index.refresh_interval,index.number_of_replicas')
+        connection.indices.put_settings(index=index_name, body={'index': constants.ELASTICSEARCH_BULK_LOAD_SETTINGS})
+    except Exception as e:
+        logger.exception('%s: \t== Could not relax settings of %s for bulk load, continuing with current settings %s =='
+                         % (log_prefix, index_name, e))
+        original_settings = None
+    try:
+        yield
+    finally:
+        if original_settings:
+            for concrete_index_name, index_settings in six.iteritems(original_settings):
+                settings = index_settings.get('settings', {}).get('index', {})
+                # a missing refresh_interval was the default, which putting None restores
+                connection.indices.put_settings(index=concrete_index_name, body={'index': {
+                    'refresh_interval': settings.get('refresh_interval'),
+                    'number_of_replicas': settings.get('number_of_replicas'),
+                }})
+            connection.indices.refresh(index=index_name)
+
+
 def create_dictionary_data_from_file(connection, index_name, doc_type, csv_file_path, update, logger, **kwargs):
     """
-    Indexes all entity data from the csv file at path csv_file_path
+    Indexes all entity data from the csv file at path csv_file_path, streaming its rows to Elasticsearch without
+    reading the whole file in memory, see stream_bulk_actions
     Args:
         connection: Elasticsearch client object
         index_name: The name of the index
@@ -195,20 +286,128 @@ def create_dictionary_data_from_file(connection, index_name, doc_type, csv_file_
     if update:
         delete_entity_by_name(connection=connection, index_name=index_name, doc_type=doc_type,
                               entity_name=dictionary_key, logger=logger, **kwargs)
-    dictionary_value = get_variants_dictionary_value_from_key(csv_file_path=csv_file_path,
-                                                              dictionary_key=dictionary_key, logger=logger,
-                                                              **kwargs)
-    if dictionary_value:
-        add_data_elastic_search(connection=connection, index_name=index_name, doc_type=doc_type,
-                                dictionary_key=dictionary_key,
-                                dictionary_value=remove_duplicate_data(dictionary_value),
-                                language_script=ENGLISH_LANG,
-                                logger=logger, **kwargs)
-    if os.path.exists(csv_file_path) and os.path.splitext(csv_file_path)[1] == '.csv':
-        os.path.basename(csv_file_path)
+    value_variants = iter_variants_from_csv(csv_file_path=csv_file_path, dictionary_key=dictionary_key, logger=logger,
+                                            **kwargs)
+    actions = _iter_entity_data_index_actions(index_name=index_name, doc_type=doc_type, entity_name=dictionary_key,
+                                              value_variants=value_variants, language_script=ENGLISH_LANG)
+    stream_bulk_actions(connection=connection, actions=actions, entity_name=dictionary_key, logger=logger, **kwargs)
+
+
+def add_variants_normalized_fields(connection, index_name, doc_type, logger, entity_names=None, **kwargs):
+    """
+    Migrate entity documents indexed before normalized variant fields were introduced: put the mapping for these
+    fields and add them to every entity document missing them, see datastore.utils.get_variants_normalized_fields
+
+    Args:
+        connection: Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents being indexed
+        logger: logging object to log at debug and exception level
+        entity_names (list, optional): only migrate documents of these entities. If None, all entities are migrated
+        kwargs:
+            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
 
+    Returns:
+        int: number of documents updated
+    """
+    connection.indices.put_mapping(body={doc_type: {'properties': VARIANTS_NORMALIZED_FIELDS_MAPPING}},
+                                   index=index_name, doc_type=doc_type)
 
-def delete_entity_by_name(connection, index_name, doc_type, entity_name, logger, **kwargs):
+    must_terms = [{'term': {'dict_type': DICTIONARY_DATA_VARIANTS}}]
+    if entity_names:
+        must_terms.append({'terms': {'entity_data': entity_names}})
+    data = {
+        'query': {
+            'bool': {
+                'must': must_terms,
+                'must_not': [{'exists': {'field': VARIANTS_TOKEN_COUNT_FIELD}}]
+            }
+        },
+        '_source': ['variants']
+    }
+
+    updated_count = 0
+    str_query = []
+    for hit in helpers.scan(connection, query=data, index=index_name, doc_type=doc_type, scroll='2m',
+                            size=constants.ELASTICSEARCH_SEARCH_SIZE):
+        str_query.append({
+            '_index': index_name,
+            '_type': doc_type,
+            '_id': hit['_id'],
+            '_op_type': 'update',
+            'doc': get_variants_normalized_fields(hit['_source'].get('variants')),
+        })
+        if len(str_query) == constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE:
+            updated_count += helpers.bulk(connection, str_query, stats_only=True, **kwargs)[0]
+            str_query = []
+    if str_query:
+        updated_count += helpers.bulk(connection, str_query, stats_only=True, **kwargs)[0]
+
+    logger.debug('%s: \t++ added normalized variant fields to %d documents ++' % (log_prefix, updated_count))
+    return updated_count
+
+
+def rekey_entity_data(connection, index_name, doc_type, logger, entity_names=None, **kwargs):
+    """
+    Migrate entity documents indexed before document ids were deterministic: index each document whose id is not
+    the id of its entity, value and language (see datastore.utils.get_entity_data_document_id) under that id and
+    delete it. Duplicate documents of a value and language collapse into one
+
+    Args:
+        connection: Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents being indexed
+        logger: logging object to log at debug and exception level
+        entity_names (list, optional): only migrate documents of these entities. If None, all entities are migrated
+        kwargs:
+            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
+
+    Returns:
+        int: number of documents moved to their deterministic id
+    """
+    must_terms = [{'term': {'dict_type': DICTIONARY_DATA_VARIANTS}}]
+    if entity_names:
+        must_terms.append({'terms': {'entity_data': entity_names}})
+    data = {'query': {'bool': {'must': must_terms}}}
+
+    rekeyed_count = 0
+    str_query = []
+    for hit in helpers.scan(connection, query=data, index=index_name, doc_type=doc_type, scroll='2m',
+                            size=constants.ELASTICSEARCH_SEARCH_SIZE):
+        source = hit['_source']
+        document_id = get_entity_data_document_id(source.get('entity_data'), source.get('value'),
+                                                  source.get('language_script'))
+        if hit['_id'] == document_id:
+            continue
+        str_query.append({'_index': index_name, '_type': doc_type, '_id': hit['_id'], '_op_type': 'delete'})
+        str_query.append(dict(source, _index=index_name, _type=doc_type, _id=document_id, _op_type='index',
+                              **{UPDATED_AT_FIELD: get_update_marker()}))
+        rekeyed_count += 1
+        if len(str_query) >= constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE:
+            helpers.bulk(connection, str_query, stats_only=True, **kwargs)
+            str_query = []
+    if str_query:
+        helpers.bulk(connection, str_query, stats_only=True, **kwargs)
+
+    logger.debug('%s: \t++ moved %d documents to deterministic ids ++' % (log_prefix, rekeyed_count))
+    return rekeyed_count
+
+def delete_entity_by_name(connection, index_name, doc_type, entity_name, logger, record_deletion=True, **kwargs):
+    """
+    Deletes all documents of the entity
+
+    Args:
+        connection: Elasticsearch client object
+        index_name: The name of the index
+        doc_type: The type of the documents being deleted
+        entity_name: name of the entity
+        logger: logging object to log at debug and exception level
+        record_deletion (bool, optional): True to write a tombstone recording deletion of the whole entity for
+                                          DataStore.get_entity_changes, False for indices without entity data
+                                          (e.g. crf training data). Defaults to True
+        kwargs:
+            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
+    """
     data = {
         'query': {
             'term': {
@@ -244,6 +443,74 @@ def delete_entity_by_name(connection, index_name, doc_type, entity_name, logger,
     for delete_query in delete_bulk_queries:
         result = helpers.bulk(connection, delete_query, stats_only=True, **kwargs)
         logger.debug('%s: \t++ %s Entity delete status %s ++' % (log_prefix, entity_name, result))
+    if record_deletion:
+        add_tombstones(connection=connection, index_name=index_name, doc_type=doc_type, entity_name=entity_name,
+                       values_and_language_scripts=None, **kwargs)
+
+
+def _get_tombstone_id(entity_name, value=None, language_script=None):
+    return 'tombstone-' + get_entity_data_document_id(entity_name, value, language_script)
+
+
+def add_tombstones(connection, index_name, doc_type, entity_name, values_and_language_scripts=None, **kwargs):
+    """
+    Record deletion of entity values for DataStore.get_entity_changes. Tombstones have deterministic ids, so
+    deleting the same value again overwrites its tombstone with a newer update marker instead of adding another
+
+    Args:
+        connection: Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents being indexed
+        entity_name (str): name of the entity
+        values_and_language_scripts (iterable, optional): (value, language_script) tuples of the deleted documents.
+                                                          If None, deletion of all values of the entity is recorded
+        kwargs:
+            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
+    """
+    if values_and_language_scripts is None:
+        values_and_language_scripts = [(None, None)]
+
+    str_query = []
+    for value, language_script in values_and_language_scripts:
+        str_query.append({
+            '_index': index_name,
+            '_type': doc_type,
+            '_id': _get_tombstone_id(entity_name, value, language_script),
+            '_op_type': 'index',
+            'dict_type': DICTIONARY_DATA_TOMBSTONE,
+            TOMBSTONE_ENTITY_FIELD: entity_name,
+            'value': value,
+            'language_script': language_script,
+            UPDATED_AT_FIELD: get_update_marker(),
+        })
+        if len(str_query) == constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE:
+            helpers.bulk(connection, str_query, stats_only=True, **kwargs)
+            str_query = []
+    if str_query:
+        helpers.bulk(connection, str_query, stats_only=True, **kwargs)
+
+
+def put_entity_manifest(connection, index_name, doc_type, entity_name, file_hash, populated_at, **kwargs):
+    """
+    Record the manifest of a repopulation of the entity from a csv file, replacing the previous one. Manifests keep
+    the entity name in their own field, so queries on entity data and the change feed never see them
+
+    Args:
+        connection: Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents being indexed
+        entity_name (str): name of the entity
+        file_hash (str): content hash of the csv file, see datastore.utils.get_file_content_hash
+        populated_at (int): update marker taken after the entity data was written
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.index
+    """
+    connection.index(index=index_name, doc_type=doc_type, id=get_entity_manifest_id(entity_name), body={
+        'dict_type': DICTIONARY_DATA_MANIFEST,
+        MANIFEST_ENTITY_FIELD: entity_name,
+        MANIFEST_FILE_HASH_FIELD: file_hash,
+        MANIFEST_POPULATED_AT_FIELD: populated_at,
+    }, **kwargs)
 
 
 def entity_data_update(connection, index_name, doc_type, entity_data, entity_name, language_script,
@@ -299,7 +566,7 @@ def update_entity_crf_data_populate(
     logger.debug('%s: +++ Started: external_api_training_data_entity_update() +++' % log_prefix)
     logger.debug('%s: +++ Started: delete_entity_by_name() +++' % log_prefix)
     delete_entity_by_name(connection=connection, index_name=index_name, doc_type=doc_type,
-                          entity_name=entity_name, logger=logger, **kwargs)
+                          entity_name=entity_name, logger=logger, record_deletion=False, **kwargs)
     logger.debug('%s: +++ Completed: delete_entity_by_name() +++' % log_prefix)
 
     logger.debug('%s: +++ Started: add_training_data_elastic_search() +++' % log_prefix)
@@ -383,8 +650,11 @@ def delete_entity_data_by_values(connection, index_name, doc_type, entity_name,
     )
 
     delete_bulk_queries = []
+    deleted_values_and_language_scripts = []
     str_query = []
     for record in results:
+        deleted_values_and_language_scripts.append((record['_source'].get('value'),
+                                                    record['_source'].get('language_script')))
         delete_dict = {
             '_index': index_name,
             '_type': doc_type,
@@ -403,6 +673,10 @@ def delete_entity_data_by_values(connection, index_name, doc_type, entity_name,
         result = helpers.bulk(connection, delete_query, stats_only=True, **kwargs)
         ner_logger.debug('delete_entity_data_by_values: entity_name: {0} result {1}'.format(entity_name, str(result)))
 
+    add_tombstones(connection=connection, index_name=index_name, doc_type=doc_type, entity_name=entity_name,
+                   values_and_language_scripts=deleted_values_and_language_scripts if values is not None else None,
+                   **kwargs)
+
 
 def add_entity_data(connection, index_name, doc_type, entity_name, value_variant_records, **kwargs):
     """
@@ -420,17 +694,8 @@ def add_entity_data(connection, index_name, doc_type, entity_name, value_variant
     """
     str_query = []
     for record in value_variant_records:
-        query_dict = {
-            '_index': index_name,
-            '_op_type': 'index',
-            '_type': doc_type,
-            'dict_type': DICTIONARY_DATA_VARIANTS,
-            'entity_data': entity_name,
-            'language_script': record.get('language_script'),
-            'value': record.get('value'),
-            'variants': record.get('variants'),
-        }
-        str_query.append(query_dict)
+        str_query.append(_get_entity_data_index_action(index_name=index_name, doc_type=doc_type,
+                                                       entity_name=entity_name, record=record))
         if len(str_query) == constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE:
             helpers.bulk(connection, str_query, stats_only=True, **kwargs)
             str_query = []
@@ -438,4 +703,88 @@ def add_entity_data(connection, index_name, doc_type, entity_name, value_variant
     if str_query:
         helpers.bulk(connection, str_query, stats_only=True, **kwargs)
 
+
+def _get_entity_data_index_action(index_name, doc_type, entity_name, record):
+    query_dict = {
+        '_index': index_name,
+        '_op_type': 'index',
+        '_type': doc_type,
+        '_id': get_entity_data_document_id(entity_name, record.get('value'), record.get('language_script')),
+        'dict_type': DICTIONARY_DATA_VARIANTS,
+        'entity_data': entity_name,
+        'language_script': record.get('language_script'),
+        'value': record.get('value'),
+        'variants': record.get('variants'),
+        UPDATED_AT_FIELD: get_update_marker(),
+    }
+    query_dict.update(get_variants_normalized_fields(record.get('variants')))
+    return query_dict
+
+
+def upsert_entity_data(connection, index_name, doc_type, entity_name, value_variant_records, values_to_delete=None,
+                       language_scripts=None, **kwargs):
+    """
+    Write the records and delete the values in a single pass of bulk requests. Records overwrite the document of
+    their value and language in place (see datastore.utils.get_entity_data_document_id). Other documents of the
+    written values and all documents of the deleted values are looked up with _mget and deleted by id, so the
+    work done is proportional to the size of the change instead of a delete by query followed by a re-index
+
+    Args:
+        connection (elasticsearch.client.Elasticsearch): Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents that will be indexed
+        entity_name (str): name of the entity
+        value_variant_records (list): List of dicts to be written, each replacing all documents of its value in
+            other languages that are not written too.
+            Sample Dict: {'value': 'value', 'language_script': 'en', variants': ['variant 1', 'variant 2']}
+        values_to_delete (list, optional): values all documents of which are deleted unless written by a record
+        language_scripts (list, optional): languages of the existing documents of the entity, if known to the
+            caller. If None, they are fetched before the lookup, see datastore.elastic_search.query.iter_entity_data
+        kwargs:
+            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
+
+    Returns:
+        tuple: number of documents written and number of documents deleted
+    """
+    index_actions = collections.OrderedDict()
+    for record in value_variant_records:
+        action = _get_entity_data_index_action(index_name=index_name, doc_type=doc_type, entity_name=entity_name,
+                                               record=record)
+        index_actions[action['_id']] = action
+
+    values = [record.get('value') for record in value_variant_records] + list(values_to_delete or [])
+    delete_actions = []
+    deleted_values_and_language_scripts = []
+    if values:
+        for record in get_entity_data(connection=connection, index_name=index_name, doc_type=doc_type,
+                                      entity_name=entity_name, values=values, language_scripts=language_scripts,
+                                      **kwargs):
+            if record['_id'] in index_actions:
+                continue
+            delete_actions.append({'_index': index_name, '_type': doc_type, '_id': record['_id'],
+                                   '_op_type': 'delete'})
+            deleted_values_and_language_scripts.append((record['_source'].get('value'),
+                                                        record['_source'].get('language_script')))
+
+    str_query = []
+    for action in itertools.chain(delete_actions, index_actions.values()):
+        str_query.append(action)
+        if len(str_query) == constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE:
+            helpers.bulk(connection, str_query, stats_only=True, **kwargs)
+            str_query = []
+    if str_query:
+        helpers.bulk(connection, str_query, stats_only=True, **kwargs)
+
+    written_values_and_language_scripts = {(action['value'], action['language_script'])
+                                           for action in index_actions.values()}
+    tombstones = [value_and_language_script for value_and_language_script in deleted_values_and_language_scripts
+                  if value_and_language_script not in written_values_and_language_scripts]
+    if tombstones:
+        add_tombstones(connection=connection, index_name=index_name, doc_type=doc_type, entity_name=entity_name,
+                       values_and_language_scripts=tombstones, **kwargs)
+
+    ner_logger.debug('%s: upsert_entity_data: entity_name: %s written %d deleted %d'
+                     % (log_prefix, entity_name, len(index_actions), len(delete_actions)))
+    return len(index_actions), len(delete_actions)
+
 # TODO: Implement method to add entities that actually works and don't overwrite data
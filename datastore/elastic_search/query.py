@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 # std imports
 import copy
+import math
 from six import string_types
 import re
 import collections
@@ -9,9 +10,17 @@ import collections
 # Local imports
 from chatbot_ner.config import ner_logger
 from datastore import constants
+from datastore.elastic_search.templates import TemplateParam, add_search_template, search_template, msearch_template
+from datastore.local_index import get_max_edits_for_token, FUZZY_PREFIX_LENGTH
+from datastore.utils import (NormalizedVariant, get_variants_normalized_from_source, get_entity_data_document_id,
+                             VARIANTS_NORMALIZED_FIELD, VARIANTS_TOKEN_COUNT_FIELD, UPDATED_AT_FIELD,
+                             DICTIONARY_DATA_TOMBSTONE, TOMBSTONE_ENTITY_FIELD, MANIFEST_FILE_HASH_FIELD,
+                             MANIFEST_POPULATED_AT_FIELD)
 from external_api.constants import SENTENCE_LIST, ENTITY_LIST
 from language_utilities.constant import ENGLISH_LANG
 from lib.nlp.const import TOKENIZER
+from lib.nlp.levenshtein_distance import damerau_levenshtein_distance
+from ner_constants import DICTIONARY_DATA_VARIANTS
 
 log_prefix = 'datastore.elastic_search.query'
 
@@ -32,7 +41,27 @@ def dictionary_query(connection, index_name, doc_type, entity_name, **kwargs):
         dictionary, search results of the 'term' query on entity_name, mapping keys to lists containing
         synonyms/variants of the key
     """
-    results_dictionary = {}
+    return dict(iter_dictionary_query(connection=connection, index_name=index_name, doc_type=doc_type,
+                                      entity_name=entity_name, **kwargs))
+
+
+def iter_dictionary_query(connection, index_name, doc_type, entity_name, **kwargs):
+    """
+    Generator form of dictionary_query. Scrolls over all documents of the entity and yields them one page at a
+    time, so that only a single page of hits is held in memory at once
+
+    Args:
+        connection: Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents that will be indexed
+        entity_name (str): name of the entity to perform a 'term' query on
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+    Yields:
+        tuple: (value, list of variants of the value) for each document of the entity. Values present in more
+            than one language script are yielded once per document
+    """
     data = {
         'query': {
             'term': {
@@ -44,14 +73,9 @@ def dictionary_query(connection, index_name, doc_type, entity_name, **kwargs):
     }
     kwargs = dict(kwargs, body=data, doc_type=doc_type, size=constants.ELASTICSEARCH_SEARCH_SIZE, index=index_name,
                   scroll='1m')
-    search_results = _run_es_search(connection, **kwargs)
-
-    # Parse hits
-    results = search_results['hits']['hits']
-    for result in results:
-        results_dictionary[result['_source']['value']] = result['_source']['variants']
-
-    return results_dictionary
+    kwargs.setdefault('_source', ['value', 'variants'])
+    for result in _iter_es_search_hits(connection, **kwargs):
+        yield result['_source']['value'], result['_source']['variants']
 
 
 def get_entity_supported_languages(connection, index_name, doc_type, entity_name, **kwargs):
@@ -98,7 +122,48 @@ def get_entity_supported_languages(connection, index_name, doc_type, entity_name
     return language_list
 
 
-def get_entity_data(connection, index_name, doc_type, entity_name, values=None, **kwargs):
+def get_entity_names(connection, index_name, doc_type, **kwargs):
+    """
+    Fetch names of all entities having dictionary data in the index
+
+    Args:
+        connection (elasticsearch.client.Elasticsearch): Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents that will be indexed
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+    Returns:
+        (list): sorted list of entity names
+    """
+    data = {
+        "query": {
+            "term": {
+                "dict_type": DICTIONARY_DATA_VARIANTS
+            }
+        },
+        "aggs": {
+            "unique_values": {
+                "terms": {
+                    "field": "entity_data.keyword",
+                    "size": 300000
+                }
+            }
+        },
+        "size": 0
+    }
+    kwargs = dict(
+        kwargs, body=data, doc_type=doc_type, index=index_name,
+        filter_path=['aggregations.unique_values.buckets.key']
+    )
+    search_results = _run_es_search(connection, **kwargs)
+    entity_names = []
+    if search_results:
+        entity_names = [bucket['key'] for bucket in search_results['aggregations']['unique_values']['buckets']]
+    return sorted(entity_names)
+
+
+def get_entity_data(connection, index_name, doc_type, entity_name, values=None, language_scripts=None, **kwargs):
     """
     Fetches entity data from ES for the specific entity
     Args:
@@ -108,8 +173,103 @@ def get_entity_data(connection, index_name, doc_type, entity_name, values=None,
         entity_name (str): name of the entity for which the data is to be fetched
         values (str, optional): List of values for which data is to be fetched. If None, all
                                 records are fetched
+        language_scripts (list, optional): languages of the entity, if known to the caller. Refer iter_entity_data
     Returns:
-        (list): List of language codes supported by this entity
+        (list): List of records (search hits) with entity data
+    """
+    return list(iter_entity_data(connection=connection, index_name=index_name, doc_type=doc_type,
+                                 entity_name=entity_name, values=values, language_scripts=language_scripts,
+                                 **kwargs))
+
+
+def iter_entity_data(connection, index_name, doc_type, entity_name, values=None, language_scripts=None, **kwargs):
+    """
+    Generator form of get_entity_data. Scrolls over the matching documents and yields them one page at a time, so
+    that only a single page of hits is held in memory at once. If values are given, their documents are looked up
+    by id instead, see _iter_entity_data_by_values
+
+    Args:
+        connection (elasticsearch.client.Elasticsearch): Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents that will be indexed
+        entity_name (str): name of the entity for which the data is to be fetched
+        values (str, optional): List of values for which data is to be fetched. If None, all
+                                records are fetched
+        language_scripts (list, optional): languages of the entity, if known to the caller, to look the values up
+                                           in. If None, they are fetched with get_entity_supported_languages. Only
+                                           used with values
+    Yields:
+        dict: records (search hits) with entity data
+    """
+    if values is not None:
+        for result in _iter_entity_data_by_values(connection=connection, index_name=index_name, doc_type=doc_type,
+                                                  entity_name=entity_name, values=values,
+                                                  language_scripts=language_scripts, **kwargs):
+            yield result
+        return
+
+    for result in _iter_entity_data_search(connection=connection, index_name=index_name, doc_type=doc_type,
+                                           entity_name=entity_name, values=None, **kwargs):
+        yield result
+
+
+def _iter_entity_data_by_values(connection, index_name, doc_type, entity_name, values, language_scripts=None,
+                                **kwargs):
+    """
+    Look up documents of the values with _mget by their ids (see datastore.utils.get_entity_data_document_id) in
+    every language of the entity, ELASTICSEARCH_SEARCH_SIZE ids per call. Values with a (value, language) pair not
+    found by id, i.e. missing in that language or indexed before document ids were deterministic, are searched for
+    with terms queries
+
+    Args:
+        connection (elasticsearch.client.Elasticsearch): Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents that will be indexed
+        entity_name (str): name of the entity for which the data is to be fetched
+        values (list): List of values for which data is to be fetched
+        language_scripts (list, optional): languages of the entity. If None, they are fetched with
+                                           get_entity_supported_languages
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.mget
+
+    Yields:
+        dict: records (documents with _id and _source) with entity data
+    """
+    values = list(collections.OrderedDict.fromkeys(
+        value.decode('utf-8') if isinstance(value, bytes) else value for value in values))
+    if language_scripts is None:
+        language_scripts = get_entity_supported_languages(connection=connection, index_name=index_name,
+                                                          doc_type=doc_type, entity_name=entity_name, **kwargs)
+    language_scripts = list(collections.OrderedDict.fromkeys(language_scripts))
+    chunk_size = max(constants.ELASTICSEARCH_SEARCH_SIZE // max(len(language_scripts), 1), 1)
+
+    found_ids = set()
+    missing_values = []
+    for i in range(0, len(values), chunk_size):
+        chunk = values[i:i + chunk_size]
+        found_pairs = set()
+        ids = [get_entity_data_document_id(entity_name, value, language_script)
+               for value in chunk for language_script in language_scripts]
+        if ids:
+            for doc in connection.mget(index=index_name, doc_type=doc_type, body={'ids': ids}, **kwargs)['docs']:
+                if doc.get('found'):
+                    found_ids.add(doc['_id'])
+                    found_pairs.add((doc['_source']['value'], doc['_source'].get('language_script')))
+                    yield doc
+        missing_values.extend(value for value in chunk
+                               if any((value, language_script) not in found_pairs
+                                      for language_script in language_scripts) or not language_scripts)
+
+    if missing_values:
+        for result in _iter_entity_data_search(connection=connection, index_name=index_name, doc_type=doc_type,
+                                               entity_name=entity_name, values=missing_values, **kwargs):
+            if result['_id'] not in found_ids:
+                yield result
+
+
+def _iter_entity_data_search(connection, index_name, doc_type, entity_name, values=None, **kwargs):
+    """
+    Scroll over documents of the entity, or of the values of the entity if given. Refer iter_entity_data
     """
     data = {
         "query": {
@@ -138,17 +298,67 @@ def get_entity_data(connection, index_name, doc_type, entity_name, values=None,
     else:
         query_list.append(data)
 
-    results = []
     for query in query_list:
         search_kwargs = dict(kwargs, body=query, doc_type=doc_type,
                              size=constants.ELASTICSEARCH_SEARCH_SIZE, index=index_name, scroll='1m')
-        search_results = _run_es_search(connection, **search_kwargs)
+        for result in _iter_es_search_hits(connection, **search_kwargs):
+            yield result
 
-        # Parse hits
-        if search_results:
-            results.extend(search_results['hits']['hits'])
 
-    return results
+def _get_entity_values_query(entity_name, value_search_term=None, variant_search_term=None,
+                             empty_variants_only=False):
+    """
+    Build the query matching documents of the entity with the filters of get_entity_unique_values. With
+    ELASTICSEARCH_VARIANT_SUBFIELDS, variant_search_term matches variants having tokens starting with each of its tokens
+    """
+    query = {
+        "bool": {
+            "must": [
+                {
+                    "match": {
+                        "entity_data": entity_name
+                    }
+                }
+            ],
+            "minimum_should_match": 0,
+            "should": []
+        }
+    }
+
+    if value_search_term:
+        query['bool']['minimum_should_match'] = 1
+        query['bool']['should'].append({
+            "wildcard": {
+                "value": u"*{0}*".format(value_search_term.lower())
+            }
+        })
+
+    if empty_variants_only:
+        query['bool']['must_not'] = [
+            {
+                "exists": {
+                    "field": "variants"
+                }
+            }
+        ]
+    elif variant_search_term and constants.ELASTICSEARCH_VARIANT_SUBFIELDS:
+        query['bool']['minimum_should_match'] = 1
+        query['bool']['should'].append({
+            "match": {
+                "variants.edge_ngrams": {
+                    "query": variant_search_term,
+                    "operator": "and"
+                }
+            }
+        })
+    elif variant_search_term:
+        query['bool']['minimum_should_match'] = 1
+        query['bool']['should'].append({
+            "match": {
+                "variants": variant_search_term
+            }
+        })
+    return query
 
 
 def get_entity_unique_values(connection, index_name, doc_type, entity_name, value_search_term=None,
@@ -165,7 +375,8 @@ def get_entity_unique_values(connection, index_name, doc_type, entity_name, valu
         variant_search_term (str): Filter variants with the specific search term
         empty_variants_only (bool): Search for values with empty variants only
     Returns:
-        list: List of values which match the filters and search criteria
+        list: List of values which match the filters and search criteria, in ascending order (same as
+              get_entity_values_page)
     """
     # aggs count is set at 3,00,000 because it is a safe limit for now.
     # If the dictionary sizes increases beyond this, then the count will have to be
@@ -180,54 +391,21 @@ def get_entity_unique_values(connection, index_name, doc_type, entity_name, valu
                 }
             }
         ],
-        "query": {
-            "bool": {
-                "must": [
-                    {
-                        "match": {
-                            "entity_data": entity_name
-                        }
-                    }
-                ],
-                "minimum_should_match": 0,
-                "should": []
-            }
-        },
+        "query": _get_entity_values_query(entity_name=entity_name, value_search_term=value_search_term,
+                                          variant_search_term=variant_search_term,
+                                          empty_variants_only=empty_variants_only),
         "aggs": {
             "unique_values": {
                 "terms": {
                     "field": "value.keyword",
-                    "size": 300000
+                    "size": 300000,
+                    "order": {"_key": "asc"}
                 }
             }
         },
         "size": 0
     }
 
-    if value_search_term:
-        data['query']['bool']['minimum_should_match'] = 1
-        data['query']['bool']['should'].append({
-            "wildcard": {
-                "value": u"*{0}*".format(value_search_term.lower())
-            }
-        })
-
-    if empty_variants_only:
-        data['query']['bool']['must_not'] = [
-            {
-                "exists": {
-                    "field": "variants"
-                }
-            }
-        ]
-    elif variant_search_term:
-        data['query']['bool']['minimum_should_match'] = 1
-        data['query']['bool']['should'].append({
-            "match": {
-                "variants": variant_search_term
-            }
-        })
-
     kwargs = dict(
         kwargs, body=data, doc_type=doc_type, size=constants.ELASTICSEARCH_SEARCH_SIZE,
         index=index_name, filter_path=['aggregations.unique_values.buckets.key']
@@ -239,8 +417,75 @@ def get_entity_unique_values(connection, index_name, doc_type, entity_name, valu
     return values
 
 
+def get_entity_values_page(connection, index_name, doc_type, entity_name, size, search_after=None,
+                           value_search_term=None, variant_search_term=None, empty_variants_only=False, **kwargs):
+    """
+    Get a page of unique values of the entity in ascending order, with the filters of get_entity_unique_values.
+    Documents are sorted by value and read with search_after from the last value of the previous page, so every
+    page costs the same however deep it is. A value has a document per language, these repeat consecutively and
+    are skipped; search_after skips all documents of the value it is given
+
+    Args:
+        connection (elasticsearch.client.Elasticsearch): Elasticsearch client object
+        index_name (str): The name of the index
+        doc_type (str): The type of the documents that will be indexed
+        entity_name (str): name of the entity for which the values are to be fetched
+        size (int): number of values in the page
+        search_after (str, optional): last value of the previous page. If None, the first page is returned
+        value_search_term (str): Filter values with the specific search term
+        variant_search_term (str): Filter variants with the specific search term
+        empty_variants_only (bool): Search for values with empty variants only
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+    Returns:
+        dict: with
+            values (list): values in the page
+            total (int): number of values matching the filters, exact upto 40000 values and approximate beyond
+            search_after (str): value to pass as search_after to get the next page, None if this is the last page
+    """
+    query = _get_entity_values_query(entity_name=entity_name, value_search_term=value_search_term,
+                                     variant_search_term=variant_search_term, empty_variants_only=empty_variants_only)
+    batch_size = min(max(size * 2, 1), constants.ELASTICSEARCH_SEARCH_SIZE)
+
+    values = []
+    total = None
+    has_more = True
+    # One value more than the page is read to know whether there is a next page
+    while has_more and len(values) <= size:
+        data = {
+            'query': query,
+            'sort': [{'value.keyword': {'order': 'asc'}}],
+            '_source': False,
+        }
+        if search_after is not None:
+            data['search_after'] = [search_after]
+        if total is None:
+            data['aggs'] = {'total': {'cardinality': {'field': 'value.keyword', 'precision_threshold': 40000}}}
+        search_kwargs = dict(kwargs, body=data, doc_type=doc_type, size=batch_size, index=index_name)
+        results = _run_es_search(connection, **search_kwargs)
+        if total is None:
+            total = results['aggregations']['total']['value']
+
+        hits = results['hits']['hits']
+        has_more = len(hits) == batch_size
+        for hit in hits:
+            value = hit['sort'][0]
+            if not values or values[-1] != value:
+                values.append(value)
+        if hits:
+            search_after = hits[-1]['sort'][0]
+
+    return {
+        'values': values[:size],
+        'total': total,
+        'search_after': values[size - 1] if len(values) > size else None,
+    }
+
+
 def full_text_query(connection, index_name, doc_type, entity_name, sentence, fuzziness_threshold,
-                    search_language_script=None, **kwargs):
+                    search_language_script=None, highlight=True, size=None, terminate_after=None, min_score=None,
+                    exact_first=None, **kwargs):
     """
     Performs compound elasticsearch boolean search query with highlights for the given sentence . The query
     searches for entity_name in the index & returns search results for the sentence only if entity_name is found.
@@ -253,6 +498,20 @@ def full_text_query(connection, index_name, doc_type, entity_name, sentence, fuz
         sentence: sentence in which entity has to be searched
         fuzziness_threshold: fuzziness_threshold for elasticsearch match query 'fuzziness' parameter
         search_language_script: language of elasticsearch documents which are eligible for match
+        highlight (bool, optional): if True, elasticsearch highlights the matched tokens of variants and variants
+                                    with all tokens highlighted are returned. If False, only value and variants
+                                    of matching documents are fetched and the variants whose tokens all fuzzily
+                                    match some token of the sentence are found here, which is much cheaper for
+                                    elasticsearch. Defaults to True
+        size (int, optional): maximum number of hits to retrieve, see get_adaptive_search_size.
+                              Defaults to ELASTICSEARCH_SEARCH_SIZE
+        terminate_after (int, optional): maximum number of documents to collect on each shard. Defaults to None
+        min_score (float, optional): hits with lower score are not retrieved. Defaults to None
+        exact_first (bool, optional): if True, variants contained exactly in the sentence are first found with a
+                                      match query without fuzziness (on the variants.shingles sub-field with
+                                      ELASTICSEARCH_VARIANT_SUBFIELDS) and the fuzzy search only runs for the tokens
+                                      of the sentence they do not cover (see _generate_es_exact_search_dictionary).
+                                      Defaults to ELASTICSEARCH_SEARCH_EXACT_FIRST
         kwargs:
             Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
 
@@ -283,21 +542,374 @@ def full_text_query(connection, index_name, doc_type, entity_name, sentence, fuz
          u'mumbai': u'mumbai',
          u'pune': u'pune'}
     """
-    data = _generate_es_search_dictionary(entity_name, sentence, fuzziness_threshold,
-                                          language_script=search_language_script)
-    kwargs = dict(kwargs, body=data, doc_type=doc_type, size=constants.ELASTICSEARCH_SEARCH_SIZE, index=index_name)
+    if exact_first is None:
+        exact_first = constants.ELASTICSEARCH_SEARCH_EXACT_FIRST
     ner_logger.debug('Running query search to ES with connection '
                      + str(connection) + ' and entity ' + entity_name)
-    results = _run_es_search(connection, **kwargs)
-    results = _parse_es_search_results(results)
+
+    exact_variants_to_values = collections.OrderedDict()
+    fuzzy_text = sentence
+    if exact_first:
+        body = _get_text_search_body(entity_name, sentence, language_script=search_language_script,
+                                     terminate_after=terminate_after, size=size, exact=True)
+        results = _run_text_search(connection, index_name, doc_type, body, **kwargs)
+        exact_variants_to_values = _parse_es_search_results_without_highlights(results, sentence, 0)
+        fuzzy_text = _get_uncovered_text(sentence, exact_variants_to_values)
+        if not fuzzy_text:
+            return exact_variants_to_values
+
+    body = _get_text_search_body(entity_name, fuzzy_text, fuzziness_threshold, language_script=search_language_script,
+                                 highlight=highlight, terminate_after=terminate_after, min_score=min_score,
+                                 highlight_text=sentence, size=size)
+    results = _run_text_search(connection, index_name, doc_type, body, **kwargs)
+    if highlight:
+        variants_to_values = _parse_es_search_results(results)
+    else:
+        variants_to_values = _parse_es_search_results_without_highlights(
+            results, sentence, _get_dynamic_fuzziness_threshold(fuzziness_threshold))
+    return _merge_variants_to_values(exact_variants_to_values, variants_to_values)
+
+
+def full_text_query_bulk(connection, index_name, doc_type, entity_names, sentence, fuzziness_threshold,
+                         search_language_script=None, highlight=True, sizes=None, terminate_after=None,
+                         min_score=None, exact_first=None, **kwargs):
+    """
+    Performs the same search as full_text_query for multiple entities at once using a single elasticsearch
+    multi search (_msearch) request, i.e. one network round trip for all the entities
+
+    Args:
+        connection: Elasticsearch client object
+        index_name: The name of the index
+        doc_type: The type of the documents that will be indexed
+        entity_names (list): names of the entities to perform a 'term' query on, one search per entity
+        sentence: sentence in which entities have to be searched
+        fuzziness_threshold: fuzziness_threshold for elasticsearch match query 'fuzziness' parameter
+        search_language_script: language of elasticsearch documents which are eligible for match
+        highlight (bool, optional): use elasticsearch highlights to find matched variants, see full_text_query.
+                                    Defaults to True
+        sizes (dict, optional): maximum number of hits to retrieve for each entity name. Entities missing from it
+                                get ELASTICSEARCH_SEARCH_SIZE. Defaults to None
+        terminate_after (int, optional): maximum number of documents to collect on each shard. Defaults to None
+        min_score (float, optional): hits with lower score are not retrieved. Defaults to None
+        exact_first (bool, optional): find variants contained exactly in the sentence before the fuzzy search, see
+                                      full_text_query. The exact searches of all entities are sent in one multi
+                                      search and the fuzzy searches in another. Defaults to
+                                      ELASTICSEARCH_SEARCH_EXACT_FIRST
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.msearch
+
+    Returns:
+        collections.OrderedDict: dictionary mapping each entity name (in the order given) to a
+                                 collections.OrderedDict of highlighted fuzzy entity variant to entity value, same
+                                 as returned by full_text_query for that entity. If the search for some entity
+                                 fails, an empty dictionary is returned for it
+
+    Example:
+        db = DataStore()
+        full_text_query_bulk(connection=db._client_or_connection, index_name=db._store_name,
+                             doc_type=db._connection_settings[ELASTICSEARCH_DOC_TYPE],
+                             entity_names=['city', 'restaurant'], sentence=u'mainland china in mumbai',
+                             fuzziness_threshold=1)
+
+        OrderedDict([('city', OrderedDict([(u'Mumbai', u'Mumbai'), (u'mumbai', u'mumbai')])),
+                     ('restaurant', OrderedDict([(u'Mainland China', u'Mainland China')]))])
+    """
+    results = collections.OrderedDict()
+    if not entity_names:
+        return results
+    if exact_first is None:
+        exact_first = constants.ELASTICSEARCH_SEARCH_EXACT_FIRST
+    sizes = sizes or {}
+
+    fuzzy_texts = collections.OrderedDict((entity_name, sentence) for entity_name in entity_names)
+    if exact_first:
+        searches = collections.OrderedDict(
+            (entity_name, _get_text_search_body(entity_name, sentence, language_script=search_language_script,
+                                                terminate_after=terminate_after, size=sizes.get(entity_name),
+                                                exact=True))
+            for entity_name in entity_names)
+        for entity_name, response in _run_es_msearch(connection, index_name, doc_type, searches, **kwargs).items():
+            results[entity_name] = collections.OrderedDict()
+            if response is not None:
+                results[entity_name] = _parse_es_search_results_without_highlights(response, sentence, 0)
+            fuzzy_texts[entity_name] = _get_uncovered_text(sentence, results[entity_name])
+
+    searches = collections.OrderedDict(
+        (entity_name, _get_text_search_body(entity_name, fuzzy_text, fuzziness_threshold,
+                                            language_script=search_language_script, highlight=highlight,
+                                            terminate_after=terminate_after, min_score=min_score,
+                                            highlight_text=sentence, size=sizes.get(entity_name)))
+        for entity_name, fuzzy_text in fuzzy_texts.items() if fuzzy_text)
+    fuzzy_results = _run_es_msearch(connection, index_name, doc_type, searches, **kwargs)
+
+    for entity_name in entity_names:
+        response = fuzzy_results.get(entity_name)
+        variants_to_values = collections.OrderedDict()
+        if response is not None and highlight:
+            variants_to_values = _parse_es_search_results(response)
+        elif response is not None:
+            variants_to_values = _parse_es_search_results_without_highlights(
+                response, sentence, _get_dynamic_fuzziness_threshold(fuzziness_threshold))
+        results[entity_name] = _merge_variants_to_values(results.get(entity_name, collections.OrderedDict()),
+                                                         variants_to_values)
+
     return results
 
 
+def _run_text_search(connection, index_name, doc_type, body, **kwargs):
+    """
+    Run a text detection lookup built with _get_text_search_body
+
+    Args:
+        connection: Elasticsearch client object
+        index_name: The name of the index
+        doc_type: The type of the documents that will be indexed
+        body (dict): search body returned by _get_text_search_body
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+    Returns:
+        dictionary, search results from elasticsearch
+    """
+    kwargs = dict(kwargs, body=body, doc_type=doc_type, index=index_name)
+    if constants.ELASTICSEARCH_SEARCH_TEMPLATES:
+        return search_template(connection, **kwargs)
+    return _run_es_search(connection, **kwargs)
+
+
+def _run_es_msearch(connection, index_name, doc_type, searches, **kwargs):
+    """
+    Run the text detection lookups of multiple entities in a single elasticsearch multi search (_msearch or
+    _msearch/template with ELASTICSEARCH_SEARCH_TEMPLATES) request
+
+    Args:
+        connection: Elasticsearch client object
+        index_name: The name of the index
+        doc_type: The type of the documents that will be indexed
+        searches (collections.OrderedDict): mapping entity name to the search body returned by _get_text_search_body
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.msearch
+
+    Returns:
+        collections.OrderedDict: mapping each entity name to its search response, None if its search failed
+    """
+    responses = collections.OrderedDict()
+    if not searches:
+        return responses
+
+    body = []
+    for data in searches.values():
+        body.append({})
+        body.append(data)
+
+    ner_logger.debug('%s: Running multi search to ES with connection %s and entities %s'
+                     % (log_prefix, str(connection), ', '.join(searches)))
+    kwargs = dict(kwargs, body=body, doc_type=doc_type, index=index_name)
+    if constants.ELASTICSEARCH_SEARCH_TEMPLATES:
+        search_responses = msearch_template(connection, **kwargs)
+    else:
+        search_responses = connection.msearch(**kwargs)['responses']
+    for entity_name, response in zip(searches, search_responses):
+        if 'error' in response:
+            ner_logger.error('%s: Multi search failed for entity %s: %s'
+                             % (log_prefix, entity_name, str(response['error'])))
+            response = None
+        responses[entity_name] = response
+    return responses
+
+
+def _get_uncovered_text(text, variants_to_values):
+    """
+    Get the tokens of the text not covered by any of the matched variants, these are the only tokens that still need
+    a fuzzy search after the exact search of full_text_query
+
+    Args:
+        text (str or unicode): text the variants were searched in
+        variants_to_values (dict): matched variants (str, unicode or NormalizedVariant) to their entity values
+
+    Returns:
+        unicode: the uncovered tokens of the lowercased text joined with spaces, empty if all tokens are covered
+    """
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    covered_tokens = set()
+    for variant in variants_to_values:
+        covered_tokens.update(getattr(variant, 'tokens', None) or TOKENIZER.tokenize(variant.lower()))
+    return u' '.join(token for token in TOKENIZER.tokenize(text.lower()) if token not in covered_tokens)
+
+
+def _merge_variants_to_values(exact_variants_to_values, variants_to_values):
+    """
+    Merge the variants found by the exact and the fuzzy search of full_text_query, exact matches first
+
+    Args:
+        exact_variants_to_values (collections.OrderedDict): variants found by the exact search
+        variants_to_values (collections.OrderedDict): variants found by the fuzzy search
+
+    Returns:
+        collections.OrderedDict: variants of both searches to their entity values
+    """
+    if not exact_variants_to_values:
+        return variants_to_values
+    merged = collections.OrderedDict(exact_variants_to_values)
+    for variant, value in variants_to_values.items():
+        if variant not in merged:
+            merged[variant] = value
+    return merged
+
+
+def get_entity_document_count(connection, index_name, doc_type, entity_name, **kwargs):
+    """
+    Get number of documents (entity values per language) stored for the entity
+
+    Args:
+        connection: Elasticsearch client object
+        index_name: The name of the index
+        doc_type: The type of the documents that will be indexed
+        entity_name: name of the entity
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.count
+
+    Returns:
+        int: number of documents of the entity
+    """
+    data = {
+        'query': {
+            'term': {
+                'entity_data': {
+                    'value': entity_name
+                }
+            }
+        }
+    }
+    kwargs = dict(kwargs, body=data, doc_type=doc_type, index=index_name)
+    return connection.count(**kwargs)['count']
+
+
+def get_entity_changes(connection, index_name, doc_type, entity_name, since, until, **kwargs):
+    """
+    Get documents of the entity written and tombstones of values of the entity deleted with an update marker
+    (see datastore.utils.get_update_marker) in (since, until], oldest first. At most ELASTICSEARCH_SEARCH_SIZE
+    documents are returned per call, the returned until is then lowered so that the next call picks up the rest
+
+    Args:
+        connection: Elasticsearch client object
+        index_name: The name of the index
+        doc_type: The type of the documents that will be indexed
+        entity_name: name of the entity
+        since (int): update marker after which changes are returned
+        until (int): update marker upto which changes are returned
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+    Returns:
+        dict: with
+            changed (list): records of written documents, shaped like get_entity_data results
+            deleted (list): (value, language_script) tuples of deleted documents
+            full_reload (bool): True if all values of the entity were deleted, changed and deleted are then empty
+            until (int): update marker to pass as since to get the next changes
+    """
+    data = {
+        'query': {
+            'bool': {
+                'filter': [
+                    {'range': {UPDATED_AT_FIELD: {'gt': since, 'lte': until}}},
+                    {'bool': {'should': [{'term': {'entity_data': entity_name}},
+                                         {'term': {TOMBSTONE_ENTITY_FIELD: entity_name}}],
+                              'minimum_should_match': 1}}
+                ]
+            }
+        },
+        'sort': [{UPDATED_AT_FIELD: {'order': 'asc', 'unmapped_type': 'long'}}]
+    }
+    kwargs = dict(kwargs, body=data, doc_type=doc_type, size=constants.ELASTICSEARCH_SEARCH_SIZE, index=index_name)
+    hits = _run_es_search(connection, **kwargs)['hits']['hits']
+
+    changes = {'changed': [], 'deleted': [], 'full_reload': False, 'until': until}
+    if len(hits) == constants.ELASTICSEARCH_SEARCH_SIZE:
+        # Documents sharing the last marker may be cut off, fetch them again with the next call
+        changes['until'] = max(hits[-1]['_source'][UPDATED_AT_FIELD] - 1, since + 1)
+    for hit in hits:
+        source = hit['_source']
+        if source[UPDATED_AT_FIELD] > changes['until']:
+            break
+        if source.get('dict_type') != DICTIONARY_DATA_TOMBSTONE:
+            changes['changed'].append(hit)
+        elif source.get('value') is None:
+            changes['full_reload'] = True
+        else:
+            changes['deleted'].append((source['value'], source.get('language_script')))
+
+    if changes['full_reload']:
+        changes['changed'], changes['deleted'] = [], []
+    return changes
+
+
+def get_entity_manifest_id(entity_name):
+    """
+    Get the id of the manifest document of the entity, see datastore.utils.DICTIONARY_DATA_MANIFEST
+    """
+    return 'manifest-' + get_entity_data_document_id(entity_name, None, None)
+
+
+def get_entity_manifest(connection, index_name, doc_type, entity_name, **kwargs):
+    """
+    Get the manifest recorded by the last repopulation of the entity from a csv file
+
+    Args:
+        connection: Elasticsearch client object
+        index_name: The name of the index
+        doc_type: The type of the documents that will be indexed
+        entity_name: name of the entity
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.get
+
+    Returns:
+        dict or None: with file_hash and populated_at, None if the entity has no manifest
+    """
+    document = connection.get(index=index_name, doc_type=doc_type, id=get_entity_manifest_id(entity_name),
+                              ignore=404, **kwargs)
+    if not document.get('found'):
+        return None
+    source = document['_source']
+    return {MANIFEST_FILE_HASH_FIELD: source.get(MANIFEST_FILE_HASH_FIELD),
+            MANIFEST_POPULATED_AT_FIELD: source.get(MANIFEST_POPULATED_AT_FIELD)}
+
+
+def get_adaptive_search_size(text, size_per_token, entity_document_count=None):
+    """
+    Choose how many hits to retrieve for a full text query on the text. A chat message can only mention a few
+    variants, so size grows linearly with the number of tokens in the text and logarithmically with the number of
+    documents of the entity (bigger dictionaries have more fuzzy neighbours per token), capped at the number of
+    documents of the entity and at ELASTICSEARCH_SEARCH_SIZE
+
+    Args:
+        text (str or unicode): text to search for
+        size_per_token (int): hits to retrieve per token of the text for a small entity
+        entity_document_count (int, optional): number of documents of the entity, see get_entity_document_count.
+                                               Defaults to None
+
+    Returns:
+        int: number of hits to retrieve
+
+    Example:
+        get_adaptive_search_size(u'book a table at mainland china', size_per_token=10, entity_document_count=5000)
+        >> 240
+    """
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    size = size_per_token * max(len(TOKENIZER.tokenize(text)), 1)
+    if entity_document_count:
+        size = min(size * (1 + int(math.log10(entity_document_count))), entity_document_count)
+    return max(min(size, constants.ELASTICSEARCH_SEARCH_SIZE), 1)
+
+
 def _run_es_search(connection, **kwargs):
     """
     Execute the elasticsearch.ElasticSearch.search() method and return all results using
     elasticsearch.ElasticSearch.scroll() method if and only if scroll is passed in kwargs.
-    Note that this is not recommended for large queries and can severly impact performance.
+    Note that this is not recommended for large queries and can severly impact performance, use
+    _iter_es_search_hits instead to consume the hits page by page.
 
     Args:
         connection: Elasticsearch client object
@@ -306,29 +918,74 @@ def _run_es_search(connection, **kwargs):
     Returns:
         dictionary, search results from elasticsearch.ElasticSearch.search
     """
-    scroll = kwargs.pop('scroll', False)
-    if not scroll:
+    if not kwargs.get('scroll'):
+        kwargs.pop('scroll', None)
         return connection.search(**kwargs)
 
-    result = connection.search(scroll=scroll, **kwargs)
-    scroll_id = result['_scroll_id']
-    scroll_size = result['hits']['total']
-    hit_list = result['hits']['hits']
-    scroll_ids = [scroll_id]
-    while scroll_size > 0:
-        _result = connection.scroll(scroll_id=scroll_id, scroll=scroll)
-        scroll_id = _result['_scroll_id']
-        scroll_ids.append(scroll_id)
-        scroll_size = len(_result['hits']['hits'])
-        hit_list += _result['hits']['hits']
+    result = None
+    hit_list = []
+    for page in _iter_es_search_pages(connection, **kwargs):
+        if result is None:
+            result = page
+        hit_list.extend(page['hits']['hits'])
 
     result['hits']['hits'] = hit_list
-    if scroll_ids:
-        connection.clear_scroll(body={"scroll_id": scroll_ids})
-
     return result
 
 
+def _iter_es_search_pages(connection, scroll='1m', **kwargs):
+    """
+    Execute the elasticsearch.ElasticSearch.search() method with scroll and yield every page of results, following
+    up with elasticsearch.ElasticSearch.scroll() until a page comes back empty. The scroll contexts are always
+    cleared, even if the consumer stops iterating early or an error is raised midway.
+
+    Args:
+        connection: Elasticsearch client object
+        scroll (str): how long elasticsearch should keep the search context alive between two pages
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+    Yields:
+        dict: raw search or scroll response for each page, the first page being the search response
+    """
+    scroll_ids = []
+    try:
+        result = connection.search(scroll=scroll, **kwargs)
+        while True:
+            scroll_id = result.get('_scroll_id')
+            if scroll_id and scroll_id not in scroll_ids:
+                scroll_ids.append(scroll_id)
+            yield result
+            if not scroll_id or not result['hits']['hits']:
+                break
+            result = connection.scroll(scroll_id=scroll_id, scroll=scroll)
+    finally:
+        if scroll_ids:
+            try:
+                connection.clear_scroll(body={'scroll_id': scroll_ids})
+            except Exception as e:
+                # Scroll contexts expire on their own, failing to clear them early is not worth failing the read
+                ner_logger.warning('%s: Failed to clear scroll contexts: %s' % (log_prefix, e))
+
+
+def _iter_es_search_hits(connection, **kwargs):
+    """
+    Scroll over all results of an elasticsearch search and yield hits one at a time. Only one page of hits is held
+    in memory at once. Refer _iter_es_search_pages
+
+    Args:
+        connection: Elasticsearch client object
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+    Yields:
+        dict: search hits
+    """
+    for page in _iter_es_search_pages(connection, **kwargs):
+        for hit in page['hits']['hits']:
+            yield hit
+
+
 def _get_dynamic_fuzziness_threshold(fuzzy_setting):
     """
     Approximately emulate AUTO:[low],[high] functionality of elasticsearch 6.2+ on older versions
@@ -349,69 +1006,249 @@ def _get_dynamic_fuzziness_threshold(fuzzy_setting):
     return fuzzy_setting
 
 
-def _generate_es_search_dictionary(entity_name, text, fuzziness_threshold, language_script=None):
+def _build_text_search_dictionary(entity_name, match_field, match_query, language_scripts=None, highlight=True,
+                                  highlight_match_query=None, terminate_after=None, min_score=None, size=None):
     """
-    Generates compound elasticsearch boolean search query dictionary for the sentence. The query generated
-    searches for entity_name in the index and returns search results for the matched word (of sentence)
-     only if entity_name is found.
+    Builds the search dictionary of text detection lookups. Documents are selected by entity name and language in
+    filter context, which elasticsearch does not score and caches across searches, and only the match query on
+    match_field is scored. Any value can be a TemplateParam placeholder, see _generate_es_search_template
 
     Args:
         entity_name: name of the entity to perform a 'term' query on
-        text: The text on which we need to identify the enitites.
-        fuzziness_threshold: fuzziness_threshold for elasticsearch match query 'fuzziness' parameter
-        language_script: language of documents to be searched, optional, defaults to None
+        match_field (str): field the match query runs on
+        match_query (dict): parameters of the match query
+        language_scripts (list, optional): languages of documents to be searched. Defaults to None, all languages
+        highlight (bool, optional): if True, ask for highlights on variants, else only fetch value and variants
+                                    from _source. Defaults to True
+        highlight_match_query (dict, optional): parameters of a match query on match_field to compute highlights
+                                                with instead of match_query. Defaults to None
+        terminate_after (int, optional): maximum number of documents to collect on each shard. Defaults to None
+        min_score (float, optional): hits with lower score are not retrieved. Defaults to None
+        size (int, optional): maximum number of hits to retrieve. Defaults to None
 
     Returns:
-        dictionary, the search query for the text
-
+        dictionary, the search query
     """
-    must_terms = []
-    term_dict_entity_name = {
+    filter_terms = [{
         'term': {
             'entity_data': {
                 'value': entity_name
             }
         }
-    }
-    must_terms.append(term_dict_entity_name)
-
-    # search on language_script, add english as default search
-    if language_script is not None:
-        term_dict_language = {
+    }]
+    if language_scripts is not None:
+        filter_terms.append({
             'terms': {
-                'language_script': [language_script, ENGLISH_LANG]
+                'language_script': language_scripts
             }
-        }
-        must_terms.append(term_dict_language)
+        })
 
     data = {
         'query': {
             'bool': {
-                'must': must_terms,
-                'should': [],
+                'filter': filter_terms,
+                'should': [{'match': {match_field: match_query}}],
                 'minimum_should_match': 1
             }
         }
     }
-    query_should_data = []
-    query = {
-        'match': {
-            'variants': {
-                'query': text,
-                'fuzziness': _get_dynamic_fuzziness_threshold(fuzziness_threshold),
-                'prefix_length': 1
-            }
+    if highlight:
+        data['highlight'] = {
+            'fields': {
+                'variants': {}
+            },
+            'order': 'score',
+            'number_of_fragments': 20
         }
+        if highlight_match_query is not None:
+            data['highlight']['highlight_query'] = {'match': {match_field: highlight_match_query}}
+    else:
+        data['_source'] = ['value', 'variants', VARIANTS_NORMALIZED_FIELD, VARIANTS_TOKEN_COUNT_FIELD]
+    if terminate_after:
+        data['terminate_after'] = terminate_after
+    if min_score:
+        data['min_score'] = min_score
+    if size:
+        data['size'] = size
+    return data
+
+
+def _get_search_language_scripts(language_script):
+    """
+    Get languages of documents searched for language_script, english documents are always searched as well
+    """
+    if language_script is None:
+        return None
+    return [language_script, ENGLISH_LANG]
+
+
+def _get_fuzzy_match_query(text, fuzziness):
+    """
+    Get parameters of the fuzzy match query on variants, each token of the text is expanded to at most
+    ELASTICSEARCH_SEARCH_MAX_EXPANSIONS terms
+    """
+    return {
+        'query': text,
+        'fuzziness': fuzziness,
+        'prefix_length': 1,
+        'max_expansions': constants.ELASTICSEARCH_SEARCH_MAX_EXPANSIONS
     }
-    query_should_data.append(query)
-    data['query']['bool']['should'] = query_should_data
-    data['highlight'] = {
-        'fields': {
-            'variants': {}
-        },
-        'order': 'score',
-        'number_of_fragments': 20
-    }
+
+
+def _get_exact_match_field():
+    """
+    Get the field searched by exact lookups: the shingles of variants if the index has them (see
+    datastore.elastic_search.create), else variants
+    """
+    if constants.ELASTICSEARCH_VARIANT_SUBFIELDS:
+        return 'variants.shingles'
+    return 'variants'
+
+
+def _get_exact_search_text(text):
+    """
+    Get the lowercased tokens of the text joined with spaces, as matched exactly against variants
+    """
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    return u' '.join(TOKENIZER.tokenize(text.lower()))
+
+
+def _generate_es_search_dictionary(entity_name, text, fuzziness_threshold, language_script=None, highlight=True,
+                                   terminate_after=None, min_score=None, highlight_text=None):
+    """
+    Generates compound elasticsearch boolean search query dictionary for the sentence. The query generated
+    searches for entity_name in the index and returns search results for the matched word (of sentence)
+     only if entity_name is found.
+
+    Args:
+        entity_name: name of the entity to perform a 'term' query on
+        text: The text on which we need to identify the enitites.
+        fuzziness_threshold: fuzziness_threshold for elasticsearch match query 'fuzziness' parameter
+        language_script: language of documents to be searched, optional, defaults to None
+        highlight (bool, optional): if True, ask for highlights on variants, else only fetch value and variants
+                                    from _source. Defaults to True
+        terminate_after (int, optional): maximum number of documents to collect on each shard. Defaults to None
+        min_score (float, optional): hits with lower score are not retrieved. Defaults to None
+        highlight_text (str or unicode, optional): if it differs from text, highlights are computed for this text
+                                                   instead, e.g. the whole sentence when text only has the tokens
+                                                   left over by an exact search. Defaults to None
+
+    Returns:
+        dictionary, the search query for the text
+
+    """
+    fuzziness = _get_dynamic_fuzziness_threshold(fuzziness_threshold)
+    highlight_match_query = None
+    if highlight and highlight_text and highlight_text != text:
+        highlight_match_query = _get_fuzzy_match_query(highlight_text, fuzziness)
+    return _build_text_search_dictionary(entity_name, 'variants', _get_fuzzy_match_query(text, fuzziness),
+                                         language_scripts=_get_search_language_scripts(language_script),
+                                         highlight=highlight, highlight_match_query=highlight_match_query,
+                                         terminate_after=terminate_after, min_score=min_score)
+
+
+def _generate_es_exact_search_dictionary(entity_name, text, language_script=None, terminate_after=None):
+    """
+    Generates the search query dictionary finding variants of the entity contained exactly in the text, with a match
+    query without fuzziness. With ELASTICSEARCH_VARIANT_SUBFIELDS, the text and the variants.shingles sub-field are
+    analyzed into their tokens and runs of up to VARIANT_SHINGLE_MAX_SIZE tokens (see datastore.elastic_search.create),
+    so variants sharing longer runs of tokens with the text score higher. Hits are fetched without highlights, see
+    _parse_es_search_results_without_highlights
+
+    Args:
+        entity_name: name of the entity to perform a 'term' query on
+        text: The text on which we need to identify the enitites.
+        language_script: language of documents to be searched, optional, defaults to None
+        terminate_after (int, optional): maximum number of documents to collect on each shard. Defaults to None
+
+    Returns:
+        dictionary, the search query for the text
+    """
+    return _build_text_search_dictionary(entity_name, _get_exact_match_field(), {'query': _get_exact_search_text(text)},
+                                         language_scripts=_get_search_language_scripts(language_script),
+                                         highlight=False, terminate_after=terminate_after)
+
+
+def _generate_es_search_template(entity_name, text, fuzziness_threshold=0, language_script=None, highlight=True,
+                                 terminate_after=None, min_score=None, highlight_text=None, size=None, exact=False):
+    """
+    Generates the same search as _generate_es_search_dictionary (or _generate_es_exact_search_dictionary if exact)
+    as a stored search template and the parameters to render it with. The template only depends on which options are
+    set, so lookups share a handful of templates and only send their parameters
+
+    Args:
+        entity_name: name of the entity to perform a 'term' query on
+        text: The text on which we need to identify the enitites.
+        fuzziness_threshold: fuzziness_threshold for elasticsearch match query 'fuzziness' parameter, ignored if exact
+        language_script: language of documents to be searched, optional, defaults to None
+        highlight (bool, optional): if True, ask for highlights on variants. Defaults to True, ignored if exact
+        terminate_after (int, optional): maximum number of documents to collect on each shard. Defaults to None
+        min_score (float, optional): hits with lower score are not retrieved. Defaults to None, ignored if exact
+        highlight_text (str or unicode, optional): text to compute highlights for if it differs from text.
+                                                   Defaults to None
+        size (int, optional): maximum number of hits to retrieve. Defaults to ELASTICSEARCH_SEARCH_SIZE
+        exact (bool, optional): if True, generate the exact search. Defaults to False
+
+    Returns:
+        dict: body for datastore.elastic_search.templates.search_template, id of the template and params
+    """
+    params = {'entity_name': entity_name, 'size': size or constants.ELASTICSEARCH_SEARCH_SIZE}
+    language_scripts = _get_search_language_scripts(language_script)
+    if language_scripts is not None:
+        params['language_scripts'] = language_scripts
+    if terminate_after:
+        params['terminate_after'] = terminate_after
+
+    highlight_match_query = None
+    if exact:
+        params['text'] = _get_exact_search_text(text)
+        match_field, match_query, highlight = _get_exact_match_field(), {'query': TemplateParam('text')}, False
+    else:
+        params['text'] = text
+        params['fuzziness'] = _get_dynamic_fuzziness_threshold(fuzziness_threshold)
+        match_field = 'variants'
+        match_query = _get_fuzzy_match_query(TemplateParam('text'), TemplateParam('fuzziness'))
+        if min_score:
+            params['min_score'] = min_score
+        if highlight and highlight_text and highlight_text != text:
+            params['highlight_text'] = highlight_text
+            highlight_match_query = _get_fuzzy_match_query(TemplateParam('highlight_text'), TemplateParam('fuzziness'))
+
+    template_params = dict((name, TemplateParam(name)) for name in params)
+    body = _build_text_search_dictionary(template_params['entity_name'], match_field, match_query,
+                                         language_scripts=template_params.get('language_scripts'),
+                                         highlight=highlight, highlight_match_query=highlight_match_query,
+                                         terminate_after=template_params.get('terminate_after'),
+                                         min_score=template_params.get('min_score'), size=template_params['size'])
+    return {'id': add_search_template(body), 'params': params}
+
+
+def _get_text_search_body(entity_name, text, fuzziness_threshold=0, language_script=None, highlight=True,
+                          terminate_after=None, min_score=None, highlight_text=None, size=None, exact=False):
+    """
+    Get the body of a text detection lookup, a reference to a stored search template with its parameters if
+    ELASTICSEARCH_SEARCH_TEMPLATES is set (see _generate_es_search_template), else the search dictionary
+
+    Args:
+        Same as _generate_es_search_template
+
+    Returns:
+        dict: search body to run with _run_text_search or _run_es_msearch
+    """
+    if constants.ELASTICSEARCH_SEARCH_TEMPLATES:
+        return _generate_es_search_template(entity_name, text, fuzziness_threshold, language_script=language_script,
+                                            highlight=highlight, terminate_after=terminate_after,
+                                            min_score=min_score, highlight_text=highlight_text, size=size,
+                                            exact=exact)
+    if exact:
+        data = _generate_es_exact_search_dictionary(entity_name, text, language_script=language_script,
+                                                    terminate_after=terminate_after)
+    else:
+        data = _generate_es_search_dictionary(entity_name, text, fuzziness_threshold, language_script=language_script,
+                                              highlight=highlight, terminate_after=terminate_after,
+                                              min_score=min_score, highlight_text=highlight_text)
+    data['size'] = size or constants.ELASTICSEARCH_SEARCH_SIZE
     return data
 
 
@@ -465,7 +1302,7 @@ def _parse_es_search_results(results):
         }
 
     """
-    entity_values, entity_variants = [], []
+    entity_values, entity_variants, entity_variants_normalized = [], [], []
     variants_to_values = collections.OrderedDict()
     if results and results['hits']['total'] > 0:
         for hit in results['hits']['hits']:
@@ -473,21 +1310,85 @@ def _parse_es_search_results(results):
                 continue
 
             value = hit['_source']['value']
+            variants_normalized = get_variants_normalized_from_source(hit['_source'])
             for variant in hit['highlight']['variants']:
                 entity_values.append(value)
                 entity_variants.append(variant)
+                entity_variants_normalized.append(variants_normalized)
 
-    for value, variant in zip(entity_values, entity_variants):
+    for value, variant, variants_normalized in zip(entity_values, entity_variants, entity_variants_normalized):
         variant = re.sub('\s+', ' ', variant.strip())
         variant_no_highlight_tags = variant.replace('<em>', '').replace('</em>', '').strip()
-        if variant.count('<em>') == len(TOKENIZER.tokenize(variant_no_highlight_tags)):
+        # tokens precomputed at index time, if the document has them
+        tokens = None
+        if variants_normalized and variant_no_highlight_tags in variants_normalized:
+            tokens = variants_normalized[variant_no_highlight_tags].split()
+        token_count = len(tokens) if tokens is not None else len(TOKENIZER.tokenize(variant_no_highlight_tags))
+        if variant.count('<em>') == token_count:
             variant = variant_no_highlight_tags
             if variant not in variants_to_values:
+                if tokens is not None:
+                    variant = NormalizedVariant(variant, tokens)
                 variants_to_values[variant] = value
 
     return variants_to_values
 
 
+def _parse_es_search_results_without_highlights(results, text, fuzziness_threshold):
+    """
+    Find variants in search results fetched without highlights that match the text and generate a variants to
+    values dictionary. This replicates on the client what the highlight based parsing checks: a variant matches if
+    each of its tokens is within the fuzziness allowed for some token of the text, with the first
+    FUZZY_PREFIX_LENGTH characters matching exactly, like the match query does
+
+    Args:
+        results (dict): search results dictionary from elasticsearch with value and variants in _source
+        text (str or unicode): text the search was run for
+        fuzziness_threshold (int or str): fuzziness used for the search, as sent to elasticsearch
+
+    Returns:
+        collections.OrderedDict: dict mapping matching variants to their entity values, in order of the hits
+    """
+    variants_to_values = collections.OrderedDict()
+    if not results or results['hits']['total'] <= 0:
+        return variants_to_values
+
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    text_tokens = [(token, get_max_edits_for_token(token, fuzziness_threshold))
+                   for token in set(TOKENIZER.tokenize(text.lower()))]
+    matched_tokens = {}
+
+    def _is_token_matched(variant_token):
+        if variant_token not in matched_tokens:
+            matched_tokens[variant_token] = any(
+                token == variant_token or
+                (max_edits and token[:FUZZY_PREFIX_LENGTH] == variant_token[:FUZZY_PREFIX_LENGTH] and
+                 damerau_levenshtein_distance(token, variant_token, max_distance=max_edits) <= max_edits)
+                for token, max_edits in text_tokens)
+        return matched_tokens[variant_token]
+
+    for hit in results['hits']['hits']:
+        value = hit['_source']['value']
+        variants_normalized = get_variants_normalized_from_source(hit['_source'])
+        for variant in hit['_source'].get('variants') or []:
+            if not variant:
+                continue
+            if variants_normalized is not None:
+                variant_tokens = variants_normalized[variant].split()
+                variant = re.sub(r'\s+', ' ', variant.strip())
+                normalized_variant = NormalizedVariant(variant, variant_tokens)
+            else:
+                variant = re.sub(r'\s+', ' ', variant.strip())
+                variant_tokens = TOKENIZER.tokenize(variant.lower())
+                normalized_variant = variant
+            if variant_tokens and variant not in variants_to_values and all(
+                    _is_token_matched(variant_token) for variant_token in variant_tokens):
+                variants_to_values[normalized_variant] = value
+
+    return variants_to_values
+
+
 def get_crf_data_for_entity_name(connection, index_name, doc_type, entity_name, **kwargs):
     """
     Get all sentence_list and entity_list for a entity stored in the index
@@ -523,6 +1424,30 @@ def get_crf_data_for_entity_name(connection, index_name, doc_type, entity_name,
 
     """
     results_dictionary = {SENTENCE_LIST: [], ENTITY_LIST: []}
+    for sentence, entities in iter_crf_data_for_entity_name(connection=connection, index_name=index_name,
+                                                            doc_type=doc_type, entity_name=entity_name, **kwargs):
+        results_dictionary[SENTENCE_LIST].append(sentence)
+        results_dictionary[ENTITY_LIST].append(entities)
+
+    return results_dictionary
+
+
+def iter_crf_data_for_entity_name(connection, index_name, doc_type, entity_name, **kwargs):
+    """
+    Generator form of get_crf_data_for_entity_name. Scrolls over the training data of the entity and yields it one
+    page at a time, so that only a single page of hits is held in memory at once
+
+    Args:
+        connection: Elasticsearch client object
+        index_name: The name of the index
+        doc_type: The type of the documents that will be indexed
+        entity_name: name of the entity to perform a 'term' query on
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search
+
+    Yields:
+        tuple: (sentence, list of entities present in the sentence)
+    """
     data = {
         'query': {
             'term': {
@@ -534,13 +1459,6 @@ def get_crf_data_for_entity_name(connection, index_name, doc_type, entity_name,
     }
     kwargs = dict(kwargs, body=data, doc_type=doc_type, size=constants.ELASTICSEARCH_SEARCH_SIZE, index=index_name,
                   scroll='1m')
-    search_results = _run_es_search(connection, **kwargs)
-
-    # Parse hits
-    results = search_results['hits']['hits']
-
-    for result in results:
-        results_dictionary[SENTENCE_LIST].append(result['_source']['sentence'])
-        results_dictionary[ENTITY_LIST].append(result['_source']['entities'])
-
-    return results_dictionary
+    kwargs.setdefault('_source', ['sentence', 'entities'])
+    for result in _iter_es_search_hits(connection, **kwargs):
+        yield result['_source']['sentence'], result['_source']['entities']
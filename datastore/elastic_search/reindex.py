@@ -0,0 +1,311 @@
+from __future__ import absolute_import
+
+import time
+
+from elasticsearch import helpers
+
+from datastore import constants
+from datastore.elastic_search.create import create_entity_index
+from datastore.utils import (UPDATED_AT_FIELD, DICTIONARY_DATA_TOMBSTONE, TOMBSTONE_ENTITY_FIELD,
+                             get_update_marker, get_entity_data_document_id)
+
+log_prefix = 'datastore.elastic_search.reindex'
+
+# Seconds between polls of a reindex task waited on with wait_for_reindex
+REINDEX_POLL_INTERVAL = 5
+
+
+def get_reindex_slices(connection):
+    """
+    Get the slices parameter for reindex requests, letting the cluster pick one slice per shard where supported
+    (Elasticsearch 6.1 and later) and ELASTICSEARCH_TRANSFER_SLICE_COUNT otherwise
+
+    Args:
+        connection: Elasticsearch client object
+
+    Returns:
+        str or int: value of the slices parameter
+    """
+    version = [int(part) for part in connection.info()['version']['number'].split('.')[:2]]
+    if version >= [6, 1]:
+        return 'auto'
+    return max(constants.ELASTICSEARCH_TRANSFER_SLICE_COUNT, 1)
+
+
+def start_reindex(connection, source_index, destination_index, query=None, **kwargs):
+    """
+    Start copying documents from source_index to destination_index on the cluster itself, in parallel slices. The
+    copy runs as a cluster task, documents are never read by this process
+
+    Args:
+        connection: Elasticsearch client object
+        source_index (str): name of the index (or alias) to copy documents from
+        destination_index (str): name of the index to copy documents to
+        query (dict, optional): query selecting the documents to copy. All documents are copied if None
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.reindex
+
+    Returns:
+        str: id of the reindex task, see get_reindex_status
+    """
+    source = {'index': source_index, 'size': constants.ELASTICSEARCH_SEARCH_SIZE}
+    if query:
+        source['query'] = query
+    response = connection.reindex(body={'source': source, 'dest': {'index': destination_index}},
+                                  slices=get_reindex_slices(connection), wait_for_completion=False, **kwargs)
+    return response['task']
+
+
+def get_reindex_status(connection, task_id):
+    """
+    Get the progress of a reindex task started with start_reindex
+
+    Args:
+        connection: Elasticsearch client object
+        task_id (str): id of the reindex task
+
+    Returns:
+        dict: with
+            completed (bool): True if the task finished
+            total (int): number of documents to copy
+            copied (int): number of documents copied so far
+            failures (list): failures reported by the task, empty if none
+    """
+    task = connection.tasks.get(task_id=task_id)
+    status = task.get('task', {}).get('status', {})
+    failures = list(task.get('response', {}).get('failures', []))
+    if task.get('error'):
+        failures.append(task['error'])
+    return {
+        'completed': bool(task.get('completed')),
+        'total': status.get('total', 0),
+        'copied': status.get('created', 0) + status.get('updated', 0),
+        'failures': failures,
+    }
+
+
+def wait_for_reindex(connection, task_id, logger, poll_interval=REINDEX_POLL_INTERVAL):
+    """
+    Block until a reindex task started with start_reindex finishes, logging its progress
+
+    Args:
+        connection: Elasticsearch client object
+        task_id (str): id of the reindex task
+        logger: logging object to log at debug and exception level
+        poll_interval (float, optional): seconds between polls of the task. Defaults to REINDEX_POLL_INTERVAL
+
+    Returns:
+        dict: final status of the task, see get_reindex_status
+    """
+    while True:
+        status = get_reindex_status(connection=connection, task_id=task_id)
+        logger.debug('%s: reindex task %s copied %d of %d documents'
+                     % (log_prefix, task_id, status['copied'], status['total']))
+        if status['completed']:
+            return status
+        time.sleep(poll_interval)
+
+
+def swap_alias(connection, alias_name, index_name):
+    """
+    Point the alias to index_name only, removing it from every other index in the same request, so that searches on
+    the alias switch from the old to the new index at once
+
+    Args:
+        connection: Elasticsearch client object
+        alias_name (str): name of the alias
+        index_name (str): name of the index the alias should point to
+    """
+    actions = [{'remove': {'index': current_index, 'alias': alias_name}}
+               for current_index in get_alias_indices(connection=connection, alias_name=alias_name)
+               if current_index != index_name]
+    actions.append({'add': {'index': index_name, 'alias': alias_name}})
+    connection.indices.update_aliases(body={'actions': actions})
+
+
+def get_alias_indices(connection, alias_name):
+    """
+    Get names of the indices the alias points to
+
+    Args:
+        connection: Elasticsearch client object
+        alias_name (str): name of the alias
+
+    Returns:
+        list: names of the indices, empty if the alias does not exist
+    """
+    if not connection.indices.exists_alias(name=alias_name):
+        return []
+    return sorted(connection.indices.get_alias(name=alias_name).keys())
+
+
+def replay_index_writes(connection, source_index, index_name, doc_type, since, logger, **kwargs):
+    """
+    Apply to index_name the documents written to source_index with an update marker after since, in the order they
+    were written. Documents are copied with their ids, and tombstones delete the documents of the values (or, for
+    deletion of a whole entity, all documents of the entity written before it) from index_name. Replaying a document
+    already copied is harmless, so since can be earlier than the first write to replay
+
+    Args:
+        connection: Elasticsearch client object
+        source_index (str): name of the index the writes went to
+        index_name (str): name of the index to apply them to
+        doc_type (str): The type of the documents indexed
+        since (int): update marker, only documents written after it are replayed
+        logger: logging object to log at debug and exception level
+        kwargs:
+            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
+
+    Returns:
+        tuple: number of documents replayed and largest update marker seen, since if none
+    """
+    connection.indices.refresh(index=source_index)
+    body = {'query': {'range': {UPDATED_AT_FIELD: {'gt': since}}},
+            'sort': [{UPDATED_AT_FIELD: {'order': 'asc', 'unmapped_type': 'long'}}]}
+    hits = helpers.scan(connection, query=body, index=source_index, doc_type=doc_type, scroll='2m',
+                        size=constants.ELASTICSEARCH_SEARCH_SIZE, preserve_order=True)
+
+    replayed, last_marker = 0, since
+    str_query = []
+    for hit in hits:
+        source = hit['_source']
+        replayed += 1
+        last_marker = max(last_marker, source[UPDATED_AT_FIELD])
+        str_query.append({'_index': index_name, '_type': doc_type, '_id': hit['_id'], '_op_type': 'index',
+                          '_source': source})
+        is_tombstone = source.get('dict_type') == DICTIONARY_DATA_TOMBSTONE
+        if is_tombstone and source.get('value') is not None:
+            document_id = get_entity_data_document_id(source[TOMBSTONE_ENTITY_FIELD], source['value'],
+                                                      source.get('language_script'))
+            str_query.append({'_index': index_name, '_type': doc_type, '_id': document_id, '_op_type': 'delete'})
+        elif is_tombstone:
+            # Documents written before the whole entity was deleted have to be searchable to be deleted by query
+            if str_query:
+                helpers.bulk(connection, str_query, stats_only=True, raise_on_error=False, **kwargs)
+                str_query = []
+            connection.indices.refresh(index=index_name)
+            connection.delete_by_query(index=index_name, doc_type=doc_type, conflicts='proceed', body={
+                'query': {'bool': {'filter': [
+                    {'term': {'entity_data': source[TOMBSTONE_ENTITY_FIELD]}},
+                    {'range': {UPDATED_AT_FIELD: {'lt': source[UPDATED_AT_FIELD]}}},
+                ]}}})
+        if len(str_query) >= constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE:
+            # Deletes of values not copied yet are reported as not found, they are not failures here
+            helpers.bulk(connection, str_query, stats_only=True, raise_on_error=False, **kwargs)
+            str_query = []
+    if str_query:
+        helpers.bulk(connection, str_query, stats_only=True, raise_on_error=False, **kwargs)
+
+    logger.debug('%s: replayed %d writes after %s from %s into %s' % (log_prefix, replayed, since, source_index,
+                                                                       index_name))
+    return replayed, last_marker
+
+
+def start_index_rebuild(connection, alias_name, doc_type, logger, **kwargs):
+    """
+    Start rebuilding the index behind alias_name: create a new index named after the alias and the current time with
+    the current mappings, with refreshes and replicas turned off (ELASTICSEARCH_BULK_LOAD_SETTINGS), and start a
+    reindex task copying all documents of the alias into it. Searches and writes keep using the current index until
+    finalize_index_rebuild replays the writes made since the start and swaps the alias once the copy is done
+
+    Args:
+        connection: Elasticsearch client object
+        alias_name (str): name of the alias searches and writes go through
+        doc_type (str): The type of the documents indexed
+        logger: logging object to log at debug and exception level
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.reindex
+
+    Returns:
+        dict: with task_id of the reindex task, index being built, source_index it is copied from and started_at,
+              the update marker writes after which are replayed by finalize_index_rebuild
+
+    Raises:
+        ValueError if alias_name is not an alias of exactly one index or the new index could not be created
+    """
+    started_at = get_update_marker()
+    source_indices = get_alias_indices(connection=connection, alias_name=alias_name)
+    if len(source_indices) != 1:
+        raise ValueError('%s should be an alias of exactly one index, found %s' % (alias_name, source_indices))
+    index_name = '%s_%s' % (alias_name, time.strftime('%Y%m%d%H%M%S'))
+    create_entity_index(connection=connection, index_name=index_name, doc_type=doc_type, logger=logger)
+    if not connection.indices.exists(index=index_name):
+        raise ValueError('index %s could not be created' % index_name)
+    connection.indices.put_settings(index=index_name, body={'index': constants.ELASTICSEARCH_BULK_LOAD_SETTINGS})
+
+    task_id = start_reindex(connection=connection, source_index=source_indices[0], destination_index=index_name,
+                            **kwargs)
+    logger.debug('%s: started rebuild of %s into %s, task %s' % (log_prefix, alias_name, index_name, task_id))
+    return {'task_id': task_id, 'index': index_name, 'source_index': source_indices[0], 'started_at': started_at}
+
+
+def get_index_rebuild_status(connection, alias_name, task_id, index_name):
+    """
+    Get the progress of a rebuild started with start_index_rebuild, see finalize_index_rebuild to swap the alias once
+    the copy completed
+
+    Args:
+        connection: Elasticsearch client object
+        alias_name (str): name of the alias searches and writes go through
+        task_id (str): id of the reindex task returned by start_index_rebuild
+        index_name (str): name of the index being built returned by start_index_rebuild
+
+    Returns:
+        dict: status of the reindex task (see get_reindex_status) with index and alias_swapped, True once the alias
+              points to the new index
+    """
+    status = get_reindex_status(connection=connection, task_id=task_id)
+    status['index'] = index_name
+    status['alias_swapped'] = get_alias_indices(connection=connection, alias_name=alias_name) == [index_name]
+    return status
+
+
+def finalize_index_rebuild(connection, alias_name, doc_type, task_id, index_name, started_at, logger, **kwargs):
+    """
+    Finish a rebuild started with start_index_rebuild once its reindex task completed without failures: restore the
+    replicas and refresh interval of the previous index on the new index, replay the writes made to the previous
+    index since the rebuild started (see replay_index_writes) and atomically point the alias to the new index (see
+    swap_alias). Writes that reached the previous index while the alias was being swapped are replayed once more after
+    the swap. The previous index is kept, to roll back by swapping the alias back
+
+    Args:
+        connection: Elasticsearch client object
+        alias_name (str): name of the alias searches and writes go through
+        doc_type (str): The type of the documents indexed
+        task_id (str): id of the reindex task returned by start_index_rebuild
+        index_name (str): name of the index being built returned by start_index_rebuild
+        started_at (int): update marker returned by start_index_rebuild
+        logger: logging object to log at debug and exception level
+        kwargs:
+            Refer http://elasticsearch-py.readthedocs.io/en/master/helpers.html#elasticsearch.helpers.bulk
+
+    Returns:
+        dict: status of the rebuild (see get_index_rebuild_status) with replayed, the number of writes replayed
+    """
+    status = get_index_rebuild_status(connection=connection, alias_name=alias_name, task_id=task_id,
+                                      index_name=index_name)
+    status['replayed'] = 0
+    if not status['completed'] or status['failures'] or status['alias_swapped']:
+        return status
+
+    alias_indices = get_alias_indices(connection=connection, alias_name=alias_name)
+    if len(alias_indices) != 1:
+        raise ValueError('%s should be an alias of exactly one index, found %s' % (alias_name, alias_indices))
+    source_index = alias_indices[0]
+    settings = connection.indices.get_settings(index=source_index, name='index.number_of_replicas')
+    replicas = settings[source_index]['settings']['index'].get('number_of_replicas')
+    connection.indices.put_settings(index=index_name, body={'index': {'refresh_interval': None,
+                                                                      'number_of_replicas': replicas}})
+
+    replayed, last_marker = replay_index_writes(connection=connection, source_index=source_index,
+                                                index_name=index_name, doc_type=doc_type, since=started_at,
+                                                logger=logger, **kwargs)
+    connection.indices.refresh(index=index_name)
+    swap_alias(connection=connection, alias_name=alias_name, index_name=index_name)
+    late_replayed, _ = replay_index_writes(connection=connection, source_index=source_index, index_name=index_name,
+                                           doc_type=doc_type, since=last_marker, logger=logger, **kwargs)
+    logger.debug('%s: %s now points to rebuilt index %s (was %s)' % (log_prefix, alias_name, index_name,
+                                                                        source_index))
+    status['alias_swapped'] = True
+    status['replayed'] = replayed + late_replayed
+    return status
@@ -0,0 +1,136 @@
+from __future__ import absolute_import
+
+import hashlib
+import json
+
+from elasticsearch import TransportError
+
+from datastore import constants
+
+log_prefix = 'datastore.elastic_search.templates'
+
+# Ids of stored search templates are this prefix followed by a hash of the template source
+SEARCH_TEMPLATE_ID_PREFIX = 'chatbot_ner_'
+
+# Sources of the search templates built by this process by id, and ids of the ones stored on the cluster
+_search_template_sources = {}
+_stored_search_template_ids = set()
+
+
+class TemplateParam(object):
+    """
+    Placeholder for a parameter in a search body passed to add_search_template. Parameters are rendered as JSON, so
+    any JSON value (string, number, list, ...) can be passed for them
+
+    Attributes:
+        name (str): name of the parameter
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+
+def add_search_template(body):
+    """
+    Turn a search body with TemplateParam placeholders into a mustache search template, to be stored on the cluster
+    the first time it is used by search_template or msearch_template. Bodies with the same structure give the same
+    template, whatever values their parameters get
+
+    Args:
+        body (dict): search body, with TemplateParam objects in place of the values passed with each search
+
+    Returns:
+        str: id of the search template
+    """
+    placeholders = {}
+
+    def _get_placeholder(param):
+        if not isinstance(param, TemplateParam):
+            raise TypeError('%r is not JSON serializable' % param)
+        placeholder = '__template_param_%s__' % param.name
+        placeholders[placeholder] = param.name
+        return placeholder
+
+    source = json.dumps(body, default=_get_placeholder, sort_keys=True, separators=(',', ':'))
+    for placeholder, name in placeholders.items():
+        source = source.replace('"%s"' % placeholder, '{{#toJson}}%s{{/toJson}}' % name)
+
+    template_id = SEARCH_TEMPLATE_ID_PREFIX + hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+    _search_template_sources[template_id] = source
+    return template_id
+
+
+def put_search_template(connection, template_id):
+    """
+    Store a search template built by add_search_template on the cluster, as a stored mustache script on
+    Elasticsearch 6 and later and in the .scripts index (_search/template API) on older versions
+
+    Args:
+        connection: Elasticsearch client object
+        template_id (str): id returned by add_search_template
+    """
+    source = _search_template_sources[template_id]
+    if constants.ELASTICSEARCH_VERSION_MAJOR >= 6:
+        connection.put_script(id=template_id, body={'script': {'lang': 'mustache', 'source': source}})
+    else:
+        connection.put_template(id=template_id, body={'template': source})
+    _stored_search_template_ids.add(template_id)
+
+
+def _is_missing_template_error(status, error):
+    return status == 404 or 'resource_not_found_exception' in str(error)
+
+
+def search_template(connection, body, **kwargs):
+    """
+    Run a search with a stored search template, storing the template first if this process did not yet. If the
+    cluster does not know the template (e.g. it was restarted without its scripts), it is stored again and the search
+    retried once
+
+    Args:
+        connection: Elasticsearch client object
+        body (dict): id of the template returned by add_search_template and params to render it with
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.search_template
+
+    Returns:
+        dict: search results, same as elasticsearch.Elasticsearch.search
+    """
+    if body['id'] not in _stored_search_template_ids:
+        put_search_template(connection=connection, template_id=body['id'])
+    try:
+        return connection.search_template(body=body, **kwargs)
+    except TransportError as e:
+        if not _is_missing_template_error(e.status_code, e.error):
+            raise
+    put_search_template(connection=connection, template_id=body['id'])
+    return connection.search_template(body=body, **kwargs)
+
+
+def msearch_template(connection, body, **kwargs):
+    """
+    Run multiple searches with stored search templates in a single request, see search_template
+
+    Args:
+        connection: Elasticsearch client object
+        body (list): header and search lines of the multi search, each search line with the id of a template
+                     returned by add_search_template and params to render it with
+        kwargs:
+            Refer https://elasticsearch-py.readthedocs.io/en/master/api.html#elasticsearch.Elasticsearch.msearch
+
+    Returns:
+        list: responses of the searches, in the same order
+    """
+    searches = body[1::2]
+    for template_id in set(search['id'] for search in searches) - _stored_search_template_ids:
+        put_search_template(connection=connection, template_id=template_id)
+
+    responses = connection.msearch_template(body=body, **kwargs)['responses']
+    missing_template_ids = set(search['id'] for search, response in zip(searches, responses)
+                               if 'error' in response and
+                               _is_missing_template_error(response.get('status'), response['error']))
+    if not missing_template_ids:
+        return responses
+    for template_id in missing_template_ids:
+        put_search_template(connection=connection, template_id=template_id)
+    return connection.msearch_template(body=body, **kwargs)['responses']
@@ -1,8 +1,13 @@
 import requests
 import json
+import threading
 from elasticsearch import Elasticsearch, RequestsHttpConnection
 from elasticsearch import helpers
+from six.moves import queue
 from chatbot_ner.config import CHATBOT_NER_DATASTORE, ner_logger
+from datastore import constants
+from datastore.elastic_search.populate import stream_bulk_actions
+from datastore.elastic_search.reindex import start_reindex, wait_for_reindex
 from datastore.exceptions import IndexNotFoundException, InvalidESURLException, \
     SourceDestinationSimilarException, \
     InternalBackupException, AliasNotFoundException, PointIndexToAliasException, \
@@ -11,6 +16,33 @@ from datastore.exceptions import IndexNotFoundException, InvalidESURLException,
 from datastore.exceptions import AliasForTransferException, EngineNotImplementedException, \
     IndexForTransferException
 
+# Elasticsearch clients of the clusters transferred from and to, by url. Clients are thread safe and keep their
+# connection pools, so they are reused by all transfers of the process
+_transfer_connections = {}
+_transfer_connections_lock = threading.Lock()
+
+
+def get_transfer_connection(es_url):
+    """
+    Get the Elasticsearch client of the cluster at es_url, created on first use
+
+    Args:
+        es_url (str): elasticsearch url with scheme and port e.g. http://localhost:9200
+
+    Returns:
+        Elasticsearch client object
+    """
+    with _transfer_connections_lock:
+        if es_url not in _transfer_connections:
+            # TODO - this works differently from other connects, picks scheme from the full URL
+            scheme, host, port = es_url.split(':')
+            ip = host[2:] if host.startswith('//') else host
+            use_ssl = scheme != 'http'
+            _transfer_connections[es_url] = Elasticsearch(hosts=[{'host': ip, 'port': int(port)}],
+                                                          use_ssl=use_ssl, verify_certs=use_ssl, scheme=scheme,
+                                                          connection_class=RequestsHttpConnection)
+        return _transfer_connections[es_url]
+
 
 class ESTransfer(object):
     """
@@ -79,10 +111,6 @@ class ESTransfer(object):
 
 
     5. _transfer_specific_documents
-        We first  load all the data related to the entities that needs to be transferred (in form of
-        an update query*) form source_es
-        {'entity_name': 'example_entity', 'entity_data': ['hello world']}
-
         Delete the entities that need to be transferred from new_live_index (es_index_1) to avoid old or
         duplicate entity entry.
 
@@ -93,7 +121,10 @@ class ESTransfer(object):
                                {'entity_name': 'extra_entity', 'entity_data': ['bye']}
 
 
-        Run the update query on new_live_index to populate new entities.
+        Stream the documents of the entities from source_es to new_live_index, reading slices of a sliced scroll
+        in parallel into a bounded queue that bulk writers drain (see _iter_source_documents), so memory use
+        does not grow with the number of documents transferred.
+        {'entity_name': 'example_entity', 'entity_data': ['hello world']}
 
             destination_es
                  1. es_index_1 {'entity_name': 'extra_entity', 'entity_data': ['bye']}
@@ -192,101 +223,86 @@ class ESTransfer(object):
             ner_logger.debug("check_if_index_exits - " + str(message))
             raise IndexNotFoundException(message)
 
-    def _scroll_over_es_return_object(self, results):
-        """
-        This function scrolls over the ES return object
-        """
-        data_new = []
-        total_records = 0
-        if 'hits' in results:
-            total_records = results['hits']['total']
-            for post in results['hits']['hits']:
-                data_new.append(post)
-            if '_scroll_id' in results.keys():
-                scroll_size = len(results['hits']['hits'])
-                while (scroll_size > 0):
-                    scroll_id = results['_scroll_id']
-                    scroll_req = {
-                        "scroll": "2m",
-                        "scroll_id": scroll_id
-                    }
-                    r = requests.post(self.source + "/_search/scroll", json=scroll_req, timeout=30)
-                    results = json.loads(r.content)
-                    for post in results['hits']['hits']:
-                        data_new.append(post)
-                    scroll_size = len(results['hits']['hits'])
-        return {
-            'hits': data_new,
-            'total': total_records
-        }
-
-    def _get_all_entities(self, query):
+    def _iter_source_documents(self, query, slice_count=None):
         """
-        Fetch all entities from source ES
-        """
-        response = {
-            'hits': [],
-            'total': 0,
-            'aggregations': {}
-        }
-        # generate url
-        url = self.source + '/' + self.es_alias + "/_search"
-        url = url + '?scroll=2m'
-        query['size'] = 10000
-        r = requests.post(url, json=query, timeout=30)
-        results = json.loads(r.content)
-        if 'error' not in results:
-            # deriving data, with scrolling if required
-            derived_data = self._scroll_over_es_return_object(results)
-            response['hits'] = derived_data['hits']
-            response['total'] = derived_data['total']
-            if 'aggregations' in results:
-                response['aggregations'] = results['aggregations']
-        return response
-
-    def _generate_update_json(self, index, hits):
-        """
-        Generate the update JSON to update specific entities
+        Read the documents matching query from the source alias with a sliced scroll, the slices being read in
+        parallel by one thread each. Threads hand documents over through a bounded queue, so at most one scroll page
+        per slice and the queue are held in memory at any time
 
         Args
-            index (string): The documents will be updated in the index created on destination from source
-            hits (object): Hits generated from the ES query
-        """
-        str_query = []
-        for i in hits:
-            str_query.append(
-                {
-                    "_index": index,
-                    "_type": i['_type'],
-                    "entity_data": i['_source']['entity_data'],
-                    "dict_type": i['_source']['dict_type'],
-                    "value": i['_source']['value'],
-                    "variants": i['_source']['variants'],
-                    "language_script": i['_source']['language_script'],
-                    "_op_type": "index"
-                }
-            )
-        return str_query
+            query (dict): body of the search
+            slice_count (int, optional): number of slices to read in parallel. Defaults to
+                                         ELASTICSEARCH_TRANSFER_SLICE_COUNT
+
+        Yields
+            dict: hits of the search, in no particular order
+        """
+        slice_count = max(slice_count or constants.ELASTICSEARCH_TRANSFER_SLICE_COUNT, 1)
+        source_connection = get_transfer_connection(self.source)
+        documents = queue.Queue(maxsize=constants.ELASTICSEARCH_BULK_HELPER_MESSAGE_SIZE)
+        slice_done = object()
+        stop = threading.Event()
+        errors = []
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    documents.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read_slice(slice_id):
+            try:
+                body = dict(query)
+                if slice_count > 1:
+                    body['slice'] = {'id': slice_id, 'max': slice_count}
+                for hit in helpers.scan(source_connection, query=body, index=self.es_alias, scroll='2m',
+                                        size=constants.ELASTICSEARCH_SEARCH_SIZE, request_timeout=30):
+                    if not put(hit):
+                        return
+            except Exception as e:
+                ner_logger.exception('Transfer from %s: reading slice %d failed %s' % (self.source, slice_id, e))
+                errors.append(e)
+            finally:
+                put(slice_done)
+
+        readers = [threading.Thread(target=read_slice, args=(slice_id,)) for slice_id in range(slice_count)]
+        for reader in readers:
+            reader.daemon = True
+            reader.start()
+
+        try:
+            remaining_slices = slice_count
+            while remaining_slices:
+                hit = documents.get()
+                if hit is slice_done:
+                    if errors:
+                        raise errors[0]
+                    remaining_slices -= 1
+                    continue
+                yield hit
+        finally:
+            stop.set()
 
-    def _run_update_query_on_es(self, update_query):
+    @staticmethod
+    def _get_index_action(index, hit):
         """
-        This function runs the update query on ES
+        Get the bulk action copying a document read from the source to index, keeping its id and source so that
+        documents keep their deterministic ids, normalized variant fields and update markers
 
+        Args
+            index (string): The index on destination the document is copied to
+            hit (dict): document as returned by the search on source
         """
-        # TODO - this works differently from other connects, picks scheme from the full URL
-        scheme, host, port = self.destination.split(':')
-        ip = host[2:] if host.startswith('//') else host
-        if scheme == 'http':
-
-            es_destination_connection = Elasticsearch(hosts=[{'host': ip, 'port': int(port)}],
-                                                      use_ssl=False, verify_certs=False, scheme=scheme,
-                                                      connection_class=RequestsHttpConnection)
-        else:
-            es_destination_connection = Elasticsearch(hosts=[{'host': ip, 'port': int(port)}],
-                                                      use_ssl=True, verify_certs=True, scheme=scheme,
-                                                      connection_class=RequestsHttpConnection)
-
-        helpers.bulk(es_destination_connection, update_query, stats_only=True)
+        return {
+            '_index': index,
+            '_type': hit['_type'],
+            '_id': hit['_id'],
+            '_op_type': 'index',
+            '_source': hit['_source'],
+        }
 
     def _run_delete_query_on_es(self, index, query):
         """
@@ -328,11 +344,12 @@ class ESTransfer(object):
                 }
             ]
 
-        full_result = self._get_all_entities(query)
-        update_query = self._generate_update_json(new_live_index, full_result['hits'])
-        query.pop('size', None)
         self._run_delete_query_on_es(new_live_index, query)
-        self._run_update_query_on_es(update_query)
+        actions = (self._get_index_action(new_live_index, hit) for hit in self._iter_source_documents(query))
+        transferred_count = stream_bulk_actions(connection=get_transfer_connection(self.destination), actions=actions,
+                                                entity_name=','.join(list_of_entities or []) or 'all entities',
+                                                logger=ner_logger)
+        ner_logger.debug('Transferred %d documents to %s' % (transferred_count, new_live_index))
 
     @staticmethod
     def transfer_data_internal(es_url, index_to_backup, backup_index):
@@ -368,20 +385,19 @@ class ESTransfer(object):
 
         requests.put(backup_index_url, json=index_to_backup_config)
 
-        final_request_dict = {
-            "source": {
-                "index": index_to_backup,
-                "size": 10000
-            },
-            "dest": {
-                "index": backup_index
-            }
-        }
-        reindex_response = requests.post('{es_url}/_reindex'.format(**{'es_url': es_url}), json=final_request_dict,
-                                         params={"refresh": "true", "wait_for_completion": "true"})
-        if reindex_response.status_code != 200:
+        # The copy runs as a sliced task on the cluster, polled instead of holding one request open until it is done
+        connection = get_transfer_connection(es_url)
+        try:
+            task_id = start_reindex(connection=connection, source_index=index_to_backup,
+                                    destination_index=backup_index)
+            status = wait_for_reindex(connection=connection, task_id=task_id, logger=ner_logger)
+        except Exception as e:
+            ner_logger.exception('transfer_data_internal - reindex failed %s' % e)
+            status = {'failures': [str(e)]}
+        if status['failures']:
             message = "transfer from " + index_to_backup + "to " + backup_index + " failed"
             raise InternalBackupException(message)
+        connection.indices.refresh(index=backup_index)
 
     @staticmethod
     def point_an_alias_to_index(es_url, alias_name, index_name):
@@ -416,6 +432,9 @@ class ESTransfer(object):
                 return self.es_index_1
             elif self.es_index_2 in indices:
                 return self.es_index_2
+            elif len(indices) == 1:
+                # index built by a rebuild, see datastore.elastic_search.reindex.start_index_rebuild
+                return indices[0]
             else:
                 raise FetchIndexForAliasException('neither es_index_1 nor es_index_2' + '' +
                                                   'belong to alias: ' + alias_name)
@@ -449,6 +468,26 @@ class ESTransfer(object):
             self.es_index_1
         return new_live_index
 
+    @staticmethod
+    def swap_alias_to_index(es_url, alias_name, current_index, new_index):
+        """
+        This function points the alias from current_index to new_index with a single _aliases request, so that
+        there is no moment at which the alias points to no index or to both
+
+        Args
+            es_url (str): The elasticsearch URL
+            alias_name (str): The name of the alias
+            current_index (str): The index the alias points to
+            new_index (str): The index the alias should point to
+        """
+        actions = [
+            {'remove': {'index': current_index, 'alias': alias_name}},
+            {'add': {'index': new_index, 'alias': alias_name}},
+        ]
+        response = requests.post(es_url + '/_aliases', json={'actions': actions})
+        if response.status_code != 200:
+            raise PointIndexToAliasException('pointing ' + new_index + 'to ' + alias_name + ' failed')
+
     def swap_index_in_es_url(self, es_url):
         """
         This function swaps the indices of the alias
@@ -458,8 +497,7 @@ class ESTransfer(object):
         """
         current_live_index = self.fetch_index_alias_points_to(es_url, self.es_alias)
         new_live_index = self.get_new_live_index(current_live_index)
-        ESTransfer.delete_an_index_from_alias(es_url, self.es_alias, current_live_index)
-        ESTransfer.point_an_alias_to_index(es_url, self.es_alias, new_live_index)
+        ESTransfer.swap_alias_to_index(es_url, self.es_alias, current_live_index, new_live_index)
 
     def transfer_specific_entities(self, list_of_entities=[]):
         """
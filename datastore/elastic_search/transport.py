@@ -0,0 +1,351 @@
+from __future__ import absolute_import
+
+import collections
+import threading
+import time
+
+from elasticsearch import Transport
+from elasticsearch.exceptions import TransportError, ConnectionError, ConnectionTimeout
+from six.moves import queue
+
+from chatbot_ner.config import ner_logger
+from datastore.exceptions import CircuitBreakerOpenException
+
+log_prefix = 'datastore.elastic_search.transport'
+
+# Endpoints that only read data and can safely be sent to more than one node at once. Scroll requests, and searches
+# opening a scroll, are left out as every request moves (or opens) a scroll cursor on the node it is sent to
+HEDGEABLE_ENDPOINTS = ('_search', '_msearch', '_count', '_mget')
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker tracking consecutive failed calls to a backend.
+
+    The breaker is closed to begin with and lets every call through. After failure_threshold consecutive failures it
+    opens and rejects calls for reset_timeout seconds, after which it is half open and lets a single trial call
+    through. The trial call closes the breaker again on success and reopens it on failure.
+
+    Attributes:
+        failure_threshold (int): consecutive failures after which the breaker opens
+        reset_timeout (float): seconds for which the breaker stays open before a trial call is let through
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        """
+        Args:
+            failure_threshold (int): consecutive failures after which the breaker opens
+            reset_timeout (float): seconds for which the breaker stays open before a trial call is let through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._get_state()
+
+    def _get_state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.time() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self):
+        """
+        Check if a call can be made now. In half open state only the first caller is allowed through until the
+        outcome of its call is recorded
+
+        Returns:
+            bool: True if the call can be made, False if it should fail fast
+        """
+        with self._lock:
+            state = self._get_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    ner_logger.warning('%s: circuit breaker opened after %d consecutive failures'
+                                       % (log_prefix, self._failures))
+                self._opened_at = time.time()
+
+
+class LatencyTracker(object):
+    """
+    Keeps the latencies of the last few successful calls to report percentiles over them
+    """
+
+    def __init__(self, window_size=1000):
+        self._latencies = collections.deque(maxlen=window_size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._latencies)
+
+    def add(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def percentile(self, percentile):
+        """
+        Args:
+            percentile (float): percentile between 0 and 100
+
+        Returns:
+            float or None: latency at the given percentile (nearest rank), None if no latency was recorded yet
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        rank = int(round(percentile / 100.0 * (len(latencies) - 1)))
+        return latencies[min(max(rank, 0), len(latencies) - 1)]
+
+
+class ResilientTransport(Transport):
+    """
+    elasticsearch.Transport with per call deadlines, hedged reads and a circuit breaker.
+
+    - Deadline: request_timeout passed to a call bounds the whole call, retries and hedged requests included, not
+      every attempt separately. Calls without request_timeout fall back to the connection timeout per attempt.
+    - Hedging: if enabled and more than one node is configured, searches (see HEDGEABLE_ENDPOINTS) that have not
+      completed within the hedge_percentile latency of recent calls (but at least hedge_min_delay seconds) are sent
+      to another node as well, and the first response wins.
+    - Circuit breaker: after circuit_breaker_failure_threshold consecutive failed calls (connection errors, timeouts
+      or 5xx responses) all calls fail fast with CircuitBreakerOpenException for circuit_breaker_reset_timeout
+      seconds. Set circuit_breaker_failure_threshold to 0 to disable the breaker.
+
+    Pass transport_class=ResilientTransport along with these keyword arguments to elasticsearch.Elasticsearch,
+    refer datastore.elastic_search.connect.connect
+    """
+
+    def __init__(self, hosts, hedge_requests=False, hedge_percentile=95, hedge_min_delay=0.05,
+                 circuit_breaker_failure_threshold=0, circuit_breaker_reset_timeout=30, **kwargs):
+        """
+        Args:
+            hosts (list): nodes to connect to, refer elasticsearch.Transport
+            hedge_requests (bool, optional): send slow searches to a second node. Defaults to False
+            hedge_percentile (float, optional): percentile of recent latencies after which a search is hedged.
+                                                Defaults to 95
+            hedge_min_delay (float, optional): minimum seconds to wait before hedging. Defaults to 0.05
+            circuit_breaker_failure_threshold (int, optional): consecutive failures after which calls fail fast,
+                                                               0 disables the circuit breaker. Defaults to 0
+            circuit_breaker_reset_timeout (float, optional): seconds for which calls fail fast. Defaults to 30
+            kwargs: refer elasticsearch.Transport
+        """
+        super(ResilientTransport, self).__init__(hosts, **kwargs)
+        self.hedge_requests = hedge_requests
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.circuit_breaker = None
+        if circuit_breaker_failure_threshold:
+            self.circuit_breaker = CircuitBreaker(failure_threshold=circuit_breaker_failure_threshold,
+                                                  reset_timeout=circuit_breaker_reset_timeout)
+        self.latencies = LatencyTracker()
+
+    def perform_request(self, method, url, params=None, body=None):
+        """
+        Perform the request, refer elasticsearch.Transport.perform_request
+
+        Raises:
+            CircuitBreakerOpenException if the circuit breaker is open
+            ConnectionTimeout if the deadline of the call passed
+            All other exceptions raised by elasticsearch.Transport.perform_request
+        """
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow_request():
+            raise CircuitBreakerOpenException()
+
+        params = dict(params or {})
+        deadline = None
+        request_timeout = params.get('request_timeout')
+        if request_timeout:
+            deadline = time.time() + float(request_timeout)
+
+        start = time.time()
+        is_search = self._is_search(method, url, params)
+        try:
+            if is_search and self.hedge_requests and len(self.connection_pool.connections) > 1:
+                result = self._perform_hedged_request(method, url, params, body, deadline)
+            else:
+                result = self._perform_request_before_deadline(method, url, params, body, deadline)
+        except Exception as e:
+            if self.circuit_breaker is not None:
+                if isinstance(e, TransportError) and not self._is_unhealthy_error(e):
+                    # the node responded, e.g. with a 404, so it is healthy
+                    self.circuit_breaker.record_success()
+                else:
+                    self.circuit_breaker.record_failure()
+            raise
+
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+        if is_search:
+            self.latencies.add(time.time() - start)
+        return result
+
+    @staticmethod
+    def _is_unhealthy_error(error):
+        if isinstance(error, ConnectionError):
+            return True
+        return isinstance(error.status_code, int) and error.status_code >= 500
+
+    @staticmethod
+    def _is_search(method, url, params):
+        """
+        Check if the request is a read only search that can be hedged, see HEDGEABLE_ENDPOINTS
+        """
+        if method not in ('GET', 'POST') or 'scroll' in params:
+            return False
+        return url.rstrip('/').rsplit('/', 1)[-1] in HEDGEABLE_ENDPOINTS
+
+    def _get_hedge_delay(self):
+        delay = self.latencies.percentile(self.hedge_percentile)
+        return max(delay or 0, self.hedge_min_delay)
+
+    def _perform_request_before_deadline(self, method, url, params, body, deadline):
+        """
+        Same as elasticsearch.Transport.perform_request except that the timeout of every attempt is capped to the
+        time left until the deadline, and no attempt is made once the deadline has passed
+        """
+        method, params, body = self._prepare_request(method, params, body)
+        for attempt in range(self.max_retries + 1):
+            if deadline is not None and deadline <= time.time():
+                raise ConnectionTimeout('TIMEOUT', 'Deadline exceeded for %s %s' % (method, url), None)
+            try:
+                return self._perform_on_connection(self.get_connection(), method, url, params, body, deadline)
+            except TransportError as e:
+                if attempt == self.max_retries or not self._is_retryable_error(e):
+                    raise
+
+    def _perform_hedged_request(self, method, url, params, body, deadline):
+        """
+        Send the request to a node and, if it has not completed within the hedge delay, to another node as well.
+        A request that fails before the hedge delay is hedged right away. The first successful response is
+        returned, if both requests fail the error of the last one is raised
+        """
+        method, params, body = self._prepare_request(method, params, body)
+        primary_connection = self.get_connection()
+        hedge_connection = self.get_connection()
+        if hedge_connection is primary_connection:
+            # only one live node, nothing to hedge to
+            return self._perform_request_before_deadline(method, url, params, body, deadline)
+
+        responses = queue.Queue()
+
+        def _send(connection):
+            try:
+                responses.put((True, self._perform_on_connection(connection, method, url, params, body, deadline)))
+            except Exception as e:
+                responses.put((False, e))
+
+        def _start(connection):
+            thread = threading.Thread(target=_send, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+        _start(primary_connection)
+        pending, hedged = 1, False
+        hedge_at = time.time() + self._get_hedge_delay()
+        while True:
+            wait_until = deadline if hedged else min(hedge_at, deadline or hedge_at)
+            try:
+                success, result = responses.get(timeout=None if wait_until is None
+                                                else max(wait_until - time.time(), 0))
+            except queue.Empty:
+                if hedged or (deadline is not None and time.time() >= deadline):
+                    raise ConnectionTimeout('TIMEOUT', 'Deadline exceeded for %s %s' % (method, url), None)
+                ner_logger.debug('%s: hedging %s %s to %s' % (log_prefix, method, url, hedge_connection.host))
+                _start(hedge_connection)
+                pending, hedged = pending + 1, True
+                continue
+
+            pending -= 1
+            if success:
+                return result
+            if not hedged and self._is_retryable_error(result):
+                _start(hedge_connection)
+                pending, hedged = pending + 1, True
+            elif not pending:
+                raise result
+
+    def _is_retryable_error(self, error):
+        if not isinstance(error, TransportError):
+            return False
+        if isinstance(error, ConnectionTimeout):
+            return self.retry_on_timeout
+        if isinstance(error, ConnectionError):
+            return True
+        return error.status_code in self.retry_on_status
+
+    def _prepare_request(self, method, params, body):
+        """
+        Serialize the body and adjust the method for clients that can not send GET with a body, as
+        elasticsearch.Transport.perform_request does
+        """
+        params = dict(params)
+        if body is not None and not isinstance(body, bytes):
+            body = self.serializer.dumps(body)
+            if method in ('HEAD', 'GET') and self.send_get_body_as == 'POST':
+                method = 'POST'
+            elif method in ('HEAD', 'GET') and self.send_get_body_as == 'source':
+                params['source'] = body
+                body = None
+            if body is not None:
+                try:
+                    body = body.encode('utf-8', 'surrogatepass')
+                except (UnicodeDecodeError, AttributeError):
+                    pass
+        return method, params, body
+
+    def _perform_on_connection(self, connection, method, url, params, body, deadline):
+        """
+        Single attempt of an already prepared request on the given connection, marking the connection dead or live
+        as elasticsearch.Transport.perform_request does
+        """
+        params = dict(params)
+        timeout = params.pop('request_timeout', None)
+        if deadline is not None:
+            timeout = max(deadline - time.time(), 0.001)
+        ignore = params.pop('ignore', ())
+        if isinstance(ignore, int):
+            ignore = (ignore,)
+
+        try:
+            status, headers, data = connection.perform_request(method, url, params, body, ignore=ignore,
+                                                               timeout=timeout)
+        except TransportError as e:
+            if method == 'HEAD' and e.status_code == 404:
+                return False
+            if self._is_retryable_error(e):
+                self.mark_dead(connection)
+            raise
+
+        if method == 'HEAD':
+            return 200 <= status < 300
+        self.connection_pool.mark_live(connection)
+        if data:
+            data = self.deserializer.loads(data, headers.get('content-type'))
+        return data
@@ -3,7 +3,8 @@ __all__ = [
     'IndexForTransferException', 'AliasForTransferException', 'NonESEngineTransferException',
     'IndexNotFoundException', 'InvalidESURLException', 'SourceDestinationSimilarException',
     'InternalBackupException', 'AliasNotFoundException', 'PointIndexToAliasException',
-    'FetchIndexForAliasException', 'DeleteIndexFromAliasException'
+    'FetchIndexForAliasException', 'DeleteIndexFromAliasException', 'CircuitBreakerOpenException',
+    'DictionarySnapshotCorruptedException'
 
 ]
 
@@ -21,8 +22,8 @@ class DataStoreSettingsImproperlyConfiguredException(Exception):
 
 class EngineNotImplementedException(Exception):
     def __init__(self, message=None):
-        self.value = "Chatbot NER datastore currently supports only the following engines: ['elasticsearch'] . " \
-                     "Please make sure the ENGINE environment variable is correctly set"
+        self.value = "Chatbot NER datastore currently supports only the following engines: " \
+                     "['elasticsearch', 'sqlite'] . Please make sure the ENGINE environment variable is correctly set"
         if message:
             self.value = message
 
@@ -41,6 +42,18 @@ class EngineConnectionException(Exception):
         return repr(self.value)
 
 
+class CircuitBreakerOpenException(EngineConnectionException):
+    """
+    This exception is raised without contacting the engine while the circuit breaker of the connection is open, i.e.
+    after too many consecutive failed requests
+    """
+    def __init__(self, message=None, engine='the configured engine'):
+        super(CircuitBreakerOpenException, self).__init__(message=message, engine=engine)
+        if not message:
+            self.value = "Chatbot NER datastore is failing fast as requests to " + engine + \
+                         " have been failing. Please make sure the " + engine + " service is healthy."
+
+
 class IndexForTransferException(Exception):
     def __init__(self, message=None):
         self.value = "ES index has not been configured for transfer. Please configure before transfer."
@@ -157,3 +170,14 @@ class DeleteIndexFromAliasException(Exception):
 
     def __str__(self):
         return repr(self.value)
+
+
+class DictionarySnapshotCorruptedException(Exception):
+    """
+    This exception is raised if a dictionary snapshot file can not be read
+    """
+    def __init__(self, message=None):
+        self.value = message
+
+    def __str__(self):
+        return repr(self.value)
@@ -0,0 +1,722 @@
+from __future__ import absolute_import
+
+import collections
+import os
+import threading
+import time
+
+from six import string_types
+
+from chatbot_ner.config import (ner_logger, TEXT_DETECTION_LOCAL_INDEX_TTL, TEXT_DETECTION_BLOOM_FILTER_ERROR_RATE,
+                                DATASTORE_CHANGE_FEED_INTERVAL)
+from datastore.constants import CHANGE_FEED_SETTLE_MS
+from datastore.snapshot import get_current_snapshot, get_current_snapshot_generation
+from datastore.utils import NormalizedVariant
+from language_utilities.constant import ENGLISH_LANG
+from lib.nlp.aho_corasick import TokenAhoCorasick
+from lib.nlp.bloom_filter import BloomFilter
+from lib.nlp.const import TOKENIZER
+from lib.nlp.fuzzy_index import FuzzyTokenIndex, get_deletion_neighbourhood
+
+log_prefix = 'datastore.local_index'
+
+# Maximum edits elasticsearch allows for fuzzy queries, fuzziness larger than this is clipped
+MAX_FUZZY_EDITS = 2
+# Same as prefix_length used in datastore.elastic_search.query._generate_es_search_dictionary
+FUZZY_PREFIX_LENGTH = 1
+
+
+def get_max_edits_for_token(token, fuzziness_threshold):
+    """
+    Emulate elasticsearch fuzziness to get maximum edits allowed for a query token
+
+    Args:
+        token (unicode): query token
+        fuzziness_threshold (int or str): int or "auto" or "auto:<int>,<int>" as accepted by
+                                          DataStore.get_similar_dictionary
+
+    Returns:
+        int: maximum number of edits allowed for the token
+    """
+    if isinstance(fuzziness_threshold, string_types):
+        fuzziness_lo, fuzziness_hi = 3, 6
+        fuzziness_threshold = fuzziness_threshold.lower()
+        if fuzziness_threshold.startswith('auto:'):
+            fuzziness_lo, fuzziness_hi = [int(value) for value in fuzziness_threshold[len('auto:'):].split(',')]
+        elif fuzziness_threshold != 'auto':
+            return min(int(fuzziness_threshold), MAX_FUZZY_EDITS)
+
+        if len(token) < fuzziness_lo:
+            return 0
+        elif len(token) >= fuzziness_hi:
+            return 2
+        return 1
+
+    return min(int(fuzziness_threshold), MAX_FUZZY_EDITS)
+
+
+class LocalEntityIndex(object):
+    """
+    In-process fuzzy index over all variants of a single entity. It answers the same question as
+    DataStore.get_similar_dictionary without a network hop, i.e. which variants of the entity have all their tokens
+    fuzzily present in the given text
+
+    Variants are tokenized with the same TOKENIZER used by TextDetector and every variant token is stored in a
+    FuzzyTokenIndex. A variant is returned when each of its tokens is within the allowed fuzziness of some token of
+    the text, which mirrors the full token coverage check done on elasticsearch highlights in
+    datastore.elastic_search.query._parse_es_search_results
+
+    Values can be added and removed after the index is built (see datastore.local_index.apply_entity_changes), a lock
+    keeps lookups consistent while that happens
+
+    Attributes:
+        entity_name (str): name of the entity this index was built for
+        created_at (float): unix timestamp at which the index was built
+    """
+
+    def __init__(self, entity_name):
+        """
+        Args:
+            entity_name (str): name of the entity this index is built for
+        """
+        self.entity_name = entity_name
+        self.created_at = time.time()
+        # Removed variants are set to None so that variant ids stay valid
+        self._variants = []
+        self._variants_count = 0
+        self._seen_variants = set()
+        self._token_to_variant_ids = collections.defaultdict(set)
+        self._value_to_variant_ids = collections.defaultdict(set)
+        self._token_index = FuzzyTokenIndex(max_distance=MAX_FUZZY_EDITS, prefix_length=FUZZY_PREFIX_LENGTH)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self._variants_count
+
+    def add(self, value, variants, language_script=ENGLISH_LANG):
+        """
+        Add an entity value and its variants to the index
+
+        Args:
+            value (unicode): entity value
+            variants (list): list of variants of the value
+            language_script (str, optional): ISO 639 code of the language of the variants. Defaults to 'en'
+        """
+        with self._lock:
+            for variant in variants or []:
+                if not variant:
+                    continue
+                if isinstance(variant, bytes):
+                    variant = variant.decode('utf-8')
+                if (variant, value, language_script) in self._seen_variants:
+                    continue
+                tokens = tuple(TOKENIZER.tokenize(variant.lower()))
+                if not tokens:
+                    continue
+                self._seen_variants.add((variant, value, language_script))
+                variant_id = len(self._variants)
+                self._variants.append((variant, value, tokens, language_script))
+                self._variants_count += 1
+                self._value_to_variant_ids[value].add(variant_id)
+                for token in tokens:
+                    self._token_index.add(token)
+                    self._token_to_variant_ids[token].add(variant_id)
+
+    def remove_value(self, value, language_script=None):
+        """
+        Remove all variants of an entity value from the index. Variant tokens stay in the fuzzy token index, they
+        just no longer lead to any variant
+
+        Args:
+            value (unicode): entity value
+            language_script (str, optional): ISO 639 code of the language of the variants to remove. If None,
+                                             variants in all languages are removed
+        """
+        with self._lock:
+            for variant_id in list(self._value_to_variant_ids.get(value, ())):
+                variant, _, tokens, variant_language_script = self._variants[variant_id]
+                if language_script is not None and variant_language_script != language_script:
+                    continue
+                self._variants[variant_id] = None
+                self._variants_count -= 1
+                self._seen_variants.discard((variant, value, variant_language_script))
+                self._value_to_variant_ids[value].discard(variant_id)
+                for token in tokens:
+                    self._token_to_variant_ids[token].discard(variant_id)
+            if not self._value_to_variant_ids.get(value, True):
+                del self._value_to_variant_ids[value]
+
+    def get_similar_dictionary(self, text, fuzziness_threshold='auto:4,7', search_language_script=None,
+                               min_token_size_for_fuzziness=None):
+        """
+        Get variants of the entity that fuzzily match the text
+
+        Args:
+            text (unicode): text for which variants need to be found
+            fuzziness_threshold (int or str): fuzziness allowed for matches on variant tokens, same semantics as the
+                                              elasticsearch match query fuzziness
+            search_language_script (str, optional): language of variants which are eligible for match. Variants
+                                                    in english are always eligible. If None, all variants are eligible
+            min_token_size_for_fuzziness (int, optional): text tokens not longer than this must match exactly
+
+        Returns:
+            collections.OrderedDict: dictionary mapping entity value variants to their entity value, ordered by number
+                                     of tokens in the variant (descending) and then by total edit distance
+        """
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
+
+        with self._lock:
+            return self._get_similar_dictionary(text=text, fuzziness_threshold=fuzziness_threshold,
+                                                search_language_script=search_language_script,
+                                                min_token_size_for_fuzziness=min_token_size_for_fuzziness)
+
+    def _get_similar_dictionary(self, text, fuzziness_threshold, search_language_script, min_token_size_for_fuzziness):
+        matched_tokens = {}
+        for text_token in set(TOKENIZER.tokenize(text.lower())):
+            max_edits = get_max_edits_for_token(text_token, fuzziness_threshold)
+            if min_token_size_for_fuzziness is not None and len(text_token) <= min_token_size_for_fuzziness:
+                max_edits = 0
+            for variant_token, distance in self._token_index.lookup(text_token, max_distance=max_edits):
+                if distance < matched_tokens.get(variant_token, MAX_FUZZY_EDITS + 1):
+                    matched_tokens[variant_token] = distance
+
+        allowed_language_scripts = None
+        if search_language_script is not None:
+            allowed_language_scripts = {search_language_script, ENGLISH_LANG}
+
+        candidate_variant_ids = set()
+        for variant_token in matched_tokens:
+            candidate_variant_ids.update(self._token_to_variant_ids.get(variant_token, ()))
+
+        scored_variants = []
+        for variant_id in candidate_variant_ids:
+            variant, value, tokens, language_script = self._variants[variant_id]
+            if allowed_language_scripts is not None and language_script not in allowed_language_scripts:
+                continue
+            if all(token in matched_tokens for token in tokens):
+                distance = sum(matched_tokens[token] for token in tokens)
+                scored_variants.append((-len(tokens), distance, variant_id))
+        scored_variants.sort()
+
+        variants_to_values = collections.OrderedDict()
+        for _, _, variant_id in scored_variants:
+            variant, value, tokens, _ = self._variants[variant_id]
+            if variant not in variants_to_values:
+                variants_to_values[NormalizedVariant(variant, list(tokens))] = value
+
+        return variants_to_values
+
+    @classmethod
+    def from_entity_data(cls, entity_name, records):
+        """
+        Build the index from records as returned by DataStore.get_entity_data or DataStore.iter_entity_data
+
+        Args:
+            entity_name (str): name of the entity
+            records (iterable): records (elasticsearch hits) with value, variants and language_script in _source
+
+        Returns:
+            LocalEntityIndex: index over all the records
+        """
+        index = cls(entity_name=entity_name)
+        for record in records:
+            source = record['_source']
+            index.add(value=source['value'], variants=source.get('variants'),
+                      language_script=source.get('language_script', ENGLISH_LANG))
+        return index
+
+    @classmethod
+    def from_dictionary(cls, entity_name, dictionary, language_script=ENGLISH_LANG):
+        """
+        Build the index from a dictionary mapping entity values to list of their variants as returned by
+        DataStore.get_entity_dictionary
+
+        Args:
+            entity_name (str): name of the entity
+            dictionary (dict): dictionary mapping entity values to list of their variants
+            language_script (str, optional): ISO 639 code of the language of the variants. Defaults to 'en'
+
+        Returns:
+            LocalEntityIndex: index over all the values in the dictionary
+        """
+        index = cls(entity_name=entity_name)
+        for value, variants in dictionary.items():
+            index.add(value=value, variants=variants, language_script=language_script)
+        return index
+
+
+def build_entity_variant_automaton(records, search_language_script=None):
+    """
+    Build an Aho-Corasick automaton over lowercased, tokenized variants of an entity for exact matching
+
+    Args:
+        records (iterable): records (elasticsearch hits) with value, variants and language_script in _source as
+                            returned by DataStore.iter_entity_data
+        search_language_script (str, optional): language of variants which are eligible for match. Variants in
+                                                English are eligible as well, same as for
+                                                LocalEntityIndex.get_similar_dictionary. If None, variants in all
+                                                languages are eligible
+
+    Returns:
+        lib.nlp.aho_corasick.TokenAhoCorasick: automaton with variant tokens as keys and (variant, value) tuples as
+                                               payloads
+    """
+    allowed_language_scripts = None
+    if search_language_script is not None:
+        allowed_language_scripts = {search_language_script, ENGLISH_LANG}
+
+    value_variants = []
+    for record in records:
+        source = record['_source']
+        if allowed_language_scripts is not None and \
+                source.get('language_script', ENGLISH_LANG) not in allowed_language_scripts:
+            continue
+        value_variants.append((source['value'], source.get('variants')))
+
+    automaton = TokenAhoCorasick()
+    for value, variants in sorted(value_variants, key=lambda value_and_variants: value_and_variants[0]):
+        for variant in variants or []:
+            if not variant:
+                continue
+            if isinstance(variant, bytes):
+                variant = variant.decode('utf-8')
+            variant = variant.lower()
+            automaton.add(TOKENIZER.tokenize(variant), (variant, value))
+    return automaton
+
+
+class EntityVariantPrefilter(object):
+    """
+    Bloom filter over the deletion neighbourhoods of all variant tokens of an entity. It tells, without false
+    negatives, whether any token of a text can be within the allowed edit distance of some variant token. Since two
+    tokens within k edits of each other share a string obtained by deleting upto k characters from each, it is enough
+    to look up the deletion neighbourhood of each text token in the filter.
+
+    Attributes:
+        max_edits (int): maximum edit distance the filter was built for
+    """
+
+    def __init__(self, bloom_filter, max_edits):
+        """
+        Args:
+            bloom_filter (lib.nlp.bloom_filter.BloomFilter): filter containing deletion neighbourhoods (upto
+                                                             max_edits deletions) of all variant tokens
+            max_edits (int): maximum edit distance the filter was built for
+        """
+        self.max_edits = max_edits
+        self._bloom_filter = bloom_filter
+
+    def __len__(self):
+        return len(self._bloom_filter)
+
+    def add_variants(self, variants):
+        """
+        Add tokens of new variants to the filter. Variants can not be removed from a bloom filter, tokens of removed
+        variants only cause false positives until the filter is rebuilt
+
+        Args:
+            variants (list): list of variants
+        """
+        for key in _get_variant_deletion_keys(variants, self.max_edits):
+            self._bloom_filter.add(key)
+
+    def may_match(self, tokens_and_max_edits):
+        """
+        Check whether any of the tokens may be within its allowed edit distance of some variant token
+
+        Args:
+            tokens_and_max_edits (iterable): (token, maximum edits allowed for the token) tuples
+
+        Returns:
+            bool: False if no token can match any variant token, True otherwise (possibly a false positive)
+        """
+        for token, max_edits in tokens_and_max_edits:
+            if max_edits > self.max_edits:
+                return True
+            if any(key in self._bloom_filter for key in get_deletion_neighbourhood(token, max_edits)):
+                return True
+        return False
+
+
+def _get_variant_deletion_keys(variants, max_edits):
+    keys = set()
+    for variant in variants or []:
+        if not variant:
+            continue
+        if isinstance(variant, bytes):
+            variant = variant.decode('utf-8')
+        for token in TOKENIZER.tokenize(variant.lower()):
+            keys.update(get_deletion_neighbourhood(token, max_edits))
+    return keys
+
+
+def build_entity_variant_prefilter(dictionary, max_edits, error_rate=TEXT_DETECTION_BLOOM_FILTER_ERROR_RATE):
+    """
+    Build a bloom filter prefilter over lowercased, tokenized variants of an entity
+
+    Args:
+        dictionary (dict): dictionary mapping entity values to list of their variants as returned by
+                           DataStore.get_entity_dictionary
+        max_edits (int): maximum edit distance between a text token and a variant token the filter must detect
+        error_rate (float, optional): false positive rate of the bloom filter.
+                                      Defaults to TEXT_DETECTION_BLOOM_FILTER_ERROR_RATE
+
+    Returns:
+        EntityVariantPrefilter: prefilter over all the variant tokens
+    """
+    keys = set()
+    for variants in dictionary.values():
+        keys.update(_get_variant_deletion_keys(variants, max_edits))
+
+    bloom_filter = BloomFilter(capacity=len(keys), error_rate=error_rate)
+    for key in keys:
+        bloom_filter.add(key)
+    return EntityVariantPrefilter(bloom_filter=bloom_filter, max_edits=max_edits)
+
+
+_local_entity_indices = {}
+_entity_variant_automata = {}
+_entity_variant_prefilters = {}
+_entity_document_counts = {}
+_local_entity_indices_lock = threading.Lock()
+# (registry id, key) to the lock held while building the object of the key, so that an object is built only once
+# at a time without blocking lookups and builds of other objects
+_build_locks = {}
+# Entity name (None for all entities) to the number of times its in-process objects were dropped, objects of the
+# entity built meanwhile may be stale and are not kept
+_invalidation_counts = collections.defaultdict(int)
+
+# Entity name to the update marker upto which changes were applied to in-process objects of the entity, see
+# refresh_local_entity_indices
+_entity_change_cursors = {}
+# Process id of the process the change feed refresher thread was started in, threads do not survive a fork
+_change_feed_refresher = {'pid': None}
+
+_prefilter_stats = {'checked': 0, 'skipped': 0}
+_prefilter_stats_lock = threading.Lock()
+
+
+def _get_or_build(registry, entity_name, build):
+    """
+    Get object for the entity from the registry, building it if it is missing, older than
+    TEXT_DETECTION_LOCAL_INDEX_TTL seconds or built from another dictionary snapshot generation than the current one.
+    Objects are built holding a lock of their own, so concurrent lookups of the same object wait for a single build
+    while lookups of other objects go on. An object built while objects of its entity were invalidated is returned
+    but not kept
+
+    Args:
+        registry (dict): dictionary mapping entity names (or tuples starting with the entity name) to
+                         (built_at, snapshot generation, object) tuples
+        entity_name (str or tuple): name of the entity, or tuple of the entity name and build arguments
+        build (callable): called with entity_name to build the object
+
+    Returns:
+        object: object for the entity
+    """
+    def _get_invalidation_counts():
+        return _invalidation_counts[registry_entity_name], _invalidation_counts[None]
+
+    def _is_valid(entry):
+        return entry is not None and time.time() - entry[0] < TEXT_DETECTION_LOCAL_INDEX_TTL \
+            and entry[1] == snapshot_generation
+
+    registry_entity_name = entity_name[0] if isinstance(entity_name, tuple) else entity_name
+    snapshot_generation = get_current_snapshot_generation()
+    entry = registry.get(entity_name)
+    if _is_valid(entry):
+        return entry[2]
+
+    _start_change_feed_refresher()
+    with _local_entity_indices_lock:
+        build_lock = _build_locks.setdefault((id(registry), entity_name), threading.Lock())
+    with build_lock:
+        entry = registry.get(entity_name)
+        if _is_valid(entry):
+            return entry[2]
+        with _local_entity_indices_lock:
+            invalidation_counts = _get_invalidation_counts()
+        entry = (time.time(), snapshot_generation, build(entity_name))
+        with _local_entity_indices_lock:
+            if _get_invalidation_counts() == invalidation_counts:
+                registry[entity_name] = entry
+    return entry[2]
+
+
+def _get_entity_snapshot(entity_name):
+    """
+    Get the current dictionary snapshot (see datastore.snapshot) if it holds up to date data of the entity
+
+    Args:
+        entity_name (str): name of the entity
+
+    Returns:
+        datastore.snapshot.DictionarySnapshot or None: the snapshot, None if entity data must be read from the
+                                                       datastore
+    """
+    snapshot = get_current_snapshot()
+    if snapshot is not None and snapshot.is_entity_current(entity_name=entity_name):
+        return snapshot
+    return None
+
+
+def _iter_entity_data(entity_name):
+    snapshot = _get_entity_snapshot(entity_name)
+    if snapshot is not None:
+        return snapshot.iter_entity_data(entity_name=entity_name)
+    # Imported here to avoid a circular import, datastore.datastore is imported by datastore/__init__
+    from datastore.datastore import DataStore
+    return DataStore().iter_entity_data(entity_name=entity_name)
+
+
+def _get_entity_dictionary(entity_name):
+    snapshot = _get_entity_snapshot(entity_name)
+    if snapshot is not None:
+        return snapshot.get_entity_dictionary(entity_name=entity_name)
+    from datastore.datastore import DataStore
+    return DataStore().get_entity_dictionary(entity_name=entity_name) or {}
+
+
+def _build_local_entity_index(entity_name):
+    index = LocalEntityIndex.from_entity_data(entity_name=entity_name, records=_iter_entity_data(entity_name))
+    ner_logger.debug('%s: built local index for %s with %d variants' % (log_prefix, entity_name, len(index)))
+    return index
+
+
+def _build_entity_variant_automaton(key):
+    entity_name, search_language_script = key
+    automaton = build_entity_variant_automaton(_iter_entity_data(entity_name),
+                                               search_language_script=search_language_script)
+    ner_logger.debug('%s: built exact match automaton for %s (language %s) with %d variants'
+                     % (log_prefix, entity_name, search_language_script, len(automaton)))
+    return automaton
+
+
+def _build_entity_variant_prefilter(key):
+    entity_name, max_edits = key
+    prefilter = build_entity_variant_prefilter(_get_entity_dictionary(entity_name), max_edits=max_edits)
+    ner_logger.debug('%s: built bloom prefilter for %s (max edits %d) with %d keys'
+                     % (log_prefix, entity_name, max_edits, len(prefilter)))
+    return prefilter
+
+
+def _get_entity_document_count(entity_name):
+    snapshot = _get_entity_snapshot(entity_name)
+    if snapshot is not None:
+        return snapshot.get_entity_document_count(entity_name=entity_name)
+    from datastore.datastore import DataStore
+    return DataStore().get_entity_document_count(entity_name=entity_name)
+
+
+def get_local_entity_index(entity_name):
+    """
+    Get the in-process LocalEntityIndex for the entity, building it if it is not built yet or if it is older than
+    TEXT_DETECTION_LOCAL_INDEX_TTL seconds. Entity data is read from the current dictionary snapshot (see
+    datastore.snapshot) when it holds up to date data of the entity, from the datastore otherwise
+
+    Args:
+        entity_name (str): name of the entity
+
+    Returns:
+        LocalEntityIndex: index over all variants of the entity
+    """
+    return _get_or_build(_local_entity_indices, entity_name, _build_local_entity_index)
+
+
+def get_entity_variant_automaton(entity_name, search_language_script=None):
+    """
+    Get the in-process exact match automaton over variants of the entity eligible for the language, building it
+    from the current dictionary snapshot or the datastore (see get_local_entity_index) if it is not built yet or if
+    it is older than TEXT_DETECTION_LOCAL_INDEX_TTL seconds
+
+    Args:
+        entity_name (str): name of the entity
+        search_language_script (str, optional): language of variants which are eligible for match, see
+                                                build_entity_variant_automaton
+
+    Returns:
+        lib.nlp.aho_corasick.TokenAhoCorasick: automaton built by build_entity_variant_automaton
+    """
+    return _get_or_build(_entity_variant_automata, (entity_name, search_language_script),
+                         _build_entity_variant_automaton)
+
+
+def get_entity_document_count(entity_name):
+    """
+    Get number of documents of the entity in the datastore, remembered in process for
+    TEXT_DETECTION_LOCAL_INDEX_TTL seconds or until the entity is written to
+
+    Args:
+        entity_name (str): name of the entity
+
+    Returns:
+        int: number of documents of the entity
+    """
+    return _get_or_build(_entity_document_counts, entity_name, _get_entity_document_count)
+
+
+def entity_variants_may_match(entity_name, tokens_and_max_edits, max_edits):
+    """
+    Check with the in-process bloom prefilter of the entity whether any of the tokens may match some variant of the
+    entity, building the prefilter from the datastore if it is not built yet or if it is older than
+    TEXT_DETECTION_LOCAL_INDEX_TTL seconds. Counts checks and skips, see get_prefilter_stats
+
+    Args:
+        entity_name (str): name of the entity
+        tokens_and_max_edits (iterable): (token, maximum edits allowed for the token) tuples
+        max_edits (int): maximum edits allowed for any token, the prefilter is built for this distance
+
+    Returns:
+        bool: False if no token can match any variant of the entity, True otherwise or if the prefilter could not
+              be built
+    """
+    try:
+        prefilter = _get_or_build(_entity_variant_prefilters, (entity_name, max_edits),
+                                  _build_entity_variant_prefilter)
+        may_match = prefilter.may_match(tokens_and_max_edits)
+    except Exception:
+        ner_logger.exception('%s: bloom prefilter check failed for %s' % (log_prefix, entity_name))
+        may_match = True
+
+    with _prefilter_stats_lock:
+        _prefilter_stats['checked'] += 1
+        _prefilter_stats['skipped'] += int(not may_match)
+    return may_match
+
+
+def get_prefilter_stats():
+    """
+    Get counters of the bloom prefilter in this process
+
+    Returns:
+        dict: checked (number of texts checked), skipped (number of datastore queries avoided) and skip_ratio
+    """
+    with _prefilter_stats_lock:
+        stats = dict(_prefilter_stats)
+    stats['skip_ratio'] = float(stats['skipped']) / stats['checked'] if stats['checked'] else 0.0
+    return stats
+
+
+def invalidate_local_entity_index(entity_name=None):
+    """
+    Drop the in-process LocalEntityIndex, exact match automaton, bloom prefilters and document count for the entity
+    so that they are rebuilt on next use
+
+    Args:
+        entity_name (str, optional): name of the entity. If None, indices of all entities are dropped
+    """
+    with _local_entity_indices_lock:
+        _invalidation_counts[entity_name] += 1
+        for registry in (_local_entity_indices, _entity_variant_automata, _entity_variant_prefilters,
+                         _entity_document_counts):
+            if entity_name is None:
+                registry.clear()
+            else:
+                for key in [registry_key for registry_key in registry
+                            if registry_key == entity_name or
+                            (isinstance(registry_key, tuple) and registry_key[0] == entity_name)]:
+                    del registry[key]
+
+
+def apply_entity_changes(entity_name, changes):
+    """
+    Patch in-process objects of the entity with changes returned by DataStore.get_entity_changes. Values are removed
+    from and added to the LocalEntityIndex in place and new variants are added to bloom prefilters. The exact match
+    automaton and document count can not be patched, they are dropped and rebuilt on next use. If all values of
+    the entity were deleted, all objects of the entity are dropped
+
+    Deletions are applied before writes: written records are current documents while a deleted value may have been
+    written again after its deletion
+
+    Args:
+        entity_name (str): name of the entity
+        changes (dict): changes as returned by DataStore.get_entity_changes
+    """
+    if changes['full_reload']:
+        invalidate_local_entity_index(entity_name=entity_name)
+        return
+    if not changes['changed'] and not changes['deleted']:
+        return
+
+    with _local_entity_indices_lock:
+        entry = _local_entity_indices.get(entity_name)
+        index = entry[2] if entry is not None else None
+        prefilters = [prefilter_entry[2] for prefilter_key, prefilter_entry in _entity_variant_prefilters.items()
+                      if prefilter_key[0] == entity_name]
+        _invalidation_counts[entity_name] += 1
+        for key in [automaton_key for automaton_key in _entity_variant_automata if automaton_key[0] == entity_name]:
+            del _entity_variant_automata[key]
+        _entity_document_counts.pop(entity_name, None)
+
+    if index is not None:
+        for value, language_script in changes['deleted']:
+            index.remove_value(value=value, language_script=language_script)
+    for record in changes['changed']:
+        source = record['_source']
+        if index is not None:
+            language_script = source.get('language_script', ENGLISH_LANG)
+            index.remove_value(value=source['value'], language_script=language_script)
+            index.add(value=source['value'], variants=source.get('variants'), language_script=language_script)
+        for prefilter in prefilters:
+            prefilter.add_variants(source.get('variants'))
+
+    ner_logger.debug('%s: applied %d changed and %d deleted values to in-process objects of %s'
+                     % (log_prefix, len(changes['changed']), len(changes['deleted']), entity_name))
+
+
+def refresh_local_entity_indices():
+    """
+    Poll DataStore.get_entity_changes for every entity having in-process objects in this process and apply the
+    changes (see apply_entity_changes). Polling of an entity starts from CHANGE_FEED_SETTLE_MS before its oldest
+    object was built, applying a change again is harmless
+    """
+    with _local_entity_indices_lock:
+        built_at = {}
+        for registry in (_local_entity_indices, _entity_variant_automata, _entity_variant_prefilters,
+                         _entity_document_counts):
+            for key, entry in registry.items():
+                entity_name = key[0] if isinstance(key, tuple) else key
+                built_at[entity_name] = min(entry[0], built_at.get(entity_name, entry[0]))
+        for entity_name in [cursor_entity_name for cursor_entity_name in _entity_change_cursors
+                            if cursor_entity_name not in built_at]:
+            del _entity_change_cursors[entity_name]
+        cursors = {}
+        for entity_name, entity_built_at in built_at.items():
+            cursors[entity_name] = _entity_change_cursors.get(entity_name,
+                                                              int(entity_built_at * 1000) - CHANGE_FEED_SETTLE_MS)
+
+    from datastore.datastore import DataStore
+    datastore = DataStore()
+    for entity_name, since in cursors.items():
+        changes = datastore.get_entity_changes(entity_name=entity_name, since=since)
+        apply_entity_changes(entity_name=entity_name, changes=changes)
+        with _local_entity_indices_lock:
+            if changes['full_reload']:
+                _entity_change_cursors.pop(entity_name, None)
+            else:
+                _entity_change_cursors[entity_name] = changes['until']
+
+
+def _run_change_feed_refresher():
+    while True:
+        time.sleep(DATASTORE_CHANGE_FEED_INTERVAL)
+        try:
+            refresh_local_entity_indices()
+        except Exception:
+            ner_logger.exception('%s: change feed refresh failed' % log_prefix)
+
+
+def _start_change_feed_refresher():
+    """
+    Start the change feed refresher thread of this process if DATASTORE_CHANGE_FEED_INTERVAL is set and it is not
+    running yet. Started lazily so that it runs in each worker process forked after import
+    """
+    if DATASTORE_CHANGE_FEED_INTERVAL <= 0 or _change_feed_refresher['pid'] == os.getpid():
+        return
+    with _local_entity_indices_lock:
+        if _change_feed_refresher['pid'] == os.getpid():
+            return
+        _change_feed_refresher['pid'] = os.getpid()
+        thread = threading.Thread(target=_run_change_feed_refresher, name='datastore-change-feed-refresher')
+        thread.daemon = True
+        thread.start()
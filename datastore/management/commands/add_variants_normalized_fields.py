@@ -0,0 +1,19 @@
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand
+
+from datastore import DataStore
+
+
+class Command(BaseCommand):
+    help = ('Add normalized forms and token counts of variants to entity data indexed before they were stored '
+            'alongside variants. Documents that already have them are left untouched, so it is safe to rerun')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity_names', default=None,
+                            help='comma separated names of entities to migrate. Defaults to all entities')
+
+    def handle(self, *args, **options):
+        entity_names = options['entity_names'].split(',') if options['entity_names'] else None
+        updated_count = DataStore().add_variants_normalized_fields(entity_names=entity_names)
+        self.stdout.write('Added normalized variant fields to %d documents' % updated_count)
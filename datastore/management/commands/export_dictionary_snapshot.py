@@ -0,0 +1,32 @@
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand
+
+from chatbot_ner.config import DATASTORE_SNAPSHOT_DIR
+from datastore import DataStore
+from datastore.snapshot import publish_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Export entity dictionaries to a new snapshot generation in DATASTORE_SNAPSHOT_DIR. Worker processes '
+            'memory map the published snapshot and switch to a new generation within '
+            'DATASTORE_SNAPSHOT_CHECK_INTERVAL seconds')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity_names', default=None,
+                            help='comma separated names of entities to export. Defaults to all entities')
+        parser.add_argument('--snapshot_dir', default=DATASTORE_SNAPSHOT_DIR,
+                            help='directory to publish the snapshot in. Defaults to DATASTORE_SNAPSHOT_DIR')
+        parser.add_argument('--keep', type=int, default=2,
+                            help='number of snapshot generations to keep, including the new one')
+
+    def handle(self, *args, **options):
+        datastore = DataStore()
+        if options['entity_names']:
+            entity_names = options['entity_names'].split(',')
+        else:
+            entity_names = datastore.get_entity_names()
+        entities = ((entity_name, datastore.iter_entity_data(entity_name=entity_name))
+                    for entity_name in entity_names)
+        file_path = publish_snapshot(entities=entities, snapshot_dir=options['snapshot_dir'], keep=options['keep'])
+        self.stdout.write('Published snapshot of %d entities to %s' % (len(entity_names), file_path))
@@ -0,0 +1,19 @@
+from __future__ import absolute_import
+
+from django.core.management.base import BaseCommand
+
+from datastore import DataStore
+
+
+class Command(BaseCommand):
+    help = ('Move entity data indexed before document ids were derived from entity name, value and language to '
+            'these ids. Documents that already have them are left untouched, so it is safe to rerun')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity_names', default=None,
+                            help='comma separated names of entities to migrate. Defaults to all entities')
+
+    def handle(self, *args, **options):
+        entity_names = options['entity_names'].split(',') if options['entity_names'] else None
+        rekeyed_count = DataStore().rekey_entity_data(entity_names=entity_names)
+        self.stdout.write('Moved %d documents to deterministic ids' % rekeyed_count)
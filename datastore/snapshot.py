@@ -0,0 +1,356 @@
+from __future__ import absolute_import
+
+import errno
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from chatbot_ner.config import (ner_logger, DATASTORE_SNAPSHOT_DIR, DATASTORE_SNAPSHOT_CHECK_INTERVAL,
+                                DATASTORE_CACHE_GENERATION_DIR)
+from datastore.cache import get_entity_generation
+from datastore.exceptions import DictionarySnapshotCorruptedException
+from language_utilities.constant import ENGLISH_LANG
+
+log_prefix = 'datastore.snapshot'
+
+SNAPSHOT_MAGIC = b'NERDICT1'
+# magic, number of entities, offset and length of the directory
+SNAPSHOT_HEADER = struct.Struct('<8sIQQ')
+# File in the snapshot directory holding the file name of the current snapshot
+CURRENT_SNAPSHOT_FILE = 'CURRENT'
+SNAPSHOT_FILE_PREFIX = 'snapshot-'
+SNAPSHOT_FILE_EXTENSION = '.bin'
+
+
+def _pack_uint32_array(items):
+    return struct.pack('<%dI' % len(items), *items)
+
+
+def _pack_string_table(strings):
+    """
+    Pack strings as an offset table of len(strings) + 1 uint32 followed by their concatenated utf-8 bytes
+    """
+    encoded_strings = [string.encode('utf-8') if not isinstance(string, bytes) else string for string in strings]
+    offsets = [0]
+    for encoded_string in encoded_strings:
+        offsets.append(offsets[-1] + len(encoded_string))
+    return _pack_uint32_array(offsets) + b''.join(encoded_strings)
+
+
+def _pack_entity(records):
+    """
+    Pack entity data records into the sections of an entity block
+
+    Args:
+        records (iterable): records (elasticsearch hits) with value, variants and language_script in _source as
+                            returned by DataStore.iter_entity_data
+
+    Returns:
+        tuple:
+            dict: number of rows, values, variants and language scripts of the entity
+            list: (section name, packed bytes) tuples in the order they are to be written
+    """
+    value_ids, language_ids, variant_offsets = {}, {}, [0]
+    row_value_ids, row_language_ids, variants = [], [], []
+    for record in records:
+        source = record['_source']
+        value = source['value']
+        language_script = source.get('language_script') or ENGLISH_LANG
+        row_value_ids.append(value_ids.setdefault(value, len(value_ids)))
+        row_language_ids.append(language_ids.setdefault(language_script, len(language_ids)))
+        variants.extend(source.get('variants') or [])
+        variant_offsets.append(len(variants))
+
+    counts = {'rows': len(row_value_ids), 'values': len(value_ids), 'variants': len(variants),
+              'languages': len(language_ids)}
+    sections = [
+        ('row_value_ids', _pack_uint32_array(row_value_ids)),
+        ('row_language_ids', _pack_uint32_array(row_language_ids)),
+        ('row_variant_offsets', _pack_uint32_array(variant_offsets)),
+        ('values', _pack_string_table(sorted(value_ids, key=value_ids.get))),
+        ('variants', _pack_string_table(variants)),
+        ('languages', _pack_string_table(sorted(language_ids, key=language_ids.get))),
+    ]
+    return counts, sections
+
+
+def write_snapshot(file_path, entities, generation, created_at):
+    """
+    Write entity data to a snapshot file. The file starts with SNAPSHOT_HEADER and is followed by one block per
+    entity and a JSON directory. An entity block holds flat uint32 arrays with the value id, language script id and
+    offset of the first variant of every row (entity value per language), followed by string tables of the values,
+    the variants and the language scripts. The directory maps entity names to counts and offsets of their sections,
+    so that a reader only touches the pages of the entities it reads
+
+    Args:
+        file_path (str): path of the snapshot file to write
+        entities (iterable): (entity name, records) tuples, records as returned by DataStore.iter_entity_data
+        generation (str): generation of the snapshot
+        created_at (float): unix timestamp of the data in the snapshot, writes to an entity after this make its
+                            data in the snapshot stale
+
+    Returns:
+        int: number of entities written
+    """
+    directory = {'generation': generation, 'created_at': created_at, 'entities': {}}
+    with open(file_path, 'wb') as snapshot_file:
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, 0, 0, 0))
+        for entity_name, records in entities:
+            counts, sections = _pack_entity(records)
+            entry = dict(counts, offsets={})
+            for section_name, packed in sections:
+                entry['offsets'][section_name] = snapshot_file.tell()
+                snapshot_file.write(packed)
+            directory['entities'][entity_name] = entry
+
+        directory_offset = snapshot_file.tell()
+        packed_directory = json.dumps(directory).encode('utf-8')
+        snapshot_file.write(packed_directory)
+        snapshot_file.seek(0)
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(directory['entities']), directory_offset,
+                                                 len(packed_directory)))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    return len(directory['entities'])
+
+
+class DictionarySnapshot(object):
+    """
+    Read-only view over a snapshot file written by write_snapshot. The file is memory mapped, so all processes that
+    open the same snapshot share one copy of its pages in the page cache instead of each holding the entity data
+
+    Attributes:
+        file_path (str): path of the snapshot file
+        generation (str): generation of the snapshot
+        created_at (float): unix timestamp of the data in the snapshot
+    """
+
+    def __init__(self, file_path):
+        """
+        Args:
+            file_path (str): path of the snapshot file
+
+        Raises:
+            DictionarySnapshotCorruptedException: if the file is not a snapshot file
+        """
+        self.file_path = file_path
+        with open(file_path, 'rb') as snapshot_file:
+            if not os.fstat(snapshot_file.fileno()).st_size:
+                raise DictionarySnapshotCorruptedException('Could not read snapshot %s: empty file' % file_path)
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            magic, _, directory_offset, directory_length = SNAPSHOT_HEADER.unpack_from(self._mmap, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError('bad magic %r' % magic)
+            directory = json.loads(self._mmap[directory_offset:directory_offset + directory_length].decode('utf-8'))
+        except (struct.error, ValueError) as e:
+            self._mmap.close()
+            raise DictionarySnapshotCorruptedException('Could not read snapshot %s: %s' % (file_path, e))
+
+        self.generation = directory['generation']
+        self.created_at = directory['created_at']
+        self._entities = directory['entities']
+
+    def __len__(self):
+        return len(self._entities)
+
+    def __contains__(self, entity_name):
+        return entity_name in self._entities
+
+    @property
+    def entity_names(self):
+        return sorted(self._entities)
+
+    def _read_uint32_array(self, offset, count):
+        return struct.unpack_from('<%dI' % count, self._mmap, offset)
+
+    def _read_string_table(self, offset, count):
+        offsets = self._read_uint32_array(offset, count + 1)
+        start = offset + 4 * (count + 1)
+        return [self._mmap[start + offsets[i]:start + offsets[i + 1]].decode('utf-8') for i in range(count)]
+
+    def is_entity_current(self, entity_name, generation_dir=None):
+        """
+        Check that the entity is in the snapshot and was not written to after the snapshot was taken
+
+        Args:
+            entity_name (str): name of the entity
+            generation_dir (str, optional): directory of the generation files touched on writes to entity data, see
+                                            datastore.cache. Defaults to DATASTORE_CACHE_GENERATION_DIR
+
+        Returns:
+            bool: True if data of the entity in the snapshot can be used
+        """
+        if entity_name not in self._entities:
+            return False
+        generation_dir = generation_dir or DATASTORE_CACHE_GENERATION_DIR
+        if not generation_dir:
+            return True
+        return max(get_entity_generation(generation_dir=generation_dir, entity_name=entity_name)) <= self.created_at
+
+    def get_entity_document_count(self, entity_name):
+        """
+        Get number of rows (entity values per language) of the entity in the snapshot
+
+        Args:
+            entity_name (str): name of the entity
+
+        Returns:
+            int: number of rows of the entity, 0 if the entity is not in the snapshot
+        """
+        entry = self._entities.get(entity_name)
+        return entry['rows'] if entry else 0
+
+    def iter_entity_data(self, entity_name):
+        """
+        Read all rows of the entity, like DataStore.iter_entity_data
+
+        Args:
+            entity_name (str): name of the entity
+
+        Yields:
+            dict: records shaped like elasticsearch hits, with value, variants and language_script in _source
+        """
+        entry = self._entities.get(entity_name)
+        if not entry:
+            return
+
+        offsets = entry['offsets']
+        row_value_ids = self._read_uint32_array(offsets['row_value_ids'], entry['rows'])
+        row_language_ids = self._read_uint32_array(offsets['row_language_ids'], entry['rows'])
+        row_variant_offsets = self._read_uint32_array(offsets['row_variant_offsets'], entry['rows'] + 1)
+        values = self._read_string_table(offsets['values'], entry['values'])
+        variants = self._read_string_table(offsets['variants'], entry['variants'])
+        language_scripts = self._read_string_table(offsets['languages'], entry['languages'])
+        for i in range(entry['rows']):
+            yield {
+                '_source': {
+                    'entity_data': entity_name,
+                    'value': values[row_value_ids[i]],
+                    'variants': variants[row_variant_offsets[i]:row_variant_offsets[i + 1]],
+                    'language_script': language_scripts[row_language_ids[i]],
+                }
+            }
+
+    def get_entity_dictionary(self, entity_name):
+        """
+        Read the entity as a dictionary, like DataStore.get_entity_dictionary
+
+        Args:
+            entity_name (str): name of the entity
+
+        Returns:
+            dict: mapping entity values to list of their variants
+        """
+        return {record['_source']['value']: record['_source']['variants']
+                for record in self.iter_entity_data(entity_name=entity_name)}
+
+    def close(self):
+        self._mmap.close()
+
+
+def _read_current_snapshot_file_name(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, CURRENT_SNAPSHOT_FILE)) as current_file:
+            return current_file.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+
+def publish_snapshot(entities, snapshot_dir=DATASTORE_SNAPSHOT_DIR, keep=2):
+    """
+    Write a new snapshot generation to snapshot_dir and make it the current snapshot. The snapshot file and then the
+    CURRENT file pointing to it are written under temporary names and renamed into place, so readers see either the
+    previous or the new generation, never a partially written one. Older generations beyond keep are deleted, workers
+    still mapping them keep their pages until they switch
+
+    Args:
+        entities (iterable): (entity name, records) tuples, records as returned by DataStore.iter_entity_data
+        snapshot_dir (str, optional): directory to publish in. Defaults to DATASTORE_SNAPSHOT_DIR
+        keep (int, optional): number of snapshot generations to keep, including the new one. Defaults to 2
+
+    Returns:
+        str: path of the published snapshot file
+    """
+    try:
+        os.makedirs(snapshot_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    created_at = time.time()
+    generation = '%d-%d' % (int(created_at * 1000), os.getpid())
+    file_name = SNAPSHOT_FILE_PREFIX + generation + SNAPSHOT_FILE_EXTENSION
+    file_path = os.path.join(snapshot_dir, file_name)
+    entity_count = write_snapshot(file_path=file_path + '.tmp', entities=entities, generation=generation,
+                                  created_at=created_at)
+    os.rename(file_path + '.tmp', file_path)
+
+    current_file_path = os.path.join(snapshot_dir, CURRENT_SNAPSHOT_FILE)
+    with open(current_file_path + '.tmp', 'w') as current_file:
+        current_file.write(file_name)
+        current_file.flush()
+        os.fsync(current_file.fileno())
+    os.rename(current_file_path + '.tmp', current_file_path)
+    ner_logger.debug('%s: published snapshot %s with %d entities' % (log_prefix, file_path, entity_count))
+
+    snapshot_file_names = sorted(name for name in os.listdir(snapshot_dir)
+                                 if name.startswith(SNAPSHOT_FILE_PREFIX) and name.endswith(SNAPSHOT_FILE_EXTENSION))
+    for name in snapshot_file_names[:-max(keep, 1)]:
+        if name != file_name:
+            try:
+                os.remove(os.path.join(snapshot_dir, name))
+            except OSError:
+                ner_logger.exception('%s: Could not remove old snapshot %s' % (log_prefix, name))
+
+    return file_path
+
+
+_current_snapshot = {'snapshot': None, 'file_name': None, 'checked_at': 0}
+_current_snapshot_lock = threading.Lock()
+
+
+def get_current_snapshot():
+    """
+    Get the current snapshot published in DATASTORE_SNAPSHOT_DIR, checking at most every
+    DATASTORE_SNAPSHOT_CHECK_INTERVAL seconds whether a new generation was published and switching to it if so.
+    The previous snapshot is not closed explicitly since other threads may still be reading from it, its mapping is
+    released once it is no longer referenced
+
+    Returns:
+        DictionarySnapshot or None: current snapshot, None if no snapshot is published or it could not be opened
+    """
+    if not DATASTORE_SNAPSHOT_DIR:
+        return None
+
+    if time.time() - _current_snapshot['checked_at'] < DATASTORE_SNAPSHOT_CHECK_INTERVAL:
+        return _current_snapshot['snapshot']
+
+    with _current_snapshot_lock:
+        if time.time() - _current_snapshot['checked_at'] >= DATASTORE_SNAPSHOT_CHECK_INTERVAL:
+            file_name = _read_current_snapshot_file_name(DATASTORE_SNAPSHOT_DIR)
+            if file_name != _current_snapshot['file_name']:
+                snapshot = None
+                if file_name is not None:
+                    try:
+                        snapshot = DictionarySnapshot(os.path.join(DATASTORE_SNAPSHOT_DIR, file_name))
+                        ner_logger.debug('%s: switched to snapshot %s' % (log_prefix, file_name))
+                    except (IOError, OSError, DictionarySnapshotCorruptedException):
+                        ner_logger.exception('%s: Could not open snapshot %s' % (log_prefix, file_name))
+                _current_snapshot['snapshot'] = snapshot
+                _current_snapshot['file_name'] = file_name
+            _current_snapshot['checked_at'] = time.time()
+    return _current_snapshot['snapshot']
+
+
+def get_current_snapshot_generation():
+    """
+    Returns:
+        str or None: generation of the current snapshot, None if there is none
+    """
+    snapshot = get_current_snapshot()
+    return snapshot.generation if snapshot is not None else None
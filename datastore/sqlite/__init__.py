@@ -0,0 +1,4 @@
+import connect
+import create
+import populate
+import query
@@ -0,0 +1,58 @@
+from __future__ import absolute_import
+
+import os
+import sqlite3
+import threading
+
+log_prefix = 'datastore.sqlite.connect'
+
+
+class SharedConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection shared by threads of the process. A connection has a single transaction, so a thread
+    committing or rolling back would also commit or roll back writes another thread made in the meantime. Using the
+    connection as a context manager (with connection:), as every write in datastore.sqlite does, holds a lock for the
+    whole transaction so that writes of threads never share one
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(SharedConnection, self).__init__(*args, **kwargs)
+        self._transaction_lock = threading.RLock()
+
+    def __enter__(self):
+        self._transaction_lock.acquire()
+        try:
+            return super(SharedConnection, self).__enter__()
+        except BaseException:
+            self._transaction_lock.release()
+            raise
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return super(SharedConnection, self).__exit__(exc_type, exc_value, traceback)
+        finally:
+            self._transaction_lock.release()
+
+
+def connect(database_path, busy_timeout=5, **kwargs):
+    """
+    Opens the SQLite database file at database_path, creating the file and its directory if they do not exist.
+    The database is opened in WAL mode so that reads from worker processes are not blocked by a writer
+
+    Args:
+        database_path (str): path of the SQLite database file, ':memory:' for a private in-memory database
+        busy_timeout (float, optional): seconds to wait for a lock held by another connection before giving up.
+                                        Defaults to 5
+        kwargs: any additional connection settings are ignored
+
+    Returns:
+        SharedConnection: connection object, shared by threads of the process
+    """
+    directory = os.path.dirname(database_path)
+    if database_path != ':memory:' and directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    connection = sqlite3.connect(database_path, timeout=busy_timeout, check_same_thread=False,
+                                 factory=SharedConnection)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    return connection
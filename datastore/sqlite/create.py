@@ -0,0 +1,154 @@
+from __future__ import absolute_import
+
+import binascii
+
+log_prefix = 'datastore.sqlite.create'
+
+ENTITY_DATA_TABLE = 'entity_data'
+ENTITY_DATA_FTS_TABLE = 'entity_data_fts'
+ENTITY_DATA_VOCABULARY_TABLE = 'entity_data_fts_vocabulary'
+CRF_DATA_TABLE = 'crf_data'
+ENTITY_DATA_TOMBSTONES_TABLE = 'entity_data_tombstones'
+ENTITY_DATA_MANIFEST_TABLE = 'entity_data_manifest'
+
+# One row per entity value and language script, as one elasticsearch document. variants is a JSON list and tokens
+# holds the tokens (see encode_token) of all variants. Both tokens and entity_key (the encoded entity name) are indexed
+# by the external content FTS5 table, kept in sync with triggers, so that a full text query is restricted to one
+# entity inside the FTS5 index. The fts5vocab table lists all indexed tokens, used to expand query tokens to fuzzy
+# matches. updated_at holds the update marker of the row and tombstones record deleted values (or with empty value
+# and language_script, deletion of the whole entity) for DataStore.get_entity_changes. The manifest holds one row per
+# entity repopulated from a csv file, see DataStore.repopulate
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS {entity_data} (
+        id INTEGER PRIMARY KEY,
+        entity_data TEXT NOT NULL,
+        entity_key TEXT NOT NULL,
+        dict_type TEXT,
+        value TEXT NOT NULL,
+        language_script TEXT NOT NULL,
+        variants TEXT NOT NULL,
+        tokens TEXT NOT NULL,
+        updated_at INTEGER NOT NULL DEFAULT 0
+    )''',
+    'CREATE INDEX IF NOT EXISTS {entity_data}_entity_value ON {entity_data} (entity_data, value)',
+    'CREATE INDEX IF NOT EXISTS {entity_data}_entity_updated_at ON {entity_data} (entity_data, updated_at)',
+    '''CREATE TABLE IF NOT EXISTS {entity_data_tombstones} (
+        entity_data TEXT NOT NULL,
+        value TEXT NOT NULL,
+        language_script TEXT NOT NULL,
+        updated_at INTEGER NOT NULL,
+        PRIMARY KEY (entity_data, value, language_script)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS {entity_data_manifest} (
+        entity_data TEXT PRIMARY KEY,
+        file_hash TEXT NOT NULL,
+        populated_at INTEGER NOT NULL
+    )''',
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS {entity_data_fts} USING fts5(
+        entity_key, tokens, content='{entity_data}', content_rowid='id', tokenize='ascii'
+    )''',
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS {entity_data_vocabulary} USING fts5vocab({entity_data_fts}, 'row')''',
+    '''CREATE TRIGGER IF NOT EXISTS {entity_data}_after_insert AFTER INSERT ON {entity_data} BEGIN
+        INSERT INTO {entity_data_fts} (rowid, entity_key, tokens) VALUES (new.id, new.entity_key, new.tokens);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS {entity_data}_after_delete AFTER DELETE ON {entity_data} BEGIN
+        INSERT INTO {entity_data_fts} ({entity_data_fts}, rowid, entity_key, tokens)
+        VALUES ('delete', old.id, old.entity_key, old.tokens);
+    END''',
+    '''CREATE TABLE IF NOT EXISTS {crf_data} (
+        id INTEGER PRIMARY KEY,
+        entity_data TEXT NOT NULL,
+        sentence TEXT NOT NULL,
+        entities TEXT NOT NULL,
+        language_script TEXT NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS {crf_data}_entity ON {crf_data} (entity_data)',
+]
+
+TABLE_NAMES = {
+    'entity_data': ENTITY_DATA_TABLE,
+    'entity_data_fts': ENTITY_DATA_FTS_TABLE,
+    'entity_data_vocabulary': ENTITY_DATA_VOCABULARY_TABLE,
+    'crf_data': CRF_DATA_TABLE,
+    'entity_data_tombstones': ENTITY_DATA_TOMBSTONES_TABLE,
+    'entity_data_manifest': ENTITY_DATA_MANIFEST_TABLE,
+}
+
+
+def encode_token(token):
+    """
+    Encode a token (as produced by lib.nlp.const.TOKENIZER) or an entity name as a hex string of its utf-8 bytes.
+    Tokens are stored encoded so that FTS5 indexes exactly the tokens TextDetector works with instead of
+    re-tokenizing variants with its own rules. Encoding keeps prefixes, i.e. tokens starting with a character are
+    the encoded tokens starting with the encoded character
+
+    Args:
+        token (unicode): token
+
+    Returns:
+        unicode: encoded token, made of characters 0-9 and a-f only
+    """
+    return binascii.hexlify(token.encode('utf-8')).decode('ascii')
+
+
+def decode_token(encoded_token):
+    """
+    Inverse of encode_token
+
+    Args:
+        encoded_token (unicode): encoded token
+
+    Returns:
+        unicode: token
+    """
+    return binascii.unhexlify(encoded_token).decode('utf-8')
+
+
+def create_tables(connection, logger, **kwargs):
+    """
+    Creates the tables for entity data and crf training data, if they do not exist already
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        logger: logging object to log at debug and exception level
+        kwargs: ignored
+    """
+    with connection:
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(%s)' % ENTITY_DATA_TABLE)]
+        if columns and 'updated_at' not in columns:
+            # Databases created before update markers were stored
+            connection.execute('ALTER TABLE %s ADD COLUMN updated_at INTEGER NOT NULL DEFAULT 0' % ENTITY_DATA_TABLE)
+        for statement in SCHEMA:
+            connection.execute(statement.format(**TABLE_NAMES))
+    logger.debug('%s: created tables' % log_prefix)
+
+
+def delete_tables(connection, logger, **kwargs):
+    """
+    Drops all tables created by create_tables along with their data
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        logger: logging object to log at debug and exception level
+        kwargs: ignored
+    """
+    with connection:
+        for table_name in [ENTITY_DATA_VOCABULARY_TABLE, ENTITY_DATA_FTS_TABLE, ENTITY_DATA_TABLE, CRF_DATA_TABLE,
+                           ENTITY_DATA_TOMBSTONES_TABLE, ENTITY_DATA_MANIFEST_TABLE]:
+            connection.execute('DROP TABLE IF EXISTS %s' % table_name)
+    logger.debug('%s: deleted tables' % log_prefix)
+
+
+def exists(connection):
+    """
+    Checks if the entity data table exists
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+
+    Returns:
+        bool: True if the table exists, False otherwise
+    """
+    row = connection.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?",
+                             (ENTITY_DATA_TABLE,)).fetchone()
+    return bool(row[0])
@@ -0,0 +1,306 @@
+from __future__ import absolute_import
+
+# std imports
+import json
+import os
+
+# Local imports
+from datastore.sqlite.create import (ENTITY_DATA_TABLE, ENTITY_DATA_TOMBSTONES_TABLE, ENTITY_DATA_MANIFEST_TABLE,
+                                     CRF_DATA_TABLE, encode_token)
+from datastore.utils import (get_files_from_directory, remove_duplicate_data, get_variants_dictionary_value_from_key,
+                             get_update_marker)
+from language_utilities.constant import ENGLISH_LANG
+from lib.nlp.const import TOKENIZER
+from ner_constants import DICTIONARY_DATA_VARIANTS
+
+log_prefix = 'datastore.sqlite.populate'
+
+# Maximum number of parameters bound to a single statement, SQLITE_MAX_VARIABLE_NUMBER is 999 on older builds
+VALUES_CHUNK_SIZE = 500
+
+
+def _to_unicode(text):
+    if isinstance(text, bytes):
+        return text.decode('utf-8')
+    return text
+
+
+def _get_entity_data_row(entity_name, value, variants, language_script):
+    """
+    Build the entity_data table row for an entity value, refer datastore.sqlite.create.SCHEMA
+
+    Args:
+        entity_name (str): name of the entity
+        value (str or unicode): entity value
+        variants (list): list of variants of the value
+        language_script (str): Language code of the entity script
+
+    Returns:
+        tuple: entity_data, entity_key, dict_type, value, language_script, variants, tokens and updated_at column
+               values
+    """
+    variants = [_to_unicode(variant) for variant in variants or []]
+    tokens = []
+    for variant in variants:
+        if variant:
+            tokens.extend(encode_token(token) for token in TOKENIZER.tokenize(variant.lower()))
+    entity_name = _to_unicode(entity_name)
+    return (entity_name, encode_token(entity_name), DICTIONARY_DATA_VARIANTS, _to_unicode(value),
+            language_script, json.dumps(variants), u' '.join(tokens), get_update_marker())
+
+
+def _insert_entity_data(connection, rows):
+    connection.executemany(
+        'INSERT INTO %s (entity_data, entity_key, dict_type, value, language_script, variants, tokens, updated_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?)' % ENTITY_DATA_TABLE, rows)
+
+
+def _delete_entity_rows(connection, entity_name, update_marker, values=None):
+    """
+    Delete rows of the entity and record the deletion in the tombstones table, refer
+    datastore.sqlite.create.SCHEMA. Must be called inside a transaction
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        update_marker (int): update marker of the deletion, see datastore.utils.get_update_marker
+        values (list, optional): values to delete. If None, all rows of the entity are deleted
+
+    Returns:
+        int: number of rows deleted
+    """
+    if values is None:
+        cursor = connection.execute('DELETE FROM %s WHERE entity_data = ?' % ENTITY_DATA_TABLE, (entity_name,))
+        connection.execute("INSERT OR REPLACE INTO %s (entity_data, value, language_script, updated_at) "
+                           "VALUES (?, '', '', ?)" % ENTITY_DATA_TOMBSTONES_TABLE, (entity_name, update_marker))
+        return cursor.rowcount
+
+    deleted_count = 0
+    for i in range(0, len(values), VALUES_CHUNK_SIZE):
+        chunk = [_to_unicode(value) for value in values[i:i + VALUES_CHUNK_SIZE]]
+        where = 'entity_data = ? AND value IN (%s)' % ', '.join('?' * len(chunk))
+        connection.execute('INSERT OR REPLACE INTO %s (entity_data, value, language_script, updated_at) '
+                           'SELECT entity_data, value, language_script, ? FROM %s WHERE %s'
+                           % (ENTITY_DATA_TOMBSTONES_TABLE, ENTITY_DATA_TABLE, where),
+                           [update_marker, entity_name] + chunk)
+        deleted_count += connection.execute('DELETE FROM %s WHERE %s' % (ENTITY_DATA_TABLE, where),
+                                            [entity_name] + chunk).rowcount
+    return deleted_count
+
+
+def create_all_dictionary_data(connection, logger, entity_data_directory_path=None, csv_file_paths=None, **kwargs):
+    """
+    Stores all entity data from csv files stored at entity_data_directory_path, one file at a time
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        logger: logging object to log at debug and exception level
+        entity_data_directory_path: Optional, Path of the directory containing the entity data csv files.
+                                    Default is None
+        csv_file_paths: Optional, list of file paths to csv files. Default is None
+        kwargs: ignored
+    """
+    logger.debug('%s: +++ Started: create_all_dictionary_data() +++' % log_prefix)
+    for csv_file_path in _get_csv_file_paths(entity_data_directory_path, csv_file_paths):
+        create_dictionary_data_from_file(connection=connection, csv_file_path=csv_file_path, update=False,
+                                         logger=logger, **kwargs)
+    logger.debug('%s: +++ Finished: create_all_dictionary_data() +++' % log_prefix)
+
+
+def recreate_all_dictionary_data(connection, logger, entity_data_directory_path=None, csv_file_paths=None,
+                                 **kwargs):
+    """
+    Replaces stored entity data with the data from csv files stored at entity_data_directory_path, one file at a
+    time
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        logger: logging object to log at debug and exception level
+        entity_data_directory_path: Optional, Path of the directory containing the entity data csv files.
+                                    Default is None
+        csv_file_paths: Optional, list of file paths to csv files. Default is None
+        kwargs: ignored
+    """
+    logger.debug('%s: +++ Started: recreate_all_dictionary_data() +++' % log_prefix)
+    for csv_file_path in _get_csv_file_paths(entity_data_directory_path, csv_file_paths):
+        create_dictionary_data_from_file(connection=connection, csv_file_path=csv_file_path, update=True,
+                                         logger=logger, **kwargs)
+    logger.debug('%s: +++ Finished: recreate_all_dictionary_data() +++' % log_prefix)
+
+
+def _get_csv_file_paths(entity_data_directory_path, csv_file_paths):
+    paths = []
+    if entity_data_directory_path:
+        paths.extend(os.path.join(entity_data_directory_path, csv_file)
+                     for csv_file in get_files_from_directory(entity_data_directory_path))
+    if csv_file_paths:
+        paths.extend(csv_file_path for csv_file_path in csv_file_paths
+                     if csv_file_path and csv_file_path.endswith('.csv'))
+    return paths
+
+
+def create_dictionary_data_from_file(connection, csv_file_path, update, logger, **kwargs):
+    """
+    Stores all entity data from the csv file at path csv_file_path. With update, existing data of the entity is
+    replaced in the same transaction, so readers never see the entity without data
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        csv_file_path: absolute file path of the csv file to populate entity data from
+        update: boolean, True if existing data of the entity must be deleted first
+        logger: logging object to log at debug and exception level
+        kwargs: ignored
+    """
+    dictionary_key = os.path.splitext(os.path.basename(csv_file_path))[0]
+    update_marker = get_update_marker()
+    dictionary_value = get_variants_dictionary_value_from_key(csv_file_path=csv_file_path,
+                                                              dictionary_key=dictionary_key, logger=logger)
+    rows = [_get_entity_data_row(dictionary_key, value, variants, ENGLISH_LANG)
+            for value, variants in remove_duplicate_data(dictionary_value).items()]
+    with connection:
+        if update:
+            _delete_entity_rows(connection, entity_name=dictionary_key, update_marker=update_marker)
+        _insert_entity_data(connection, rows)
+    logger.debug('%s: \t++ %s stored %d values ++' % (log_prefix, dictionary_key, len(rows)))
+
+
+def delete_entity_by_name(connection, entity_name, logger, **kwargs):
+    """
+    Deletes all data of the entity
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        logger: logging object to log at debug and exception level
+        kwargs: ignored
+    """
+    with connection:
+        _delete_entity_rows(connection, entity_name=entity_name, update_marker=get_update_marker())
+    logger.debug('%s: \t++ %s Entity deleted ++' % (log_prefix, entity_name))
+
+
+def entity_data_update(connection, entity_data, entity_name, language_script, logger, **kwargs):
+    """
+    Stores entity data sent via the external api call
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_data (list): List of dicts consisting of value and variants.
+        entity_name (str): Name of the dictionary
+        language_script (str): The code for the language script
+        logger: logging object to log at debug and exception level
+        kwargs: ignored
+    """
+    logger.debug('%s: +++ Started: external_api_entity_update() +++' % log_prefix)
+    if entity_data:
+        dictionary_value = {}
+        for temp_dict in entity_data:
+            dictionary_value[temp_dict['value']] = temp_dict['variants']
+        rows = [_get_entity_data_row(entity_name, value, variants, language_script)
+                for value, variants in dictionary_value.items()]
+        with connection:
+            _insert_entity_data(connection, rows)
+    logger.debug('%s: +++ Completed: external_api_entity_update() +++' % log_prefix)
+
+
+def delete_entity_data_by_values(connection, entity_name, values=None, **kwargs):
+    """
+    Deletes entity data of the entity depending on the values
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity for which the data is to be deleted.
+        values (list, optional): List of values for which data is to be deleted. If None, all records are deleted
+        kwargs: ignored
+    """
+    with connection:
+        _delete_entity_rows(connection, entity_name=entity_name, update_marker=get_update_marker(), values=values)
+
+
+def add_entity_data(connection, entity_name, value_variant_records, **kwargs):
+    """
+    Store entity data for the records
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity for which the data is to be created
+        value_variant_records (list): List of dicts to be stored.
+            Sample Dict: {'value': 'value', 'language_script': 'en', variants': ['variant 1', 'variant 2']}
+        kwargs: ignored
+    """
+    rows = [_get_entity_data_row(entity_name, record.get('value'), record.get('variants'),
+                                 record.get('language_script'))
+            for record in value_variant_records]
+    with connection:
+        _insert_entity_data(connection, rows)
+
+
+def upsert_entity_data(connection, entity_name, value_variant_records, values_to_delete=None, **kwargs):
+    """
+    Replace all rows of the values of the records with the records and delete rows of values_to_delete in a single
+    transaction
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        value_variant_records (list): List of dicts to be stored.
+            Sample Dict: {'value': 'value', 'language_script': 'en', variants': ['variant 1', 'variant 2']}
+        values_to_delete (list, optional): values all rows of which are deleted unless written by a record
+        kwargs: ignored
+
+    Returns:
+        tuple: number of rows written and number of rows deleted (including rows replaced by the records)
+    """
+    # Taken before the rows are built so that deletions are ordered before the writes replacing them
+    update_marker = get_update_marker()
+    rows = [_get_entity_data_row(entity_name, record.get('value'), record.get('variants'),
+                                 record.get('language_script'))
+            for record in value_variant_records]
+    values = [record.get('value') for record in value_variant_records] + list(values_to_delete or [])
+    deleted_count = 0
+    with connection:
+        if values:
+            deleted_count = _delete_entity_rows(connection, entity_name=entity_name, update_marker=update_marker,
+                                                values=values)
+        _insert_entity_data(connection, rows)
+    return len(rows), deleted_count
+
+
+def put_entity_manifest(connection, entity_name, file_hash, populated_at, **kwargs):
+    """
+    Record the manifest of a repopulation of the entity from a csv file, replacing the previous one
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        file_hash (str): content hash of the csv file, see datastore.utils.get_file_content_hash
+        populated_at (int): update marker taken after the entity data was written
+        kwargs: ignored
+    """
+    with connection:
+        connection.execute('INSERT OR REPLACE INTO %s (entity_data, file_hash, populated_at) VALUES (?, ?, ?)'
+                           % ENTITY_DATA_MANIFEST_TABLE, (entity_name, file_hash, populated_at))
+
+
+def update_entity_crf_data_populate(connection, entity_list, entity_name, sentence_list, language_script, logger,
+                                    **kwargs):
+    """
+    Replaces the crf training data of the entity
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): Name of the entity for which the training data has to be populated
+        entity_list (list): List consisting of the entities corresponding to the sentence_list
+        sentence_list (list): List of sentences for training
+        language_script (str): The code for the language script
+        logger: logging object to log at debug and exception level
+        kwargs: ignored
+    """
+    rows = [(entity_name, _to_unicode(sentence), json.dumps([_to_unicode(entity) for entity in entities]),
+             language_script)
+            for sentence, entities in zip(sentence_list, entity_list)]
+    with connection:
+        connection.execute('DELETE FROM %s WHERE entity_data = ?' % CRF_DATA_TABLE, (entity_name,))
+        connection.executemany('INSERT INTO %s (entity_data, sentence, entities, language_script) '
+                               'VALUES (?, ?, ?, ?)' % CRF_DATA_TABLE, rows)
+    logger.debug('%s: \t++ %s stored %d training sentences ++' % (log_prefix, entity_name, len(rows)))
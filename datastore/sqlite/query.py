@@ -0,0 +1,462 @@
+from __future__ import absolute_import
+
+# std imports
+import collections
+import json
+
+# Local imports
+from chatbot_ner.config import ner_logger
+from datastore import constants
+from datastore.local_index import LocalEntityIndex, get_max_edits_for_token, FUZZY_PREFIX_LENGTH
+from datastore.sqlite.create import (ENTITY_DATA_TABLE, ENTITY_DATA_FTS_TABLE, ENTITY_DATA_VOCABULARY_TABLE,
+                                     ENTITY_DATA_TOMBSTONES_TABLE, ENTITY_DATA_MANIFEST_TABLE, CRF_DATA_TABLE,
+                                     encode_token, decode_token)
+from datastore.sqlite.populate import VALUES_CHUNK_SIZE
+from datastore.utils import MANIFEST_FILE_HASH_FIELD, MANIFEST_POPULATED_AT_FIELD
+from external_api.constants import SENTENCE_LIST, ENTITY_LIST
+from language_utilities.constant import ENGLISH_LANG
+from lib.nlp.const import TOKENIZER
+from lib.nlp.levenshtein_distance import damerau_levenshtein_distance
+
+log_prefix = 'datastore.sqlite.query'
+
+# Encoded tokens only contain 0-9 and a-f, so all tokens starting with an encoded prefix sort before the prefix
+# followed by this character
+_ENCODED_PREFIX_UPPER_BOUND = u'g'
+
+
+def dictionary_query(connection, entity_name, **kwargs):
+    """
+    Get all variants data for a entity as a dictionary
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        kwargs: ignored
+
+    Returns:
+        dict: mapping entity values to lists containing synonyms/variants of the value
+    """
+    return dict(iter_dictionary_query(connection=connection, entity_name=entity_name, **kwargs))
+
+
+def iter_dictionary_query(connection, entity_name, **kwargs):
+    """
+    Generator form of dictionary_query
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        kwargs: ignored
+
+    Yields:
+        tuple: (value, list of variants of the value) for each row of the entity. Values present in more than one
+            language script are yielded once per row
+    """
+    cursor = connection.execute('SELECT value, variants FROM %s WHERE entity_data = ?' % ENTITY_DATA_TABLE,
+                                (entity_name,))
+    for row in cursor:
+        yield row['value'], json.loads(row['variants'])
+
+
+def get_entity_supported_languages(connection, entity_name, **kwargs):
+    """
+    Fetch languages supported by a specific entity
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity for which the language codes are to be fetched
+        kwargs: ignored
+
+    Returns:
+        (list): List of language codes supported by this entity
+    """
+    cursor = connection.execute('SELECT language_script FROM %s WHERE entity_data = ? GROUP BY language_script '
+                                'ORDER BY COUNT(*) DESC, language_script' % ENTITY_DATA_TABLE, (entity_name,))
+    return [row['language_script'] for row in cursor]
+
+
+def get_entity_names(connection, **kwargs):
+    """
+    Fetch names of all entities having dictionary data
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        kwargs: ignored
+
+    Returns:
+        (list): sorted list of entity names
+    """
+    cursor = connection.execute('SELECT DISTINCT entity_data FROM %s ORDER BY entity_data' % ENTITY_DATA_TABLE)
+    return [row['entity_data'] for row in cursor]
+
+
+def get_entity_data(connection, entity_name, values=None, **kwargs):
+    """
+    Fetches entity data for the specific entity
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity for which the data is to be fetched
+        values (list, optional): List of values for which data is to be fetched. If None, all records are fetched
+        kwargs: ignored
+
+    Returns:
+        (list): List of records with entity data, shaped like elasticsearch search hits
+    """
+    return list(iter_entity_data(connection=connection, entity_name=entity_name, values=values, **kwargs))
+
+
+def iter_entity_data(connection, entity_name, values=None, **kwargs):
+    """
+    Generator form of get_entity_data
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity for which the data is to be fetched
+        values (list, optional): List of values for which data is to be fetched. If None, all records are fetched
+        kwargs: ignored
+
+    Yields:
+        dict: records with entity data, shaped like elasticsearch search hits, i.e. with _id and _source having
+              entity_data, dict_type, value, language_script and variants
+    """
+    query = 'SELECT * FROM %s WHERE entity_data = ?' % ENTITY_DATA_TABLE
+    if values is None:
+        parameters_list = [[entity_name]]
+    else:
+        values = [value.decode('utf-8') if isinstance(value, bytes) else value for value in values]
+        parameters_list = [[entity_name] + values[i:i + VALUES_CHUNK_SIZE]
+                           for i in range(0, len(values), VALUES_CHUNK_SIZE)]
+
+    for parameters in parameters_list:
+        chunk_query = query
+        if values is not None:
+            chunk_query += ' AND value IN (%s)' % ', '.join('?' * (len(parameters) - 1))
+        for row in connection.execute(chunk_query, parameters):
+            yield _get_record(row)
+
+
+def _get_record(row):
+    return {
+        '_id': str(row['id']),
+        '_source': {
+            'entity_data': row['entity_data'],
+            'dict_type': row['dict_type'],
+            'value': row['value'],
+            'language_script': row['language_script'],
+            'variants': json.loads(row['variants']),
+        }
+    }
+
+
+def get_entity_unique_values(connection, entity_name, value_search_term=None, variant_search_term=None,
+                             empty_variants_only=False, **kwargs):
+    """
+    Search for values in entity with filters
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity for which the data is to be fetched
+        value_search_term (str): Filter values containing the search term (case insensitive)
+        variant_search_term (str): Filter values having a variant with any token of the search term
+        empty_variants_only (bool): Search for values with empty variants only
+        kwargs: ignored
+
+    Returns:
+        list: List of values which match the filters and search criteria, in ascending order (same as
+              get_entity_values_page)
+    """
+    where, parameters = _get_entity_values_where(entity_name=entity_name, value_search_term=value_search_term,
+                                                 variant_search_term=variant_search_term,
+                                                 empty_variants_only=empty_variants_only)
+    cursor = connection.execute('SELECT DISTINCT value FROM %s WHERE %s ORDER BY value'
+                                % (ENTITY_DATA_TABLE, where), parameters)
+    return [row['value'] for row in cursor]
+
+
+def get_entity_values_page(connection, entity_name, size, search_after=None, value_search_term=None,
+                           variant_search_term=None, empty_variants_only=False, **kwargs):
+    """
+    Get a page of unique values of the entity in ascending order, with the filters of get_entity_unique_values.
+    Pages start after the last value of the previous page, so every page costs the same however deep it is
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity for which the values are to be fetched
+        size (int): number of values in the page
+        search_after (str, optional): last value of the previous page. If None, the first page is returned
+        value_search_term (str): Filter values containing the search term (case insensitive)
+        variant_search_term (str): Filter values having a variant with any token of the search term
+        empty_variants_only (bool): Search for values with empty variants only
+        kwargs: ignored
+
+    Returns:
+        dict: values in the page, total number of values matching the filters and search_after to get the next page
+              (None if this is the last page). Refer datastore.elastic_search.query.get_entity_values_page
+    """
+    where, parameters = _get_entity_values_where(entity_name=entity_name, value_search_term=value_search_term,
+                                                 variant_search_term=variant_search_term,
+                                                 empty_variants_only=empty_variants_only)
+    total = connection.execute('SELECT COUNT(DISTINCT value) FROM %s WHERE %s' % (ENTITY_DATA_TABLE, where),
+                               parameters).fetchone()[0]
+    if search_after is not None:
+        where += ' AND value > ?'
+        parameters.append(search_after.decode('utf-8') if isinstance(search_after, bytes) else search_after)
+    cursor = connection.execute('SELECT DISTINCT value FROM %s WHERE %s ORDER BY value LIMIT ?'
+                                % (ENTITY_DATA_TABLE, where), parameters + [size + 1])
+    values = [row['value'] for row in cursor]
+    return {
+        'values': values[:size],
+        'total': total,
+        'search_after': values[size - 1] if len(values) > size else None,
+    }
+
+
+def _get_entity_values_where(entity_name, value_search_term=None, variant_search_term=None,
+                             empty_variants_only=False):
+    """
+    Build the WHERE clause and its parameters matching rows of the entity with the filters of
+    get_entity_unique_values
+    """
+    conditions, parameters = [], []
+    if value_search_term:
+        conditions.append('value LIKE ?')
+        parameters.append(u'%{0}%'.format(value_search_term.lower()))
+
+    if empty_variants_only:
+        where = " AND tokens = ''"
+    else:
+        where = ''
+        variant_tokens = TOKENIZER.tokenize(variant_search_term.lower()) if variant_search_term else []
+        if variant_tokens:
+            conditions.append('id IN (SELECT rowid FROM %s WHERE %s MATCH ?)'
+                              % (ENTITY_DATA_FTS_TABLE, ENTITY_DATA_FTS_TABLE))
+            parameters.append(_get_match_expression(entity_name, [encode_token(token) for token in variant_tokens]))
+
+    if conditions:
+        where += ' AND (%s)' % ' OR '.join(conditions)
+    return 'entity_data = ?' + where, [entity_name] + parameters
+
+
+def get_entity_document_count(connection, entity_name, **kwargs):
+    """
+    Get number of rows (entity values per language) stored for the entity
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        kwargs: ignored
+
+    Returns:
+        int: number of rows of the entity
+    """
+    return connection.execute('SELECT COUNT(*) FROM %s WHERE entity_data = ?' % ENTITY_DATA_TABLE,
+                              (entity_name,)).fetchone()[0]
+
+
+def get_entity_changes(connection, entity_name, since, until, **kwargs):
+    """
+    Get rows of the entity written and tombstones of values of the entity deleted with an update marker
+    (see datastore.utils.get_update_marker) in (since, until]
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        since (int): update marker after which changes are returned
+        until (int): update marker upto which changes are returned
+        kwargs: ignored
+
+    Returns:
+        dict: with
+            changed (list): records of written rows, shaped like get_entity_data results
+            deleted (list): (value, language_script) tuples of deleted rows
+            full_reload (bool): True if all values of the entity were deleted, changed and deleted are then empty
+            until (int): update marker to pass as since to get the next changes
+    """
+    changes = {'changed': [], 'deleted': [], 'full_reload': False, 'until': until}
+    cursor = connection.execute('SELECT value, language_script FROM %s WHERE entity_data = ? AND updated_at > ? '
+                                'AND updated_at <= ?' % ENTITY_DATA_TOMBSTONES_TABLE, (entity_name, since, until))
+    for row in cursor:
+        if not row['value'] and not row['language_script']:
+            changes['full_reload'] = True
+            changes['deleted'] = []
+            return changes
+        changes['deleted'].append((row['value'], row['language_script']))
+
+    cursor = connection.execute('SELECT * FROM %s WHERE entity_data = ? AND updated_at > ? AND updated_at <= ? '
+                                'ORDER BY updated_at' % ENTITY_DATA_TABLE, (entity_name, since, until))
+    changes['changed'] = [_get_record(row) for row in cursor]
+    return changes
+
+
+def get_entity_manifest(connection, entity_name, **kwargs):
+    """
+    Get the manifest recorded by the last repopulation of the entity from a csv file
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        kwargs: ignored
+
+    Returns:
+        dict or None: with file_hash and populated_at, None if the entity has no manifest
+    """
+    row = connection.execute('SELECT file_hash, populated_at FROM %s WHERE entity_data = ?'
+                             % ENTITY_DATA_MANIFEST_TABLE, (entity_name,)).fetchone()
+    if row is None:
+        return None
+    return {MANIFEST_FILE_HASH_FIELD: row['file_hash'], MANIFEST_POPULATED_AT_FIELD: row['populated_at']}
+
+
+def full_text_query(connection, entity_name, sentence, fuzziness_threshold, search_language_script=None, size=None,
+                    **kwargs):
+    """
+    Find variants of the entity that fuzzily match the sentence, like
+    datastore.elastic_search.query.full_text_query does.
+
+    Every token of the sentence is expanded to the indexed tokens within the edit distance allowed for it (sharing
+    the first FUZZY_PREFIX_LENGTH characters, as elasticsearch fuzzy queries do), looked up in the FTS5 vocabulary.
+    The size best ranked (bm25) rows of the entity containing any of these tokens are fetched and their variants
+    are checked on the client with a LocalEntityIndex
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity to search in
+        sentence (str or unicode): sentence in which entity has to be searched
+        fuzziness_threshold (int or str): fuzziness allowed for matches on variant tokens, same semantics as the
+                                          elasticsearch match query fuzziness
+        search_language_script (str, optional): language of rows which are eligible for match, rows in english
+                                                are always eligible. If None, all rows are eligible
+        size (int, optional): maximum number of rows to retrieve. Defaults to ELASTICSEARCH_SEARCH_SIZE
+        kwargs: ignored
+
+    Returns:
+        collections.OrderedDict: dictionary mapping matching entity variants to entity value, ordered by number of
+                                 tokens in the variant (descending) and then by total edit distance
+    """
+    if isinstance(sentence, bytes):
+        sentence = sentence.decode('utf-8')
+    terms = _get_candidate_terms(connection, sentence, fuzziness_threshold)
+    if not terms:
+        return collections.OrderedDict()
+
+    query = ('SELECT {entity_data}.* FROM {fts} JOIN {entity_data} ON {entity_data}.id = {fts}.rowid '
+             'WHERE {fts} MATCH ?').format(entity_data=ENTITY_DATA_TABLE, fts=ENTITY_DATA_FTS_TABLE)
+    parameters = [_get_match_expression(entity_name, terms)]
+    if search_language_script is not None:
+        query += ' AND %s.language_script IN (?, ?)' % ENTITY_DATA_TABLE
+        parameters.extend([search_language_script, ENGLISH_LANG])
+    query += ' ORDER BY %s.rank LIMIT ?' % ENTITY_DATA_FTS_TABLE
+    parameters.append(size or constants.ELASTICSEARCH_SEARCH_SIZE)
+
+    ner_logger.debug('%s: Running full text query for entity %s with %d candidate tokens'
+                     % (log_prefix, entity_name, len(terms)))
+    records = [_get_record(row) for row in connection.execute(query, parameters)]
+    index = LocalEntityIndex.from_entity_data(entity_name=entity_name, records=records)
+    return index.get_similar_dictionary(text=sentence, fuzziness_threshold=fuzziness_threshold,
+                                        search_language_script=search_language_script)
+
+
+def full_text_query_bulk(connection, entity_names, sentence, fuzziness_threshold, search_language_script=None,
+                         sizes=None, **kwargs):
+    """
+    Performs full_text_query for multiple entities
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_names (list): names of the entities to search in
+        sentence (str or unicode): sentence in which entities have to be searched
+        fuzziness_threshold (int or str): fuzziness allowed for matches on variant tokens
+        search_language_script (str, optional): language of rows which are eligible for match
+        sizes (dict, optional): maximum number of rows to retrieve for each entity name. Entities missing from it
+                                get ELASTICSEARCH_SEARCH_SIZE. Defaults to None
+        kwargs: ignored
+
+    Returns:
+        collections.OrderedDict: dictionary mapping each entity name (in the order given) to the
+                                 collections.OrderedDict returned by full_text_query for that entity
+    """
+    results = collections.OrderedDict()
+    for entity_name in entity_names:
+        results[entity_name] = full_text_query(connection=connection, entity_name=entity_name, sentence=sentence,
+                                               fuzziness_threshold=fuzziness_threshold,
+                                               search_language_script=search_language_script,
+                                               size=(sizes or {}).get(entity_name))
+    return results
+
+
+def _get_candidate_terms(connection, text, fuzziness_threshold):
+    """
+    Get encoded indexed tokens that may match some token of the text
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        text (unicode): text to be searched
+        fuzziness_threshold (int or str): fuzziness allowed for matches on variant tokens
+
+    Returns:
+        list: sorted encoded tokens
+    """
+    terms = set()
+    for token in set(TOKENIZER.tokenize(text.lower())):
+        terms.add(encode_token(token))
+        max_edits = get_max_edits_for_token(token, fuzziness_threshold)
+        if not max_edits:
+            continue
+        prefix = encode_token(token[:FUZZY_PREFIX_LENGTH])
+        cursor = connection.execute('SELECT term FROM %s WHERE term >= ? AND term < ?'
+                                    % ENTITY_DATA_VOCABULARY_TABLE, (prefix, prefix + _ENCODED_PREFIX_UPPER_BOUND))
+        for row in cursor:
+            candidate = decode_token(row['term'])
+            if abs(len(candidate) - len(token)) <= max_edits and \
+                    damerau_levenshtein_distance(token, candidate, max_distance=max_edits) <= max_edits:
+                terms.add(row['term'])
+    return sorted(terms)
+
+
+def _get_match_expression(entity_name, encoded_tokens):
+    """
+    Build the FTS5 query for rows of the entity containing any of the encoded tokens
+    """
+    return u'entity_key : "%s" AND (%s)' % (encode_token(entity_name),
+                                             u' OR '.join(u'tokens : "%s"' % token for token in encoded_tokens))
+
+
+def get_crf_data_for_entity_name(connection, entity_name, **kwargs):
+    """
+    Get all sentence_list and entity_list for a entity
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        kwargs: ignored
+
+    Returns:
+        dict: with sentence_list and entity_list of the entity, refer
+              datastore.elastic_search.query.get_crf_data_for_entity_name
+    """
+    results_dictionary = {SENTENCE_LIST: [], ENTITY_LIST: []}
+    for sentence, entities in iter_crf_data_for_entity_name(connection=connection, entity_name=entity_name,
+                                                            **kwargs):
+        results_dictionary[SENTENCE_LIST].append(sentence)
+        results_dictionary[ENTITY_LIST].append(entities)
+    return results_dictionary
+
+
+def iter_crf_data_for_entity_name(connection, entity_name, **kwargs):
+    """
+    Generator form of get_crf_data_for_entity_name
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        entity_name (str): name of the entity
+        kwargs: ignored
+
+    Yields:
+        tuple: (sentence, list of entities present in the sentence)
+    """
+    cursor = connection.execute('SELECT sentence, entities FROM %s WHERE entity_data = ? ORDER BY id'
+                                % CRF_DATA_TABLE, (entity_name,))
+    for row in cursor:
+        yield row['sentence'], json.loads(row['entities'])
@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+
+import json
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients giving up on slow responses (timeouts, hedged requests) are expected
+        pass
+
+
+class FakeElasticsearchServer(object):
+    """
+    Minimal HTTP server on localhost standing in for an elasticsearch node in tests. Every request is answered with
+    the status and JSON body returned by handler after sleeping for delay seconds. Requests are recorded as
+    (method, path, body) tuples
+
+    Example:
+        with FakeElasticsearchServer(handler=lambda method, path, body: (200, {'hits': {'hits': []}})) as server:
+            connect(connection_url=server.url)
+    """
+
+    def __init__(self, handler=None, delay=0):
+        self.handler = handler or (lambda method, path, body: (200, {}))
+        self.delay = delay
+        self.requests = []
+        fake = self
+
+        class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else None
+                fake.requests.append((self.command, self.path, body))
+                if fake.delay:
+                    time.sleep(fake.delay)
+                status, data = fake.handler(self.command, self.path, body)
+                payload = json.dumps(data).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _RequestHandler)
+        self.url = 'http://127.0.0.1:%d' % self._server.server_address[1]
+
+    def start(self):
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,79 @@
+from __future__ import absolute_import
+
+import shutil
+import tempfile
+
+import mock
+from django.test import TestCase
+
+from datastore.cache import EntityResultsCache
+
+
+def _get(cache, entity_name, key):
+    return cache.get(entity_name, key)[:2]
+
+
+def _set(cache, entity_name, key, value):
+    cache.set(entity_name, key, value, generation=cache._get_generation(entity_name))
+
+
+class EntityResultsCacheTest(TestCase):
+
+    def setUp(self):
+        self.generation_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.generation_dir, ignore_errors=True)
+
+    def test_lru_eviction_and_counters(self):
+        cache = EntityResultsCache(max_size=2, ttl=60, negative_ttl=60)
+        _set(cache, 'city', u'mumbai', {u'mumbai': u'Mumbai'})
+        _set(cache, 'city', u'pune', {u'pune': u'Pune'})
+        self.assertEqual(_get(cache, 'city', u'mumbai'), (True, {u'mumbai': u'Mumbai'}))
+        _set(cache, 'city', u'goa', {u'goa': u'Goa'})
+
+        self.assertEqual(_get(cache, 'city', u'pune'), (False, None))
+        self.assertEqual(_get(cache, 'city', u'mumbai'), (True, {u'mumbai': u'Mumbai'}))
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses'], stats['evictions']), (2, 2, 1, 1))
+
+    def test_ttl_and_negative_ttl(self):
+        cache = EntityResultsCache(max_size=10, ttl=60, negative_ttl=5)
+        with mock.patch('datastore.cache.time.time', return_value=1000):
+            _set(cache, 'city', u'mumbai', {u'mumbai': u'Mumbai'})
+            _set(cache, 'city', u'yes', {})
+        with mock.patch('datastore.cache.time.time', return_value=1010):
+            self.assertEqual(_get(cache, 'city', u'mumbai'), (True, {u'mumbai': u'Mumbai'}))
+            self.assertEqual(_get(cache, 'city', u'yes'), (False, None))
+        with mock.patch('datastore.cache.time.time', return_value=1100):
+            self.assertEqual(_get(cache, 'city', u'mumbai'), (False, None))
+
+    def test_invalidation_reaches_other_processes(self):
+        cache = EntityResultsCache(max_size=10, ttl=60, negative_ttl=60, generation_dir=self.generation_dir)
+        other_process_cache = EntityResultsCache(max_size=10, ttl=60, negative_ttl=60,
+                                                 generation_dir=self.generation_dir)
+        for results_cache in (cache, other_process_cache):
+            _set(results_cache, 'city', u'mumbai', {u'mumbai': u'Mumbai'})
+            _set(results_cache, 'restaurant', u'kfc', {u'kfc': u'KFC'})
+
+        cache.invalidate('city')
+
+        self.assertEqual(_get(cache, 'city', u'mumbai'), (False, None))
+        self.assertEqual(_get(other_process_cache, 'city', u'mumbai'), (False, None))
+        self.assertEqual(_get(other_process_cache, 'restaurant', u'kfc'), (True, {u'kfc': u'KFC'}))
+
+        cache.invalidate()
+        self.assertEqual(_get(other_process_cache, 'restaurant', u'kfc'), (False, None))
+
+    def test_result_looked_up_before_invalidation_is_stale(self):
+        cache = EntityResultsCache(max_size=10, ttl=60, negative_ttl=60)
+        found, _, generation = cache.get('city', u'mumbai')
+        self.assertFalse(found)
+        # the entity is written to while the result is looked up
+        cache.invalidate('city')
+        cache.set('city', u'mumbai', {u'mumbai': u'Mumbai'}, generation=generation)
+        self.assertEqual(_get(cache, 'city', u'mumbai'), (False, None))
+
+        found, _, generation = cache.get('city', u'mumbai')
+        cache.set('city', u'mumbai', {u'mumbai': u'Mumbai'}, generation=generation)
+        self.assertEqual(_get(cache, 'city', u'mumbai'), (True, {u'mumbai': u'Mumbai'}))
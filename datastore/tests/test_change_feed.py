@@ -0,0 +1,115 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import mock
+from django.test import TestCase
+
+from datastore import local_index
+from datastore.elastic_search import query as es_query
+from datastore.local_index import LocalEntityIndex
+from datastore.sqlite import connect, create, populate, query
+from datastore.utils import UPDATED_AT_FIELD, DICTIONARY_DATA_TOMBSTONE, TOMBSTONE_ENTITY_FIELD, get_update_marker
+
+
+class SQLiteChangeFeedTest(TestCase):
+
+    def setUp(self):
+        self.connection = connect.connect(database_path=':memory:')
+        create.create_tables(connection=self.connection, logger=mock.Mock())
+        populate.add_entity_data(connection=self.connection, entity_name='city', value_variant_records=[
+            {'value': u'Mumbai', 'language_script': 'en', 'variants': [u'Mumbai', u'Bombay']},
+            {'value': u'Pune', 'language_script': 'en', 'variants': [u'Pune']},
+        ])
+        self.since = get_update_marker()
+
+    def tearDown(self):
+        self.connection.close()
+
+    def _get_changes(self):
+        return query.get_entity_changes(connection=self.connection, entity_name='city', since=self.since,
+                                        until=get_update_marker())
+
+    def test_changed_and_deleted_values(self):
+        self.assertEqual(self._get_changes(), {'changed': [], 'deleted': [], 'full_reload': False,
+                                               'until': mock.ANY})
+        populate.add_entity_data(connection=self.connection, entity_name='city', value_variant_records=[
+            {'value': u'Goa', 'language_script': 'en', 'variants': [u'Goa', u'Panaji']},
+        ])
+        populate.delete_entity_data_by_values(connection=self.connection, entity_name='city', values=[u'Pune'])
+        changes = self._get_changes()
+        self.assertEqual([record['_source']['value'] for record in changes['changed']], [u'Goa'])
+        self.assertEqual(changes['deleted'], [(u'Pune', 'en')])
+        self.assertFalse(changes['full_reload'])
+
+    def test_entity_deletion_requires_full_reload(self):
+        populate.delete_entity_by_name(connection=self.connection, entity_name='city', logger=mock.Mock())
+        changes = self._get_changes()
+        self.assertTrue(changes['full_reload'])
+        self.assertEqual((changes['changed'], changes['deleted']), ([], []))
+
+
+class ElasticsearchChangeFeedTest(TestCase):
+
+    def test_get_entity_changes(self):
+        hits = [
+            {'_source': {'entity_data': 'city', 'value': u'Goa', 'variants': [u'goa'], 'language_script': 'en',
+                         UPDATED_AT_FIELD: 11}},
+            {'_source': {TOMBSTONE_ENTITY_FIELD: 'city', 'dict_type': DICTIONARY_DATA_TOMBSTONE, 'value': u'Pune',
+                         'language_script': 'en', UPDATED_AT_FIELD: 12}},
+        ]
+        with mock.patch('datastore.elastic_search.query._run_es_search',
+                        return_value={'hits': {'hits': hits}}) as search_mock:
+            changes = es_query.get_entity_changes(connection=None, index_name='entity_data', doc_type='data_dictionary',
+                                                  entity_name='city', since=10, until=20)
+        self.assertEqual(changes, {'changed': hits[:1], 'deleted': [(u'Pune', 'en')], 'full_reload': False,
+                                   'until': 20})
+        body = search_mock.call_args[1]['body']
+        self.assertEqual(body['query']['bool']['filter'][0], {'range': {UPDATED_AT_FIELD: {'gt': 10, 'lte': 20}}})
+
+
+class ApplyEntityChangesTest(TestCase):
+
+    def setUp(self):
+        local_index.invalidate_local_entity_index('city')
+        records = [
+            {'_source': {'value': u'Mumbai', 'variants': [u'mumbai', u'bombay'], 'language_script': 'en'}},
+            {'_source': {'value': u'Pune', 'variants': [u'pune'], 'language_script': 'en'}},
+        ]
+        with mock.patch('datastore.local_index._iter_entity_data', return_value=records):
+            self.index = local_index.get_local_entity_index('city')
+
+    def tearDown(self):
+        local_index.invalidate_local_entity_index('city')
+
+    def test_remove_value(self):
+        index = LocalEntityIndex.from_dictionary(entity_name='city', dictionary={u'Mumbai': [u'mumbai', u'bombay']})
+        index.remove_value(u'Mumbai', language_script='hi')
+        self.assertEqual(len(index), 2)
+        index.remove_value(u'Mumbai')
+        self.assertEqual(len(index), 0)
+        self.assertEqual(index.get_similar_dictionary(u'bombay', fuzziness_threshold=1), {})
+
+    def test_changes_are_applied_in_place(self):
+        local_index.apply_entity_changes('city', {
+            'changed': [{'_source': {'value': u'Mumbai', 'variants': [u'mumbai'], 'language_script': 'en'}},
+                        {'_source': {'value': u'Goa', 'variants': [u'goa'], 'language_script': 'en'}}],
+            'deleted': [(u'Pune', 'en')],
+            'full_reload': False,
+        })
+        self.assertIs(local_index.get_local_entity_index('city'), self.index)
+        result = self.index.get_similar_dictionary(u'mumbai bombay pune goa', fuzziness_threshold=0)
+        self.assertEqual(dict(result), {u'mumbai': u'Mumbai', u'goa': u'Goa'})
+
+    def test_full_reload_drops_index(self):
+        local_index.apply_entity_changes('city', {'changed': [], 'deleted': [], 'full_reload': True})
+        self.assertNotIn('city', local_index._local_entity_indices)
+
+    def test_refresh_polls_datastore_from_cursor(self):
+        changes = {'changed': [], 'deleted': [(u'Pune', 'en')], 'full_reload': False, 'until': 42}
+        with mock.patch('datastore.datastore.DataStore') as datastore_mock:
+            datastore_mock.return_value.get_entity_changes.return_value = changes
+            local_index.refresh_local_entity_indices()
+            local_index.refresh_local_entity_indices()
+        calls = datastore_mock.return_value.get_entity_changes.call_args_list
+        self.assertEqual(calls[1], mock.call(entity_name='city', since=42))
+        self.assertEqual(self.index.get_similar_dictionary(u'pune', fuzziness_threshold=0), {})
@@ -0,0 +1,147 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import threading
+
+from django.test import TestCase
+
+from datastore import local_index
+from datastore.local_index import (LocalEntityIndex, build_entity_variant_automaton, build_entity_variant_prefilter,
+                                   get_max_edits_for_token)
+
+
+class LocalEntityIndexTest(TestCase):
+
+    def setUp(self):
+        self.index = LocalEntityIndex.from_entity_data(entity_name='city', records=[
+            {'_source': {'value': u'chennai', 'variants': [u'', u'chennai', u'madras'], 'language_script': 'en'}},
+            {'_source': {'value': u'New Delhi', 'variants': [u'delhi', u'new delhi'], 'language_script': 'en'}},
+            {'_source': {'value': u'goa', 'variants': [u'goa'], 'language_script': 'en'}},
+            {'_source': {'value': u'mumbai', 'variants': [u'मुंबई'], 'language_script': 'hi'}},
+        ])
+
+    def test_max_edits_for_token(self):
+        self.assertEqual(get_max_edits_for_token(u'goa', 'auto:4,7'), 0)
+        self.assertEqual(get_max_edits_for_token(u'delhi', 'auto:4,7'), 1)
+        self.assertEqual(get_max_edits_for_token(u'bangalore', 'auto:4,7'), 2)
+        self.assertEqual(get_max_edits_for_token(u'bangalore', 5), 2)
+        self.assertEqual(get_max_edits_for_token(u'bangalore', 'auto'), 2)
+
+    def test_exact_and_fuzzy_variants(self):
+        result = self.index.get_similar_dictionary(u'come to chenai , i will visit new delhi', fuzziness_threshold=1)
+        self.assertEqual(list(result.items()), [(u'new delhi', u'New Delhi'), (u'delhi', u'New Delhi'),
+                                                (u'chennai', u'chennai')])
+
+    def test_min_token_size_for_fuzziness(self):
+        result = self.index.get_similar_dictionary(u'come to chenai', fuzziness_threshold=1,
+                                                   min_token_size_for_fuzziness=6)
+        self.assertEqual(list(result.items()), [])
+
+    def test_prefix_must_match(self):
+        result = self.index.get_similar_dictionary(u'come to hennai', fuzziness_threshold=1)
+        self.assertEqual(list(result.items()), [])
+
+    def test_language_script_filter(self):
+        result = self.index.get_similar_dictionary(u'मुंबई', fuzziness_threshold=1, search_language_script='en')
+        self.assertEqual(list(result.items()), [])
+        result = self.index.get_similar_dictionary(u'मुंबई', fuzziness_threshold=1, search_language_script='hi')
+        self.assertEqual(list(result.items()), [(u'मुंबई', u'mumbai')])
+
+
+class EntityVariantAutomatonTest(TestCase):
+
+    def test_longest_leftmost_exact_matches(self):
+        automaton = build_entity_variant_automaton([
+            {'_source': {'value': u'New Delhi', 'variants': [u'delhi', u'New Delhi'], 'language_script': 'en'}},
+            {'_source': {'value': u'Chennai', 'variants': [u'chennai', u'', u'madras'], 'language_script': 'en'}},
+            {'_source': {'value': u'Tamil Nadu', 'variants': [u'tamil nadu', u'nadu'], 'language_script': 'en'}},
+        ])
+        tokens = u'from new delhi to tamil nadu via delhi and chennai'.split()
+        self.assertEqual(automaton.find_longest_leftmost(tokens),
+                         [(1, 3, (u'new delhi', u'New Delhi')),
+                          (4, 6, (u'tamil nadu', u'Tamil Nadu')),
+                          (7, 8, (u'delhi', u'New Delhi')),
+                          (9, 10, (u'chennai', u'Chennai'))])
+        self.assertEqual(len(automaton.find_all(tokens)), 6)
+
+    def test_variants_filtered_by_language(self):
+        records = [
+            {'_source': {'value': u'mumbai', 'variants': [u'mumbai'], 'language_script': 'en'}},
+            {'_source': {'value': u'mumbai', 'variants': [u'मुंबई'], 'language_script': 'hi'}},
+            {'_source': {'value': u'pune', 'variants': [u'पुणे'], 'language_script': 'mr'}},
+        ]
+        tokens = [u'मुंबई', u'mumbai', u'पुणे']
+        self.assertEqual(build_entity_variant_automaton(records, search_language_script='hi').find_all(tokens),
+                         [(0, 1, (u'मुंबई', u'mumbai')), (1, 2, (u'mumbai', u'mumbai'))])
+        self.assertEqual(build_entity_variant_automaton(records, search_language_script='en').find_all(tokens),
+                         [(1, 2, (u'mumbai', u'mumbai'))])
+        self.assertEqual(len(build_entity_variant_automaton(records).find_all(tokens)), 3)
+
+
+class EntityVariantPrefilterTest(TestCase):
+
+    def test_no_false_negatives_within_max_edits(self):
+        prefilter = build_entity_variant_prefilter({u'Chennai': [u'chennai', u'madras'],
+                                                    u'New Delhi': [u'new delhi']}, max_edits=2, error_rate=0.001)
+        for token, max_edits in [(u'chennai', 0), (u'chenai', 1), (u'chenani', 2), (u'madrs', 1), (u'dlehi', 2),
+                                 (u'new', 0)]:
+            self.assertTrue(prefilter.may_match([(u'want', 0), (token, max_edits)]), token)
+        self.assertFalse(prefilter.may_match([(u'to', 0), (u'i', 0), (u'want', 1), (u'biryani', 2)]))
+        # more edits than the filter was built for can not be ruled out
+        self.assertTrue(prefilter.may_match([(u'biryani', 3)]))
+
+
+class GetOrBuildTest(TestCase):
+
+    def setUp(self):
+        self.registry = {}
+        self.building = threading.Event()
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _slow_build(self, entity_name):
+        self.building.set()
+        self.release.wait(5)
+        return entity_name.upper()
+
+    def _start_slow_build(self, results):
+        thread = threading.Thread(target=lambda: results.append(
+            local_index._get_or_build(self.registry, 'city', self._slow_build)))
+        thread.start()
+        self.assertTrue(self.building.wait(5))
+        return thread
+
+    def test_build_does_not_block_other_entities(self):
+        results = []
+        thread = self._start_slow_build(results)
+        other_results = []
+        other_thread = threading.Thread(target=lambda: other_results.append(
+            local_index._get_or_build(self.registry, 'restaurant', lambda entity_name: 'kfc')))
+        other_thread.start()
+        other_thread.join(1)
+        # built while the build of city is still running
+        self.assertEqual(other_results, ['kfc'])
+        self.release.set()
+        thread.join(5)
+        self.assertEqual(results, ['CITY'])
+
+    def test_object_built_during_invalidation_is_not_kept(self):
+        results = []
+        thread = self._start_slow_build(results)
+        local_index.invalidate_local_entity_index('city')
+        self.release.set()
+        thread.join(5)
+        self.assertEqual(results, ['CITY'])
+        self.assertNotIn('city', self.registry)
+        self.assertEqual(local_index._get_or_build(self.registry, 'city', lambda entity_name: 'rebuilt'), 'rebuilt')
+
+    def test_invalidation_of_other_entity_keeps_object(self):
+        results = []
+        thread = self._start_slow_build(results)
+        local_index.invalidate_local_entity_index('restaurant')
+        local_index.apply_entity_changes('restaurant', {'full_reload': False, 'changed': [],
+                                                        'deleted': [(u'kfc', 'en')]})
+        self.release.set()
+        thread.join(5)
+        self.assertEqual(results, ['CITY'])
+        self.assertEqual(self.registry['city'][2], 'CITY')
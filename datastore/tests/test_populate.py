@@ -0,0 +1,137 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import mock
+from django.test import TestCase
+
+from datastore import constants
+from datastore.elastic_search.populate import (add_data_elastic_search, add_variants_normalized_fields,
+                                               upsert_entity_data, create_dictionary_data_from_file,
+                                               relaxed_index_settings)
+from datastore.utils import (get_entity_data_document_id, get_variants_dictionary_value_from_key,
+                             iter_variants_from_csv, remove_duplicate_data)
+
+
+class VariantsNormalizedFieldsTest(TestCase):
+
+    @mock.patch('datastore.elastic_search.populate.helpers')
+    def test_fields_stored_at_index_time(self, helpers):
+        add_data_elastic_search(connection=mock.Mock(), index_name='entity_data', doc_type='data_dictionary',
+                                dictionary_key='city', dictionary_value={u'New Delhi': [u'New  Delhi', u'', u'Dilli!']},
+                                language_script='en', logger=mock.Mock())
+        document = helpers.bulk.call_args[0][1][0]
+        self.assertEqual(document['variants_normalized'], [u'new delhi', u'', u'dilli'])
+        self.assertEqual(document['variants_token_count'], [2, 0, 1])
+
+    @mock.patch('datastore.elastic_search.populate.helpers')
+    def test_migration_updates_documents_missing_fields(self, helpers):
+        connection = mock.Mock()
+        helpers.scan.return_value = iter([{'_id': '1', '_source': {'variants': [u'Mumbai', u'Bombay City']}}])
+        helpers.bulk.return_value = (1, 0)
+        updated_count = add_variants_normalized_fields(connection=connection, index_name='entity_data',
+                                                       doc_type='data_dictionary', logger=mock.Mock(),
+                                                       entity_names=['city'])
+
+        self.assertEqual(updated_count, 1)
+        self.assertIn('variants_normalized', connection.indices.put_mapping.call_args[1]['body']['data_dictionary'][
+            'properties'])
+        query = helpers.scan.call_args[1]['query']['query']['bool']
+        self.assertEqual(query['must_not'], [{'exists': {'field': 'variants_token_count'}}])
+        self.assertEqual(helpers.bulk.call_args[0][1], [{
+            '_index': 'entity_data', '_type': 'data_dictionary', '_id': '1', '_op_type': 'update',
+            'doc': {'variants_normalized': [u'mumbai', u'bombay city'], 'variants_token_count': [1, 2]}}])
+
+
+class UpsertEntityDataTest(TestCase):
+
+    @mock.patch('datastore.elastic_search.populate.add_tombstones')
+    @mock.patch('datastore.elastic_search.populate.get_entity_data')
+    @mock.patch('datastore.elastic_search.populate.helpers')
+    def test_single_pass_without_delete_by_query(self, helpers, get_entity_data, add_tombstones):
+        connection = mock.Mock()
+        mumbai_en_id = get_entity_data_document_id('city', u'Mumbai', 'en')
+        get_entity_data.return_value = [
+            {'_id': mumbai_en_id, '_source': {'value': u'Mumbai', 'language_script': 'en'}},
+            {'_id': get_entity_data_document_id('city', u'Mumbai', 'hi'),
+             '_source': {'value': u'Mumbai', 'language_script': 'hi'}},
+            {'_id': 'random', '_source': {'value': u'Pune', 'language_script': 'en'}},
+        ]
+        counts = upsert_entity_data(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                    entity_name='city', values_to_delete=[u'Pune'], value_variant_records=[
+                                        {'value': u'Mumbai', 'language_script': 'en', 'variants': [u'Bombay']}],
+                                    language_scripts=['en', 'hi'])
+
+        self.assertEqual(counts, (1, 2))
+        self.assertEqual(get_entity_data.call_args[1]['values'], [u'Mumbai', u'Pune'])
+        self.assertEqual(get_entity_data.call_args[1]['language_scripts'], ['en', 'hi'])
+        actions = helpers.bulk.call_args[0][1]
+        self.assertEqual([(action['_op_type'], action['_id']) for action in actions], [
+            ('delete', get_entity_data_document_id('city', u'Mumbai', 'hi')), ('delete', 'random'),
+            ('index', mumbai_en_id)])
+        self.assertEqual(add_tombstones.call_args[1]['values_and_language_scripts'],
+                         [(u'Mumbai', 'hi'), (u'Pune', 'en')])
+        self.assertFalse(connection.delete_by_query.called)
+
+
+class StreamingBulkLoadTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_file_path = os.path.join(self.directory, 'city.csv')
+        with open(self.csv_file_path, 'w') as f:
+            f.write('value,variants\n'
+                    'Mumbai,Mumbai|Bombay\n'
+                    'Pune,Pune|Poona|Pune\n'
+                    'Goa,Goa\n'
+                    'Mumbai,Bambai|Bombay\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_iter_variants_matches_dictionary(self):
+        value_variants = list(iter_variants_from_csv(csv_file_path=self.csv_file_path, dictionary_key='city',
+                                                     logger=mock.Mock()))
+        # values on a single row are streamed in file order, repeated values are merged at the end
+        self.assertEqual([value for value, _ in value_variants], ['Pune', 'Goa', 'Mumbai'])
+        expected = remove_duplicate_data(get_variants_dictionary_value_from_key(
+            csv_file_path=self.csv_file_path, dictionary_key='city', logger=mock.Mock()))
+        self.assertEqual({value: sorted(variants) for value, variants in value_variants},
+                         {value: sorted(variants) for value, variants in expected.items()})
+
+    @mock.patch('datastore.elastic_search.populate.helpers')
+    def test_file_is_streamed_with_parallel_bulk(self, helpers):
+        sent_actions = []
+
+        def parallel_bulk(connection, actions, **kwargs):
+            for action in actions:
+                sent_actions.append(action)
+                yield True, {}
+
+        helpers.parallel_bulk.side_effect = parallel_bulk
+        create_dictionary_data_from_file(connection=mock.Mock(), index_name='entity_data', doc_type='data_dictionary',
+                                         csv_file_path=self.csv_file_path, update=False, logger=mock.Mock())
+
+        expected_ids = [get_entity_data_document_id('city', value, 'en') for value in ['Mumbai', 'Pune', 'Goa']]
+        self.assertEqual(sorted(action['_id'] for action in sent_actions), sorted(expected_ids))
+        self.assertEqual(helpers.parallel_bulk.call_args[1]['thread_count'], constants.ELASTICSEARCH_BULK_THREAD_COUNT)
+        self.assertEqual(helpers.parallel_bulk.call_args[1]['queue_size'], constants.ELASTICSEARCH_BULK_QUEUE_SIZE)
+        self.assertFalse(helpers.bulk.called)
+
+    def test_relaxed_index_settings_are_restored_on_failure(self):
+        connection = mock.Mock()
+        connection.indices.get_settings.return_value = {
+            'entity_data_v1': {'settings': {'index': {'number_of_replicas': '1'}}}}
+
+        def load():
+            with relaxed_index_settings(connection=connection, index_name='entity_data', logger=mock.Mock()):
+                raise ValueError('bulk load failed')
+
+        self.assertRaises(ValueError, load)
+        self.assertEqual(connection.indices.put_settings.call_args_list, [
+            mock.call(index='entity_data', body={'index': constants.ELASTICSEARCH_BULK_LOAD_SETTINGS}),
+            mock.call(index='entity_data_v1', body={'index': {'refresh_interval': None, 'number_of_replicas': '1'}}),
+        ])
+        connection.indices.refresh.assert_called_once_with(index='entity_data')
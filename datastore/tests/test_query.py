@@ -0,0 +1,397 @@
+from __future__ import absolute_import
+
+import mock
+from django.test import TestCase
+
+from datastore import constants
+from datastore.elastic_search.create import create_entity_index
+from datastore.elastic_search.query import (full_text_query, full_text_query_bulk, get_adaptive_search_size,
+                                            get_entity_data, get_entity_unique_values, get_entity_values_page,
+                                            iter_dictionary_query,
+                                            _generate_es_search_dictionary)
+from datastore.utils import get_entity_data_document_id
+
+
+def _highlighted_response(hits):
+    return {
+        'hits': {
+            'total': len(hits),
+            'hits': [{'_source': {'value': value}, 'highlight': {'variants': variants}} for value, variants in hits]
+        }
+    }
+
+
+class FullTextQueryBulkTest(TestCase):
+
+    def test_single_msearch_for_all_entities(self):
+        connection = mock.Mock()
+        connection.msearch.return_value = {
+            'responses': [
+                _highlighted_response([(u'Mumbai', [u'<em>mumbai</em>'])]),
+                _highlighted_response([(u'Mainland China', [u'<em>mainland</em> <em>china</em>',
+                                                             u'<em>china</em> town'])]),
+            ]
+        }
+        results = full_text_query_bulk(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                       entity_names=['city', 'restaurant'], sentence=u'mainland china in mumbai',
+                                       fuzziness_threshold=1, search_language_script='en')
+
+        self.assertEqual(connection.msearch.call_count, 1)
+        body = connection.msearch.call_args[1]['body']
+        self.assertEqual(len(body), 4)
+        self.assertEqual(body[1]['query']['bool']['filter'][0], {'term': {'entity_data': {'value': 'city'}}})
+        self.assertEqual(body[3]['query']['bool']['filter'][0], {'term': {'entity_data': {'value': 'restaurant'}}})
+        self.assertEqual(list(results.keys()), ['city', 'restaurant'])
+        self.assertEqual(dict(results['city']), {u'mumbai': u'Mumbai'})
+        self.assertEqual(dict(results['restaurant']), {u'mainland china': u'Mainland China'})
+
+    def test_failed_search_returns_empty_dictionary(self):
+        connection = mock.Mock()
+        connection.msearch.return_value = {
+            'responses': [
+                {'error': {'type': 'index_not_found_exception'}},
+                _highlighted_response([(u'Mumbai', [u'<em>mumbai</em>'])]),
+            ]
+        }
+        results = full_text_query_bulk(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                       entity_names=['restaurant', 'city'], sentence=u'mumbai',
+                                       fuzziness_threshold=1)
+        self.assertEqual(dict(results['restaurant']), {})
+        self.assertEqual(dict(results['city']), {u'mumbai': u'Mumbai'})
+
+
+class FullTextQueryWithoutHighlightsTest(TestCase):
+
+    def test_variants_matched_locally(self):
+        connection = mock.Mock()
+        connection.search.return_value = {
+            'hits': {
+                'total': 3,
+                'hits': [
+                    {'_source': {'value': u'Mainland China', 'variants': [u'Mainland  China', u'china town', u'']}},
+                    {'_source': {'value': u'Mumbai', 'variants': [u'mumbai', u'Bombay', u'navi mumbai']}},
+                    {'_source': {'value': u'Mangalore', 'variants': [u'mangalore']}},
+                ]
+            }
+        }
+        results = full_text_query(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                  entity_name='restaurant', sentence=u'mainland chna in mumbai', fuzziness_threshold=1,
+                                  highlight=False)
+
+        body = connection.search.call_args[1]['body']
+        self.assertNotIn('highlight', body)
+        self.assertEqual(body['_source'], ['value', 'variants', 'variants_normalized', 'variants_token_count'])
+        self.assertEqual(list(results.items()), [(u'Mainland China', u'Mainland China'), (u'mumbai', u'Mumbai')])
+
+    def test_precomputed_variant_tokens(self):
+        connection = mock.Mock()
+        connection.search.return_value = {
+            'hits': {
+                'total': 1,
+                'hits': [{'_source': {'value': u'Mainland China', 'variants': [u'Mainland China', u'MC'],
+                                      'variants_normalized': [u'mainland china', u'mc'],
+                                      'variants_token_count': [2, 1]},
+                          'highlight': {'variants': [u'<em>Mainland</em> <em>China</em>']}}]
+            }
+        }
+        for highlight in (True, False):
+            results = full_text_query(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                      entity_name='restaurant', sentence=u'mainland china', fuzziness_threshold=1,
+                                      highlight=highlight)
+            self.assertEqual(list(results.items()), [(u'Mainland China', u'Mainland China')])
+            self.assertEqual(list(results.keys())[0].tokens, [u'mainland', u'china'])
+
+
+def _source_response(hits):
+    return {
+        'hits': {
+            'total': len(hits),
+            'hits': [{'_source': {'value': value, 'variants': variants}} for value, variants in hits]
+        }
+    }
+
+
+class ExactFirstFullTextQueryTest(TestCase):
+
+    @mock.patch.object(constants, 'ELASTICSEARCH_VARIANT_SUBFIELDS', True)
+    def test_fuzzy_search_for_uncovered_tokens(self):
+        connection = mock.Mock()
+        connection.search.side_effect = [
+            _source_response([(u'Mainland China', [u'mainland china', u'MC'])]),
+            _highlighted_response([(u'Mumbai', [u'<em>mumbai</em>']),
+                                   (u'Mainland China', [u'<em>mainland</em> <em>china</em>'])]),
+        ]
+        results = full_text_query(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                  entity_name='restaurant', sentence=u'Mainland China in mumbay',
+                                  fuzziness_threshold=1, exact_first=True)
+
+        exact_body, fuzzy_body = [call[1]['body'] for call in connection.search.call_args_list]
+        self.assertEqual(exact_body['query']['bool']['should'],
+                         [{'match': {'variants.shingles': {'query': u'mainland china in mumbay'}}}])
+        self.assertNotIn('highlight', exact_body)
+        self.assertEqual(fuzzy_body['query']['bool']['should'][0]['match']['variants']['query'], u'in mumbay')
+        self.assertEqual(fuzzy_body['highlight']['highlight_query']['match']['variants']['query'],
+                         u'Mainland China in mumbay')
+        self.assertEqual(list(results.items()), [(u'mainland china', u'Mainland China'), (u'mumbai', u'Mumbai')])
+
+    def test_covered_text_skips_fuzzy_search(self):
+        connection = mock.Mock()
+        connection.search.return_value = _source_response([(u'Mainland China', [u'mainland china'])])
+        results = full_text_query(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                  entity_name='restaurant', sentence=u'mainland china', fuzziness_threshold=1,
+                                  exact_first=True)
+        self.assertEqual(connection.search.call_count, 1)
+        self.assertEqual(list(results.items()), [(u'mainland china', u'Mainland China')])
+        body = connection.search.call_args[1]['body']
+        self.assertEqual(body['query']['bool']['should'], [{'match': {'variants': {'query': u'mainland china'}}}])
+
+    def test_bulk_fuzzy_search_only_for_entities_with_uncovered_tokens(self):
+        connection = mock.Mock()
+        connection.msearch.side_effect = [
+            {'responses': [_source_response([]), _source_response([(u'Mainland China', [u'mainland china'])])]},
+            {'responses': [_highlighted_response([(u'Mangalore', [u'<em>mangalore</em>'])])]},
+        ]
+        results = full_text_query_bulk(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                       entity_names=['city', 'restaurant'], sentence=u'mainland china',
+                                       fuzziness_threshold=1, exact_first=True)
+
+        self.assertEqual(connection.msearch.call_count, 2)
+        fuzzy_body = connection.msearch.call_args[1]['body']
+        self.assertEqual(len(fuzzy_body), 2)
+        self.assertEqual(fuzzy_body[1]['query']['bool']['filter'][0], {'term': {'entity_data': {'value': 'city'}}})
+        self.assertEqual(list(results.keys()), ['city', 'restaurant'])
+        self.assertEqual(dict(results['restaurant']), {u'mainland china': u'Mainland China'})
+
+    def test_variant_subfields_mapping(self):
+        connection = mock.Mock()
+        with mock.patch.object(constants, 'ELASTICSEARCH_VARIANT_SUBFIELDS', True):
+            create_entity_index(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                logger=mock.Mock())
+        analysis = connection.indices.create.call_args[1]['body']['index']['analysis']
+        self.assertIn('my_analyzer', analysis['analyzer'])
+        self.assertIn('variant_shingle_analyzer', analysis['analyzer'])
+        variants_mapping = connection.indices.put_mapping.call_args[1]['body']['data_dictionary']['properties'][
+            'variants']
+        self.assertEqual(sorted(variants_mapping['fields']), ['edge_ngrams', 'shingles'])
+
+
+class SearchTemplateTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(constants, 'ELASTICSEARCH_SEARCH_TEMPLATES', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('datastore.elastic_search.templates._stored_search_template_ids', set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_filter_context_and_max_expansions(self):
+        body = _generate_es_search_dictionary('city', u'mumbai', 1, language_script='hi')
+        self.assertEqual(body['query']['bool']['filter'], [{'term': {'entity_data': {'value': 'city'}}},
+                                                           {'terms': {'language_script': ['hi', 'en']}}])
+        self.assertNotIn('must', body['query']['bool'])
+        match_query = body['query']['bool']['should'][0]['match']['variants']
+        self.assertEqual(match_query['max_expansions'], constants.ELASTICSEARCH_SEARCH_MAX_EXPANSIONS)
+
+    def test_search_sends_template_id_and_params(self):
+        connection = mock.Mock()
+        connection.search_template.return_value = _highlighted_response([(u'Mumbai', [u'<em>mumbai</em>'])])
+        for sentence in (u'mumbai', u'pune'):
+            results = full_text_query(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                      entity_name='city', sentence=sentence, fuzziness_threshold=1,
+                                      search_language_script='hi', size=20)
+        self.assertEqual(dict(results), {u'mumbai': u'Mumbai'})
+        self.assertEqual(connection.put_template.call_count, 1)
+        connection.search.assert_not_called()
+
+        body = connection.search_template.call_args[1]['body']
+        self.assertEqual(body['params'], {'entity_name': 'city', 'text': u'pune', 'fuzziness': 1,
+                                          'language_scripts': ['hi', 'en'], 'size': 20})
+        put_template_kwargs = connection.put_template.call_args[1]
+        self.assertEqual(put_template_kwargs['id'], body['id'])
+        source = put_template_kwargs['body']['template']
+        self.assertIn('"filter":[{"term":{"entity_data":{"value":{{#toJson}}entity_name{{/toJson}}}}}', source)
+        self.assertIn('"query":{{#toJson}}text{{/toJson}}', source)
+        self.assertNotIn('pune', source)
+
+    def test_missing_template_is_stored_again(self):
+        connection = mock.Mock()
+        connection.msearch_template.side_effect = [
+            {'responses': [{'error': {'type': 'resource_not_found_exception'}, 'status': 404}]},
+            {'responses': [_highlighted_response([(u'Mumbai', [u'<em>mumbai</em>'])])]},
+        ]
+        results = full_text_query_bulk(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                       entity_names=['city'], sentence=u'mumbai', fuzziness_threshold=1)
+        self.assertEqual(dict(results['city']), {u'mumbai': u'Mumbai'})
+        self.assertEqual(connection.put_template.call_count, 2)
+        self.assertEqual(connection.msearch_template.call_count, 2)
+
+
+class SearchLimitsTest(TestCase):
+
+    def test_adaptive_search_size(self):
+        text = u'book a table at mainland china'
+        self.assertEqual(get_adaptive_search_size(text, size_per_token=10), 60)
+        self.assertEqual(get_adaptive_search_size(text, size_per_token=10, entity_document_count=5000), 240)
+        self.assertEqual(get_adaptive_search_size(text, size_per_token=10, entity_document_count=50), 50)
+        with mock.patch('datastore.elastic_search.query.constants.ELASTICSEARCH_SEARCH_SIZE', 100):
+            self.assertEqual(get_adaptive_search_size(text, size_per_token=10, entity_document_count=5000), 100)
+
+    def test_limits_in_msearch_body(self):
+        connection = mock.Mock()
+        connection.msearch.return_value = {'responses': [_highlighted_response([]), _highlighted_response([])]}
+        full_text_query_bulk(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                             entity_names=['city', 'restaurant'], sentence=u'mumbai', fuzziness_threshold=1,
+                             sizes={'city': 20}, terminate_after=500, min_score=0.5)
+        body = connection.msearch.call_args[1]['body']
+        self.assertEqual((body[1]['size'], body[1]['terminate_after'], body[1]['min_score']), (20, 500, 0.5))
+        self.assertEqual(body[3]['size'], constants.ELASTICSEARCH_SEARCH_SIZE)
+
+
+class ScrollIteratorTest(TestCase):
+
+    @staticmethod
+    def _page(scroll_id, values):
+        return {'_scroll_id': scroll_id, 'hits': {'total': 3, 'hits': [
+            {'_source': {'value': value, 'variants': [value.lower()]}} for value in values]}}
+
+    def test_hits_streamed_page_by_page(self):
+        connection = mock.Mock()
+        connection.search.return_value = self._page('s1', [u'Mumbai', u'Delhi'])
+        connection.scroll.side_effect = [self._page('s2', [u'Goa']), self._page('s2', [])]
+        results = iter_dictionary_query(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                        entity_name='city')
+
+        self.assertEqual(next(results), (u'Mumbai', [u'mumbai']))
+        self.assertFalse(connection.scroll.called)
+        self.assertEqual(list(results), [(u'Delhi', [u'delhi']), (u'Goa', [u'goa'])])
+        connection.clear_scroll.assert_called_once_with(body={'scroll_id': ['s1', 's2']})
+
+    def test_scroll_cleared_when_consumer_stops_early(self):
+        connection = mock.Mock()
+        connection.search.return_value = self._page('s1', [u'Mumbai', u'Delhi'])
+        results = iter_dictionary_query(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                        entity_name='city')
+        next(results)
+        results.close()
+        connection.clear_scroll.assert_called_once_with(body={'scroll_id': ['s1']})
+
+
+class EntityDataLookupTest(TestCase):
+
+    @mock.patch('datastore.elastic_search.query.get_entity_supported_languages', return_value=['en', 'hi'])
+    def test_values_looked_up_by_id(self, _):
+        connection = mock.Mock()
+        mumbai_id = get_entity_data_document_id('city', u'Mumbai', 'en')
+        mumbai_hi_id = get_entity_data_document_id('city', u'Mumbai', 'hi')
+        connection.mget.return_value = {'docs': [
+            {'_id': mumbai_id, 'found': True, '_source': {'value': u'Mumbai', 'language_script': 'en'}},
+            {'_id': mumbai_hi_id, 'found': True, '_source': {'value': u'Mumbai', 'language_script': 'hi'}},
+            {'_id': get_entity_data_document_id('city', u'Goa', 'en'), 'found': False},
+            {'_id': get_entity_data_document_id('city', u'Goa', 'hi'), 'found': False},
+        ]}
+        # Goa was indexed with a random id
+        connection.search.return_value = {'_scroll_id': 's1', 'hits': {'total': 1, 'hits': [
+            {'_id': 'random', '_source': {'value': u'Goa', 'language_script': 'en'}}]}}
+        connection.scroll.return_value = {'_scroll_id': 's1', 'hits': {'total': 1, 'hits': []}}
+
+        records = get_entity_data(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                  entity_name='city', values=[u'Mumbai', u'Goa', u'Mumbai'])
+
+        self.assertEqual([record['_id'] for record in records], [mumbai_id, mumbai_hi_id, 'random'])
+        self.assertEqual(len(connection.mget.call_args[1]['body']['ids']), 4)
+        terms = connection.search.call_args[1]['body']['query']['bool']['must'][1]
+        self.assertEqual(terms, {'terms': {'value.keyword': [u'Goa']}})
+
+    def test_values_found_in_one_language_searched_for_others(self):
+        connection = mock.Mock()
+        mumbai_en_id = get_entity_data_document_id('city', u'Mumbai', 'en')
+        goa_en_id = get_entity_data_document_id('city', u'Goa', 'en')
+        goa_hi_id = get_entity_data_document_id('city', u'Goa', 'hi')
+        connection.mget.return_value = {'docs': [
+            {'_id': mumbai_en_id, 'found': True, '_source': {'value': u'Mumbai', 'language_script': 'en'}},
+            {'_id': get_entity_data_document_id('city', u'Mumbai', 'hi'), 'found': False},
+            {'_id': goa_en_id, 'found': True, '_source': {'value': u'Goa', 'language_script': 'en'}},
+            {'_id': goa_hi_id, 'found': True, '_source': {'value': u'Goa', 'language_script': 'hi'}},
+        ]}
+        # the hindi document of Mumbai was indexed with a random id
+        connection.search.return_value = {'_scroll_id': 's1', 'hits': {'total': 2, 'hits': [
+            {'_id': mumbai_en_id, '_source': {'value': u'Mumbai', 'language_script': 'en'}},
+            {'_id': 'random', '_source': {'value': u'Mumbai', 'language_script': 'hi'}}]}}
+        connection.scroll.return_value = {'_scroll_id': 's1', 'hits': {'total': 2, 'hits': []}}
+
+        records = get_entity_data(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                  entity_name='city', values=[u'Mumbai', u'Goa'], language_scripts=['en', 'hi'])
+
+        self.assertEqual([record['_id'] for record in records], [mumbai_en_id, goa_en_id, goa_hi_id, 'random'])
+        self.assertFalse(connection.search.call_args[1]['body'].get('aggs'))
+        terms = connection.search.call_args[1]['body']['query']['bool']['must'][1]
+        self.assertEqual(terms, {'terms': {'value.keyword': [u'Mumbai']}})
+
+    @mock.patch('datastore.elastic_search.query.get_entity_supported_languages')
+    def test_values_found_in_every_language_not_searched(self, get_entity_supported_languages):
+        connection = mock.Mock()
+        connection.mget.return_value = {'docs': [
+            {'_id': get_entity_data_document_id('city', u'Goa', 'en'), 'found': True,
+             '_source': {'value': u'Goa', 'language_script': 'en'}},
+        ]}
+
+        records = get_entity_data(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                  entity_name='city', values=[u'Goa'], language_scripts=['en'])
+
+        self.assertEqual(len(records), 1)
+        self.assertFalse(get_entity_supported_languages.called)
+        self.assertFalse(connection.search.called)
+
+
+class EntityValuesPageTest(TestCase):
+
+    @staticmethod
+    def _response(values, total=None):
+        response = {'hits': {'hits': [{'_id': str(i), 'sort': [value]} for i, value in enumerate(values)]}}
+        if total is not None:
+            response['aggregations'] = {'total': {'value': total}}
+        return response
+
+    def test_pages_read_with_search_after(self):
+        connection = mock.Mock()
+        # every value has documents in two languages
+        connection.search.side_effect = [self._response([u'Agra', u'Agra', u'Delhi', u'Delhi'], total=3),
+                                         self._response([u'Goa'])]
+        page = get_entity_values_page(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                      entity_name='city', size=2, search_after=u'Agartala')
+
+        self.assertEqual(page, {'values': [u'Agra', u'Delhi'], 'total': 3, 'search_after': u'Delhi'})
+        first_body = connection.search.call_args_list[0][1]['body']
+        self.assertEqual(first_body['search_after'], [u'Agartala'])
+        self.assertIn('aggs', first_body)
+        second_body = connection.search.call_args_list[1][1]['body']
+        self.assertEqual(second_body['search_after'], [u'Delhi'])
+        self.assertNotIn('aggs', second_body)
+
+    def test_last_page(self):
+        connection = mock.Mock()
+        connection.search.return_value = self._response([u'Agra', u'Delhi'], total=2)
+        page = get_entity_values_page(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                      entity_name='city', size=2)
+        self.assertEqual(page, {'values': [u'Agra', u'Delhi'], 'total': 2, 'search_after': None})
+        self.assertNotIn('search_after', connection.search.call_args[1]['body'])
+
+    def test_browse_paths_share_filters(self):
+        connection = mock.Mock()
+        connection.search.return_value = self._response([], total=0)
+        connection.search.return_value['aggregations']['unique_values'] = {'buckets': [{'key': u'Bangalore'}]}
+        with mock.patch.object(constants, 'ELASTICSEARCH_VARIANT_SUBFIELDS', True):
+            values = get_entity_unique_values(connection=connection, index_name='entity_data',
+                                              doc_type='data_dictionary', entity_name='city', variant_search_term=u'ban')
+            unique_values_query = connection.search.call_args[1]['body']['query']
+            unique_values_order = connection.search.call_args[1]['body']['aggs']['unique_values']['terms']['order']
+            get_entity_values_page(connection=connection, index_name='entity_data', doc_type='data_dictionary',
+                                   entity_name='city', size=2, variant_search_term=u'ban')
+            page_query = connection.search.call_args[1]['body']['query']
+        self.assertEqual(values, [u'Bangalore'])
+        self.assertEqual(unique_values_query, page_query)
+        # both paths return values in the order of value.keyword
+        self.assertEqual(unique_values_order, {'_key': 'asc'})
+        self.assertEqual(unique_values_query['bool']['should'],
+                         [{'match': {'variants.edge_ngrams': {'query': u'ban', 'operator': 'and'}}}])
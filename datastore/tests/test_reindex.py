@@ -0,0 +1,181 @@
+from __future__ import absolute_import
+
+import json
+
+import mock
+from django.test import TestCase
+
+from datastore.elastic_search import reindex
+from datastore.elastic_search.connect import connect
+from datastore.tests.fake_es_server import FakeElasticsearchServer
+from datastore.utils import get_entity_data_document_id
+
+
+def _get_connection(version='5.5.0', alias_indices=('entity_data_1',), task=None):
+    connection = mock.Mock()
+    connection.info.return_value = {'version': {'number': version}}
+    connection.indices.exists_alias.return_value = bool(alias_indices)
+    connection.indices.get_alias.return_value = {index: {'aliases': {'entity_data': {}}} for index in alias_indices}
+    connection.indices.get_settings.return_value = {
+        index: {'settings': {'index': {'number_of_replicas': '1'}}} for index in alias_indices}
+    connection.reindex.return_value = {'task': 'node:1'}
+    connection.tasks.get.return_value = task or {}
+    return connection
+
+
+class IndexRebuildTest(TestCase):
+
+    def test_slices(self):
+        self.assertEqual(reindex.get_reindex_slices(_get_connection(version='6.2.4')), 'auto')
+        with mock.patch.object(reindex.constants, 'ELASTICSEARCH_TRANSFER_SLICE_COUNT', 3):
+            self.assertEqual(reindex.get_reindex_slices(_get_connection(version='5.5.0')), 3)
+
+    def test_swap_alias_is_single_request(self):
+        connection = _get_connection(alias_indices=('entity_data_1', 'entity_data_2'))
+        reindex.swap_alias(connection=connection, alias_name='entity_data', index_name='entity_data_2')
+        connection.indices.update_aliases.assert_called_once_with(body={'actions': [
+            {'remove': {'index': 'entity_data_1', 'alias': 'entity_data'}},
+            {'add': {'index': 'entity_data_2', 'alias': 'entity_data'}},
+        ]})
+
+    @mock.patch('datastore.elastic_search.reindex.create_entity_index')
+    def test_start_index_rebuild(self, create_entity_index):
+        connection = _get_connection()
+        rebuild = reindex.start_index_rebuild(connection=connection, alias_name='entity_data',
+                                              doc_type='data_dictionary', logger=mock.Mock())
+        self.assertEqual(rebuild['task_id'], 'node:1')
+        self.assertEqual(rebuild['source_index'], 'entity_data_1')
+        self.assertTrue(rebuild['index'].startswith('entity_data_'))
+        self.assertTrue(rebuild['started_at'] > 0)
+        self.assertEqual(create_entity_index.call_args[1]['index_name'], rebuild['index'])
+        reindex_kwargs = connection.reindex.call_args[1]
+        self.assertEqual(reindex_kwargs['body']['source']['index'], 'entity_data_1')
+        self.assertEqual(reindex_kwargs['body']['dest'], {'index': rebuild['index']})
+        self.assertFalse(reindex_kwargs['wait_for_completion'])
+        connection.indices.update_aliases.assert_not_called()
+
+    def test_start_index_rebuild_requires_single_index(self):
+        connection = _get_connection(alias_indices=())
+        self.assertRaises(ValueError, reindex.start_index_rebuild, connection=connection, alias_name='entity_data',
+                          doc_type='data_dictionary', logger=mock.Mock())
+        connection.reindex.assert_not_called()
+
+    def test_status_does_not_swap_alias(self):
+        connection = _get_connection(task={'completed': True, 'response': {'failures': []},
+                                           'task': {'status': {'total': 10, 'created': 10, 'updated': 0}}})
+        status = reindex.get_index_rebuild_status(connection=connection, alias_name='entity_data', task_id='node:1',
+                                                  index_name='entity_data_2')
+        self.assertEqual((status['completed'], status['copied'], status['alias_swapped']), (True, 10, False))
+        connection.indices.update_aliases.assert_not_called()
+        connection.indices.put_settings.assert_not_called()
+
+    @mock.patch('datastore.elastic_search.reindex.helpers')
+    def test_finalize_waits_for_copy(self, helpers):
+        running = {'completed': False, 'task': {'status': {'total': 10, 'created': 4, 'updated': 0}}}
+        connection = _get_connection(task=running)
+        status = reindex.finalize_index_rebuild(connection=connection, alias_name='entity_data', doc_type='data',
+                                                task_id='node:1', index_name='entity_data_2', started_at=100,
+                                                logger=mock.Mock())
+        self.assertEqual((status['copied'], status['total'], status['alias_swapped']), (4, 10, False))
+        helpers.scan.assert_not_called()
+        connection.indices.update_aliases.assert_not_called()
+
+    @mock.patch('datastore.elastic_search.reindex.helpers')
+    def test_finalize_replays_writes_and_swaps_alias(self, helpers):
+        written = {'_id': 'doc1', '_source': {'entity_data': 'city', 'value': 'delhi', 'language_script': 'en',
+                                              'dict_type': 'variants', 'updated_at': 150}}
+        tombstone = {'_id': 'tombstone-1', '_source': {'tombstone_entity_data': 'city', 'value': 'mumbai',
+                                                       'language_script': 'en', 'dict_type': 'tombstone',
+                                                       'updated_at': 160}}
+        late = {'_id': 'doc2', '_source': {'entity_data': 'city', 'value': 'pune', 'language_script': 'en',
+                                           'dict_type': 'variants', 'updated_at': 170}}
+        helpers.scan.side_effect = [iter([written, tombstone]), iter([late])]
+        connection = _get_connection(task={'completed': True, 'response': {'failures': []},
+                                           'task': {'status': {'total': 10, 'created': 10, 'updated': 0}}})
+        manager = mock.Mock()
+        manager.attach_mock(helpers.bulk, 'bulk')
+        manager.attach_mock(connection.indices.update_aliases, 'update_aliases')
+
+        status = reindex.finalize_index_rebuild(connection=connection, alias_name='entity_data', doc_type='data',
+                                                task_id='node:1', index_name='entity_data_2', started_at=100,
+                                                logger=mock.Mock())
+
+        self.assertTrue(status['alias_swapped'])
+        self.assertEqual(status['replayed'], 3)
+        self.assertEqual([c[1]['query']['query']['range']['updated_at']['gt'] for c in helpers.scan.call_args_list],
+                         [100, 160])
+        self.assertEqual([c[0] for c in manager.mock_calls], ['bulk', 'update_aliases', 'bulk'])
+        replayed = helpers.bulk.call_args_list[0][0][1]
+        self.assertEqual([(action['_id'], action['_op_type']) for action in replayed], [
+            ('doc1', 'index'), ('tombstone-1', 'index'),
+            (get_entity_data_document_id('city', 'mumbai', 'en'), 'delete')])
+        self.assertEqual(replayed[0]['_index'], 'entity_data_2')
+        self.assertEqual([action['_id'] for action in helpers.bulk.call_args_list[1][0][1]], ['doc2'])
+        connection.indices.put_settings.assert_called_once_with(
+            index='entity_data_2', body={'index': {'refresh_interval': None, 'number_of_replicas': '1'}})
+        connection.indices.update_aliases.assert_called_once_with(body={'actions': [
+            {'remove': {'index': 'entity_data_1', 'alias': 'entity_data'}},
+            {'add': {'index': 'entity_data_2', 'alias': 'entity_data'}},
+        ]})
+
+    @mock.patch('datastore.elastic_search.reindex.helpers')
+    def test_replay_entity_deletion(self, helpers):
+        tombstone = {'_id': 'tombstone-city', '_source': {'tombstone_entity_data': 'city', 'value': None,
+                                                          'language_script': None, 'dict_type': 'tombstone',
+                                                          'updated_at': 160}}
+        helpers.scan.return_value = iter([tombstone])
+        connection = _get_connection()
+        replayed, last_marker = reindex.replay_index_writes(connection=connection, source_index='entity_data_1',
+                                                            index_name='entity_data_2', doc_type='data', since=100,
+                                                            logger=mock.Mock())
+        self.assertEqual((replayed, last_marker), (1, 160))
+        self.assertEqual(connection.delete_by_query.call_args[1]['index'], 'entity_data_2')
+        self.assertEqual(connection.delete_by_query.call_args[1]['body']['query']['bool']['filter'], [
+            {'term': {'entity_data': 'city'}}, {'range': {'updated_at': {'lt': 160}}}])
+
+    @mock.patch('datastore.elastic_search.reindex.helpers')
+    def test_failed_copy_keeps_alias(self, helpers):
+        connection = _get_connection(task={'completed': True, 'response': {'failures': [{'cause': 'mapping'}]}})
+        status = reindex.finalize_index_rebuild(connection=connection, alias_name='entity_data', doc_type='data',
+                                                task_id='node:1', index_name='entity_data_2', started_at=100,
+                                                logger=mock.Mock())
+        self.assertFalse(status['alias_swapped'])
+        self.assertEqual(status['failures'], [{'cause': 'mapping'}])
+        helpers.scan.assert_not_called()
+        connection.indices.update_aliases.assert_not_called()
+
+
+class IndexWithoutUpdateMarkersTest(TestCase):
+    """
+    Rebuild of an index created before documents had an updated_at field, so its mapping has none
+    """
+
+    @staticmethod
+    def _handler(method, path, body):
+        path = path.split('?')[0]
+        if path == '/_tasks/node%3A1':
+            return 200, {'completed': True, 'response': {'failures': []},
+                         'task': {'status': {'total': 1, 'created': 1, 'updated': 0}}}
+        if path == '/_alias/entity_data':
+            return 200, {'entity_data_1': {'aliases': {'entity_data': {}}}}
+        if path == '/entity_data_1/_settings/index.number_of_replicas':
+            return 200, {'entity_data_1': {'settings': {'index': {'number_of_replicas': '1'}}}}
+        if path.endswith('/_search'):
+            sort = json.loads(body)['sort'][0]['updated_at']
+            if 'unmapped_type' not in sort:
+                return 400, {'error': {'type': 'search_phase_execution_exception',
+                                       'reason': 'No mapping found for [updated_at] in order to sort on'},
+                             'status': 400}
+            return 200, {'_scroll_id': 'scroll-1', '_shards': {'total': 1, 'successful': 1},
+                         'hits': {'total': 0, 'hits': []}}
+        return 200, {'acknowledged': True}
+
+    def test_finalize_without_update_marker_mapping(self):
+        with FakeElasticsearchServer(handler=self._handler) as server:
+            connection = connect(connection_url=server.url)
+            status = reindex.finalize_index_rebuild(connection=connection, alias_name='entity_data',
+                                                    doc_type='data_dictionary', task_id='node:1',
+                                                    index_name='entity_data_2', started_at=100, logger=mock.Mock())
+        self.assertTrue(status['alias_swapped'])
+        self.assertEqual(status['replayed'], 0)
+        self.assertIn(('POST', '/_aliases'), [request[:2] for request in server.requests])
@@ -0,0 +1,95 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import mock
+from django.test import TestCase
+
+from datastore import local_index, snapshot
+from datastore.exceptions import DictionarySnapshotCorruptedException
+
+CITY_RECORDS = [
+    {'_source': {'value': u'Mumbai', 'variants': [u'mumbai', u'bombay'], 'language_script': 'en'}},
+    {'_source': {'value': u'Mumbai', 'variants': [u'मुंबई'], 'language_script': 'hi'}},
+    {'_source': {'value': u'Pune', 'variants': [], 'language_script': 'en'}},
+]
+
+
+class DictionarySnapshotTest(TestCase):
+
+    def setUp(self):
+        self.snapshot_dir = tempfile.mkdtemp()
+        self.generation_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+        shutil.rmtree(self.generation_dir, ignore_errors=True)
+
+    def _publish(self, entities):
+        return snapshot.publish_snapshot(entities=entities, snapshot_dir=self.snapshot_dir)
+
+    def test_round_trip(self):
+        file_path = self._publish([('city', CITY_RECORDS), ('empty', [])])
+        dictionary_snapshot = snapshot.DictionarySnapshot(file_path)
+        self.assertEqual(dictionary_snapshot.entity_names, ['city', 'empty'])
+        self.assertEqual([record['_source'] for record in dictionary_snapshot.iter_entity_data('city')],
+                         [dict(record['_source'], entity_data='city') for record in CITY_RECORDS])
+        self.assertEqual(dictionary_snapshot.get_entity_dictionary('city'), {u'Mumbai': [u'मुंबई'], u'Pune': []})
+        self.assertEqual(dictionary_snapshot.get_entity_document_count('city'), 3)
+        self.assertEqual(list(dictionary_snapshot.iter_entity_data('empty')), [])
+        self.assertEqual(list(dictionary_snapshot.iter_entity_data('missing')), [])
+
+    def test_is_entity_current(self):
+        dictionary_snapshot = snapshot.DictionarySnapshot(self._publish([('city', CITY_RECORDS)]))
+        self.assertTrue(dictionary_snapshot.is_entity_current('city', generation_dir=self.generation_dir))
+        self.assertFalse(dictionary_snapshot.is_entity_current('restaurant', generation_dir=self.generation_dir))
+
+        generation_file_path = os.path.join(self.generation_dir, 'city')
+        open(generation_file_path, 'a').close()
+        os.utime(generation_file_path, (dictionary_snapshot.created_at + 1, dictionary_snapshot.created_at + 1))
+        self.assertFalse(dictionary_snapshot.is_entity_current('city', generation_dir=self.generation_dir))
+
+    def test_corrupted_snapshot(self):
+        file_path = os.path.join(self.snapshot_dir, 'snapshot-bad.bin')
+        with open(file_path, 'wb') as f:
+            f.write(b'not a snapshot at all, not even close')
+        self.assertRaises(DictionarySnapshotCorruptedException, snapshot.DictionarySnapshot, file_path)
+
+    def test_publish_swaps_current_and_prunes_old_generations(self):
+        with mock.patch('datastore.snapshot.DATASTORE_SNAPSHOT_DIR', self.snapshot_dir), \
+                mock.patch('datastore.snapshot.DATASTORE_SNAPSHOT_CHECK_INTERVAL', 0), \
+                mock.patch.dict(snapshot._current_snapshot, {'snapshot': None, 'file_name': None, 'checked_at': 0}):
+            self.assertIsNone(snapshot.get_current_snapshot())
+
+            with mock.patch('datastore.snapshot.time.time', return_value=1000):
+                self._publish([('city', CITY_RECORDS[:1])])
+            first_snapshot = snapshot.get_current_snapshot()
+            self.assertEqual(first_snapshot.get_entity_document_count('city'), 1)
+
+            for now in (1001, 1002):
+                with mock.patch('datastore.snapshot.time.time', return_value=now):
+                    self._publish([('city', CITY_RECORDS)])
+            current_snapshot = snapshot.get_current_snapshot()
+            self.assertNotEqual(current_snapshot.generation, first_snapshot.generation)
+            self.assertEqual(current_snapshot.get_entity_document_count('city'), 3)
+            # the replaced snapshot stays readable while it is referenced
+            self.assertEqual(first_snapshot.get_entity_document_count('city'), 1)
+            self.assertEqual(len([name for name in os.listdir(self.snapshot_dir) if name.endswith('.bin')]), 2)
+
+    def test_local_index_reads_from_snapshot(self):
+        self._publish([('city', CITY_RECORDS)])
+        with mock.patch('datastore.snapshot.DATASTORE_SNAPSHOT_DIR', self.snapshot_dir), \
+                mock.patch('datastore.snapshot.DATASTORE_SNAPSHOT_CHECK_INTERVAL', 0), \
+                mock.patch('datastore.snapshot.DATASTORE_CACHE_GENERATION_DIR', self.generation_dir), \
+                mock.patch.dict(snapshot._current_snapshot, {'snapshot': None, 'file_name': None, 'checked_at': 0}), \
+                mock.patch('datastore.datastore.DataStore') as datastore_mock:
+            local_index.invalidate_local_entity_index('city')
+            result = local_index.get_local_entity_index('city').get_similar_dictionary(u'fly to bombay',
+                                                                                      fuzziness_threshold=1)
+            self.assertEqual(list(result.items()), [(u'bombay', u'Mumbai')])
+            self.assertEqual(local_index.get_entity_document_count('city'), 3)
+            self.assertFalse(datastore_mock.called)
+            local_index.invalidate_local_entity_index('city')
@@ -0,0 +1,224 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import threading
+
+import mock
+from django.test import TestCase
+
+from datastore.datastore import DataStore
+from datastore.sqlite import connect, create, populate, query
+
+
+class SQLiteEngineTest(TestCase):
+
+    def setUp(self):
+        self.connection = connect.connect(database_path=':memory:')
+        create.create_tables(connection=self.connection, logger=mock.Mock())
+        populate.add_entity_data(connection=self.connection, entity_name='city', value_variant_records=[
+            {'value': u'Mumbai', 'language_script': 'en', 'variants': [u'Mumbai', u'Bombay']},
+            {'value': u'New Delhi', 'language_script': 'en', 'variants': [u'New Delhi', u'Dilli', u'']},
+            {'value': u'Pune', 'language_script': 'en', 'variants': []},
+            {'value': u'मुंबई', 'language_script': 'hi', 'variants': [u'मुंबई']},
+        ])
+        populate.add_entity_data(connection=self.connection, entity_name='restaurant', value_variant_records=[
+            {'value': u'Mumbai Masala', 'language_script': 'en', 'variants': [u'Mumbai Masala']},
+        ])
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_full_text_query(self):
+        results = query.full_text_query(connection=self.connection, entity_name='city',
+                                        sentence=u'flights from mumbai to new delhi', fuzziness_threshold=1)
+        self.assertEqual(results, {u'New Delhi': u'New Delhi', u'Mumbai': u'Mumbai'})
+        self.assertEqual(list(results)[0], u'New Delhi')
+        self.assertEqual(list(results)[0].tokens, [u'new', u'delhi'])
+
+    def test_full_text_query_fuzzy(self):
+        results = query.full_text_query(connection=self.connection, entity_name='city',
+                                        sentence=u'flights to bombey', fuzziness_threshold=1)
+        self.assertEqual(results, {u'Bombay': u'Mumbai'})
+        results = query.full_text_query(connection=self.connection, entity_name='city',
+                                        sentence=u'flights to bombey', fuzziness_threshold=0)
+        self.assertEqual(results, {})
+        # first character must match exactly
+        results = query.full_text_query(connection=self.connection, entity_name='city',
+                                        sentence=u'flights to dombay', fuzziness_threshold=1)
+        self.assertEqual(results, {})
+
+    def test_full_text_query_language_script(self):
+        results = query.full_text_query(connection=self.connection, entity_name='city', sentence=u'मुंबई mumbai',
+                                        fuzziness_threshold=1, search_language_script='hi')
+        self.assertEqual(results, {u'मुंबई': u'मुंबई', u'Mumbai': u'Mumbai'})
+        results = query.full_text_query(connection=self.connection, entity_name='city', sentence=u'मुंबई mumbai',
+                                        fuzziness_threshold=1, search_language_script='mr')
+        self.assertEqual(results, {u'Mumbai': u'Mumbai'})
+
+    def test_full_text_query_bulk(self):
+        results = query.full_text_query_bulk(connection=self.connection, entity_names=['restaurant', 'city'],
+                                             sentence=u'mumbai masala', fuzziness_threshold=1)
+        self.assertEqual(list(results), ['restaurant', 'city'])
+        self.assertEqual(results['restaurant'], {u'Mumbai Masala': u'Mumbai Masala'})
+        self.assertEqual(results['city'], {u'Mumbai': u'Mumbai'})
+
+    def test_unique_values(self):
+        self.assertEqual(query.get_entity_unique_values(connection=self.connection, entity_name='city',
+                                                        value_search_term='DEL'), [u'New Delhi'])
+        self.assertEqual(query.get_entity_unique_values(connection=self.connection, entity_name='city',
+                                                        variant_search_term='bombay'), [u'Mumbai'])
+        self.assertEqual(query.get_entity_unique_values(connection=self.connection, entity_name='city',
+                                                        empty_variants_only=True), [u'Pune'])
+        self.assertEqual(query.get_entity_supported_languages(connection=self.connection, entity_name='city'),
+                         ['en', 'hi'])
+
+    def test_values_page(self):
+        page = query.get_entity_values_page(connection=self.connection, entity_name='city', size=2)
+        self.assertEqual(page, {'values': [u'Mumbai', u'New Delhi'], 'total': 4, 'search_after': u'New Delhi'})
+        page = query.get_entity_values_page(connection=self.connection, entity_name='city', size=2,
+                                            search_after=page['search_after'])
+        self.assertEqual(page, {'values': [u'Pune', u'मुंबई'], 'total': 4, 'search_after': None})
+        page = query.get_entity_values_page(connection=self.connection, entity_name='city', size=2,
+                                            value_search_term='DEL')
+        self.assertEqual(page, {'values': [u'New Delhi'], 'total': 1, 'search_after': None})
+
+    def test_delete_entity_data_by_values(self):
+        populate.delete_entity_data_by_values(connection=self.connection, entity_name='city', values=[u'Mumbai'])
+        self.assertEqual(query.get_entity_document_count(connection=self.connection, entity_name='city'), 3)
+        self.assertEqual(query.full_text_query(connection=self.connection, entity_name='city', sentence=u'bombay',
+                                               fuzziness_threshold=1), {})
+        self.assertEqual(query.get_entity_document_count(connection=self.connection, entity_name='restaurant'), 1)
+
+    def test_transactions_of_threads_do_not_mix(self):
+        inserted, other_committed = threading.Event(), threading.Event()
+
+        def _failing_write():
+            try:
+                with self.connection:
+                    populate._insert_entity_data(self.connection, [
+                        populate._get_entity_data_row('city', u'Goa', [u'Goa'], 'en')])
+                    inserted.set()
+                    other_committed.wait(0.5)
+                    raise ValueError('write failed')
+            except ValueError:
+                pass
+
+        def _other_write():
+            populate.add_entity_data(connection=self.connection, entity_name='city', value_variant_records=[
+                {'value': u'Chennai', 'language_script': 'en', 'variants': [u'Chennai']}])
+            other_committed.set()
+
+        failing_thread = threading.Thread(target=_failing_write)
+        failing_thread.start()
+        self.assertTrue(inserted.wait(5))
+        other_thread = threading.Thread(target=_other_write)
+        other_thread.start()
+        failing_thread.join(5)
+        other_thread.join(5)
+        # the rolled back write was not committed along with the write of the other thread
+        values = query.get_entity_unique_values(connection=self.connection, entity_name='city')
+        self.assertIn(u'Chennai', values)
+        self.assertNotIn(u'Goa', values)
+
+    def test_crf_data(self):
+        populate.update_entity_crf_data_populate(connection=self.connection, entity_name='city',
+                                                 sentence_list=[u'fly to mumbai'], entity_list=[[u'mumbai']],
+                                                 language_script='en', logger=mock.Mock())
+        self.assertEqual(list(query.iter_crf_data_for_entity_name(connection=self.connection, entity_name='city')),
+                         [(u'fly to mumbai', [u'mumbai'])])
+
+
+class SQLitePopulateFromFilesTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'city.csv'), 'w') as f:
+            f.write('value,variants\nMumbai,Mumbai|Bombay\nPune,Pune\n')
+        self.connection = connect.connect(database_path=os.path.join(self.directory, 'db', 'datastore.sqlite3'))
+        create.create_tables(connection=self.connection, logger=mock.Mock())
+
+    def tearDown(self):
+        self.connection.close()
+        shutil.rmtree(self.directory)
+
+    def test_recreate_replaces_entity_data(self):
+        populate.create_all_dictionary_data(connection=self.connection, logger=mock.Mock(),
+                                            entity_data_directory_path=self.directory)
+        populate.recreate_all_dictionary_data(connection=self.connection, logger=mock.Mock(),
+                                              entity_data_directory_path=self.directory)
+        dictionary = query.dictionary_query(connection=self.connection, entity_name='city')
+        self.assertEqual({value: sorted(variants) for value, variants in dictionary.items()},
+                         {u'Mumbai': [u'Bombay', u'Mumbai'], u'Pune': [u'Pune']})
+        self.assertTrue(create.exists(connection=self.connection))
+        create.delete_tables(connection=self.connection, logger=mock.Mock())
+        self.assertFalse(create.exists(connection=self.connection))
+
+
+class SQLiteRepopulateDeltaTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_file_path = os.path.join(self.directory, 'city.csv')
+        self._write_csv('value,variants\nMumbai,Bombay|Mumbai\nPune,Pune|Poona\nDelhi,Delhi\n')
+        settings = {'engine': 'sqlite', 'sqlite': {'database_path': os.path.join(self.directory, 'datastore.sqlite3')}}
+        for patcher in [mock.patch('datastore.datastore.CHATBOT_NER_DATASTORE', settings),
+                        mock.patch('datastore.datastore.DATASTORE_CACHE_GENERATION_DIR', self.directory),
+                        mock.patch.dict(DataStore._instanceDict, clear=True)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.datastore = DataStore()
+        self.datastore.create()
+        self.datastore.add_entity_data(entity_name='city', value_variant_records=[
+            {'value': u'Mumbai', 'language_script': 'en', 'variants': [u'Mumbai', u'Bombay']},
+            {'value': u'Pune', 'language_script': 'en', 'variants': [u'Pune']},
+            {'value': u'Goa', 'language_script': 'en', 'variants': [u'Goa']},
+        ])
+
+    def tearDown(self):
+        self.datastore._client_or_connection.close()
+        shutil.rmtree(self.directory)
+
+    def _write_csv(self, content):
+        with open(self.csv_file_path, 'w') as f:
+            f.write(content)
+
+    def _repopulate(self, **kwargs):
+        plans = self.datastore.repopulate(entity_data_directory_path=self.directory, **kwargs)
+        self.assertEqual([plan['entity_name'] for plan in plans], ['city'])
+        return plans[0]
+
+    def _get_dictionary(self):
+        return {record['_source']['value']: sorted(record['_source']['variants'])
+                for record in self.datastore.iter_entity_data(entity_name='city')}
+
+    def test_dry_run_plans_without_writing(self):
+        plan = self._repopulate(dry_run=True)
+        self.assertFalse(plan['skipped'])
+        self.assertEqual((plan['added'], plan['changed'], plan['removed'], plan['unchanged']),
+                         ([u'Delhi'], [u'Pune'], [u'Goa'], 1))
+        self.assertEqual(plan['language_scripts'], ['en'])
+        self.assertIn(u'Goa', self._get_dictionary())
+        self.assertFalse(self._repopulate(dry_run=True)['skipped'])
+
+    def test_only_changes_are_written_and_unchanged_entities_skipped(self):
+        mumbai_before = self.datastore.get_entity_data(entity_name='city', values=[u'Mumbai'])
+        self._repopulate()
+        expected = {u'Mumbai': [u'Bombay', u'Mumbai'], u'Pune': [u'Poona', u'Pune'], u'Delhi': [u'Delhi']}
+        self.assertEqual(self._get_dictionary(), expected)
+        self.assertEqual(self.datastore.get_entity_data(entity_name='city', values=[u'Mumbai']), mumbai_before)
+
+        self.assertTrue(self._repopulate()['skipped'])
+
+        # data edited since the last repopulation is brought back in line with the file
+        self.datastore.add_entity_data(entity_name='city', value_variant_records=[
+            {'value': u'Goa', 'language_script': 'en', 'variants': [u'Goa']}])
+        plan = self._repopulate()
+        self.assertEqual((plan['skipped'], plan['removed'], plan['unchanged']), (False, [u'Goa'], 3))
+        self.assertEqual(self._get_dictionary(), expected)
+
+        self._write_csv('value,variants\nMumbai,Bombay|Mumbai\nPune,Pune|Poona\n')
+        plan = self._repopulate()
+        self.assertEqual((plan['removed'], plan['unchanged']), ([u'Delhi'], 2))
@@ -0,0 +1,67 @@
+from __future__ import absolute_import
+
+import mock
+from django.test import TestCase
+
+from datastore.elastic_search import transfer
+from datastore.elastic_search.transfer import ESTransfer, get_transfer_connection
+
+DATASTORE_SETTINGS = {
+    'engine': 'elasticsearch',
+    'elasticsearch': {'es_index_1': 'entity_data_v1', 'es_index_2': 'entity_data_v2', 'es_alias': 'entity_data'},
+}
+
+
+def _get_hits(slice_id):
+    return [{'_type': 'data_dictionary', '_id': '%d-%d' % (slice_id, i),
+             '_source': {'entity_data': 'city', 'value': u'value %d %d' % (slice_id, i), 'updated_at': 1}}
+            for i in range(3)]
+
+
+class SlicedScrollTransferTest(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('datastore.elastic_search.transfer.CHATBOT_NER_DATASTORE', DATASTORE_SETTINGS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.es_transfer = ESTransfer(source='http://localhost:9200', destination='http://localhost:9400')
+        self.sent_actions = []
+
+    def _stream_bulk_actions(self, connection, actions, **kwargs):
+        self.sent_actions.extend(actions)
+        return len(self.sent_actions)
+
+    @mock.patch('datastore.elastic_search.transfer.stream_bulk_actions')
+    @mock.patch('datastore.elastic_search.transfer.helpers')
+    def test_slices_are_streamed_to_destination(self, helpers, stream_bulk_actions):
+        helpers.scan.side_effect = lambda connection, query, **kwargs: iter(_get_hits(query['slice']['id']))
+        stream_bulk_actions.side_effect = self._stream_bulk_actions
+        with mock.patch.object(ESTransfer, '_run_delete_query_on_es') as delete_query, \
+                mock.patch.object(transfer.constants, 'ELASTICSEARCH_TRANSFER_SLICE_COUNT', 3):
+            self.es_transfer._transfer_specific_documents('entity_data_v2', ['city'])
+
+        self.assertEqual(delete_query.call_args[0][0], 'entity_data_v2')
+        self.assertEqual(sorted(call[1]['query']['slice'] for call in helpers.scan.call_args_list),
+                         [{'id': 0, 'max': 3}, {'id': 1, 'max': 3}, {'id': 2, 'max': 3}])
+        self.assertEqual(sorted(action['_id'] for action in self.sent_actions),
+                         sorted(hit['_id'] for slice_id in range(3) for hit in _get_hits(slice_id)))
+        action = [action for action in self.sent_actions if action['_id'] == '1-2'][0]
+        self.assertEqual(action, {'_index': 'entity_data_v2', '_type': 'data_dictionary', '_id': '1-2',
+                                  '_op_type': 'index', '_source': _get_hits(1)[2]['_source']})
+        self.assertIs(stream_bulk_actions.call_args[1]['connection'], get_transfer_connection('http://localhost:9400'))
+
+    @mock.patch('datastore.elastic_search.transfer.helpers')
+    def test_failed_slice_aborts_transfer(self, helpers):
+        def scan(connection, query, **kwargs):
+            if query['slice']['id'] == 1:
+                raise ValueError('scroll expired')
+            return iter(_get_hits(query['slice']['id']))
+
+        helpers.scan.side_effect = scan
+        documents = self.es_transfer._iter_source_documents(query={'query': {'match_all': {}}}, slice_count=2)
+        self.assertRaises(ValueError, list, documents)
+
+    def test_connections_are_reused(self):
+        destination_connection = get_transfer_connection('http://localhost:9400')
+        self.assertIs(get_transfer_connection('http://localhost:9400'), destination_connection)
+        self.assertIsNot(get_transfer_connection('http://localhost:9200'), destination_connection)
@@ -0,0 +1,86 @@
+from __future__ import absolute_import
+
+import time
+
+from django.test import TestCase
+from elasticsearch.exceptions import ConnectionTimeout, TransportError
+
+from datastore.elastic_search.connect import connect
+from datastore.exceptions import CircuitBreakerOpenException
+from datastore.tests.fake_es_server import FakeElasticsearchServer
+
+
+def _search_handler(method, path, body):
+    return 200, {'hits': {'total': 0, 'hits': []}}
+
+
+class ResilientTransportTest(TestCase):
+
+    def test_deadline_bounds_retries(self):
+        with FakeElasticsearchServer(handler=_search_handler) as server:
+            connection = connect(connection_url=server.url, max_retries=3, retry_on_timeout=True)
+            server.delay = 1
+            start = time.time()
+            with self.assertRaises(ConnectionTimeout):
+                connection.search(index='entity_data', body={}, request_timeout=0.3)
+            self.assertLess(time.time() - start, 0.9)
+
+    def test_slow_search_hedged_to_other_node(self):
+        with FakeElasticsearchServer(handler=_search_handler) as slow_server, \
+                FakeElasticsearchServer(handler=_search_handler) as fast_server:
+            connection = connect(connection_url=','.join([slow_server.url, fast_server.url]), hedge_requests=True,
+                                 hedge_min_delay=0.05)
+            slow_server.delay = 1
+            for _ in range(2):
+                start = time.time()
+                self.assertEqual(connection.search(index='entity_data', body={}, request_timeout=5)['hits']['hits'],
+                                 [])
+                self.assertLess(time.time() - start, 0.5)
+            # one of the searches went to the slow node first and was hedged to the fast one
+            self.assertEqual(len([request for request in fast_server.requests if request[0] != 'HEAD']), 2)
+
+    def test_search_without_deadline_hedged(self):
+        with FakeElasticsearchServer(handler=_search_handler) as slow_server, \
+                FakeElasticsearchServer(handler=_search_handler) as fast_server:
+            connection = connect(connection_url=','.join([slow_server.url, fast_server.url]), hedge_requests=True,
+                                 hedge_min_delay=0.05)
+            slow_server.delay = 1
+            for _ in range(2):
+                start = time.time()
+                self.assertEqual(connection.search(index='entity_data', body={})['hits']['hits'], [])
+                self.assertLess(time.time() - start, 0.5)
+
+    def test_scroll_search_not_hedged(self):
+        with FakeElasticsearchServer(handler=_search_handler) as first_server, \
+                FakeElasticsearchServer(handler=_search_handler) as second_server:
+            connection = connect(connection_url=','.join([first_server.url, second_server.url]), hedge_requests=True,
+                                 hedge_min_delay=0.05)
+            first_server.delay = second_server.delay = 0.3
+            connection.search(index='entity_data', body={}, scroll='1m')
+            searches = [request for request in first_server.requests + second_server.requests
+                        if request[0] != 'HEAD']
+            self.assertEqual(len(searches), 1)
+
+    def test_circuit_breaker_fails_fast(self):
+        statuses = [503]
+
+        def _handler(method, path, body):
+            if method == 'HEAD':
+                return 200, {}
+            return statuses[0], {'hits': {'total': 0, 'hits': []}}
+
+        with FakeElasticsearchServer(handler=_handler) as server:
+            connection = connect(connection_url=server.url, max_retries=0, circuit_breaker_failure_threshold=2,
+                                 circuit_breaker_reset_timeout=0.2)
+            for _ in range(2):
+                with self.assertRaises(TransportError):
+                    connection.search(index='entity_data', body={})
+            request_count = len(server.requests)
+            with self.assertRaises(CircuitBreakerOpenException):
+                connection.search(index='entity_data', body={})
+            self.assertEqual(len(server.requests), request_count)
+
+            statuses[0] = 200
+            time.sleep(0.25)
+            self.assertEqual(connection.search(index='entity_data', body={})['hits']['hits'], [])
+            self.assertEqual(connection.transport.circuit_breaker.state, 'closed')
@@ -1,7 +1,40 @@
 import csv
+import hashlib
+import json
 import os
+import threading
+import time
 from collections import defaultdict
 
+import six
+
+from lib.nlp.const import TOKENIZER
+
+log_prefix = 'datastore.utils'
+
+# Fields stored with each entity document alongside variants, holding for each variant (in the same order) its
+# lowercased tokens joined with a space and its number of tokens
+VARIANTS_NORMALIZED_FIELD = 'variants_normalized'
+VARIANTS_TOKEN_COUNT_FIELD = 'variants_token_count'
+
+# Field stored with each entity document holding the update marker of its last write, see get_update_marker
+UPDATED_AT_FIELD = 'updated_at'
+# Tombstone documents record deletions of entity values for DataStore.get_entity_changes. They keep the entity name in
+# their own field instead of entity_data so that queries on entity data never see them. A tombstone without a value
+# records deletion of all values of the entity
+DICTIONARY_DATA_TOMBSTONE = 'tombstone'
+TOMBSTONE_ENTITY_FIELD = 'tombstone_entity_data'
+# Manifests record for each entity populated from a csv file the content hash of the file and the update marker at
+# which population finished, so that repopulation can skip entities whose file and data did not change since. They
+# keep the entity name in their own field like tombstones
+DICTIONARY_DATA_MANIFEST = 'manifest'
+MANIFEST_ENTITY_FIELD = 'manifest_entity_data'
+MANIFEST_FILE_HASH_FIELD = 'file_hash'
+MANIFEST_POPULATED_AT_FIELD = 'populated_at'
+
+_last_update_marker = [0]
+_update_marker_lock = threading.Lock()
+
 
 def read_csv(file_path):
     """
@@ -17,6 +50,112 @@ def read_csv(file_path):
     return reader
 
 
+def get_variants_dictionary_value_from_key(csv_file_path, dictionary_key, logger, **kwargs):
+    """
+    Reads the csv file at csv_file_path and create a dictionary mapping
+    entity value to a list of their variants. The entity values are first column of the
+    csv file and their corresponding variants are stored in the second column delimited by '|'
+
+    Args:
+        csv_file_path: absolute file path of the csv file populate entity data from
+        dictionary_key: name of the entity to be put the values under
+        logger: logging object to log at debug and exception level
+        kwargs:
+            Ignored, accepted for compatibility with the callers passing on engine specific kwargs
+
+    Returns:
+        Dictionary mapping entity value to a list of their variants.
+    """
+    dictionary_value = defaultdict(list)
+    try:
+        csv_reader = read_csv(csv_file_path)
+        next(csv_reader)
+        for data_row in csv_reader:
+            try:
+                data = map(str.strip, data_row[1].split('|'))
+                # remove empty strings
+                data = [variant for variant in data if variant]
+                dictionary_value[_get_csv_row_value(data_row)].extend(data)
+
+            except Exception as e:
+                logger.exception('%s: \t\t== Exception in dict creation for keyword: %s -- %s -- %s =='
+                                 % (log_prefix, dictionary_key, data_row, e))
+
+    except Exception as e:
+        logger.exception(
+            '%s: \t\t\t=== Exception in __get_variants_dictionary_value_from_key() Dictionary Key: %s \n %s  ===' % (
+                log_prefix,
+                dictionary_key, e.message))
+
+    return dictionary_value
+
+
+def _get_csv_row_value(data_row):
+    """
+    Entity value of a row of an entity data csv file, with the same normalization as
+    get_variants_dictionary_value_from_key
+    """
+    return data_row[0].strip().replace('.', ' ')
+
+
+def iter_variants_from_csv(csv_file_path, dictionary_key, logger, **kwargs):
+    """
+    Streams (entity value, list of unique variants) pairs from the csv file at csv_file_path without holding the whole
+    file in memory. The file is read twice: the first pass only collects the values appearing on more than one row,
+    whose variants are merged and yielded after all other values, so that each value is yielded exactly once like in
+    remove_duplicate_data(get_variants_dictionary_value_from_key(...))
+
+    Args:
+        csv_file_path: absolute file path of the csv file populate entity data from
+        dictionary_key: name of the entity to be put the values under
+        logger: logging object to log at debug and exception level
+        kwargs:
+            Ignored, accepted for compatibility with the callers passing on engine specific kwargs
+
+    Yields:
+        tuple: entity value and list of its unique variants
+    """
+    try:
+        seen_values, repeated_values = set(), set()
+        with open(csv_file_path, 'rt') as file_object:
+            csv_reader = csv.reader(file_object)
+            next(csv_reader)
+            for data_row in csv_reader:
+                if data_row:
+                    value = _get_csv_row_value(data_row)
+                    if value in seen_values:
+                        repeated_values.add(value)
+                    seen_values.add(value)
+        del seen_values
+
+        repeated_value_variants = defaultdict(list)
+        with open(csv_file_path, 'rt') as file_object:
+            csv_reader = csv.reader(file_object)
+            next(csv_reader)
+            for data_row in csv_reader:
+                try:
+                    data = map(str.strip, data_row[1].split('|'))
+                    # remove empty strings
+                    data = [variant for variant in data if variant]
+                    value = _get_csv_row_value(data_row)
+                except Exception as e:
+                    logger.exception('%s: \t\t== Exception in dict creation for keyword: %s -- %s -- %s =='
+                                     % (log_prefix, dictionary_key, data_row, e))
+                    continue
+                if value in repeated_values:
+                    repeated_value_variants[value].extend(data)
+                else:
+                    yield value, list(set(data))
+
+        for value, variants in six.iteritems(repeated_value_variants):
+            yield value, list(set(variants))
+
+    except Exception as e:
+        logger.exception(
+            '%s: \t\t\t=== Exception in iter_variants_from_csv() Dictionary Key: %s \n %s  ===' % (
+                log_prefix, dictionary_key, e))
+
+
 def remove_duplicate_data(dictionary_value):
     """
     Removes duplicates from lists in a dictionary mapping keys to lists
@@ -55,3 +194,175 @@ def get_files_from_directory(directory_path):
         return []
     return [f for f in os.listdir(directory_path) if
             os.path.isfile(os.path.join(directory_path, f)) and f.endswith('.csv')]
+
+
+class NormalizedVariant(six.text_type):
+    """
+    Variant string which carries the tokens of its lowercased form, as precomputed at index time, so that consumers
+    of DataStore.get_similar_dictionary results need not tokenize it again. Behaves as a plain unicode string
+    otherwise (equality, hashing, string methods)
+
+    Attributes:
+        tokens (list): tokens of the lowercased variant as returned by TOKENIZER
+    """
+
+    def __new__(cls, variant, tokens):
+        normalized_variant = super(NormalizedVariant, cls).__new__(cls, variant)
+        normalized_variant.tokens = tokens
+        return normalized_variant
+
+    def __getnewargs__(self):
+        return six.text_type(self), self.tokens
+
+
+def get_variants_normalized_fields(variants):
+    """
+    Compute the normalized forms and token counts of variants to be stored at index time
+
+    Args:
+        variants (list): list of variants (str or unicode) of an entity value
+
+    Returns:
+        dict: VARIANTS_NORMALIZED_FIELD and VARIANTS_TOKEN_COUNT_FIELD mapped to lists parallel to variants
+
+    Example:
+        get_variants_normalized_fields([u'New  Delhi', u'', u'Dilli!'])
+
+        Output:
+            {'variants_normalized': [u'new delhi', u'', u'dilli'], 'variants_token_count': [2, 0, 1]}
+    """
+    normalized, token_counts = [], []
+    for variant in variants or []:
+        if isinstance(variant, bytes):
+            variant = variant.decode('utf-8')
+        tokens = TOKENIZER.tokenize(variant.lower()) if variant else []
+        normalized.append(u' '.join(tokens))
+        token_counts.append(len(tokens))
+    return {
+        VARIANTS_NORMALIZED_FIELD: normalized,
+        VARIANTS_TOKEN_COUNT_FIELD: token_counts,
+    }
+
+
+def get_variants_normalized_from_source(source):
+    """
+    Get normalized forms precomputed at index time for the variants of an entity document
+
+    Args:
+        source (dict): _source of an entity document
+
+    Returns:
+        dict or None: mapping each variant to its lowercased tokens joined with a space, None if the document was
+                      indexed without normalized fields
+    """
+    variants = source.get('variants') or []
+    normalized = source.get(VARIANTS_NORMALIZED_FIELD)
+    if normalized is None or len(normalized) != len(variants):
+        return None
+    return dict(zip(variants, normalized))
+
+
+def get_update_marker():
+    """
+    Get the marker to store with a document being written, milliseconds since epoch. Markers are strictly increasing
+    within a process even if the clock steps back, so documents written later always carry a larger marker
+
+    Returns:
+        int: update marker
+    """
+    with _update_marker_lock:
+        _last_update_marker[0] = max(int(time.time() * 1000), _last_update_marker[0] + 1)
+        return _last_update_marker[0]
+
+
+def get_entity_data_document_id(entity_name, value, language_script):
+    """
+    Get the id of the document holding variants of the entity value in the language. Ids are a stable hash of the
+    three, so writing a value again overwrites its document and documents can be looked up by id
+
+    Args:
+        entity_name (str): name of the entity
+        value (str or unicode): entity value
+        language_script (str): ISO 639 code of the language of the variants
+
+    Returns:
+        str: hex digest to use as document id
+    """
+    key = json.dumps([entity_name, value, language_script])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def get_file_content_hash(file_path):
+    """
+    Get the hash of the contents of a file, read in blocks
+
+    Args:
+        file_path (str): path of the file
+
+    Returns:
+        str: hex digest of the file contents
+    """
+    content_hash = hashlib.sha1()
+    with open(file_path, 'rb') as file_object:
+        for block in iter(lambda: file_object.read(1 << 16), b''):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+
+def get_entity_value_content_hash(value, variants):
+    """
+    Get a hash of an entity value and its variants which does not depend on the order or duplicates of variants, nor
+    on whether strings are utf-8 encoded bytes (as read from csv files) or unicode (as read from the datastore)
+
+    Args:
+        value (str or unicode): entity value
+        variants (list): variants of the value
+
+    Returns:
+        str: hex digest of the value and its variants
+    """
+    variants = set(variant.decode('utf-8') if isinstance(variant, bytes) else variant for variant in variants or [])
+    key = json.dumps([value, sorted(variants)])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def get_entity_data_delta(value_variants, existing_records, language_script):
+    """
+    Compare entity values and their variants read from a csv file to the records of the entity in the datastore,
+    using get_entity_value_content_hash of each side. A value is changed if its variants differ or if it is stored in
+    other languages as well, since populating an entity from a file replaces all its data
+
+    Args:
+        value_variants (iterable): (entity value, list of its variants) pairs, as yielded by iter_variants_from_csv
+        existing_records (iterable): records of the entity, as yielded by DataStore.iter_entity_data
+        language_script (str): language code of the variants read from the csv file
+
+    Returns:
+        dict: with
+            records (list): records (see DataStore.upsert_entity_data) of the added and changed values
+            added (list): values not in the datastore
+            changed (list): values in the datastore with other variants or in other languages
+            removed (list): values in the datastore and not in value_variants
+            unchanged (int): number of values to leave as they are
+            language_scripts (list): languages of existing_records
+    """
+    existing_hashes = defaultdict(dict)
+    for record in existing_records:
+        source = record['_source']
+        existing_hashes[source['value']][source.get('language_script')] = get_entity_value_content_hash(
+            source['value'], source.get('variants'))
+
+    delta = {'records': [], 'added': [], 'changed': [], 'removed': [], 'unchanged': 0,
+             'language_scripts': sorted(set(language for languages in existing_hashes.values()
+                                            for language in languages))}
+    for value, variants in value_variants:
+        value = value.decode('utf-8') if isinstance(value, bytes) else value
+        content_hash = get_entity_value_content_hash(value, variants)
+        languages = existing_hashes.pop(value, None)
+        if languages == {language_script: content_hash}:
+            delta['unchanged'] += 1
+            continue
+        delta['added' if languages is None else 'changed'].append(value)
+        delta['records'].append({'value': value, 'language_script': language_script, 'variants': variants})
+    delta['removed'] = list(existing_hashes)
+    return delta
@@ -14,13 +14,13 @@ from datastore.exceptions import IndexNotFoundException, InvalidESURLException,
 from chatbot_ner.config import ner_logger
 from external_api.constants import ENTITY_DATA, ENTITY_NAME, LANGUAGE_SCRIPT, ENTITY_LIST, \
     EXTERNAL_API_DATA, SENTENCE_LIST, READ_MODEL_FROM_S3, ES_CONFIG, READ_EMBEDDINGS_FROM_REMOTE_URL, \
-    LIVE_CRF_MODEL_PATH
+    LIVE_CRF_MODEL_PATH, RESPONSE_FORMAT, NDJSON_FORMAT
 
 from django.views.decorators.csrf import csrf_exempt
 from models.crf_v2.crf_train import CrfTrain
 
 from external_api.lib import dictionary_utils
-from external_api.response_utils import external_api_response_wrapper
+from external_api.response_utils import external_api_response_wrapper, ndjson_streaming_response
 from external_api.exceptions import APIHandlerException
 
 
@@ -31,21 +31,23 @@ def get_entity_word_variants(request):
         request (HttpResponse): HTTP response from url
 
     Returns:
-        HttpResponse : With data consisting of a list of value variants.
+        HttpResponse : With data consisting of a list of value variants sorted by value. If the format get param
+            is ndjson, a StreamingHttpResponse with one {"value", "variants", "language_script"} object per line
+            instead, in no particular order, see external_api.response_utils.ndjson_streaming_response
     """
     response = {"success": False, "error": "", "result": []}
     try:
         entity_name = request.GET.get(ENTITY_NAME)
         datastore_obj = DataStore()
-        result = datastore_obj.get_entity_dictionary(entity_name=entity_name)
-
-        structured_result = []
-        # The list around result.keys() is to make it compatible to python3
-        key_list = list(result.keys())
-        key_list.sort()
-        for value in key_list:
-            structured_result.append({'value': value, 'variants': result[value]})
-        result = structured_result
+        if request.GET.get(RESPONSE_FORMAT) == NDJSON_FORMAT:
+            records = datastore_obj.iter_entity_data(entity_name=entity_name)
+            return ndjson_streaming_response({'value': record['_source']['value'],
+                                              'variants': record['_source']['variants'],
+                                              'language_script': record['_source'].get('language_script')}
+                                             for record in records)
+        # Stream values from the datastore instead of materializing the raw hits and a dictionary on top of them
+        result = dict(datastore_obj.iter_entity_dictionary(entity_name=entity_name))
+        result = [{'value': value, 'variants': result[value]} for value in sorted(result)]
 
         response['result'] = result
         response['success'] = True
@@ -135,6 +137,36 @@ def transfer_entities(request):
     return HttpResponse(json.dumps(response), content_type='application/json', status=200)
 
 
+@csrf_exempt
+@external_api_response_wrapper
+def rebuild_index(request):
+    """
+    API call to rebuild the elasticsearch index behind the datastore alias on the cluster, see
+    DataStore.rebuild_index. POST without data starts a rebuild and returns its task_id, index and started_at. GET
+    with the task_id and index params returns its progress. POST with task_id, index and started_at in external_api_data
+    replays the writes made since the rebuild started and points the alias to the new index, once the copy completed
+    """
+    datastore_object = DataStore()
+    if request.method == 'POST':
+        if not request.POST.get(EXTERNAL_API_DATA):
+            return datastore_object.rebuild_index()
+        external_api_data = json.loads(request.POST.get(EXTERNAL_API_DATA))
+        task_id, index_name = external_api_data.get('task_id'), external_api_data.get('index')
+        started_at = external_api_data.get('started_at')
+        if not task_id or not index_name or started_at is None:
+            raise APIHandlerException('task_id, index and started_at are required')
+        return datastore_object.finalize_rebuild(task_id=task_id, index_name=index_name, started_at=int(started_at))
+
+    elif request.method == 'GET':
+        task_id, index_name = request.GET.get('task_id'), request.GET.get('index')
+        if not task_id or not index_name:
+            raise APIHandlerException('task_id and index are required')
+        return datastore_object.get_rebuild_status(task_id=task_id, index_name=index_name)
+
+    else:
+        raise APIHandlerException("{0} is not allowed.".format(request.method))
+
+
 def get_crf_training_data(request):
     """
     This function is used obtain the training data given the entity_name.
@@ -142,7 +174,9 @@ def get_crf_training_data(request):
          request (HttpResponse): HTTP response from url
 
      Returns:
-         HttpResponse : With data consisting of a dictionary consisting of sentence_list and entity_list
+         HttpResponse : With data consisting of a dictionary consisting of sentence_list and entity_list. If the
+            format get param is ndjson, a StreamingHttpResponse with one {"sentence", "entities"} object per line
+            instead, see external_api.response_utils.ndjson_streaming_response
 
      Examples:
          get request params
@@ -153,6 +187,10 @@ def get_crf_training_data(request):
     try:
         entity_name = request.GET.get(ENTITY_NAME)
         datastore_obj = DataStore()
+        if request.GET.get(RESPONSE_FORMAT) == NDJSON_FORMAT:
+            training_data = datastore_obj.iter_crf_data_for_entity_name(entity_name=entity_name)
+            return ndjson_streaming_response({'sentence': sentence, 'entities': entities}
+                                             for sentence, entities in training_data)
         result = datastore_obj.get_crf_data_for_entity_name(entity_name=entity_name)
         response['result'] = result
         response['success'] = True
@@ -316,7 +354,8 @@ def entity_data_view(request, entity_name):
             variant_search_term=params.get('variant_search_term', None),
             empty_variants_only=params.get('empty_variants_only', False),
             pagination_size=pagination_size,
-            pagination_from=pagination_from
+            pagination_from=pagination_from,
+            search_after=params.get('search_after', None)
         )
 
     elif request.method == 'POST':
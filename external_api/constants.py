@@ -8,3 +8,7 @@ READ_MODEL_FROM_S3 = 'read_model_from_s3'
 ES_CONFIG = 'es_config'
 READ_EMBEDDINGS_FROM_REMOTE_URL = 'read_embeddings_from_remote_url'
 LIVE_CRF_MODEL_PATH = 'live_crf_model_path'
+
+# Query param and its value selecting newline delimited JSON streaming responses for endpoints exporting whole entities
+RESPONSE_FORMAT = 'format'
+NDJSON_FORMAT = 'ndjson'
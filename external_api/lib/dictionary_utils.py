@@ -7,6 +7,8 @@ on other haptik repository.
 TODO: Move to consistent terminology and use 'value' everywhere
 """
 
+import collections
+
 from external_api.exceptions import APIHandlerException
 from datastore.datastore import DataStore
 
@@ -115,7 +117,7 @@ def get_records_from_values(entity_name, values=None):
                 }
     """
     datastore_obj = DataStore()
-    results = datastore_obj.get_entity_data(
+    results = datastore_obj.iter_entity_data(
         entity_name=entity_name,
         values=values
     )
@@ -152,11 +154,15 @@ def search_entity_values(
         variant_search_term=None,
         empty_variants_only=False,
         pagination_size=None,
-        pagination_from=None
+        pagination_from=None,
+        search_after=None
 ):
     """
     Searches for values within the specific entity. If pagination details not specified, all
-    data will be returned.
+    data will be returned. Values are returned in ascending order. Pages requested with search_after
+    are read starting after it, so that fetching a deep page costs the same as the first one. Paginating
+    with pagination_from instead needs all matching values to be fetched for every page, its pages
+    return search_after to switch to the cheaper pages.
 
     Args:
         entity_name (str): Name of the entity for which records are to be fetched
@@ -170,12 +176,29 @@ def search_entity_values(
             If it is None, the results will not be paginated
         pagination_from (int, optional): Offset to skip initial data (useful for pagination queries)
             If it is None, the results will not be paginated
+        search_after (str, optional): search_after returned with the previous page, used instead of
+            pagination_from to fetch the next page
     Returns:
-        dict: total records (for pagination) and a list of individual records which match by the search filters
+        dict: total records (for pagination), a list of individual records which match by the search filters
+            and search_after to fetch the next page (None if there is no next page or the results are not
+            paginated)
     """
     values = None
     total_records = None
-    if value_search_term or variant_search_term or empty_variants_only or pagination_size or pagination_from:
+    next_search_after = None
+    if pagination_size and pagination_size > 0 and search_after is not None:
+        page = DataStore().get_entity_values_page(
+            entity_name=entity_name,
+            size=pagination_size,
+            search_after=search_after,
+            value_search_term=value_search_term,
+            variant_search_term=variant_search_term,
+            empty_variants_only=empty_variants_only,
+        )
+        values = page['values']
+        total_records = page['total']
+        next_search_after = page['search_after']
+    elif value_search_term or variant_search_term or empty_variants_only or pagination_size or pagination_from:
         values = get_entity_unique_values(
             entity_name=entity_name,
             value_search_term=value_search_term,
@@ -184,9 +207,16 @@ def search_entity_values(
         )
         total_records = len(values)
         if pagination_size > 0 and pagination_from >= 0:
-            values = values[pagination_from:pagination_from + pagination_size]
+            pagination_to = pagination_from + pagination_size
+            if pagination_to < len(values):
+                next_search_after = values[pagination_to - 1]
+            values = values[pagination_from:pagination_to]
 
     records_dict = get_records_from_values(entity_name, values)
+    if values is not None:
+        # keep the order of the values
+        records_dict = collections.OrderedDict(
+            (value, records_dict[value]) for value in values if value in records_dict)
     records_list = []
     for value, variant_data in records_dict.items():
         records_list.append({
@@ -199,7 +229,8 @@ def search_entity_values(
 
     return {
         'records': records_list,
-        'total': total_records
+        'total': total_records,
+        'search_after': next_search_after
     }
 
 
@@ -215,7 +246,6 @@ def update_entity_records(entity_name, data):
     Returns:
         None
     """
-    # Delete some records first
     records_to_delete = data.get('deleted', [])
     records_to_create = data.get('edited', [])
     replace_data = data.get('replace')
@@ -236,8 +266,8 @@ def update_entity_records(entity_name, data):
                     'variants': variants.get('value', [])
                 })
 
-    # delete words
-    delete_records_by_values(entity_name=entity_name, values=values_to_delete)
-
+    # Edited words overwrite their records in place, records of deleted words and languages removed from edited
+    # words are deleted in the same pass
     datastore_obj = DataStore()
-    datastore_obj.add_entity_data(entity_name, value_variants_to_create)
+    datastore_obj.upsert_entity_data(entity_name=entity_name, value_variant_records=value_variants_to_create,
+                                     values_to_delete=values_to_delete)
@@ -1,15 +1,18 @@
 from __future__ import absolute_import
 
+import itertools
 import json
 from functools import wraps
 
 # Django
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 # Local imports
 from external_api.exceptions import APIHandlerException
 from chatbot_ner.config import ner_logger
 
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
 
 class APIResponse(object):
     def __init__(self):
@@ -60,3 +63,36 @@ def external_api_response_wrapper(view_func):
         return response.toHttpResponse()
 
     return wrapper
+
+
+def ndjson_streaming_response(records):
+    """
+    Stream records as newline delimited JSON, one record per line, so that memory use does not grow with the number
+    of records and the first bytes are sent as soon as the first record is read.
+
+    The first record is read before the response is returned, so that errors raised while connecting to or
+    querying the datastore propagate to the caller and can still be answered with an error status. Errors raised
+    after streaming has started can not change the status anymore, the stream then ends with a line
+    {"success": false, "error": "..."}
+
+    Args:
+        records (iterable): JSON serializable records, typically a generator reading from the datastore
+
+    Returns:
+        django.http.StreamingHttpResponse: response streaming the records
+    """
+    records = iter(records)
+    try:
+        first_record = next(records)
+    except StopIteration:
+        return StreamingHttpResponse(iter([]), content_type=NDJSON_CONTENT_TYPE, status=200)
+
+    def _generate_lines():
+        try:
+            for record in itertools.chain([first_record], records):
+                yield json.dumps(record) + '\n'
+        except Exception as e:
+            ner_logger.exception('Error while streaming response: %s' % e)
+            yield json.dumps({'success': False, 'error': str(e)}) + '\n'
+
+    return StreamingHttpResponse(_generate_lines(), content_type=NDJSON_CONTENT_TYPE, status=200)
@@ -4,7 +4,7 @@ from django.test.client import RequestFactory
 from django.test.testcases import TestCase
 from mock import patch
 
-from external_api.api import entity_data_list_view
+from external_api.api import entity_data_list_view, get_entity_word_variants, get_crf_training_data
 
 
 class ExternalAPITestCase(TestCase):
@@ -26,3 +26,51 @@ class ExternalAPITestCase(TestCase):
 
         self.assertEqual(200, response.status_code)
         self.assertEqual(json.dumps(expected_content), response.content)
+
+
+class NDJSONExportTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    @patch('external_api.api.DataStore')
+    def test_entity_word_variants_streamed(self, datastore_mock):
+        datastore_mock.return_value.iter_entity_data.return_value = iter([
+            {'_source': {'value': u'Mumbai', 'variants': [u'Bombay'], 'language_script': 'en'}},
+            {'_source': {'value': u'Pune', 'variants': [], 'language_script': 'en'}},
+        ])
+        request = self.factory.get('/entities/get_entity_word_variants', {'entity_name': 'city', 'format': 'ndjson'})
+
+        response = get_entity_word_variants(request)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/x-ndjson', response['Content-Type'])
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'value': u'Mumbai', 'variants': [u'Bombay'], 'language_script': 'en'},
+            {'value': u'Pune', 'variants': [], 'language_script': 'en'}])
+
+    @patch('external_api.api.DataStore')
+    def test_error_before_streaming_returns_500(self, datastore_mock):
+        datastore_mock.return_value.iter_crf_data_for_entity_name.side_effect = ValueError('no connection')
+        request = self.factory.get('/entities/get_crf_training_data', {'entity_name': 'city', 'format': 'ndjson'})
+
+        response = get_crf_training_data(request)
+
+        self.assertEqual(500, response.status_code)
+        self.assertEqual('no connection', json.loads(response.content)['error'])
+
+    @patch('external_api.api.DataStore')
+    def test_error_while_streaming_ends_stream_with_error(self, datastore_mock):
+        def _training_data(entity_name):
+            yield u'hello pratik', [u'pratik']
+            raise ValueError('scroll expired')
+
+        datastore_mock.return_value.iter_crf_data_for_entity_name.side_effect = _training_data
+        request = self.factory.get('/entities/get_crf_training_data', {'entity_name': 'name', 'format': 'ndjson'})
+
+        response = get_crf_training_data(request)
+
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [
+            {'sentence': u'hello pratik', 'entities': [u'pratik']}, {'success': False, 'error': 'scroll expired'}])
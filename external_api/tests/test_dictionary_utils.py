@@ -0,0 +1,59 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+import mock
+from django.test import TestCase
+
+from datastore.datastore import DataStore
+from external_api.lib import dictionary_utils
+
+
+class SearchEntityValuesTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        settings = {'engine': 'sqlite', 'sqlite': {'database_path': os.path.join(self.directory, 'datastore.sqlite3')}}
+        for patcher in [mock.patch('datastore.datastore.CHATBOT_NER_DATASTORE', settings),
+                        mock.patch('datastore.datastore.DATASTORE_CACHE_GENERATION_DIR', self.directory),
+                        mock.patch.dict(DataStore._instanceDict, clear=True)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.datastore = DataStore()
+        self.datastore.create()
+        # Values in both languages come first when ordered by number of documents
+        self.datastore.add_entity_data(entity_name='city', value_variant_records=[
+            {'value': u'Ahmedabad', 'language_script': 'en', 'variants': [u'Ahmedabad']},
+            {'value': u'Bengaluru', 'language_script': 'en', 'variants': [u'Bangalore']},
+            {'value': u'Chennai', 'language_script': 'en', 'variants': [u'Madras']},
+            {'value': u'Delhi', 'language_script': 'en', 'variants': [u'Delhi']},
+            {'value': u'Delhi', 'language_script': 'hi', 'variants': [u'दिल्ली']},
+            {'value': u'Goa', 'language_script': 'en', 'variants': [u'Goa']},
+            {'value': u'Mumbai', 'language_script': 'en', 'variants': [u'Bombay']},
+            {'value': u'Mumbai', 'language_script': 'hi', 'variants': [u'मुंबई']},
+        ])
+        self.values = [u'Ahmedabad', u'Bengaluru', u'Chennai', u'Delhi', u'Goa', u'Mumbai']
+
+    def tearDown(self):
+        self.datastore._client_or_connection.close()
+        shutil.rmtree(self.directory)
+
+    def test_pages_by_offset_and_search_after_agree(self):
+        offset_pages = [dictionary_utils.search_entity_values(entity_name='city', pagination_size=2,
+                                                              pagination_from=pagination_from)
+                        for pagination_from in (0, 2, 4)]
+        self.assertEqual([record['word'] for page in offset_pages for record in page['records']], self.values)
+        self.assertEqual([page['total'] for page in offset_pages], [6, 6, 6])
+        self.assertEqual([page['search_after'] for page in offset_pages], [u'Bengaluru', u'Delhi', None])
+        self.assertEqual(sorted(offset_pages[1]['records'][1]['variants']), ['en', 'hi'])
+
+        # continuing from an offset page with search_after gives the same pages
+        page = dictionary_utils.search_entity_values(entity_name='city', pagination_size=2,
+                                                     search_after=offset_pages[0]['search_after'])
+        self.assertEqual(page, offset_pages[1])
+        page = dictionary_utils.search_entity_values(entity_name='city', pagination_size=2,
+                                                     search_after=page['search_after'])
+        self.assertEqual(page, offset_pages[2])
@@ -0,0 +1,139 @@
+from __future__ import absolute_import
+
+from collections import deque
+
+
+class TokenAhoCorasick(object):
+    """
+    Aho-Corasick automaton over sequences of tokens instead of characters. It finds all occurrences of any of the
+    added token sequences (keys) in a list of tokens in a single linear scan, independent of the number of keys.
+
+    For Example:
+        automaton = TokenAhoCorasick()
+        automaton.add((u'new', u'delhi'), u'New Delhi')
+        automaton.add((u'delhi',), u'New Delhi')
+        automaton.add((u'goa',), u'Goa')
+        automaton.find_longest_leftmost([u'from', u'new', u'delhi', u'to', u'goa'])
+        >> [(1, 3, u'New Delhi'), (4, 5, u'Goa')]
+
+    Keys can be added only before the first search, the automaton is built lazily on first search.
+    """
+
+    def __init__(self):
+        # Trie of tokens, node 0 is the root. Each node has transitions, failure link and length of the longest key
+        # ending at this node (0 if none) along with its payload
+        self._transitions = [{}]
+        self._failure = [0]
+        self._key_length = [0]
+        self._payload = [None]
+        # Link to the nearest node on the failure chain that ends a key, used to report all keys ending at a position
+        self._output_link = [0]
+        self._built = False
+
+    def __len__(self):
+        return sum(1 for length in self._key_length if length)
+
+    def add(self, tokens, payload):
+        """
+        Add a key to the automaton. If the key was already added, the payload of the first add is kept
+
+        Args:
+            tokens (iterable): non empty sequence of tokens to search for
+            payload (object): value returned along with occurrences of this key
+
+        Raises:
+            ValueError: if the automaton is already built
+        """
+        if self._built:
+            raise ValueError('Keys can not be added after the automaton is built')
+        tokens = tuple(tokens)
+        if not tokens:
+            return
+
+        node = 0
+        for token in tokens:
+            next_node = self._transitions[node].get(token)
+            if next_node is None:
+                next_node = len(self._transitions)
+                self._transitions.append({})
+                self._failure.append(0)
+                self._key_length.append(0)
+                self._payload.append(None)
+                self._output_link.append(0)
+                self._transitions[node][token] = next_node
+            node = next_node
+
+        if not self._key_length[node]:
+            self._key_length[node] = len(tokens)
+            self._payload[node] = payload
+
+    def _build(self):
+        """
+        Compute failure and output links breadth first
+        """
+        queue = deque()
+        for child in self._transitions[0].values():
+            self._failure[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for token, child in self._transitions[node].items():
+                failure = self._failure[node]
+                while failure and token not in self._transitions[failure]:
+                    failure = self._failure[failure]
+                self._failure[child] = self._transitions[failure].get(token, 0)
+                if self._failure[child] == child:
+                    self._failure[child] = 0
+                fallback = self._failure[child]
+                self._output_link[child] = fallback if self._key_length[fallback] else self._output_link[fallback]
+                queue.append(child)
+
+        self._built = True
+
+    def find_all(self, tokens):
+        """
+        Find all, possibly overlapping, occurrences of keys in tokens
+
+        Args:
+            tokens (list): tokens to search in
+
+        Returns:
+            list: list of (start, end, payload) tuples, tokens[start:end] being the key, ordered by end
+        """
+        if not self._built:
+            self._build()
+
+        matches = []
+        node = 0
+        for position, token in enumerate(tokens):
+            while node and token not in self._transitions[node]:
+                node = self._failure[node]
+            node = self._transitions[node].get(token, 0)
+
+            output = node if self._key_length[node] else self._output_link[node]
+            while output:
+                end = position + 1
+                matches.append((end - self._key_length[output], end, self._payload[output]))
+                output = self._output_link[output]
+
+        return matches
+
+    def find_longest_leftmost(self, tokens):
+        """
+        Find non overlapping occurrences of keys in tokens preferring the leftmost and then the longest occurrence
+
+        Args:
+            tokens (list): tokens to search in
+
+        Returns:
+            list: list of (start, end, payload) tuples, tokens[start:end] being the key, ordered by start
+        """
+        matches = sorted(self.find_all(tokens), key=lambda match: (match[0], match[0] - match[1]))
+        selected = []
+        covered_until = 0
+        for start, end, payload in matches:
+            if start >= covered_until:
+                selected.append((start, end, payload))
+                covered_until = end
+        return selected
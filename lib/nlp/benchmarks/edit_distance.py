@@ -0,0 +1,110 @@
+"""
+Microbenchmark edit distance kernels on token pairs of realistic lengths
+
+Usage:
+    python -m lib.nlp.benchmarks.edit_distance --text_tokens 20 --variant_tokens 500 --max_distance 2
+
+Random lowercase tokens of 3 to 12 characters are generated as variant tokens, text tokens are variant tokens with
+a typo or unrelated tokens. Every text token is compared with every variant token, which is what text detection
+does for a message against the variants returned by the datastore. Reports the time per run for the unbounded
+dynamic programming, the banded scalar kernel, the batched numpy kernel and the memo, along with the speedup over
+the unbounded kernel.
+"""
+from __future__ import absolute_import, print_function
+
+import argparse
+import random
+import timeit
+
+from lib.nlp.levenshtein_distance import edit_distance, edit_distances, EditDistanceCache
+
+LETTERS = u'abcdefghijklmnopqrstuvwxyz'
+
+
+def _random_token(rng):
+    return u''.join(rng.choice(LETTERS) for _ in range(rng.randint(3, 12)))
+
+
+def _add_typo(token, rng):
+    """
+    Apply a single random edit (insert, delete or substitute) to a token
+    """
+    position = rng.randint(0, len(token) - 1)
+    operation = rng.choice(['insert', 'delete', 'substitute'])
+    letter = rng.choice(LETTERS)
+    if operation == 'insert':
+        return token[:position] + letter + token[position:]
+    elif operation == 'delete' and len(token) > 1:
+        return token[:position] + token[position + 1:]
+    return token[:position] + letter + token[position + 1:]
+
+
+def generate_tokens(text_tokens_count, variant_tokens_count, typo_probability=0.5, seed=0):
+    """
+    Generate text tokens and variant tokens to compare
+
+    Args:
+        text_tokens_count (int): number of text tokens
+        variant_tokens_count (int): number of variant tokens
+        typo_probability (float, optional): probability of a text token being a misspelt variant token rather than
+                                            an unrelated token
+        seed (int, optional): seed for the random number generator, for reproducible runs
+
+    Returns:
+        tuple:
+            list: text tokens
+            list: variant tokens
+    """
+    rng = random.Random(seed)
+    variant_tokens = [_random_token(rng) for _ in range(variant_tokens_count)]
+    text_tokens = [_add_typo(rng.choice(variant_tokens), rng) if rng.random() < typo_probability
+                   else _random_token(rng) for _ in range(text_tokens_count)]
+    return text_tokens, variant_tokens
+
+
+def run(text_tokens_count, variant_tokens_count, max_distance, repeat, seed=0):
+    text_tokens, variant_tokens = generate_tokens(text_tokens_count, variant_tokens_count, seed=seed)
+
+    def unbounded():
+        return [[min(edit_distance(text_token, variant_token), max_distance) for variant_token in variant_tokens]
+                for text_token in text_tokens]
+
+    def banded():
+        return [[edit_distance(text_token, variant_token, max_distance=max_distance)
+                 for variant_token in variant_tokens] for text_token in text_tokens]
+
+    def batched():
+        return [edit_distances(text_token, variant_tokens, max_distance=max_distance) for text_token in text_tokens]
+
+    def memo():
+        # batched prefetch followed by a lookup for every pair, as done by text detection
+        cache = EditDistanceCache()
+        for text_token in text_tokens:
+            cache.prefetch(text_token, variant_tokens, max_distance=max_distance)
+        return [[cache.distance(text_token, variant_token, max_distance=max_distance)
+                 for variant_token in variant_tokens] for text_token in text_tokens]
+
+    expected = unbounded()
+    print('%-10s %12s %8s %6s' % ('kernel', 'ms_per_run', 'speedup', 'same'))
+    baseline_ms = None
+    for name, kernel in (('unbounded', unbounded), ('banded', banded), ('batched', batched), ('memo', memo)):
+        milliseconds = min(timeit.repeat(kernel, number=1, repeat=repeat)) * 1000.0
+        baseline_ms = baseline_ms or milliseconds
+        print('%-10s %12.3f %8.2f %6s' % (name, milliseconds, baseline_ms / milliseconds, kernel() == expected))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark edit distance kernels')
+    parser.add_argument('--text_tokens', type=int, default=20, help='number of text tokens')
+    parser.add_argument('--variant_tokens', type=int, default=500, help='number of variant tokens')
+    parser.add_argument('--max_distance', type=int, default=2, help='max_distance passed to the kernels')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per kernel, the fastest is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    run(text_tokens_count=args.text_tokens, variant_tokens_count=args.variant_tokens,
+        max_distance=args.max_distance, repeat=args.repeat, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
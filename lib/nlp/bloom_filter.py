@@ -0,0 +1,82 @@
+from __future__ import absolute_import
+
+import hashlib
+import math
+import struct
+
+
+class BloomFilter(object):
+    """
+    Compact probabilistic set membership structure. Membership tests never give false negatives, i.e. an added item
+    is always reported as present, but may give false positives with probability close to error_rate once capacity
+    items have been added.
+
+    For Example:
+        bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+        bloom_filter.add(u'chennai')
+        u'chennai' in bloom_filter
+        >> True
+        u'mumbai' in bloom_filter
+        >> False (True with probability ~0.01)
+
+    Attributes:
+        capacity (int): number of items the filter is sized for
+        error_rate (float): false positive probability at capacity
+        num_bits (int): size of the bit array
+        num_hashes (int): number of bit positions set per item
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        Args:
+            capacity (int): number of items the filter is sized for
+            error_rate (float, optional): false positive probability at capacity, between 0 and 1. Defaults to 0.01
+
+        Raises:
+            ValueError: if error_rate is not between 0 and 1
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError('error_rate must be between 0 and 1')
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.num_bits = max(int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.num_hashes = max(int(round(float(self.num_bits) / self.capacity * math.log(2))), 1)
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def size_in_bytes(self):
+        return len(self._bits)
+
+    def _get_positions(self, item):
+        """
+        Get bit positions of the item using double hashing on two halves of its md5 digest
+
+        Args:
+            item (unicode or str): item to hash
+
+        Returns:
+            generator: num_hashes bit positions
+        """
+        if not isinstance(item, bytes):
+            item = item.encode('utf-8')
+        hash1, hash2 = struct.unpack('<QQ', hashlib.md5(item).digest())
+        return ((hash1 + i * hash2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item):
+        """
+        Add an item to the filter
+
+        Args:
+            item (unicode or str): item to add
+        """
+        for position in self._get_positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, item):
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._get_positions(item))
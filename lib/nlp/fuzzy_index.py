@@ -0,0 +1,129 @@
+from __future__ import absolute_import
+
+from collections import defaultdict
+
+from lib.nlp.levenshtein_distance import damerau_levenshtein_distance
+
+
+def get_deletion_neighbourhood(string, max_distance):
+    """
+    Get all strings obtained by deleting upto max_distance characters from string, including string itself. Two
+    strings within max_distance Levenshtein (or Damerau-Levenshtein) edits of each other always share at least one
+    string of their deletion neighbourhoods
+
+    Args:
+        string (unicode): string to generate the deletion neighbourhood for
+        max_distance (int): maximum number of deletions
+
+    Returns:
+        set: set of strings
+    """
+    keys = {string}
+    frontier = {string}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for item in frontier:
+            for i in range(len(item)):
+                next_frontier.add(item[:i] + item[i + 1:])
+        next_frontier -= keys
+        if not next_frontier:
+            break
+        keys |= next_frontier
+        frontier = next_frontier
+    return keys
+
+
+class FuzzyTokenIndex(object):
+    """
+    In-memory fuzzy lookup structure over a vocabulary of tokens based on deletion neighbourhoods (as used by
+    SymSpell). Every token is stored under all the strings that can be obtained by deleting up to max_distance
+    characters from it. At lookup time the same deletions are generated for the query token and all vocabulary
+    tokens sharing any of these keys are verified with Damerau-Levenshtein distance.
+
+    Like elasticsearch fuzzy queries with prefix_length, the first prefix_length characters of a token must match
+    exactly and are never edited.
+
+    For Example:
+        index = FuzzyTokenIndex(max_distance=2, prefix_length=1)
+        for token in [u'delhi', u'mumbai', u'chennai', u'madras']:
+            index.add(token)
+        index.lookup(u'chenai', max_distance=1)
+        >> [(u'chennai', 1)]
+
+    Attributes:
+        max_distance (int): maximum edit distance supported by lookups on this index
+        prefix_length (int): number of leading characters that must match exactly
+    """
+
+    def __init__(self, max_distance=2, prefix_length=1):
+        """
+        Args:
+            max_distance (int, optional): maximum edit distance supported by lookups on this index. Defaults to 2
+                                          which is also the maximum fuzziness elasticsearch allows
+            prefix_length (int, optional): number of leading characters that must match exactly. Defaults to 1
+        """
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self._vocabulary = set()
+        self._deletes = defaultdict(set)
+
+    def __len__(self):
+        return len(self._vocabulary)
+
+    def __contains__(self, token):
+        return token in self._vocabulary
+
+    def _deletion_keys(self, token, max_distance):
+        """
+        Generate keys for all strings obtained by deleting upto max_distance characters from token after
+        the fixed prefix
+
+        Args:
+            token (unicode): token to generate the deletion neighbourhood for
+            max_distance (int): maximum number of deletions
+
+        Returns:
+            set: set of (prefix, suffix with deletions) tuples
+        """
+        prefix, suffix = token[:self.prefix_length], token[self.prefix_length:]
+        return {(prefix, key) for key in get_deletion_neighbourhood(suffix, max_distance)}
+
+    def add(self, token):
+        """
+        Add a token to the index
+
+        Args:
+            token (unicode): token to add
+        """
+        if not token or token in self._vocabulary:
+            return
+        self._vocabulary.add(token)
+        for key in self._deletion_keys(token, self.max_distance):
+            self._deletes[key].add(token)
+
+    def lookup(self, token, max_distance):
+        """
+        Find all the tokens in the index that are within max_distance Damerau-Levenshtein edits of the given token
+
+        Args:
+            token (unicode): query token
+            max_distance (int): maximum edit distance allowed, clipped to the max_distance of the index
+
+        Returns:
+            list: list of (token, distance) tuples sorted by distance and then token
+        """
+        max_distance = min(max(max_distance, 0), self.max_distance)
+        if max_distance == 0:
+            return [(token, 0)] if token in self._vocabulary else []
+
+        candidates = set()
+        for key in self._deletion_keys(token, max_distance):
+            candidates.update(self._deletes.get(key, ()))
+
+        matches = []
+        for candidate in candidates:
+            distance = damerau_levenshtein_distance(candidate, token, max_distance=max_distance)
+            if distance <= max_distance:
+                matches.append((candidate, distance))
+        matches.sort(key=lambda match: (match[1], match[0]))
+        return matches
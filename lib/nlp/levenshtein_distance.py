@@ -1,7 +1,36 @@
+from __future__ import absolute_import
+
+import numpy as np
+
+
+def _decode(string):
+    if isinstance(string, bytes):
+        return string.decode('utf-8')
+    return string
+
+
+def _get_band_width(insertion_cost, deletion_cost, max_distance):
+    """
+    Get the maximum number of unmatched characters (i.e. the distance from the diagonal of the dynamic programming
+    matrix) an alignment can have without its cost exceeding max_distance
+
+    Returns:
+        int or None: band width, None if the band can not be bounded because of non positive costs
+    """
+    min_cost = min(insertion_cost, deletion_cost)
+    if min_cost <= 0:
+        return None
+    return int(max_distance // min_cost)
+
+
 def edit_distance(string1, string2, insertion_cost=1, deletion_cost=1, substitution_cost=2, max_distance=None):
     """
     Calculate the weighted levenshtein distance between two strings
 
+    When max_distance is given only the diagonal band of the dynamic programming matrix that alignments within
+    max_distance can pass through is computed and the computation stops as soon as a whole row exceeds
+    max_distance
+
     Args:
         string1 (unicode): unicode string. If any encoded string type 'str' is passed, it will be decoded using utf-8
         string2 (unicode): unicode string. If any encoded string type 'str' is passed, it will be decoded using utf-8
@@ -22,26 +51,243 @@ def edit_distance(string1, string2, insertion_cost=1, deletion_cost=1, substitut
     So, whenever distance exceeds the max_distance the function will break and return the max_distance else
     it will return levenshtein distance
     """
-    if isinstance(string1, bytes):
-        string1 = string1.decode('utf-8')
+    string1, string2 = _decode(string1), _decode(string2)
 
-    if isinstance(string2, bytes):
-        string2 = string2.decode('utf-8')
+    if string1 == string2:
+        return 0
 
     if len(string1) > len(string2):
         string1, string2 = string2, string1
-    distances = range(len(string1) + 1)
+
+    band_width = _get_band_width(insertion_cost, deletion_cost, max_distance) if max_distance else None
+    if band_width is None:
+        band_width = len(string2)
+    elif len(string2) - len(string1) > band_width:
+        return max_distance
+
+    infinity = float('inf')
+    distances = list(range(len(string1) + 1))
     for index2, char2 in enumerate(string2):
-        new_distances = [index2 + 1]
-        for index1, char1 in enumerate(string1):
-            if char1 == char2:
-                new_distances.append(distances[index1])
+        # only columns index1 + 1 in [index2 + 1 - band_width, index2 + 1 + band_width] can be within the band
+        low = max(0, index2 - band_width)
+        high = min(len(string1), index2 + 1 + band_width)
+        new_distances = [infinity] * (len(string1) + 1)
+        new_distances[0] = index2 + 1 if low == 0 else infinity
+        for index1 in range(low, high):
+            if string1[index1] == char2:
+                new_distances[index1 + 1] = distances[index1]
             else:
-                new_distances.append(min((distances[index1] + substitution_cost,
-                                         distances[index1 + 1] + insertion_cost,
-                                         new_distances[-1] + deletion_cost)))
+                new_distances[index1 + 1] = min(distances[index1] + substitution_cost,
+                                                distances[index1 + 1] + insertion_cost,
+                                                new_distances[index1] + deletion_cost)
         distances = new_distances
-        if max_distance and min(new_distances) > max_distance:
+        if max_distance and min(distances[low:high + 1]) > max_distance:
             return max_distance
 
+    if max_distance and distances[-1] > max_distance:
+        return max_distance
     return distances[-1]
+
+
+def edit_distances(string, candidates, insertion_cost=1, deletion_cost=1, substitution_cost=2, max_distance=None):
+    """
+    Calculate the weighted levenshtein distance (see edit_distance) between a string and each of the candidates at
+    once. The dynamic programming rows for all candidates are computed together as numpy arrays, so the cost is
+    mostly independent of the number of candidates
+
+    Args:
+        string (unicode): string to compare with candidates, same as string1 of edit_distance
+        candidates (list): list of unicode strings, each same as string2 of edit_distance
+        insertion_cost (int, optional): cost penalty for insertion operation, defaults to 1
+        deletion_cost (int, optional): cost penalty for deletion operation, defaults to 1
+        substitution_cost (int, optional): cost penalty for substitution operation, defaults to 2
+        max_distance (int, optional): distances larger than this are returned as max_distance. If None complete
+                                      edit distances are returned. Defaults to None
+
+    Returns:
+        list: edit_distance(string, candidate, ...) for every candidate, in the same order
+
+    For Example:
+        edit_distances('chennai', ['chenai', 'chennai', 'mumbai'], max_distance=2)
+        >> [1, 0, 2]
+    """
+    string = _decode(string)
+    candidates = [_decode(candidate) for candidate in candidates]
+    results = [None] * len(candidates)
+
+    band_width = _get_band_width(insertion_cost, deletion_cost, max_distance) if max_distance else None
+    pending = []
+    for i, candidate in enumerate(candidates):
+        if candidate == string:
+            results[i] = 0
+        elif band_width is not None and abs(len(candidate) - len(string)) > band_width:
+            results[i] = max_distance
+        else:
+            pending.append(i)
+
+    if not pending:
+        return results
+
+    width = max(len(candidates[i]) for i in pending)
+    codes = np.full((len(pending), width), -1, dtype=np.int64)
+    lengths = np.zeros(len(pending), dtype=np.int64)
+    for row, i in enumerate(pending):
+        candidate = candidates[i]
+        codes[row, :len(candidate)] = [ord(char) for char in candidate]
+        lengths[row] = len(candidate)
+
+    # edit_distance swaps the strings when string is longer than the candidate, which swaps the roles of
+    # insertion and deletion costs. Columns follow the candidate and rows follow the string
+    swapped = lengths < len(string)
+    candidate_only_cost = np.where(swapped, deletion_cost, insertion_cost).astype(np.float64)[:, np.newaxis]
+    string_only_cost = np.where(swapped, insertion_cost, deletion_cost).astype(np.float64)[:, np.newaxis]
+
+    columns = np.arange(width + 1, dtype=np.float64)[np.newaxis, :]
+    valid = columns <= lengths[:, np.newaxis]
+    distances = np.repeat(columns, len(pending), axis=0)
+    exceeded = np.zeros(len(pending), dtype=bool)
+    for index, char in enumerate(string):
+        same = codes == ord(char)
+        # cost of reaching each cell from the previous row (diagonal or vertical move)
+        base = np.minimum(np.where(same, distances[:, :-1], distances[:, :-1] + substitution_cost),
+                          distances[:, 1:] + string_only_cost)
+        base = np.concatenate([np.full((len(pending), 1), index + 1, dtype=np.float64), base], axis=1)
+        # horizontal moves within the row: new[j] = min over k <= j of base[k] + (j - k) * cost
+        steps = columns * candidate_only_cost
+        distances = np.minimum.accumulate(base - steps, axis=1) + steps
+        if max_distance:
+            exceeded |= np.where(valid, distances, np.inf).min(axis=1) > max_distance
+            if exceeded.all():
+                break
+
+    final = distances[np.arange(len(pending)), lengths]
+    for row, i in enumerate(pending):
+        distance = final[row]
+        if max_distance and (exceeded[row] or distance > max_distance):
+            results[i] = max_distance
+        else:
+            results[i] = int(distance) if distance == int(distance) else float(distance)
+
+    return results
+
+
+class EditDistanceCache(object):
+    """
+    Memo of edit_distance results, meant to be used for the lifetime of a single request where the same pairs
+    of tokens get compared repeatedly. Results computed with some max_distance are reused for lookups with the same
+    or a smaller max_distance
+
+    For Example:
+        cache = EditDistanceCache()
+        cache.prefetch(u'chennai', [u'chenai', u'mumbai', u'madras'], max_distance=3)
+        cache.distance(u'chennai', u'chenai', max_distance=2)
+        >> 1
+
+    Attributes:
+        insertion_cost (int): cost penalty for insertion operation
+        deletion_cost (int): cost penalty for deletion operation
+        substitution_cost (int): cost penalty for substitution operation
+    """
+
+    def __init__(self, insertion_cost=1, deletion_cost=1, substitution_cost=2):
+        self.insertion_cost = insertion_cost
+        self.deletion_cost = deletion_cost
+        self.substitution_cost = substitution_cost
+        self._distances = {}
+
+    def __len__(self):
+        return len(self._distances)
+
+    def _get(self, string1, string2, max_distance):
+        """
+        Returns:
+            int or None: memoized distance valid for max_distance, None if not available
+        """
+        entry = self._distances.get((string1, string2))
+        if entry is None:
+            return None
+        distance, computed_max_distance = entry
+        if computed_max_distance is None or distance < computed_max_distance:
+            # exact distance
+            return min(distance, max_distance) if max_distance else distance
+        if max_distance and max_distance <= computed_max_distance:
+            return min(distance, max_distance)
+        return None
+
+    def distance(self, string1, string2, max_distance=None):
+        """
+        Same as edit_distance(string1, string2, max_distance=max_distance) with the costs of this cache
+        """
+        distance = self._get(string1, string2, max_distance)
+        if distance is None:
+            distance = edit_distance(string1, string2, insertion_cost=self.insertion_cost,
+                                     deletion_cost=self.deletion_cost, substitution_cost=self.substitution_cost,
+                                     max_distance=max_distance)
+            self._distances[(string1, string2)] = (distance, max_distance or None)
+        return distance
+
+    def prefetch(self, string, candidates, max_distance=None):
+        """
+        Compute distances between string and all the candidates not memoized yet in a single batch (see
+        edit_distances) so that later calls to distance() for these pairs are served from the memo
+
+        Args:
+            string (unicode): string to compare with candidates, same as string1 of edit_distance
+            candidates (iterable): unicode strings, each same as string2 of edit_distance
+            max_distance (int, optional): maximum distance of interest. Defaults to None
+        """
+        candidates = [candidate for candidate in set(candidates)
+                      if self._get(string, candidate, max_distance) is None]
+        if not candidates:
+            return
+        distances = edit_distances(string, candidates, insertion_cost=self.insertion_cost,
+                                   deletion_cost=self.deletion_cost, substitution_cost=self.substitution_cost,
+                                   max_distance=max_distance)
+        for candidate, distance in zip(candidates, distances):
+            self._distances[(string, candidate)] = (distance, max_distance or None)
+
+
+def damerau_levenshtein_distance(string1, string2, max_distance=None):
+    """
+    Calculate the (optimal string alignment) Damerau-Levenshtein distance between two strings with unit costs for
+    insertion, deletion, substitution and transposition of adjacent characters. This is the distance elasticsearch
+    uses for fuzzy matching when fuzzy transpositions are enabled (the default for match queries)
+
+    Args:
+        string1 (unicode): unicode string. If any encoded string type 'str' is passed, it will be decoded using utf-8
+        string2 (unicode): unicode string. If any encoded string type 'str' is passed, it will be decoded using utf-8
+        max_distance (int, optional): Stop computing edit distance if it grows larger than this argument.
+                                      If None complete edit distance is returned. Defaults to None
+
+    Returns:
+        int: edit distance between the two strings, or max_distance + 1 if it exceeds max_distance
+
+    For Example:
+        damerau_levenshtein_distance('chennai', 'chenani')
+        >> 1
+
+        damerau_levenshtein_distance('beautiful', 'beauty', max_distance=2)
+        >> 3
+    """
+    string1, string2 = _decode(string1), _decode(string2)
+
+    if max_distance is not None and abs(len(string1) - len(string2)) > max_distance:
+        return max_distance + 1
+
+    previous_row = None
+    row = list(range(len(string2) + 1))
+    for index1 in range(1, len(string1) + 1):
+        previous_previous_row, previous_row = previous_row, row
+        row = [index1] + [0] * len(string2)
+        for index2 in range(1, len(string2) + 1):
+            cost = 0 if string1[index1 - 1] == string2[index2 - 1] else 1
+            row[index2] = min(previous_row[index2] + 1,
+                              row[index2 - 1] + 1,
+                              previous_row[index2 - 1] + cost)
+            if (cost and index1 > 1 and index2 > 1 and string1[index1 - 1] == string2[index2 - 2]
+                    and string1[index1 - 2] == string2[index2 - 1]):
+                row[index2] = min(row[index2], previous_previous_row[index2 - 2] + 1)
+        if max_distance is not None and min(row) > max_distance:
+            return max_distance + 1
+
+    return row[-1]
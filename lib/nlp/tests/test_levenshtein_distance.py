@@ -0,0 +1,60 @@
+from __future__ import absolute_import
+
+import random
+
+from django.test import TestCase
+
+from lib.nlp.levenshtein_distance import edit_distance, edit_distances, EditDistanceCache
+
+
+def _full_edit_distance(string1, string2, insertion_cost=1, deletion_cost=1, substitution_cost=2):
+    if len(string1) > len(string2):
+        string1, string2 = string2, string1
+    distances = list(range(len(string1) + 1))
+    for index2, char2 in enumerate(string2):
+        new_distances = [index2 + 1]
+        for index1, char1 in enumerate(string1):
+            if char1 == char2:
+                new_distances.append(distances[index1])
+            else:
+                new_distances.append(min(distances[index1] + substitution_cost,
+                                         distances[index1 + 1] + insertion_cost,
+                                         new_distances[-1] + deletion_cost))
+        distances = new_distances
+    return distances[-1]
+
+
+class EditDistanceTest(TestCase):
+
+    def test_examples(self):
+        self.assertEqual(edit_distance(u'hello', u'helllo', max_distance=3), 1)
+        self.assertEqual(edit_distance(u'beautiful', u'beauty', max_distance=3), 3)
+        self.assertEqual(edit_distance(u'chennai', u'chenani'), 2)
+        self.assertEqual(edit_distance(u'delhi', u'ahmedabad', max_distance=2), 2)
+        self.assertEqual(edit_distances(u'chennai', [u'chenai', u'chennai', u'mumbai', u''], max_distance=2),
+                         [1, 0, 2, 2])
+
+    def test_bounded_and_batched_match_full_dynamic_programming(self):
+        rng = random.Random(0)
+        for _ in range(500):
+            string = u''.join(rng.choice(u'abc') for _ in range(rng.randint(0, 8)))
+            candidates = [u''.join(rng.choice(u'abc') for _ in range(rng.randint(0, 8))) for _ in range(4)]
+            costs = rng.choice([(1, 1, 2), (1, 2, 2), (2, 1, 1)])
+            max_distance = rng.choice([None, 1, 2, 3])
+            expected = [_full_edit_distance(string, candidate, *costs) for candidate in candidates]
+            if max_distance:
+                expected = [min(distance, max_distance) for distance in expected]
+            self.assertEqual([edit_distance(string, candidate, *costs, max_distance=max_distance)
+                              for candidate in candidates], expected)
+            self.assertEqual(edit_distances(string, candidates, *costs, max_distance=max_distance), expected)
+
+    def test_cache_reuses_results_within_computed_bound(self):
+        cache = EditDistanceCache()
+        cache.prefetch(u'bangalore', [u'bangalre', u'mangalore', u'hyderabad'], max_distance=2)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.distance(u'bangalore', u'bangalre', max_distance=1), 1)
+        self.assertEqual(cache.distance(u'bangalore', u'hyderabad', max_distance=1), 1)
+        self.assertEqual(cache.distance(u'bangalore', u'mangalore', max_distance=2), 2)
+        # bound larger than the one computed with, recomputed
+        self.assertEqual(cache.distance(u'bangalore', u'hyderabad'), 14)
+        self.assertEqual(len(cache), 3)
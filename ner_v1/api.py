@@ -21,7 +21,8 @@ from ner_v1.chatbot.tag_message import run_ner
 from ner_v1.constant import (PARAMETER_MIN_TOKEN_LEN_FUZZINESS, PARAMETER_FUZZINESS, PARAMETER_MIN_DIGITS,
                              PARAMETER_MAX_DIGITS, PARAMETER_READ_MODEL_FROM_S3,
                              PARAMETER_READ_EMBEDDINGS_FROM_REMOTE_URL,
-                             PARAMETER_LIVE_CRF_MODEL_PATH)
+                             PARAMETER_LIVE_CRF_MODEL_PATH, PARAMETER_USE_LOCAL_INDEX,
+                             PARAMETER_EXACT_MATCH_PREPASS)
 
 
 def to_bool(value):
@@ -68,7 +69,9 @@ def get_parameters_dictionary(request):
         PARAMETER_MAX_DIGITS: request.GET.get('max_number_digits'),
         PARAMETER_READ_EMBEDDINGS_FROM_REMOTE_URL: to_bool(request.GET.get('read_embeddings_from_remote_url')),
         PARAMETER_READ_MODEL_FROM_S3: to_bool(request.GET.get('read_model_from_s3')),
-        PARAMETER_LIVE_CRF_MODEL_PATH: request.GET.get('live_crf_model_path')
+        PARAMETER_LIVE_CRF_MODEL_PATH: request.GET.get('live_crf_model_path'),
+        PARAMETER_USE_LOCAL_INDEX: to_bool(request.GET.get('use_local_index')),
+        PARAMETER_EXACT_MATCH_PREPASS: to_bool(request.GET.get('exact_match_prepass'))
     }
 
     return parameters_dict
@@ -99,6 +102,8 @@ def text(request):
             live_crf_model_path=parameters_dict[PARAMETER_LIVE_CRF_MODEL_PATH],
             read_model_from_s3=parameters_dict[PARAMETER_READ_MODEL_FROM_S3],
             read_embeddings_from_remote_url=parameters_dict[PARAMETER_READ_EMBEDDINGS_FROM_REMOTE_URL],
+            use_local_index=parameters_dict[PARAMETER_USE_LOCAL_INDEX],
+            exact_match_prepass=parameters_dict[PARAMETER_EXACT_MATCH_PREPASS],
         )
         ner_logger.debug('Finished %s : %s ' % (parameters_dict[PARAMETER_ENTITY_NAME], entity_output))
     except TypeError as e:
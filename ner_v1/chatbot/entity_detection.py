@@ -116,6 +116,11 @@ def get_text(message, entity_name, structured_value, fallback_value, bot_message
             read_model_from_s3 (bool): If True read CRF model from S3. Defaults to False
             read_embeddings_from_remote_url (bool): if True read word embeddings from configured remote url. Defaults
                                                     to False
+            use_local_index (bool): if True match against an in-process index of the entity dictionary instead of
+                                    querying the datastore for every message. Defaults to False
+            exact_match_prepass (bool): if True find exact occurrences of variants with an in-process automaton
+                                        first and search only the rest of the message in the datastore. Defaults
+                                        to False
 
 
 
@@ -194,11 +199,99 @@ def get_text(message, entity_name, structured_value, fallback_value, bot_message
         ]
 
     """
+    text_model_detector = _get_text_model_detector(entity_name=entity_name, language=language, **kwargs)
+
+    entity_output = text_model_detector.detect(message=message,
+                                               structured_value=structured_value,
+                                               fallback_value=fallback_value,
+                                               bot_message=bot_message)
+
+
+    return entity_output
+
+
+def get_text_bulk(message, entity_names, structured_value, fallback_value, bot_message, language=ENGLISH_LANG,
+                  **kwargs):
+    """Same as get_text but detects multiple textual entities. Similar variants for all the entities are fetched
+    from the datastore in a single request instead of one request per entity
+
+    Args:
+        message (str or unicode or None): natural language text on which detection logic is to be run.
+                                          Note if structured value is passed detection is run on
+                                          structured value instead of message
+        entity_names (list): names of the entities. Also act as elastic-search dictionary names
+        structured_value (str or unicode or None): Value obtained from any structured elements.
+        fallback_value (str or unicode or None): If the detection logic fails to detect any value
+                                                 either from structured_value or message then
+                                                 we return a fallback_value as an output.
+        bot_message (str or unicode or None): previous message from a bot/agent.
+        language (str): ISO 639-1 code of language of message
+        **kwargs: extra configuration arguments for TextDetector, same as get_text
+
+    Returns:
+        dict: dictionary mapping each entity name to its output as returned by get_text
+
+    Example:
+
+        >>> message = u'i want to order chinese from  mainland china in mumbai'
+        >>> output = get_text_bulk(message=message,
+        >>>                        entity_names=['restaurant', 'city'],
+        >>>                        structured_value=None,
+        >>>                        fallback_value=None,
+        >>>                        bot_message=None)
+        >>> print(output)
+
+        {
+            'restaurant': [
+                {
+                    'detection': 'message',
+                    'original_text': 'mainland china',
+                    'entity_value': {'value': u'Mainland China'}
+                }
+            ],
+            'city': [
+                {
+                    'detection': 'message',
+                    'original_text': 'mumbai',
+                    'entity_value': {'value': u'Mumbai'}
+                }
+            ]
+        }
+    """
+    text_model_detectors = [_get_text_model_detector(entity_name=entity_name, language=language, **kwargs)
+                            for entity_name in entity_names]
+
+    TextModelDetector.prefetch_similar_dictionaries(text_detectors=text_model_detectors,
+                                                    texts=[structured_value if structured_value else message])
+
+    entities_output = {}
+    for entity_name, text_model_detector in zip(entity_names, text_model_detectors):
+        entities_output[entity_name] = text_model_detector.detect(message=message,
+                                                                  structured_value=structured_value,
+                                                                  fallback_value=fallback_value,
+                                                                  bot_message=bot_message)
+
+    return entities_output
+
+
+def _get_text_model_detector(entity_name, language=ENGLISH_LANG, **kwargs):
+    """Create TextModelDetector for the entity configured with the extra arguments accepted by get_text
+
+    Args:
+        entity_name (str): name of the entity
+        language (str): ISO 639-1 code of language of message
+        **kwargs: extra configuration arguments for TextDetector, see get_text
+
+    Returns:
+        TextModelDetector: detector for the entity
+    """
     fuzziness = kwargs.get('fuzziness', None)
     min_token_len_fuzziness = kwargs.get('min_token_len_fuzziness', None)
     live_crf_model_path = kwargs.get('live_crf_model_path', None)
     read_model_from_s3 = kwargs.get('read_model_from_s3', False)
     read_embeddings_from_remote_url = kwargs.get('read_embeddings_from_remote_url', False)
+    use_local_index = kwargs.get('use_local_index', False)
+    exact_match_prepass = kwargs.get('exact_match_prepass', False)
 
     text_model_detector = TextModelDetector(entity_name=entity_name,
                                             language=language,
@@ -214,13 +307,13 @@ def get_text(message, entity_name, structured_value, fallback_value, bot_message
         min_token_len_fuzziness = int(min_token_len_fuzziness)
         text_model_detector.set_min_token_size_for_levenshtein(min_size=min_token_len_fuzziness)
 
-    entity_output = text_model_detector.detect(message=message,
-                                               structured_value=structured_value,
-                                               fallback_value=fallback_value,
-                                               bot_message=bot_message)
+    if use_local_index:
+        text_model_detector.set_local_index_mode(enabled=True)
 
+    if exact_match_prepass:
+        text_model_detector.set_exact_match_prepass_mode(enabled=True)
 
-    return entity_output
+    return text_model_detector
 
 
 def get_location(message, entity_name, structured_value, fallback_value, bot_message):
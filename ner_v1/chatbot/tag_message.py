@@ -1,5 +1,5 @@
 from ner_v1.chatbot.combine_detection_logic import combine_output_of_detection_logic_and_tag
-from ner_v1.chatbot.entity_detection import get_text, get_city, get_date, get_time, get_email, \
+from ner_v1.chatbot.entity_detection import get_text, get_text_bulk, get_city, get_date, get_time, get_email, \
     get_phone_number, get_budget, get_number, get_pnr, get_shopping_size
 
 
@@ -79,9 +79,7 @@ def run_ner(entities, message):
 }
 
     """
-    entity_data = {}
-    for entity in entities:
-        entity_data[entity] = get_entity_function(entity=entity, message=message)
+    entity_data = get_entity_function(entity=entities, message=message)
     return combine_output_of_detection_logic_and_tag(entity_data, message)
 
 
@@ -93,13 +91,21 @@ def get_entity_function(entity, message):
     In entity_function_dictionary  key is the name of the entity and the value is which functionality to call for that
     entity
 
+    If a list of entity names is passed, the output of every entity is returned in a dictionary keyed by entity name.
+    When more than one of them are textual entities, they are detected together with get_text_bulk so that the
+    datastore is queried once for all of them instead of once per entity
+
     Attributes:
-        entity: name of the entity that calls specific detection logic
+        entity: name of the entity that calls specific detection logic or list of such names
         message: message on which detection logic needs to run
 
     Example:
         entity_output = get_entity_function(entity='date', message='set me reminder on 30th March')
         print entity_output
+
+        entities_output = get_entity_function(entity=['date', 'restaurant', 'cuisine'],
+                                              message='book a table at mainland china for chinese on 30th March')
+        print entities_output['restaurant']
     """
     entity_function_dictionary = {
         'date': get_date,
@@ -115,6 +121,17 @@ def get_entity_function(entity, message):
 
     }
 
+    if isinstance(entity, (list, tuple)):
+        entities_output = {}
+        text_entities = [entity_name for entity_name in entity if entity_name not in entity_function_dictionary]
+        if len(text_entities) > 1:
+            entities_output.update(get_text_bulk(message=message, entity_names=text_entities, structured_value=None,
+                                                 fallback_value=None, bot_message=None))
+        for entity_name in entity:
+            if entity_name not in entities_output:
+                entities_output[entity_name] = get_entity_function(entity=entity_name, message=message)
+        return entities_output
+
     if entity in entity_function_dictionary:
         return entity_function_dictionary.get(entity)(message=message, entity_name=entity, structured_value=None,
                                                       fallback_value=None, bot_message=None)
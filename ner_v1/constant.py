@@ -119,6 +119,8 @@ CRF_MODEL_VERIFIED = 'crf_model_verified'
 PARAMETER_READ_MODEL_FROM_S3 = 'read_model_from_s3'
 PARAMETER_READ_EMBEDDINGS_FROM_REMOTE_URL = 'read_embeddings_from_remote_url'
 PARAMETER_LIVE_CRF_MODEL_PATH = 'live_crf_model_path'
+PARAMETER_USE_LOCAL_INDEX = 'use_local_index'
+PARAMETER_EXACT_MATCH_PREPASS = 'exact_match_prepass'
 
 #  ********************** emoji removal ******************************************************
 EMOJI_RANGES = {
@@ -0,0 +1,94 @@
+# coding=utf-8
+from __future__ import absolute_import
+
+import collections
+import re
+
+import mock
+from django.test import TestCase
+
+from datastore.exceptions import CircuitBreakerOpenException
+from datastore.local_index import build_entity_variant_automaton, build_entity_variant_prefilter
+from ner_v1.detectors.textual.text.text_detection import (TextDetector, get_tokens_and_spans,
+                                                          replace_word_bounded_substring)
+
+
+class TextDetectionTest(TestCase):
+
+    def setUp(self):
+        with mock.patch('ner_v1.detectors.textual.text.text_detection.DataStore'):
+            self.text_detector = TextDetector(entity_name='city')
+
+    def _detect(self, text, variants_to_values):
+        with mock.patch.object(self.text_detector, '_get_similar_dictionary',
+                               return_value=collections.OrderedDict(variants_to_values)):
+            return self.text_detector.detect_entity(text)
+
+    def test_get_tokens_and_spans(self):
+        text = u' i want to order 1 pc hot & crispy, (a b) c '
+        tokens, spans = get_tokens_and_spans(text)
+        self.assertEqual(tokens, [u'i', u'want', u'to', u'order', u'1', u'pc', u'hot', u'crispy', u'a', u'b', u'c'])
+        self.assertEqual([text[start:end] for start, end in spans],
+                         [u'i', u'want', u'to', u'order', u'1', u'pc', u'hot', u'crispy,', u'a', u'b)', u'c'])
+
+    def test_replace_word_bounded_substring(self):
+        for text, substring in [(u' mumbai to mumbai, navi-mumbai mumbaikar ', u'mumbai'),
+                                (u' chennai, tamilnadu ', u'chennai,'),
+                                (u' (a b) c (a b)c ', u'(a b)'),
+                                (u' मुंबई से मुंबईकर ', u'मुंबई')]:
+            expected = re.sub(r'\b%s\b' % re.escape(substring), u'__city__', text, flags=re.UNICODE)
+            self.assertEqual(replace_word_bounded_substring(text, substring, u'__city__'), expected)
+
+    def test_detect_entity(self):
+        values, original_texts = self._detect(u'Come to Chennai, Tamil Nadu,  I will visit Delehi next year',
+                                              [(u'chennai', u'Chennai'), (u'tamil nadu', u'Tamil Nadu'),
+                                               (u'delhi', u'New Delhi'), (u'goa', u'Goa')])
+        self.assertEqual(values, [u'Tamil Nadu', u'Chennai', u'New Delhi'])
+        self.assertEqual(original_texts, [u'tamil nadu,', u'chennai,', u'delehi'])
+
+    def test_detect_entity_repeated_and_special_characters(self):
+        values, original_texts = self._detect(u'1 pc hot & crispy from mumbai to mumbai',
+                                              [(u'mumbai', u'Mumbai'), (u'1 pc hot crispy', u'1 Pc Hot & Crispy')])
+        self.assertEqual(values, [u'1 Pc Hot & Crispy', u'Mumbai'])
+        self.assertEqual(original_texts, [u'1 pc hot & crispy', u'mumbai'])
+        self.assertEqual(self.text_detector.tagged_text, u' __city__ from __city__ to __city__ ')
+
+    def test_exact_match_prepass(self):
+        automaton = build_entity_variant_automaton([
+            {'_source': {'value': u'Chennai', 'variants': [u'chennai', u'madras'], 'language_script': 'en'}},
+            {'_source': {'value': u'New Delhi', 'variants': [u'delhi', u'new delhi'], 'language_script': 'en'}},
+        ], search_language_script='en')
+        self.text_detector.set_exact_match_prepass_mode()
+        similar_dictionary = mock.Mock(return_value=collections.OrderedDict([(u'delhi', u'New Delhi')]))
+        with mock.patch('ner_v1.detectors.textual.text.text_detection.get_entity_variant_automaton',
+                        return_value=automaton), \
+                mock.patch.object(self.text_detector, '_get_similar_dictionary', similar_dictionary):
+            values, original_texts = self.text_detector.detect_entity(u'Madras, new delhi to delehi')
+            self.assertEqual(values, [u'New Delhi', u'Chennai', u'New Delhi'])
+            self.assertEqual(original_texts, [u'new delhi', u'madras,', u'delehi'])
+            self.assertEqual(self.text_detector.tagged_text, u' __city__, __city__ to __city__ ')
+            similar_dictionary.assert_called_once_with(text=u'to delehi')
+
+            similar_dictionary.reset_mock()
+            values, original_texts = self.text_detector.detect_entity(u'new delhi')
+            self.assertEqual(values, [u'New Delhi'])
+            self.assertFalse(similar_dictionary.called)
+
+    def test_bloom_prefilter(self):
+        prefilter = build_entity_variant_prefilter({u'Chennai': [u'chennai'], u'New Delhi': [u'new delhi']},
+                                                   max_edits=1, error_rate=0.001)
+        self.text_detector.set_bloom_prefilter_mode()
+        self.text_detector.db.get_similar_dictionary.return_value = collections.OrderedDict([(u'chennai', u'Chennai')])
+        with mock.patch('datastore.local_index._build_entity_variant_prefilter', return_value=prefilter), \
+                mock.patch('datastore.local_index._entity_variant_prefilters', {}):
+            self.assertEqual(self.text_detector.detect_entity(u'order biryani for dinner'), ([], []))
+            self.assertFalse(self.text_detector.db.get_similar_dictionary.called)
+
+            values, original_texts = self.text_detector.detect_entity(u'flights to chenai')
+            self.assertEqual(values, [u'Chennai'])
+            self.assertEqual(original_texts, [u'chenai'])
+            self.assertTrue(self.text_detector.db.get_similar_dictionary.called)
+
+    def test_circuit_breaker_open(self):
+        self.text_detector.db.get_similar_dictionary.side_effect = CircuitBreakerOpenException()
+        self.assertEqual(self.text_detector.detect_entity(u'flights to chennai'), ([], []))
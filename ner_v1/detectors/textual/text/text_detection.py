@@ -1,16 +1,115 @@
 import collections
-import re
 
 from six import iteritems
 
 import language_utilities.constant as lang_constant
-from chatbot_ner.config import ner_logger
+from chatbot_ner.config import ner_logger, TEXT_DETECTION_BLOOM_PREFILTER
 from datastore import DataStore
+from datastore.exceptions import CircuitBreakerOpenException
+from datastore.local_index import (get_local_entity_index, get_entity_variant_automaton, entity_variants_may_match,
+                                   MAX_FUZZY_EDITS)
 from lib.nlp.const import TOKENIZER, whitespace_tokenizer
-from lib.nlp.levenshtein_distance import edit_distance
+from lib.nlp.levenshtein_distance import EditDistanceCache
 from ner_v1.detectors.base_detector import BaseDetector
 
 
+def get_tokens_and_spans(text):
+    """
+    Tokenize text and find start and end position of every token in the text in a single left to right pass
+
+    If a token is followed by special characters (except whitespace) that are dropped by the tokenizer, like
+    ',' in 'chennai, mumbai' or ')' in '(A B) C', the span of the token is extended over them
+
+    Args:
+        text (str or unicode): text to get tokens from and indicies of those tokens in the given text
+
+    Returns:
+        tuple:
+            list: containing tokens, direct results from tokenizer.tokenize
+            list: containing (int, int) indicating start and end position of ith token (of first list)
+                  in given text
+
+    Raises:
+        ValueError: if a token returned by the tokenizer is not found as it is in the text
+
+    E.g.
+    In: text = u' i want to order 1 pc hot & crispy '
+    Out: ([u'i', u'want', u'to', u'order', u'1', u'pc', u'hot', u'crispy'],
+          [(1, 2), (3, 7), (8, 10), (11, 16), (17, 18), (19, 21), (22, 25), (28, 34)])
+    """
+    txt = text.rstrip() + ' __eos__'
+    tokens = TOKENIZER.tokenize(txt)
+    spans = []
+
+    position = 0
+    for token in tokens:
+        start = txt.index(token, position)
+        end = start + len(token)
+
+        # Small block to handle tricky cases like '(A B) C'
+        # It extends the previous token's end boundary if there are special characters except whitespace
+        # towards the end of previous token
+        prefix = txt[position:end]
+        prefix_tokens = whitespace_tokenizer.tokenize(prefix)
+        if prefix and len(prefix_tokens) > 1 and prefix_tokens[0] and spans:
+            previous_start, previous_end = spans[-1]
+            spans[-1] = (previous_start, previous_end + len(prefix_tokens[0]))
+
+        spans.append((start, end))
+        position = end
+
+    # remove eos parts
+    tokens.pop()
+    spans.pop()
+
+    return tokens, spans
+
+
+def _is_word_character(character):
+    return character == u'_' or character.isalnum()
+
+
+def replace_word_bounded_substring(text, substring, replacement):
+    """
+    Replace all non overlapping occurrences of substring in text that start and end at word boundaries. This gives
+    the same result as a re.UNICODE regex substitution of re.escape(substring) surrounded by word boundaries (\\b)
+    but works on spans found with str.find instead of compiling a new pattern for every substring
+
+    Args:
+        text (unicode): text to replace the substring in
+        substring (unicode): non empty substring to replace
+        replacement (unicode): string to put in place of every occurrence
+
+    Returns:
+        unicode: text with occurrences replaced, the same text object if nothing was replaced
+    """
+    spans = []
+    text_length, substring_length = len(text), len(substring)
+    position = text.find(substring)
+    while position != -1:
+        end = position + substring_length
+        at_start_boundary = (position > 0 and _is_word_character(text[position - 1])) != \
+                            (position < text_length and _is_word_character(text[position]))
+        at_end_boundary = (end > 0 and _is_word_character(text[end - 1])) != \
+                          (end < text_length and _is_word_character(text[end]))
+        if at_start_boundary and at_end_boundary:
+            spans.append((position, end))
+            position = text.find(substring, end)
+        else:
+            position = text.find(substring, position + 1)
+
+    if not spans:
+        return text
+
+    parts, previous_end = [], 0
+    for start, end in spans:
+        parts.append(text[previous_end:start])
+        parts.append(replacement)
+        previous_end = end
+    parts.append(text[previous_end:])
+    return u''.join(parts)
+
+
 class TextDetector(BaseDetector):
     """
     TextDetector detects custom entities in text string by performing similarity searches against a list fetched from
@@ -38,6 +137,20 @@ class TextDetector(BaseDetector):
         original_texts (list): list of substrings of the text detected as entities
         processed_text (str): string with detected text entities removed
         tag (str): entity_name prepended and appended with '__'
+        _use_local_index (bool): if True, similar variants are looked up in an in-process index built from the
+                                 entity dictionary instead of querying the datastore for every message
+        _use_exact_match_prepass (bool): if True, exact occurrences of variants are found with an in-process
+                                         automaton before the fuzzy search, which then only gets the unmatched part
+                                         of the text
+        _use_bloom_prefilter (bool): if True, texts none of whose tokens can match a variant of the entity according
+                                     to an in-process bloom filter are not sent to the datastore
+        _prefetched_similar_dictionaries (dict): similar variants already fetched from the datastore (see
+                                                 prefetch_similar_dictionaries) keyed by the text they were fetched
+                                                 for
+        _processed_text_tokens_cache (tuple or None): processed_text along with its tokens and token spans, see
+                                                      _get_processed_text_tokens
+        _edit_distance_cache (EditDistanceCache): memo of edit distances between text tokens and variant tokens,
+                                                  reset for every text
     """
 
     def __init__(self, entity_name=None, source_language_script=lang_constant.ENGLISH_LANG, translation_enabled=False):
@@ -78,6 +191,13 @@ class TextDetector(BaseDetector):
         self.set_fuzziness_threshold(fuzziness=1)
         self._min_token_size_for_fuzziness = 4
 
+        self._use_local_index = False
+        self._use_exact_match_prepass = False
+        self._use_bloom_prefilter = TEXT_DETECTION_BLOOM_PREFILTER
+        self._prefetched_similar_dictionaries = {}
+        self._processed_text_tokens_cache = None
+        self._edit_distance_cache = EditDistanceCache()
+
         self.db = DataStore()
 
     @property
@@ -154,6 +274,179 @@ class TextDetector(BaseDetector):
         """
         self._min_token_size_for_fuzziness = min_size
 
+    def set_local_index_mode(self, enabled=True):
+        """
+        Enable or disable matching against an in-process index of the entity dictionary. When enabled, similar
+        variants for a message are found locally (see datastore.local_index) following the same fuzziness rules
+        instead of running a full text query on the datastore
+
+        Args:
+            enabled (bool, optional): True to match locally, False to query the datastore. Defaults to True
+        """
+        self._use_local_index = enabled
+
+    def set_exact_match_prepass_mode(self, enabled=True):
+        """
+        Enable or disable the exact match prepass. When enabled, exact (case insensitive, token level) occurrences of
+        variants of the entity are found first in a single scan of the text with an Aho-Corasick automaton built
+        from the entity dictionary (see datastore.local_index). Only the tokens not covered by these occurrences are
+        searched with the fuzzy path and if every token is covered, the fuzzy search is skipped altogether
+
+        Args:
+            enabled (bool, optional): True to run the exact match prepass. Defaults to True
+        """
+        self._use_exact_match_prepass = enabled
+
+    def set_bloom_prefilter_mode(self, enabled=True):
+        """
+        Enable or disable the bloom prefilter. When enabled, every text token is looked up (along with the strings
+        obtained by deleting upto its fuzziness threshold characters) in a bloom filter over the variant tokens of the
+        entity (see datastore.local_index). If no token can be close enough to any variant token to be detected, the
+        datastore is not queried and nothing is detected. Defaults to TEXT_DETECTION_BLOOM_PREFILTER
+
+        Args:
+            enabled (bool, optional): True to use the bloom prefilter. Defaults to True
+        """
+        self._use_bloom_prefilter = enabled
+
+    def _get_max_fuzziness_threshold(self):
+        """
+        Returns:
+            int: largest fuzziness threshold _get_fuzziness_threshold_for_token can return
+        """
+        if type(self._fuzziness) == int:
+            return self._fuzziness
+        return 2
+
+    def _may_match_variants(self, text):
+        """
+        Check with the bloom prefilter whether any token of the text can be matched to a variant of the entity by
+        _get_entity_substring_from_text. Tokens longer than _min_token_size_for_fuzziness are matched within their
+        fuzziness threshold, others only exactly.
+
+        Args:
+            text (unicode): tokenized text joined with whitespace
+
+        Returns:
+            bool: False if nothing can be detected in the text, True otherwise
+        """
+        max_fuzziness_threshold = self._get_max_fuzziness_threshold()
+        if not self._use_bloom_prefilter or max_fuzziness_threshold > MAX_FUZZY_EDITS:
+            return True
+
+        tokens_and_max_edits = []
+        for token in set(whitespace_tokenizer.tokenize(text)):
+            if not token:
+                continue
+            max_edits = 0
+            if len(token) > self._min_token_size_for_fuzziness:
+                max_edits = self._get_fuzziness_threshold_for_token(token)
+            tokens_and_max_edits.append((token, max_edits))
+
+        return entity_variants_may_match(entity_name=self.entity_name, tokens_and_max_edits=tokens_and_max_edits,
+                                         max_edits=max_fuzziness_threshold)
+
+    def _get_similar_dictionary(self, text):
+        """
+        Get variants of the entity similar to the text either from the datastore or from the in-process index
+        depending on the matching mode
+
+        Args:
+            text (unicode): tokenized text joined with whitespace
+
+        Returns:
+            collections.OrderedDict: dictionary mapping entity value variants to their entity value
+        """
+        if text in self._prefetched_similar_dictionaries:
+            return self._prefetched_similar_dictionaries.pop(text)
+
+        if self._use_local_index:
+            local_index = get_local_entity_index(entity_name=self.entity_name)
+            return local_index.get_similar_dictionary(text=text,
+                                                      fuzziness_threshold=self._fuzziness,
+                                                      search_language_script=self._target_language_script,
+                                                      min_token_size_for_fuzziness=self._min_token_size_for_fuzziness)
+
+        if not self._may_match_variants(text):
+            return collections.OrderedDict()
+
+        try:
+            return self.db.get_similar_dictionary(entity_name=self.entity_name,
+                                                  text=text,
+                                                  fuzziness_threshold=self._fuzziness,
+                                                  search_language_script=self._target_language_script)
+        except CircuitBreakerOpenException:
+            # Fail fast with no detections instead of waiting on an unhealthy datastore
+            ner_logger.warning('Datastore circuit breaker is open, skipping text detection for %s' % self.entity_name)
+            return collections.OrderedDict()
+
+    @staticmethod
+    def _get_datastore_query_text(text):
+        """
+        Get the text that is sent to the datastore when detecting entities in the given text
+
+        Args:
+            text (str or unicode): text to detect entities in
+
+        Returns:
+            unicode: lowercased tokens of text joined with whitespace
+        """
+        text = text.lower()
+        if isinstance(text, bytes):
+            text = text.decode('utf-8')
+        return u' '.join(TOKENIZER.tokenize(text))
+
+    @staticmethod
+    def prefetch_similar_dictionaries(text_detectors, texts):
+        """
+        Fetch similar variants for entities of all the given detectors in a single datastore request per text
+        instead of one request per detector. The results are kept on each detector and used by its next call to
+        detect_entity (or detect) on the same text, so detectors can then be run one by one as usual.
+
+        Detectors are grouped by fuzziness and language script, each group needs its own request. Detectors in
+        local index mode are skipped as they don't query the datastore, as are detectors running the exact match
+        prepass as they query the datastore with part of the text only. Entities ruled out by the bloom prefilter
+        (see set_bloom_prefilter_mode) are left out of the request
+
+        Args:
+            text_detectors (list): list of TextDetector (or subclass) instances
+            texts (list): texts (str or unicode) on which the detectors will be run, e.g. message and/or
+                          structured value. None or empty texts are ignored
+
+        Example:
+            detectors = [TextDetector(entity_name='city'), TextDetector(entity_name='restaurant')]
+            TextDetector.prefetch_similar_dictionaries(text_detectors=detectors, texts=[message])
+            for detector in detectors:
+                detector.detect_entity(message)
+        """
+        groups = collections.OrderedDict()
+        for text_detector in text_detectors:
+            if text_detector._use_local_index or text_detector._use_exact_match_prepass:
+                continue
+            key = (text_detector._fuzziness, text_detector._target_language_script)
+            groups.setdefault(key, collections.OrderedDict()).setdefault(text_detector.entity_name, []).append(
+                text_detector)
+
+        db = DataStore()
+        for query_text in {TextDetector._get_datastore_query_text(text) for text in texts if text}:
+            for (fuzziness, language_script), entity_detectors in iteritems(groups):
+                entity_names = [entity_name for entity_name, detectors in iteritems(entity_detectors)
+                                if any(text_detector._may_match_variants(query_text) for text_detector in detectors)]
+                results = {}
+                if entity_names:
+                    try:
+                        results = db.get_similar_dictionary_bulk(entity_names=entity_names,
+                                                                 text=query_text,
+                                                                 fuzziness_threshold=fuzziness,
+                                                                 search_language_script=language_script)
+                    except CircuitBreakerOpenException:
+                        ner_logger.warning('Datastore circuit breaker is open, skipping text detection for %s'
+                                           % ', '.join(entity_names))
+                for entity_name, detectors in iteritems(entity_detectors):
+                    for text_detector in detectors:
+                        text_detector._prefetched_similar_dictionaries[query_text] = collections.OrderedDict(
+                            results.get(entity_name, {}))
+
     def _process_text(self, text):
         self.text = text.lower()
         if isinstance(self.text, bytes):
@@ -166,6 +459,42 @@ class TextDetector(BaseDetector):
         # self.processed_text = self.regx_to_process.text_substitute(self.processed_text)
         self.processed_text = u' ' + self.processed_text + u' '
         self.tagged_text = self.processed_text
+        self._edit_distance_cache = EditDistanceCache()
+
+    def _get_processed_text_tokens(self):
+        """
+        Get tokens of processed_text. These are computed once for every version of processed_text (it only changes
+        when a detected substring is replaced with the tag) and shared by all the candidate variants instead of
+        tokenizing the text again for every variant
+
+        Returns:
+            list: tokens of processed_text
+        """
+        if self._processed_text_tokens_cache is None or self._processed_text_tokens_cache[0] is not self.processed_text:
+            self._processed_text_tokens_cache = (self.processed_text, TOKENIZER.tokenize(self.processed_text), None)
+
+        return self._processed_text_tokens_cache[1]
+
+    def _get_processed_text_spans(self):
+        """
+        Get tokens of processed_text along with their character spans, cached the same way as
+        _get_processed_text_tokens
+
+        Returns:
+            tuple:
+                list: tokens as returned by get_tokens_and_spans
+                list: (int, int) start and end position in processed_text of each token
+
+        Raises:
+            ValueError: see get_tokens_and_spans
+        """
+        tokens = self._get_processed_text_tokens()
+        processed_text, _, tokens_and_spans = self._processed_text_tokens_cache
+        if tokens_and_spans is None:
+            tokens_and_spans = get_tokens_and_spans(processed_text)
+            self._processed_text_tokens_cache = (processed_text, tokens, tokens_and_spans)
+
+        return tokens_and_spans
 
     def _get_substring_from_processed_text(self, matched_tokens):
         """
@@ -193,56 +522,9 @@ class TextDetector(BaseDetector):
         Notice that & is dropped during tokenization but when finding original text, we recover it from processed text
         """
 
-        def _get_tokens_and_indices(text):
-            """
-            Args:
-                text (str or unicode): text to get tokens from and indicies of those tokens in the given text
-
-            Returns:
-                tuple:
-                    list: containing tokens, direct results from tokenizer.tokenize
-                    list: containing (int, int) indicating start and end position of ith token (of first list)
-                          in given text
-
-            E.g.
-            In: text = u'i want to order 1 pc hot & crispy'
-            Out: ([u'i', u'want', u'to', u'order', u'1', u'pc', u'hot', u'crispy'],
-                  [(1, 2), (3, 7), (8, 10), (11, 16), (17, 18), (19, 21), (22, 25), (28, 34)])
-
-            """
-            txt = text.rstrip() + ' __eos__'
-            processed_text_tokens = TOKENIZER.tokenize(txt)
-            processed_text_tokens_indices = []
-
-            offset = 0
-            for token in processed_text_tokens:
-                st = txt.index(token)
-                en = st + len(token)
-
-                # Small block to handle tricky cases like '(A B) C'
-                # It extends the previous token's end boundary if there are special characters except whitespace
-                # towards the end of previous token
-                prefix = txt[:en]
-                prefix_tokens = whitespace_tokenizer.tokenize(prefix)
-                if prefix and len(prefix_tokens) > 1 and prefix_tokens[0]:
-                    if processed_text_tokens_indices:
-                        s, e = processed_text_tokens_indices.pop()
-                        e += len(prefix_tokens[0])
-                        processed_text_tokens_indices.append((s, e))
-
-                txt = txt[en:]
-                processed_text_tokens_indices.append((offset + st, offset + en))
-                offset += en
-
-            # remove eos parts
-            processed_text_tokens.pop()
-            processed_text_tokens_indices.pop()
-
-            return processed_text_tokens, processed_text_tokens_indices
-
         try:
             n = len(matched_tokens)
-            tokens, indices = _get_tokens_and_indices(self.processed_text)
+            tokens, indices = self._get_processed_text_spans()
             for i in range(len(tokens) - n + 1):
                 if tokens[i:i + n] == matched_tokens:
                     start = indices[i][0]
@@ -298,12 +580,80 @@ class TextDetector(BaseDetector):
         """
         self._process_text(text)
 
-        values, original_texts = self._text_detection_with_variants()
+        values, original_texts = [], []
+        if self._use_exact_match_prepass:
+            values, original_texts = self._text_detection_with_exact_matches()
+
+        if not self._use_exact_match_prepass or self._get_untagged_tokens():
+            fuzzy_values, fuzzy_original_texts = self._text_detection_with_variants()
+            values, original_texts = values + fuzzy_values, original_texts + fuzzy_original_texts
 
         self.text_entity_values, self.original_texts = values, original_texts
 
         return self.text_entity_values, self.original_texts
 
+    def _get_untagged_tokens(self):
+        """
+        Get tokens of processed_text that are not part of a tag, i.e. not yet detected as an entity
+
+        Returns:
+            list: tokens of processed_text except the tag tokens
+        """
+        tag_tokens = set(TOKENIZER.tokenize(self.tag))
+        return [token for token in self._get_processed_text_tokens() if token not in tag_tokens]
+
+    def _text_detection_with_exact_matches(self):
+        """
+        Find exact, longest leftmost occurrences of variants of the entity in processed_text using the entity
+        variant automaton and replace them with the tag in processed_text and tagged_text.
+
+        Occurrences are tagged longest first (the same order used for exact matches in
+        _text_detection_with_variants) so that a shorter variant does not break a longer one containing it
+
+        Returns:
+             tuple:
+                list: containing the detected text entities
+                list: containing their corresponding substrings in the original message.
+        """
+        original_final_list = []
+        value_final_list = []
+
+        automaton = get_entity_variant_automaton(entity_name=self.entity_name,
+                                                 search_language_script=self._target_language_script)
+        tokens = self._get_processed_text_tokens()
+        matched_tokens_to_values = collections.OrderedDict()
+        for start, end, (_, value) in automaton.find_longest_leftmost(tokens):
+            matched_tokens_to_values.setdefault(tuple(tokens[start:end]), value)
+
+        matched_tokens_list = sorted(matched_tokens_to_values.keys(), key=len, reverse=True)
+        for matched_tokens in matched_tokens_list:
+            n = len(matched_tokens)
+            try:
+                tokens, spans = self._get_processed_text_spans()
+            except ValueError:
+                ner_logger.exception('Error getting original text (%s, %s)' % (matched_tokens, self.processed_text))
+                break
+            starts = [i for i in range(len(tokens) - n + 1) if tuple(tokens[i:i + n]) == matched_tokens]
+            if not starts:
+                # already replaced along with some other occurrence
+                continue
+
+            start, end = spans[starts[0]][0], spans[starts[0] + n - 1][1]
+            original_text = self.processed_text[start:end]
+            value_final_list.append(matched_tokens_to_values[matched_tokens])
+            original_final_list.append(original_text)
+
+            processed_text = replace_word_bounded_substring(self.processed_text, original_text, self.tag)
+            if processed_text is self.processed_text:
+                # original text ends with special characters (e.g. 'chennai,') and is not followed by a word
+                # boundary, tag only the tokens so that they are not searched again in the fuzzy path
+                original_text = self.processed_text[start:spans[starts[0] + n - 1][0] + len(matched_tokens[-1])]
+                processed_text = replace_word_bounded_substring(self.processed_text, original_text, self.tag)
+            self.tagged_text = replace_word_bounded_substring(self.tagged_text, original_text, self.tag)
+            self.processed_text = processed_text
+
+        return value_final_list, original_final_list
+
     def _text_detection_with_variants(self):
         """
         This function will normalise the message by breaking it into trigrams, bigrams and unigrams. The generated
@@ -320,56 +670,84 @@ class TextDetector(BaseDetector):
         value_final_list = []
         variants_to_values = collections.OrderedDict()
 
-        text = u' '.join(TOKENIZER.tokenize(self.processed_text))
+        text = self._get_datastore_query_text(self.processed_text)
+        if self._use_exact_match_prepass:
+            text = u' '.join(self._get_untagged_tokens())
 
-        _variants_to_values = self.db.get_similar_dictionary(entity_name=self.entity_name,
-                                                             text=text,
-                                                             fuzziness_threshold=self._fuzziness,
-                                                             search_language_script=self._target_language_script)
+        _variants_to_values = self._get_similar_dictionary(text=text)
 
+        variants_tokens = {}
         for variant, value in iteritems(_variants_to_values):
+            # tokens precomputed at index time, see datastore.utils.NormalizedVariant
+            tokens = getattr(variant, 'tokens', None)
             variant = variant.lower()
             if isinstance(variant, bytes):
                 variant = variant.decode('utf-8')
 
             variants_to_values[variant] = value
+            if tokens is not None:
+                variants_tokens[variant] = tokens
 
         variants_list = variants_to_values.keys()
+        for variant in variants_list:
+            if variant not in variants_tokens:
+                variants_tokens[variant] = TOKENIZER.tokenize(variant)
 
         # Length based ordering, this reorders the results from datastore
         # that are already sorted by some relevance scoring
 
         exact_matches, fuzzy_variants = [], []
-        _text = u' '.join(TOKENIZER.tokenize(self.processed_text))
+        _text = u' '.join(self._get_processed_text_tokens())
         for variant in variants_list:
-            if u' '.join(TOKENIZER.tokenize(variant)) in _text:
+            if u' '.join(variants_tokens[variant]) in _text:
                 exact_matches.append(variant)
             else:
                 fuzzy_variants.append(variant)
 
-        exact_matches.sort(key=lambda s: len(TOKENIZER.tokenize(s)), reverse=True)
-        fuzzy_variants.sort(key=lambda s: len(TOKENIZER.tokenize(s)), reverse=True)
+        exact_matches.sort(key=lambda s: len(variants_tokens[s]), reverse=True)
+        fuzzy_variants.sort(key=lambda s: len(variants_tokens[s]), reverse=True)
         variants_list = exact_matches + fuzzy_variants
 
+        self._prefetch_edit_distances(variants_tokens.values())
+
         for variant in variants_list:
-            original_text = self._get_entity_substring_from_text(variant)
+            original_text = self._get_entity_substring_from_text(variant, variant_tokens=variants_tokens[variant])
             if original_text:
                 value_final_list.append(variants_to_values[variant])
                 original_final_list.append(original_text)
-                _pattern = re.compile(r'\b%s\b' % re.escape(original_text), re.UNICODE)
-                self.tagged_text = _pattern.sub(self.tag, self.tagged_text)
+                self.tagged_text = replace_word_bounded_substring(self.tagged_text, original_text, self.tag)
                 # Instead of dropping completely like in other entities,
                 # we replace with tag to avoid matching non contiguous segments
-                self.processed_text = _pattern.sub(self.tag, self.processed_text)
+                self.processed_text = replace_word_bounded_substring(self.processed_text, original_text, self.tag)
         return value_final_list, original_final_list
 
-    def _get_entity_substring_from_text(self, variant):
+    def _prefetch_edit_distances(self, variants_tokens):
+        """
+        Compute edit distances between every text token eligible for fuzzy matching and all the distinct variant
+        tokens in one batch per text token, so that _get_entity_substring_from_text finds them in the memo instead
+        of computing them pair by pair for every variant
+
+        Args:
+            variants_tokens (iterable): tokens of each variant
+        """
+        unique_variant_tokens = set(token for variant_tokens in variants_tokens for token in variant_tokens)
+        if not unique_variant_tokens:
+            return
+
+        for text_token in set(self._get_processed_text_tokens()):
+            if len(text_token) > self._min_token_size_for_fuzziness:
+                self._edit_distance_cache.prefetch(string=text_token,
+                                                   candidates=unique_variant_tokens - {text_token},
+                                                   max_distance=self._get_fuzziness_threshold_for_token(text_token) + 1)
+
+    def _get_entity_substring_from_text(self, variant, variant_tokens=None):
         """
         Check ngrams of the text for similarity against the variant (can be a ngram) using Levenshtein distance
         and return the closest substring in the text that matches the variant
 
         Args:
             variant(str or unicode): string, ngram of variant to fuzzy detect in the text using Levenshtein distance
+            variant_tokens (list, optional): tokens of the variant if already computed. Defaults to None
 
         Returns:
             str or unicode or None: part of the given text that was detected as entity given the variant,
@@ -385,9 +763,9 @@ class TextDetector(BaseDetector):
             'delehi'
 
         """
-        text = self.processed_text
-        variant_tokens = TOKENIZER.tokenize(variant)
-        text_tokens = TOKENIZER.tokenize(text)
+        if variant_tokens is None:
+            variant_tokens = TOKENIZER.tokenize(variant)
+        text_tokens = self._get_processed_text_tokens()
         original_text_tokens = []
         variant_token_i = 0
         for text_token in text_tokens:
@@ -396,9 +774,9 @@ class TextDetector(BaseDetector):
             same = variant_token == text_token
             ft = self._get_fuzziness_threshold_for_token(text_token)
             if same or (len(text_token) > self._min_token_size_for_fuzziness
-                        and edit_distance(string1=variant_token,
-                                          string2=text_token,
-                                          max_distance=ft + 1) <= ft):
+                        and self._edit_distance_cache.distance(string1=text_token,
+                                                               string2=variant_token,
+                                                               max_distance=ft + 1) <= ft):
                 original_text_tokens.append(text_token)
                 variant_token_i += 1
                 if variant_token_i == len(variant_tokens):
@@ -0,0 +1,157 @@
+from __future__ import absolute_import
+
+import imp
+import os
+import shutil
+import tempfile
+import threading
+
+import boto3
+import mock
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.test import TestCase
+from moto.s3.models import s3_backend
+from moto.server import create_backend_app
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from chatbot_ner.config import BASE_DIR
+
+# data/ is not a package, the script is run directly by docker/cmd.sh
+get_external_entities = imp.load_source('get_external_entities',
+                                        os.path.join(BASE_DIR, 'data', 'get_external_entities.py'))
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class SyncDirTest(TestCase):
+    """
+    Syncs from a moto S3 server over HTTP, so that listing pages, quoted ETags and download errors are the ones
+    returned to a real boto3 client
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super(SyncDirTest, cls).setUpClass()
+        cls.server = make_server('127.0.0.1', 0, create_backend_app('s3'), request_handler=_QuietRequestHandler)
+        server_thread = threading.Thread(target=cls.server.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(SyncDirTest, cls).tearDownClass()
+
+    def setUp(self):
+        s3_backend.reset()
+        self.target = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.target, ignore_errors=True)
+        self.client = self._get_client()
+        self.client.create_bucket(Bucket='bucket')
+        self._put('entity_data/city.csv', b'value,variants\nmumbai,bombay\n')
+        self._put('entity_data/restaurant.csv', b'value,variants\nkfc,kfc\n')
+        self._put('entity_data/', b'')
+
+        self.downloaded = []
+        download_file = self.client.download_file
+
+        def record_download(bucket, key, file_path):
+            self.downloaded.append(key)
+            return download_file(bucket, key, file_path)
+
+        self.client.download_file = record_download
+        patcher = mock.patch.object(get_external_entities, '_print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_client(self):
+        return boto3.client('s3', endpoint_url='http://127.0.0.1:%d' % self.server.server_port,
+                            region_name='us-east-1', aws_access_key_id='key', aws_secret_access_key='secret',
+                            config=Config(s3={'addressing_style': 'path'}))
+
+    def _put(self, key, content):
+        self.client.put_object(Bucket='bucket', Key=key, Body=content)
+
+    def _sync(self):
+        self.downloaded = []
+        return get_external_entities.sync_dir(self.client, 'bucket', 'entity_data', self.target, thread_count=2)
+
+    def _read(self, file_name):
+        with open(os.path.join(self.target, file_name), 'rb') as local_file:
+            return local_file.read()
+
+    def test_unchanged_files_are_skipped(self):
+        self.assertEqual(self._sync()['downloaded'], 2)
+        self.assertEqual(sorted(self.downloaded), ['entity_data/city.csv', 'entity_data/restaurant.csv'])
+        self.assertEqual(self._read('city.csv'), b'value,variants\nmumbai,bombay\n')
+        manifest = get_external_entities.load_sync_manifest(self.target)
+        etag = manifest['entity_data/city.csv']['etag']
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+        stats = self._sync()
+        self.assertEqual((stats['downloaded'], stats['skipped']), (0, 2))
+        self.assertEqual(self.downloaded, [])
+
+    def test_changed_etag_is_downloaded(self):
+        self._sync()
+        self._put('entity_data/city.csv', b'value,variants\npune,poona\n')
+        stats = self._sync()
+        self.assertEqual((stats['downloaded'], stats['skipped']), (1, 1))
+        self.assertEqual(self.downloaded, ['entity_data/city.csv'])
+        self.assertEqual(self._read('city.csv'), b'value,variants\npune,poona\n')
+
+    def test_objects_listed_over_several_pages(self):
+        for i in range(5):
+            self._put('entity_data/more/city_%d.csv' % i, b'value,variants\ngoa,goa\n')
+        self.client.meta.events.register('before-parameter-build.s3.ListObjectsV2',
+                                         lambda params, **kwargs: params.setdefault('MaxKeys', 2))
+        listed_pages = []
+        self.client.meta.events.register('after-call.s3.ListObjectsV2',
+                                         lambda parsed, **kwargs: listed_pages.append(parsed.get('KeyCount')))
+
+        self.assertEqual(self._sync()['downloaded'], 7)
+        self.assertEqual(len(listed_pages), 4)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.target, 'more'))),
+                         ['city_%d.csv' % i for i in range(5)])
+        self.assertEqual(self._sync()['skipped'], 7)
+
+    def test_deleted_objects_are_removed(self):
+        self._sync()
+        self.client.delete_object(Bucket='bucket', Key='entity_data/restaurant.csv')
+        stats = self._sync()
+        self.assertEqual((stats['downloaded'], stats['skipped'], stats['removed']), (0, 1, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.target, 'restaurant.csv')))
+        self.assertNotIn('entity_data/restaurant.csv', get_external_entities.load_sync_manifest(self.target))
+
+    def test_failed_download_leaves_no_partial_file(self):
+        self._sync()
+        city_etag = get_external_entities.load_sync_manifest(self.target)['entity_data/city.csv']['etag']
+        self._put('entity_data/city.csv', b'value,variants\npune,poona\n')
+        # the object is deleted between listing and download
+        deleting_client = self._get_client()
+
+        def handler(**kwargs):
+            deleting_client.delete_object(Bucket='bucket', Key='entity_data/city.csv')
+
+        self.client.meta.events.register('after-call.s3.ListObjectsV2', handler)
+
+        with self.assertRaises(ClientError) as context:
+            self._sync()
+        self.assertEqual(context.exception.response['Error']['Code'], '404')
+        # the previous copy is kept and no temporary file is left behind
+        self.assertEqual(self._read('city.csv'), b'value,variants\nmumbai,bombay\n')
+        self.assertEqual(sorted(os.listdir(self.target)),
+                         sorted(['city.csv', 'restaurant.csv', get_external_entities.SYNC_MANIFEST_FILE_NAME]))
+        manifest = get_external_entities.load_sync_manifest(self.target)
+        self.assertEqual(manifest['entity_data/city.csv']['etag'], city_etag)
+
+        self.client.meta.events.unregister('after-call.s3.ListObjectsV2', handler)
+        self._put('entity_data/city.csv', b'value,variants\npune,poona\n')
+        self.assertEqual(self._sync()['downloaded'], 1)
+        self.assertEqual(self._read('city.csv'), b'value,variants\npune,poona\n')